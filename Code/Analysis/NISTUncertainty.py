@@ -8,6 +8,8 @@
 """ This module contains definitions for uncertainty analysis for NIST sparameter impedance.
 It follows uncertainty equations originally found in the calrep hp basic program, and
 is primarily used in the function calrep see also <a href="./SParameter.m.html">SParameter</a>.
+The frequency and magnitude arguments of all functions can be numbers or numpy arrays, scalar calls are cached
+and return lists of floats, array calls return lists of arrays.
 
 
 
@@ -38,6 +40,8 @@ import sys
 import os
 import re
 import math
+import functools
+import itertools
 #-----------------------------------------------------------------------------
 # Third Party Imports
 sys.path.append(os.path.join(os.path.dirname( __file__ ), '..','..'))
@@ -56,422 +60,357 @@ CONNECTOR_TYPES=['14 mm','7 mm', 'Type-N','3.5 mm', '2.92 mm', '2.4mm', '1.85 mm
 MINIMUM_DB=100
 """The smallest value in dB for a linear magnitude of zero. Note this one is positive,
 which is different than touchstone models definition."""
+SCALAR_CACHE_SIZE=2**16
+"""The number of scalar calls remembered by each uncertainty function"""
+# The coefficient tables are keyed by the regular expression that selects the connector or waveguide type,
+# the first key that matches is used and the last key '' matches everything else
+COAX_S11_S_NIST_COEFFICIENTS={'14':[.0005,0.],'7':[-3.303,.025],'N':[-3.327,.046],'3.5':[-3.281,.03],
+                              '2.9':[-3.281,.03],'2.4':[400.,.75],'':[400.,.75]}
+"""Coefficients of S NIST for S11 in coax, a constant magnitude for 14 mm, [a,b] of 10**(a+b*frequency) for 7 mm
+to 2.92 mm and [a,b] of 1/(a-b*frequency*exp(.04*frequency)) for everything else"""
+COAX_S11_TYPE_B_SCALES={'14':[1.,.5],'7':[1.,1.],'N':[1.,1.],'3.5':[2.,2.],'2.9':[2.4,2.4],'2.4':[2.92,2.92],
+                        '':[2.92,2.92]}
+"""Factors [magnitude,phase] that multiply the coax S11 type B uncertainties for each connector"""
+COAX_S12_S_NIST_CONNECTORS={'14':'14 mm','7':'7 mm','N':'Type-N','3.5|2.92':'3.5 mm','2.4':'2.4 mm','':None}
+"""The S NIST equations used for S21 in coax, 3.5 mm and 2.92 mm share the same equations"""
+COAX_S12_TYPE_B_SCALES={'14|7|N':1.,'3.5':2.,'2.92':2.4,'2.4':2.92,'':1.}
+"""Factors that multiply the coax S21 type B magnitude uncertainty for each connector"""
+COAX_POWER_CONNECTORS={'7':'7 mm','N':'Type-N','3.5':'3.5 mm','':None}
+"""The power (effective efficiency) equations used for each coax connector"""
+WAVEGUIDE_S11_S_NIST_UNCERTAINTIES={'90|62|42|28':[.0015,.09],'22|15':[.003,.17],'10':[.004,.23],'':[.004,.23]}
+"""S NIST [magnitude,phase] for S11 in waveguide"""
+WAVEGUIDE_S11_TYPE_B_COEFFICIENTS={'90':[.003,.2],'62':[.003,.5],'42':[.002,.85],'28':[.002,1.0],'22':[.004,1.53],
+                                   '15':[.004,2.29],'10':[.005,3.36],'':[.005,3.36]}
+"""Coefficients [magnitude,phase] of the type B uncertainty for S11 in waveguide"""
+WAVEGUIDE_S21_TYPE_B_UNCERTAINTIES={'90':[.02,.2],'62':[.02,.5],'42':[.01,.85],'28':[.01,1.0],'22':[.01,1.53],
+                                    '15':[.012,2.29],'10':[.022,3.36],'':[.022,3.36]}
+"""Type B [magnitude,phase] for S21 in waveguide before division by sqrt(3)"""
+WAVEGUIDE_POWER_S_NIST_UNCERTAINTIES={'90|62|42|28':[.2],'22|10':[.5],'15':[.75],'':[.75]}
+"""S NIST for power (effective efficiency) in waveguide"""
+WAVEGUIDE_POWER_TYPE_B_UNCERTAINTIES={'90|62|42|28':[.2],'22|15':[.4],'10':[.9],'':[.9]}
+"""Type B for power (effective efficiency) in waveguide"""
+WR_CONNECTOR_FAMILIES={'14|7|N|3|2':'coax','w':'waveguide','':None}
+"""Selects the coax or waveguide functions in S_NIST and type_b"""
+PARAMETER_TYPES={'11|22':'S11','12|21':'S21','p|eff':'Power','':None}
+"""Selects the reflection, transmission or power functions in S_NIST and type_b"""
 
 #-----------------------------------------------------------------------------
 # Module Functions
+@functools.lru_cache(maxsize=None)
+def match_type_key(type_string,keys):
+    """Returns the first regular expression in the tuple keys that matches type_string, ignoring case, or None.
+    The result is cached so each connector, waveguide, parameter or format string is only searched once"""
+    for key in keys:
+        if re.search(key,type_string,re.IGNORECASE):
+            return key
+    return None
+
+def lookup_type(type_string,table):
+    """Returns the value in the table (a dictionary keyed by regular expressions) of the first key that
+    matches type_string"""
+    return table[match_type_key(type_string,tuple(table.keys()))]
+
+def is_magnitude_format(format):
+    """Returns True if format is a linear magnitude format ('mag') and False if it is dB"""
+    return match_type_key(format,('mag',)) is not None
+
+def cached_scalar(function):
+    """Decorator for the uncertainty functions, calls with only scalar arguments are cached and return a list of
+    floats, calls with a list, tuple or array are passed to the vectorized function and return a list of arrays.
+    The cache is available as function.cache_info() and function.cache_clear()"""
+    def scalar_function(*args,**keywordargs):
+        return tuple(float(value) for value in function(*args,**keywordargs))
+    cached_function=functools.lru_cache(maxsize=SCALAR_CACHE_SIZE)(scalar_function)
+    @functools.wraps(function)
+    def cached_scalar_function(*args,**keywordargs):
+        for value in itertools.chain(args,keywordargs.values()):
+            if isinstance(value,(np.ndarray,list,tuple)):
+                return function(*args,**keywordargs)
+        return list(cached_function(*args,**keywordargs))
+    cached_scalar_function.cache_info=cached_function.cache_info
+    cached_scalar_function.cache_clear=cached_function.cache_clear
+    return cached_scalar_function
+
+def to_arrays(*values):
+    """Returns the values as float arrays broadcast to a common shape"""
+    return np.broadcast_arrays(*[np.asarray(value,dtype=float) for value in values])
+
+def broadcast_uncertainties(uncertainties,*values):
+    """Returns the list uncertainties unchanged if all values are scalars, otherwise each uncertainty (a constant
+    or an array) as a float array of the broadcast shape of values"""
+    if not any([isinstance(value,(np.ndarray,list,tuple)) for value in values]):
+        return uncertainties
+    shape=np.broadcast(*[np.asarray(value,dtype=float) for value in values]).shape
+    return [np.array(np.broadcast_to(np.asarray(uncertainty,dtype=float),shape)) for uncertainty in uncertainties]
+
+def magnitude_to_decibels(magnitude):
+    """Converts a linear magnitude to the positive dB (-20*log10(magnitude)) used by the S21 equations,
+    magnitudes less than or equal to zero are MINIMUM_DB"""
+    with np.errstate(divide='ignore',invalid='ignore'):
+        return np.where(magnitude<=0,float(MINIMUM_DB),-20.*np.log10(magnitude))
+
+def decibel_uncertainty_to_magnitude(magnitude,uncertainty_decibels):
+    """Converts an uncertainty in dB to an uncertainty in the linear magnitude"""
+    return np.abs((1./math.log10(math.e))*magnitude*uncertainty_decibels/20.)
+
+def decibel_regions(magnitude_decibels):
+    """Returns the conditions for the [0,25), [25,40) and [40,65) dB regions of the S21 equations"""
+    return [(magnitude_decibels>=0)&(magnitude_decibels<25),
+            (magnitude_decibels>=25)&(magnitude_decibels<40),
+            (magnitude_decibels>=40)&(magnitude_decibels<65)]
+
+@cached_scalar
 def coax_s11_S_NIST(connector_type='Type-N',frequency=1.0):
     """Calculates S_NIST, for S11 in coax systems"""
-    if re.search('14',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=.0005
-        uncertainty_phase=math.atan(uncertainty_magnitude)
-    elif re.search('7',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=10.0**(-3.303+.025*frequency)
-        uncertainty_phase=math.atan(uncertainty_magnitude)
-    elif re.search('N',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=10.0**(-3.327+.046*frequency)
-        uncertainty_phase=math.atan(uncertainty_magnitude)
-    elif re.search('3.5',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=10.0**(-3.281+.03*frequency)
-        uncertainty_phase=math.atan(uncertainty_magnitude)
-    elif re.search('2.9',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=10.0**(-3.281+.03*frequency)
-        uncertainty_phase=math.atan(uncertainty_magnitude)
-    elif re.search('2.4',connector_type,re.IGNORECASE):
-        # TODO: Fix this, the printed version is blurry
-        uncertainty_magnitude=1/(400.-.75*frequency*math.exp(.04*frequency))
-        uncertainty_phase=math.atan(uncertainty_magnitude)
-    else:
-        uncertainty_magnitude=1/(400.-.75*frequency*math.exp(.04*frequency))
-        uncertainty_phase=math.atan(uncertainty_magnitude)
+    [frequency]=to_arrays(frequency)
+    key=match_type_key(connector_type,tuple(COAX_S11_S_NIST_COEFFICIENTS.keys()))
+    [a,b]=COAX_S11_S_NIST_COEFFICIENTS[key]
+    with np.errstate(all='ignore'):
+        if key=='14':
+            uncertainty_magnitude=np.full(frequency.shape,a)
+        elif key in ['7','N','3.5','2.9']:
+            uncertainty_magnitude=10.0**(a+b*frequency)
+        else:
+            # TODO: Fix this, the printed version is blurry
+            uncertainty_magnitude=1/(a-b*frequency*np.exp(.04*frequency))
+        uncertainty_phase=np.arctan(uncertainty_magnitude)
     return [uncertainty_magnitude,uncertainty_phase]
 
+@cached_scalar
 def coax_s11_type_b(connector_type='Type-N',frequency=1.0,magnitude_S11=1.0):
     """Calculates Type-B uncertainties for S11 in a coax system"""
-    Dx=.001*(1.61+.07*math.sqrt(frequency)+.04/frequency)+.0012
-    Dy=.001*(.01*frequency+.04/frequency)
-    uncertainty_m1=math.sqrt(Dx**2+Dy**2)
-    uncertainty_m2=.00008/frequency
-    uncertainty_m3=.1651*math.sqrt(frequency)*5.*6*10**6/(.35*math.sqrt((1.4*10**7)**3))
-    delta=math.sqrt((uncertainty_m1**2+uncertainty_m2**2+uncertainty_m3**2)/3)
-    uncertainty_arg1=math.atan(uncertainty_m1/magnitude_S11)
-    uncertainty_arg2=math.atan(uncertainty_m2/magnitude_S11)
-    uncertainty_arg3=12.0115*frequency*.0025
-    delta_arg=math.sqrt((uncertainty_arg1**2+uncertainty_arg2**2+uncertainty_arg3**2)/3)
-    if re.search('14',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=delta
-        uncertainty_phase=.5*delta_arg
-    elif re.search('7',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=delta
-        uncertainty_phase=delta_arg
-    elif re.search('N',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=delta
-        uncertainty_phase=delta_arg
-    elif re.search('3.5',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=2*delta
-        uncertainty_phase=2*delta_arg
-    elif re.search('2.9',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=2.4*delta
-        uncertainty_phase=2.4*delta_arg
-    elif re.search('2.4',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=2.92*delta
-        uncertainty_phase=2.92*delta_arg
-    else:
-        uncertainty_magnitude=2.92*delta
-        uncertainty_phase=2.92*delta_arg
-    return [uncertainty_magnitude,uncertainty_phase]
+    [frequency,magnitude_S11]=to_arrays(frequency,magnitude_S11)
+    with np.errstate(all='ignore'):
+        Dx=.001*(1.61+.07*np.sqrt(frequency)+.04/frequency)+.0012
+        Dy=.001*(.01*frequency+.04/frequency)
+        uncertainty_m1=np.sqrt(Dx**2+Dy**2)
+        uncertainty_m2=.00008/frequency
+        uncertainty_m3=.1651*np.sqrt(frequency)*5.*6*10**6/(.35*math.sqrt((1.4*10**7)**3))
+        delta=np.sqrt((uncertainty_m1**2+uncertainty_m2**2+uncertainty_m3**2)/3)
+        uncertainty_arg1=np.arctan(uncertainty_m1/magnitude_S11)
+        uncertainty_arg2=np.arctan(uncertainty_m2/magnitude_S11)
+        uncertainty_arg3=12.0115*frequency*.0025
+        delta_arg=np.sqrt((uncertainty_arg1**2+uncertainty_arg2**2+uncertainty_arg3**2)/3)
+    [magnitude_scale,phase_scale]=lookup_type(connector_type,COAX_S11_TYPE_B_SCALES)
+    return [magnitude_scale*delta,phase_scale*delta_arg]
 
-def waveguide_s11_S_NIST(waveguide_type='WR90'):
-    """Caluclates the S NIST Uncertainity for S11 on waveguide systems"""
-    if re.search('90|62|42|28',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.0015
-        uncertainty_phase=.09
-    elif re.search('22|15',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.003
-        uncertainty_phase=.17
-    elif re.search('10',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.004
-        uncertainty_phase=.23
-    else:
-        uncertainty_magnitude=.004
-        uncertainty_phase=.23
-    return [uncertainty_magnitude,uncertainty_phase]
+@cached_scalar
+def waveguide_s11_S_NIST(waveguide_type='WR90',frequency=None):
+    """Caluclates the S NIST Uncertainity for S11 on waveguide systems, the uncertainties do not depend on
+    frequency, if frequency is an array they are arrays of its shape"""
+    return broadcast_uncertainties(list(lookup_type(waveguide_type,WAVEGUIDE_S11_S_NIST_UNCERTAINTIES)),frequency)
 
+@cached_scalar
 def waveguide_s11_type_b(waveguide_type='WR90',magnitude_S11=1.0):
     """Calculates type B uncertainties for waveguides"""
-    if re.search('90',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.003*(1.0+magnitude_S11**2)/math.sqrt(3.)
-        uncertainty_phase=math.sqrt(math.atan(uncertainty_magnitude/(magnitude_S11+.001))**2+0.2**2/3.)
-    elif re.search('62',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.003*(1.0+magnitude_S11**2)/math.sqrt(3.)
-        uncertainty_phase=math.sqrt(math.atan(uncertainty_magnitude/(magnitude_S11+.001))**2+0.5**2/3.)
-    elif re.search('42',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.002*(1.0+magnitude_S11**2)/math.sqrt(3.)
-        uncertainty_phase=math.sqrt(math.atan(uncertainty_magnitude/(magnitude_S11+.001))**2+0.85**2/3.)
-    elif re.search('28',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.002*(1.0+magnitude_S11**2)/math.sqrt(3.)
-        uncertainty_phase=math.sqrt(math.atan(uncertainty_magnitude/(magnitude_S11+.001))**2+1.0**2/3.)
-    elif re.search('22',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.004*(1.0+magnitude_S11**2)/math.sqrt(3.)
-        uncertainty_phase=math.sqrt(math.atan(uncertainty_magnitude/(magnitude_S11+.001))**2+1.53**2/3.)
-    elif re.search('15',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.004*(1.0+magnitude_S11**2)/math.sqrt(3.)
-        uncertainty_phase=math.sqrt(math.atan(uncertainty_magnitude/(magnitude_S11+.001))**2+2.29**2/3.)
-    elif re.search('10',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.005*(1.0+magnitude_S11**2)/math.sqrt(3.)
-        uncertainty_phase=math.sqrt(math.atan(uncertainty_magnitude/(magnitude_S11+.001))**2+3.36**2/3.)
-    else:
-        uncertainty_magnitude=.005*(1.0+magnitude_S11**2)/math.sqrt(3.)
-        uncertainty_phase=math.sqrt(math.atan(uncertainty_magnitude/(magnitude_S11+.001))**2+3.36**2/3.)
+    [magnitude_S11]=to_arrays(magnitude_S11)
+    [magnitude_coefficient,phase_coefficient]=lookup_type(waveguide_type,WAVEGUIDE_S11_TYPE_B_COEFFICIENTS)
+    with np.errstate(all='ignore'):
+        uncertainty_magnitude=magnitude_coefficient*(1.0+magnitude_S11**2)/math.sqrt(3.)
+        uncertainty_phase=np.sqrt(np.arctan(uncertainty_magnitude/(magnitude_S11+.001))**2+phase_coefficient**2/3.)
     return [uncertainty_magnitude,uncertainty_phase]
 
-
+@cached_scalar
 def coax_s12_S_NIST(connector_type='N',frequency=1,magnitude_S21=10,format='DB'):
-    """Calculates SNIST for connector type, power and frequency"""
-    frequency=float(frequency)
-    if re.search('mag',format,re.IGNORECASE):
+    """Calculates SNIST for connector type, power and frequency. Frequencies and magnitudes outside of the
+    ranges of the equations are nan"""
+    [frequency,magnitude_S21]=to_arrays(frequency,magnitude_S21)
+    magnitude=magnitude_S21
+    if is_magnitude_format(format):
         # if the format is mag then change the number to db
-        magnitude=magnitude_S21
-        try:
-            magnitude_S21=-20.*math.log10(magnitude_S21)
-        except:
-            magnitude_S21=MINIMUM_DB
-    if re.search('14',connector_type,re.IGNORECASE):
-        if magnitude_S21>=0 and magnitude_S21<25:
-            uncertainty_magnitude=.0005+.00035*frequency
-            uncertainty_phase=.02+.0153*frequency
-        elif magnitude_S21>=25 and magnitude_S21<40:
-            uncertainty_magnitude=.02
-            uncertainty_phase=.1+.017*frequency
-        elif magnitude_S21>=40 and magnitude_S21<65:
-            uncertainty_magnitude=.02+.00015*(magnitude_S21-40.)**2
-            uncertainty_phase=.1+.017*frequency
+        magnitude_S21=magnitude_to_decibels(magnitude)
+    connector=lookup_type(connector_type,COAX_S12_S_NIST_CONNECTORS)
+    regions=decibel_regions(magnitude_S21)
+    with np.errstate(all='ignore'):
+        high_loss=.02+.00015*(magnitude_S21-40.)**2
+        if connector=='14 mm':
+            uncertainty_magnitude=np.select(regions,[.0005+.00035*frequency,.02,high_loss],.004)
+            uncertainty_phase=np.select(regions,[.02+.0153*frequency,.1+.017*frequency,.1+.017*frequency],np.nan)
+        elif connector=='7 mm':
+            low_frequency=(frequency>=.01)&(frequency<1.)
+            high_frequency=(frequency>=1.)&(frequency<=18.)
+            conditions=[regions[0]&low_frequency,regions[0]&high_frequency,
+                        regions[1]&low_frequency,regions[1]&high_frequency,
+                        regions[2]&low_frequency,regions[2]&high_frequency]
+            uncertainty_magnitude=np.select(conditions,[10.**(-3.06+.051*frequency),10.**(-2.816+.038*frequency),
+                                                        .02,.02,high_loss,high_loss],np.nan)
+            uncertainty_phase=np.select(conditions,[10.**(-1.95+.792*frequency),10.**(-.927+.023*frequency),
+                                                    10.**(-.96+.259*frequency),.1+.017*frequency,
+                                                    10.**(-.96+.259*frequency),.1+.017*frequency],np.nan)
+            beyond_65=~(regions[0]|regions[1]|regions[2])
+            uncertainty_magnitude=np.where(beyond_65,.004,uncertainty_magnitude)
+            uncertainty_phase=np.where(beyond_65,.1+.017*frequency,uncertainty_phase)
+        elif connector=='Type-N':
+            uncertainty_magnitude=np.select(regions[:2],[10.**(-2.17+.024*frequency),.02],high_loss)
+            uncertainty_phase=np.select(regions[:1],[10.**(-1.138+.032*frequency)],.1+.017*frequency)
+        elif connector=='3.5 mm':
+            uncertainty_phase=.1+.0098*frequency
+            uncertainty_magnitude=np.select(regions[1:],[.02,high_loss],.0005+.00027*frequency)
+        elif connector=='2.4 mm':
+            uncertainty_phase=.1+.0098*frequency
+            uncertainty_magnitude=np.select(regions[1:],[.03,.03+.00015*(magnitude_S21-40.)**2],.01+.0004*frequency)
         else:
-            uncertainty_magnitude=.004
-        #enforce min uncertainties
-        if uncertainty_magnitude<.004:
-            uncertainty_magnitude=.004
-
-    elif re.search('7',connector_type,re.IGNORECASE):
-        if magnitude_S21>=0 and magnitude_S21<25:
-            if frequency>=.01 and frequency<1.:
-                uncertainty_magnitude=10.**(-3.06+.051*frequency)
-                uncertainty_phase=10.**(-1.95+.792*frequency)
-            elif frequency>=1. and frequency<=18.:
-                uncertainty_magnitude=10.**(-2.816+.038*frequency)
-                uncertainty_phase=10.**(-.927+.023*frequency)
-        elif magnitude_S21>=25 and magnitude_S21<40:
-            if frequency>=.01 and frequency<1.:
-                uncertainty_magnitude=.02
-                uncertainty_phase=10.**(-.96+.259*frequency)
-            elif frequency>=1. and frequency<=18.:
-                uncertainty_magnitude=.02
-                uncertainty_phase=.1+.017*frequency
-        elif magnitude_S21>=40 and magnitude_S21<65:
-            if frequency>=.01 and frequency<1.:
-                uncertainty_magnitude=.02+.00015*(magnitude_S21-40)**2
-                uncertainty_phase=10.**(-.96+.259*frequency)
-            elif frequency>=1. and frequency<=18.:
-                uncertainty_magnitude=.02+.00015*(magnitude_S21-40)**2
-                uncertainty_phase=.1+.017*frequency
-        else:
-            uncertainty_phase=.1+.017*frequency
-            uncertainty_magnitude=.004
-        #enforce min uncertainties
-        if uncertainty_magnitude<.004:
-            uncertainty_magnitude=.004
-
-    elif re.search('N',connector_type,re.IGNORECASE):
-        if magnitude_S21>=0 and magnitude_S21<25:
-            uncertainty_magnitude=10.**(-2.17+.024*frequency)
-            uncertainty_phase=10.**(-1.138+.032*frequency)
-        elif magnitude_S21>=25 and magnitude_S21<40:
-            uncertainty_magnitude=.02
-            uncertainty_phase=.1+.017*frequency
-        elif magnitude_S21>=40 and magnitude_S21<65:
-            uncertainty_magnitude=.02+.00015*(magnitude_S21-40.)**2
-            uncertainty_phase=.1+.017*frequency
-        else:
-            uncertainty_magnitude=.02+.00015*(magnitude_S21-40.)**2
-            uncertainty_phase=.1+.017*frequency
-        #enforce min uncertainties
-        if uncertainty_magnitude<.004:
-            uncertainty_magnitude=.004
-    elif re.search('3.5|2.92|2.4',connector_type,re.IGNORECASE):
-        # All of the following cases have the same phase uncertainty
-        uncertainty_phase=.1+.0098*frequency
-        if re.search('3.5|2.92',connector_type,re.IGNORECASE):
-            # 3.5mm and 2.92mm have the same mag relations
-            if magnitude_S21>=0 and magnitude_S21<25:
-                uncertainty_magnitude=.0005+.00027*frequency
-            elif magnitude_S21>=25 and magnitude_S21<40:
-                uncertainty_magnitude=.02
-            elif magnitude_S21>=40 and magnitude_S21<65:
-                uncertainty_magnitude=.02+.00015*(magnitude_S21-40.)**2
-            else:
-                uncertainty_magnitude = .0005 + .00027 * frequency
-        elif re.search('2.4',connector_type,re.IGNORECASE):
-            # 3.5mm and 2.92mm have the same mag relations
-            if magnitude_S21>=0 and magnitude_S21<25:
-                uncertainty_magnitude=.01+.0004*frequency
-            elif magnitude_S21>=25 and magnitude_S21<40:
-                uncertainty_magnitude=.03
-            elif magnitude_S21>=40 and magnitude_S21<65:
-                uncertainty_magnitude=.03+.00015*(magnitude_S21-40.)**2
-            else:
-                uncertainty_magnitude = .01 + .0004 * frequency
-    else:
-        uncertainty_magnitude=.002
-        uncertainty_phase=.01
-        #enforce min uncertainties
-    if uncertainty_magnitude<.002:
-        uncertainty_magnitude=.002
-    #enforce min uncertainties
-    if uncertainty_phase<.01:
-        uncertainty_phase=.01
-    if re.search('mag',format,re.IGNORECASE):
-        # if the format is mag then change the uncertainty back to mag
-        uncertainty_magnitude=abs((1./math.log10(math.e))*magnitude*uncertainty_magnitude/20.)
+            uncertainty_magnitude=np.full(frequency.shape,.002)
+            uncertainty_phase=np.full(frequency.shape,.01)
+        #enforce min uncertainties, nan (undefined) values stay nan
+        if connector in ['14 mm','7 mm','Type-N']:
+            uncertainty_magnitude=np.maximum(uncertainty_magnitude,.004)
+        uncertainty_magnitude=np.maximum(uncertainty_magnitude,.002)
+        uncertainty_phase=np.maximum(uncertainty_phase,.01)
+        if is_magnitude_format(format):
+            # if the format is mag then change the uncertainty back to mag
+            uncertainty_magnitude=decibel_uncertainty_to_magnitude(magnitude,uncertainty_magnitude)
     return [uncertainty_magnitude,uncertainty_phase]
 
+@cached_scalar
 def coax_s12_type_b(connector_type='N',frequency=1,magnitude_S21=10,format='DB'):
     """Calculates the type-b uncertainty for coax connecters"""
-    if re.search('mag',format,re.IGNORECASE):
-        # if the format is mag then change the number to db
-        magnitude=magnitude_S21
-        try:
-            magnitude_S21=-20.*math.log10(magnitude_S21)
-        except:
-            magnitude_S21=MINIMUM_DB
-    uncertainty_m4=.0006*math.sqrt(frequency)+.0011
-    uncertainty_m5=(1.434*math.sqrt(frequency)*5.*6.*10**6)/(.35*math.sqrt((1.4*10**7)**3))
-    delta=math.sqrt((uncertainty_m4**2+uncertainty_m5**2)/3)
-    uncertainty_arg4=math.atan(.01*math.sqrt((.017+.018*math.sqrt(frequency)+.05*frequency+.018*frequency**2)))
-    uncertainty_arg5=12.0115*frequency*.0025
-    delta_arg=math.sqrt((uncertainty_arg4**2+uncertainty_arg5**2)/3)
-    if frequency<=1.:
-        delta_arg=.03
-    if re.search('14|7|N',connector_type,re.IGNORECASE):
-        uncertainty_magnitude=delta
-        uncertainty_phase=delta_arg
-    elif re.search('3.5|2.92|2.4',connector_type,re.IGNORECASE):
-        uncertainty_phase=delta_arg
-        if re.search('3.5',connector_type,re.IGNORECASE):
-            uncertainty_magnitude=2.*delta
-        elif re.search('2.92',connector_type,re.IGNORECASE):
-            uncertainty_magnitude=2.4*delta
-        elif re.search('2.4',connector_type,re.IGNORECASE):
-            uncertainty_magnitude=2.92*delta
-    else :
-        uncertainty_magnitude=delta
-        uncertainty_phase=delta_arg
-    if re.search('mag',format,re.IGNORECASE):
-        #print("Converting Back to Mag")
-        # if the format is mag then change the uncertainty back to mag
-        uncertainty_magnitude=abs((1/math.log10(math.e))*magnitude*uncertainty_magnitude/20.)
-        #print("Type B Uncertainty magnitude is {0} ".format(uncertainty_magnitude))
-    return [uncertainty_magnitude,uncertainty_phase]
+    [frequency,magnitude_S21]=to_arrays(frequency,magnitude_S21)
+    with np.errstate(all='ignore'):
+        uncertainty_m4=.0006*np.sqrt(frequency)+.0011
+        uncertainty_m5=(1.434*np.sqrt(frequency)*5.*6.*10**6)/(.35*math.sqrt((1.4*10**7)**3))
+        delta=np.sqrt((uncertainty_m4**2+uncertainty_m5**2)/3)
+        uncertainty_arg4=np.arctan(.01*np.sqrt((.017+.018*np.sqrt(frequency)+.05*frequency+.018*frequency**2)))
+        uncertainty_arg5=12.0115*frequency*.0025
+        delta_arg=np.sqrt((uncertainty_arg4**2+uncertainty_arg5**2)/3)
+        delta_arg=np.where(frequency<=1.,.03,delta_arg)
+        uncertainty_magnitude=lookup_type(connector_type,COAX_S12_TYPE_B_SCALES)*delta
+        if is_magnitude_format(format):
+            # if the format is mag then change the uncertainty back to mag
+            uncertainty_magnitude=decibel_uncertainty_to_magnitude(magnitude_S21,uncertainty_magnitude)
+    return [uncertainty_magnitude,delta_arg]
 
+@cached_scalar
 def waveguide_s21_S_NIST(magnitude_S21=1,format='DB'):
     """Calculates SNIST for S21 in Waveguides"""
-    if re.search('mag',format,re.IGNORECASE):
+    [magnitude_S21]=to_arrays(magnitude_S21)
+    magnitude=magnitude_S21
+    if is_magnitude_format(format):
         # if the format is mag then change the number to db
-        magnitude=magnitude_S21
-        try:
-            magnitude_S21=-20.*math.log10(magnitude_S21)
-        except:
-            magnitude_S21=MINIMUM_DB
-    uncertainty_phase=.15
-    if magnitude_S21>=0 and magnitude_S21<25:
-        uncertainty_magnitude=.01
-    elif magnitude_S21>=25 and magnitude_S21<=40:
-        uncertainty_magnitude=.02
-    elif magnitude_S21>40:
-        uncertainty_magnitude=.02+.00015*(magnitude_S21-40)**2
-    else:
-        uncertainty_magnitude=.02+.00015*(magnitude_S21-40)**2
-    if re.search('mag',format,re.IGNORECASE):
-        # if the format is mag then change the uncertainty back to mag
-        uncertainty_magnitude=abs((1/math.log10(math.e))*magnitude*uncertainty_magnitude/20.)
+        magnitude_S21=magnitude_to_decibels(magnitude)
+    with np.errstate(all='ignore'):
+        uncertainty_phase=np.full(magnitude_S21.shape,.15)
+        uncertainty_magnitude=np.select([(magnitude_S21>=0)&(magnitude_S21<25),
+                                         (magnitude_S21>=25)&(magnitude_S21<=40)],
+                                        [.01,.02],.02+.00015*(magnitude_S21-40)**2)
+        if is_magnitude_format(format):
+            # if the format is mag then change the uncertainty back to mag
+            uncertainty_magnitude=decibel_uncertainty_to_magnitude(magnitude,uncertainty_magnitude)
     return [uncertainty_magnitude,uncertainty_phase]
 
+@cached_scalar
 def waveguide_s21_type_b(waveguide_type='WR90',magnitude_S21=1,format='DB'):
     """Calculates type B uncertainty for S21 in Waveguides"""
-    if re.search('mag',format,re.IGNORECASE):
+    [magnitude_S21]=to_arrays(magnitude_S21)
+    if is_magnitude_format(format):
         # if the format is mag then change the number to db
-        magnitude=magnitude_S21
-        try:
-            magnitude_S21=-20.*math.log10(magnitude_S21)
-        except:
-            magnitude_S21=MINIMUM_DB
-    if re.search('90',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.02/math.sqrt(3)
-        uncertainty_phase=.2/math.sqrt(3)
-    elif re.search('62',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.02/math.sqrt(3)
-        uncertainty_phase=.5/math.sqrt(3)
-    elif re.search('42',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.01/math.sqrt(3)
-        uncertainty_phase=.85/math.sqrt(3)
-    elif re.search('28',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.01/math.sqrt(3)
-        uncertainty_phase=1.0/math.sqrt(3)
-    elif re.search('22',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.01/math.sqrt(3)
-        uncertainty_phase=1.53/math.sqrt(3)
-    elif re.search('15',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.012/math.sqrt(3)
-        uncertainty_phase=2.29/math.sqrt(3)
-    elif re.search('10',waveguide_type,re.IGNORECASE):
-        uncertainty_magnitude=.022/math.sqrt(3)
-        uncertainty_phase=3.36/math.sqrt(3)
-    else:
-        uncertainty_magnitude=.022/math.sqrt(3)
-        uncertainty_phase=3.36/math.sqrt(3)
-
-    if re.search('mag',format,re.IGNORECASE):
+        magnitude_S21=magnitude_to_decibels(magnitude_S21)
+    [uncertainty_magnitude,uncertainty_phase]=[value/math.sqrt(3) for value in
+                                               lookup_type(waveguide_type,WAVEGUIDE_S21_TYPE_B_UNCERTAINTIES)]
+    uncertainty_magnitude=np.full(magnitude_S21.shape,uncertainty_magnitude)
+    uncertainty_phase=np.full(magnitude_S21.shape,uncertainty_phase)
+    if is_magnitude_format(format):
         # if the format is mag then change the uncertainty back to mag
-        uncertainty_magnitude=abs((1/math.log10(math.e))*magnitude_S21*uncertainty_magnitude/20.)
+        uncertainty_magnitude=decibel_uncertainty_to_magnitude(magnitude_S21,uncertainty_magnitude)
     return [uncertainty_magnitude,uncertainty_phase]
 
+@cached_scalar
 def coax_power_S_NIST(connector_type='N',frequency=1.):
-    """Calculates SNIST for coax power measurements"""
-    if re.search('7',connector_type,re.IGNORECASE):
-        uncertainty_eff=.09+.01*frequency
-    elif re.search('N',connector_type,re.IGNORECASE):
-        uncertainty_eff=10**(-1.4+.04*frequency)
-    elif re.search('3.5',connector_type,re.IGNORECASE):
-        if frequency<.05:
+    """Calculates SNIST for coax power measurements, frequencies above 18 GHz are nan for 3.5 mm"""
+    [frequency]=to_arrays(frequency)
+    connector=lookup_type(connector_type,COAX_POWER_CONNECTORS)
+    with np.errstate(all='ignore'):
+        if connector=='7 mm':
+            uncertainty_eff=.09+.01*frequency
+        elif connector=='Type-N':
             uncertainty_eff=10**(-1.4+.04*frequency)
-        elif frequency>=.05 and frequency<=18.:
-            uncertainty_eff=.25
-    else:
-        uncertainty_eff=.25
+        elif connector=='3.5 mm':
+            uncertainty_eff=np.select([frequency<.05,(frequency>=.05)&(frequency<=18.)],
+                                      [10**(-1.4+.04*frequency),.25],np.nan)
+        else:
+            uncertainty_eff=np.full(frequency.shape,.25)
     return [uncertainty_eff]
 
+@cached_scalar
 def coax_power_type_b(connector_type='N',frequency=1.):
-    """Calculates type b for coax power measurements"""
-    if re.search('7',connector_type,re.IGNORECASE):
-        uncertainty_eff=math.sqrt((.365+.105*math.sqrt(frequency)/math.sqrt(3))**2+.2**2/3)
-    elif re.search('N',connector_type,re.IGNORECASE):
-        if frequency<.05:
-            uncertainty_eff=math.sqrt((.365+.105*math.sqrt(frequency)/math.sqrt(3))**2+.2**2/3)
-        elif frequency>=.05 and frequency<=18.:
-            uncertainty_eff=math.sqrt((.09+.00267*frequency+.000223*frequency**2)**2+.2**2/3)
-    elif re.search('3.5',connector_type,re.IGNORECASE):
-        if frequency<.05:
-            uncertainty_eff=.0103*frequency+.582
-        elif frequency>=.05 and frequency<=18.:
-            uncertainty_eff=.7
-    else:
-        uncertainty_eff=.7
-
+    """Calculates type b for coax power measurements, frequencies above 18 GHz are nan for Type-N and 3.5 mm"""
+    [frequency]=to_arrays(frequency)
+    connector=lookup_type(connector_type,COAX_POWER_CONNECTORS)
+    with np.errstate(all='ignore'):
+        low_frequency=np.sqrt((.365+.105*np.sqrt(frequency)/math.sqrt(3))**2+.2**2/3)
+        if connector=='7 mm':
+            uncertainty_eff=low_frequency
+        elif connector=='Type-N':
+            uncertainty_eff=np.select([frequency<.05,(frequency>=.05)&(frequency<=18.)],
+                                      [low_frequency,
+                                       np.sqrt((.09+.00267*frequency+.000223*frequency**2)**2+.2**2/3)],np.nan)
+        elif connector=='3.5 mm':
+            uncertainty_eff=np.select([frequency<.05,(frequency>=.05)&(frequency<=18.)],
+                                      [.0103*frequency+.582,.7],np.nan)
+        else:
+            uncertainty_eff=np.full(frequency.shape,.7)
     return [uncertainty_eff]
 
-def waveguide_power_S_NIST(waveguide_type='WR90'):
-    """Calculates SNIST for waveguide systems"""
-    if re.search('90|62|42|28',waveguide_type,re.IGNORECASE):
-        uncertainty_eff = .2
-    elif re.search('22|10',waveguide_type,re.IGNORECASE):
-        uncertainty_eff = .5
-    elif re.search('15',waveguide_type,re.IGNORECASE):
-        uncertainty_eff = .75
-    else:
-        uncertainty_eff = .75
-    return [uncertainty_eff]
+@cached_scalar
+def waveguide_power_S_NIST(waveguide_type='WR90',frequency=None):
+    """Calculates SNIST for waveguide systems, if frequency is an array the constants are arrays of its shape"""
+    return broadcast_uncertainties(list(lookup_type(waveguide_type,WAVEGUIDE_POWER_S_NIST_UNCERTAINTIES)),frequency)
 
-def waveguide_power_type_b(waveguide_type='WR90'):
-    """Calculates type b for waveguide systems"""
-    if re.search('90|62|42|28',waveguide_type,re.IGNORECASE):
-        uncertainty_eff = .2
-    elif re.search('22|15',waveguide_type,re.IGNORECASE):
-        uncertainty_eff = .4
-    elif re.search('10',waveguide_type,re.IGNORECASE):
-        uncertainty_eff = .9
-    else:
-        uncertainty_eff = .9
-    return [uncertainty_eff]
+@cached_scalar
+def waveguide_power_type_b(waveguide_type='WR90',frequency=None):
+    """Calculates type b for waveguide systems, if frequency is an array the constants are arrays of its shape"""
+    return broadcast_uncertainties(list(lookup_type(waveguide_type,WAVEGUIDE_POWER_TYPE_B_UNCERTAINTIES)),frequency)
 
+@cached_scalar
 def S_NIST(wr_connector_type='Type-N', frequency=1, parameter='S11', magnitude=1.0, phase=0, format='mag'):
     """S_NIST calculates the Standard NIST uncertainty given the connector_type, parameter (S11,S12 or Power)
-     frequency, magnitude and phase"""
+     frequency, magnitude and phase. Frequency, magnitude and phase can be numbers or arrays"""
     out=[0]
-    if re.search('14|7|N|3|2', wr_connector_type, re.IGNORECASE):
-        if re.search('11|22',parameter,re.IGNORECASE):
+    family=lookup_type(wr_connector_type,WR_CONNECTOR_FAMILIES)
+    parameter_type=lookup_type(parameter,PARAMETER_TYPES)
+    if family=='coax':
+        if parameter_type=='S11':
             out=coax_s11_S_NIST(connector_type=wr_connector_type, frequency=frequency)
-        elif re.search('12|21',parameter,re.IGNORECASE):
+        elif parameter_type=='S21':
             out=coax_s12_S_NIST(connector_type=wr_connector_type, magnitude_S21=magnitude,
                                 frequency=frequency, format=format)
-        elif re.search('p|eff',parameter,re.IGNORECASE):
+        elif parameter_type=='Power':
             out=coax_power_S_NIST(connector_type=wr_connector_type, frequency=frequency)
-    elif re.search('w', wr_connector_type, re.IGNORECASE):
-        if re.search('11|22',parameter,re.IGNORECASE):
-            out=waveguide_s11_S_NIST(wr_connector_type)
-        elif re.search('21|12',parameter,re.IGNORECASE):
+    elif family=='waveguide':
+        if parameter_type=='S11':
+            out=waveguide_s11_S_NIST(wr_connector_type,frequency=frequency)
+        elif parameter_type=='S21':
             out=waveguide_s21_S_NIST(magnitude_S21=magnitude,format=format)
-        elif re.search('p|eff',parameter,re.IGNORECASE):
-            out=waveguide_power_S_NIST(waveguide_type=wr_connector_type)
+        elif parameter_type=='Power':
+            out=waveguide_power_S_NIST(waveguide_type=wr_connector_type,frequency=frequency)
+        # the waveguide uncertainties depend on at most one of frequency and magnitude
+        out=broadcast_uncertainties(out,frequency,magnitude)
     return out
 
+@cached_scalar
 def type_b(wr_connector_type='Type-N', frequency=1, parameter='S11', magnitude=1.0, phase=0, format='mag'):
     """type_b calculates the Standard type_b uncertainty given the connector_type, parameter (S11,S12 or Power)
-     frequency, magnitude and phase"""
+     frequency, magnitude and phase. Frequency, magnitude and phase can be numbers or arrays"""
     out=[0]
-    if re.search('14|7|N|3|2', wr_connector_type, re.IGNORECASE):
-        if re.search('11|22',parameter,re.IGNORECASE):
+    family=lookup_type(wr_connector_type,WR_CONNECTOR_FAMILIES)
+    parameter_type=lookup_type(parameter,PARAMETER_TYPES)
+    if family=='coax':
+        if parameter_type=='S11':
             out=coax_s11_type_b(connector_type=wr_connector_type, frequency=frequency,
                                 magnitude_S11=magnitude)
-        elif re.search('12|21',parameter,re.IGNORECASE):
+        elif parameter_type=='S21':
             out=coax_s12_type_b(connector_type=wr_connector_type,
                                 magnitude_S21=magnitude, frequency=frequency, format=format)
-        elif re.search('p|eff',parameter,re.IGNORECASE):
+        elif parameter_type=='Power':
             out=coax_power_type_b(connector_type=wr_connector_type, frequency=frequency)
-    elif re.search('w', wr_connector_type, re.IGNORECASE):
-        if re.search('11|22',parameter,re.IGNORECASE):
+    elif family=='waveguide':
+        if parameter_type=='S11':
             out=waveguide_s11_type_b(wr_connector_type)
-        elif re.search('21|12',parameter,re.IGNORECASE):
+        elif parameter_type=='S21':
             out=waveguide_s21_type_b(magnitude_S21=magnitude,format=format)
-        elif re.search('p|eff',parameter,re.IGNORECASE):
-            out=waveguide_power_type_b(waveguide_type=wr_connector_type)
+        elif parameter_type=='Power':
+            out=waveguide_power_type_b(waveguide_type=wr_connector_type,frequency=frequency)
+        out=broadcast_uncertainties(out,frequency,magnitude)
     return out
 
 
@@ -480,12 +419,36 @@ def type_b(wr_connector_type='Type-N', frequency=1, parameter='S11', magnitude=1
 
 #-----------------------------------------------------------------------------
 # Module Scripts
-def test_uncertainty():
-    frequency=np.linspace(.1,18,1000)
-    s11_mag_thru=[0 for i in range(1000)]
-    s12_mag_thru=[1 for i in range(1000)]
+def test_uncertainty(connector_type='Type-N',number_points=1000):
+    """Calculates S_NIST and type_b for a thru on a sweep of number_points frequencies, with one array call and
+    one scalar call per point, checks that they agree and prints the times"""
+    import time
+    frequency=np.linspace(.1,18,number_points)
+    s11_mag_thru=np.zeros(number_points)
+    s12_mag_thru=np.ones(number_points)
+    for parameter,magnitude in [('magS11',s11_mag_thru),('magS21',s12_mag_thru)]:
+        for uncertainty_function in [S_NIST,type_b]:
+            uncertainty_function.cache_clear()
+            start=time.time()
+            array_uncertainties=uncertainty_function(wr_connector_type=connector_type,frequency=frequency,
+                                                     parameter=parameter,magnitude=magnitude)
+            array_time=time.time()-start
+            scalar_times=[]
+            for repeat in range(2):
+                start=time.time()
+                scalar_uncertainties=[uncertainty_function(wr_connector_type=connector_type,frequency=frequency_value,
+                                                           parameter=parameter,magnitude=magnitude_value)
+                                      for frequency_value,magnitude_value in zip(frequency.tolist(),
+                                                                                 magnitude.tolist())]
+                scalar_times.append(time.time()-start)
+            difference=np.nanmax(np.abs(np.array(scalar_uncertainties).T-np.array(array_uncertainties)))
+            print(("{0}({1},{2}): array {3:.5f} s, scalar {4:.5f} s, cached scalar {5:.5f} s, "
+                   "largest difference {6}".format(uncertainty_function.__name__,connector_type,parameter,
+                                                   array_time,scalar_times[0],scalar_times[1],difference)))
+            print(("The scalar cache is {0}".format(uncertainty_function.cache_info())))
 
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    for connector_type in ['Type-N','WR15']:
+        test_uncertainty(connector_type)
\ No newline at end of file
@@ -52,6 +52,13 @@ import datetime
 import sys
 import cmath
 import math
+import collections
+import tempfile
+try:
+    from concurrent.futures import ProcessPoolExecutor,ThreadPoolExecutor
+except:
+    ProcessPoolExecutor=None
+    ThreadPoolExecutor=None
 
 #-----------------------------------------------------------------------------
 # Third Party Imports
@@ -141,34 +148,30 @@ def add_white_noise_s2p(s2p_model,noise_level=.0005):
     noisy_s2p=S2PV1(**options)
     return noisy_s2p
 
+def model_column_array(model, column_name="Frequency"):
+    """Returns the column column_name of model as a numpy array, using the column cache of models that have
+    get_column_array (AsciiDataTable, SNP) and np.array(model[column_name]) for other models. The cached arrays
+    are read only"""
+    if hasattr(model, "get_column_array"):
+        return model.get_column_array(column_name)
+    return np.array(model[column_name])
+
 def frequency_model_collapse_multiple_measurements(model, **options):
     """Returns a model with a single set of frequencies. Default is to average values together
     but geometric mean, std, variance, rss, mad and median are options.
     Geometric means of odd number of negative values fails"""
     if type(model) in [pandas.DataFrame]:
         model_1 = DataFrame_to_AsciiDataTable(model)
-    defaults = {"method": "mean"}
-    # load other options from model
-    for option, value in model.options.items():
-        if not re.search('begin_line|end_line', option):
-            defaults[option] = value
-    for element in model.elements:
-        if model.__dict__[element]:
-            if re.search("meta", element, re.IGNORECASE):
-                defaults["metadata"] = model.metadata.copy()
-            else:
-                defaults[element] = model.__dict__[element][:]
-    # We need to preserve the frequency column some how
-    collapse_options = {}
-    for key, value in defaults.items():
-        collapse_options[key] = value
-    for key, value in options.items():
-        collapse_options[key] = value
-    unique_frequency_list = sorted(list(set(model["Frequency"])))
+    collapse_options = frequency_model_collapse_options(model, **options)
     frequency_selector = model.column_names.index("Frequency")
+    # the rows of each frequency, gathered in one pass in the order of model.data
+    frequency_rows = {}
+    for row in model.data:
+        frequency_rows.setdefault(row[frequency_selector], []).append(row)
+    unique_frequency_list = sorted(frequency_rows.keys())
     out_data = []
     for index, frequency in enumerate(unique_frequency_list):
-        data_row = [x for x in model.data[:] if x[frequency_selector] == frequency]
+        data_row = frequency_rows[frequency]
         if re.search('mean|av', collapse_options["method"], re.IGNORECASE):
             new_row = np.mean(np.array(data_row), axis=0).tolist()
         elif re.search('median', collapse_options["method"], re.IGNORECASE):
@@ -188,8 +191,34 @@ def frequency_model_collapse_multiple_measurements(model, **options):
         new_row[frequency_selector]=frequency
         out_data.append(new_row)
 
-    collapse_options["data"] = out_data
+    return frequency_model_from_collapse(collapse_options, out_data)
 
+def frequency_model_collapse_options(model, **options):
+    """Returns the options used to build a collapsed model, the options and elements of model updated
+    with options. The default method is mean"""
+    defaults = {"method": "mean"}
+    # load other options from model
+    for option, value in model.options.items():
+        if not re.search('begin_line|end_line', option):
+            defaults[option] = value
+    for element in model.elements:
+        if model.__dict__[element]:
+            if re.search("meta", element, re.IGNORECASE):
+                defaults["metadata"] = model.metadata.copy()
+            else:
+                defaults[element] = model.__dict__[element][:]
+    # We need to preserve the frequency column some how
+    collapse_options = {}
+    for key, value in defaults.items():
+        collapse_options[key] = value
+    for key, value in options.items():
+        collapse_options[key] = value
+    return collapse_options
+
+def frequency_model_from_collapse(collapse_options, data):
+    """Returns an AsciiDataTable with the options from frequency_model_collapse_options and the collapsed data,
+    the specific_descriptor is prefixed with the method"""
+    collapse_options["data"] = data
     if collapse_options["specific_descriptor"]:
         collapse_options["specific_descriptor"] = collapse_options["method"] + "_" + \
                                                   collapse_options["specific_descriptor"]
@@ -216,14 +245,20 @@ def frequency_model_difference(model_1, model_2, **options):
     if type(model_2) in [pandas.DataFrame]:
         model_2 = DataFrame_to_AsciiDataTable(model_2)
     # now start with a set of frequencies (unique values from both)
-    frequency_set_1 = set(model_1["Frequency"])
-    frequency_set_2 = set(model_2["Frequency"])
-    model_2_frequency_selector = model_2.column_names.index('Frequency')
+    model_1_column_index = column_index_map(model_1.column_names)
+    model_2_column_index = column_index_map(model_2.column_names)
+    model_1_frequency_selector = model_1_column_index['Frequency']
+    model_2_frequency_selector = model_2_column_index['Frequency']
+    # the first row of model_2 at each frequency
+    model_2_frequency_rows = {}
+    for row in model_2.data:
+        model_2_frequency_rows.setdefault(row[model_2_frequency_selector], row)
+    frequency_set_1 = set(model_column_array(model_1, "Frequency").tolist())
     column_names_set_1 = set(model_1.column_names)
     column_names_set_2 = set(model_2.column_names)
 
     # All points must be in the intersection to be used
-    frequency_intersection = list(frequency_set_1.intersection(frequency_set_2))
+    frequency_intersection = frequency_set_1.intersection(model_2_frequency_rows.keys())
     column_names_intersection = list(column_names_set_1.intersection(column_names_set_2))
 
     if not frequency_intersection:
@@ -236,27 +271,27 @@ def frequency_model_difference(model_1, model_2, **options):
             new_column_names.append(column)
             column_types.append(model_1.options["column_types"][column_index])
 
+    # (column index in model_1, column index in model_2 or None to copy the model_1 value) for each output column
+    difference_columns = []
+    for column_index, column in enumerate(model_1.column_names):
+        if column in column_names_intersection and column not in ["Frequency"]:
+            model_2_column_selector = model_2_column_index[column]
+            if re.search('int|float', model_1.options["column_types"][column_index], re.IGNORECASE) and \
+                    re.search('int|float', model_2.options["column_types"][model_2_column_selector], re.IGNORECASE):
+                difference_columns.append((column_index, model_2_column_selector))
+            elif difference_options["columns"] in ["all"]:
+                difference_columns.append((column_index, None))
     difference_data = []
-    for row_index, frequency in enumerate(model_1["Frequency"]):
-        new_row = [frequency]
+    for row in model_1.data:
+        frequency = row[model_1_frequency_selector]
         if frequency in frequency_intersection:
-            model_2_frequency_row =list( filter(lambda x: x[model_2_frequency_selector] == frequency, model_2.data))[0]
-            # print("{0} is {1}".format("model_2_frequency_row",model_2_frequency_row))
-            for column_index, column in enumerate(model_1.column_names):
-                if column in column_names_intersection and column not in ["Frequency"]:
-                    model_2_column_selector = model_2.column_names.index(column)
-                    if re.search('int|float',
-                                 model_1.options["column_types"][column_index],
-                                 re.IGNORECASE) and re.search('int|float',
-                                                              model_2.options["column_types"][model_2_column_selector],
-                                                              re.IGNORECASE):
-
-                        new_row.append(
-                            model_1.data[row_index][column_index] - model_2_frequency_row[model_2_column_selector])
-
-                        # Print("New Column Names are {0}".format(new_column_names))
-                    elif difference_options["columns"] in ["all"]:
-                        new_row.append(model_1.data[row_index][column_index])
+            model_2_frequency_row = model_2_frequency_rows[frequency]
+            new_row = [frequency]
+            for column_index, model_2_column_selector in difference_columns:
+                if model_2_column_selector is None:
+                    new_row.append(row[column_index])
+                else:
+                    new_row.append(row[column_index] - model_2_frequency_row[model_2_column_selector])
             difference_data.append(new_row)
     difference_options["column_names"] = new_column_names
     # print("New Column Names are {0}".format(new_column_names))
@@ -267,76 +302,164 @@ def frequency_model_difference(model_1, model_2, **options):
     return result
 
 
+def read_reference_curve_file(file_path, data_format="RI"):
+    """Reads a touchstone file with SNP, changes it to data_format and returns (column_names, data array).
+    This is the unit of work of stream_reference_curve_files so it only returns numbers"""
+    snp_file = SNP(file_path)
+    snp_file.change_data_format(data_format)
+    return (snp_file.column_names[:], np.array(snp_file.data, dtype=np.float64))
+
+def stream_reference_curve_files(file_paths, **options):
+    """Yields (file_path, column_names, data array) for each touchstone file in file_paths in order. The files are
+    parsed by read_reference_curve_file in a pool of options["max_workers"] processes (threads if
+    options["processes"] is False) and only a few files per worker are in flight at a time"""
+    defaults = {"format": "RI", "parallel": True, "processes": True, "max_workers": None}
+    stream_options = {}
+    for key, value in defaults.items():
+        stream_options[key] = value
+    for key, value in options.items():
+        stream_options[key] = value
+    if stream_options["processes"]:
+        executor_class = ProcessPoolExecutor
+    else:
+        executor_class = ThreadPoolExecutor
+    if not stream_options["parallel"] or executor_class is None or len(file_paths) < 2:
+        for file_path in file_paths:
+            yield (file_path,) + read_reference_curve_file(file_path, stream_options["format"])
+        return
+    max_workers = stream_options["max_workers"] or os.cpu_count() or 1
+    window = 4 * max_workers
+    with executor_class(max_workers=max_workers) as executor:
+        pending = collections.deque()
+        for file_path in file_paths:
+            pending.append((file_path, executor.submit(read_reference_curve_file, file_path,
+                                                       stream_options["format"])))
+            if len(pending) >= window:
+                (pending_path, future) = pending.popleft()
+                yield (pending_path,) + future.result()
+        while pending:
+            (pending_path, future) = pending.popleft()
+            yield (pending_path,) + future.result()
+
+def fold_reference_curve_files(file_paths, accumulator, column_names, frequencies, **options):
+    """Folds the touchstone files in file_paths one at a time into accumulator, a FrequencyStatisticsAccumulator,
+    so the files are never combined in memory. Every file must have column_names and the frequencies. If
+    options["nominal_data"] is an array nominal_data-data is accumulated instead of data. The other options are
+    passed to stream_reference_curve_files, returns the accumulator"""
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    nominal_data = options.pop("nominal_data", None)
+    frequency_selector = column_names.index("Frequency")
+    # like frequency_model_difference the first row of a repeated frequency is subtracted from the nominal rows
+    unique_frequencies, first_rows, groups = np.unique(frequencies, return_index=True, return_inverse=True)
+    first_rows = first_rows[groups]
+    for (file_path, file_column_names, data) in stream_reference_curve_files(file_paths, **options):
+        if file_column_names != column_names or len(data) != len(frequencies) or \
+                not np.array_equal(data[:, frequency_selector], frequencies):
+            raise ReferenceCurveError("The file {0} does not have the same columns and frequencies as "
+                                      "the first file".format(file_path))
+        if nominal_data is not None:
+            data = nominal_data - data[first_rows]
+        accumulator.add(data)
+    return accumulator
+
+def reference_curve_file_paths(directory, file_filter="s\d+p"):
+    """Returns the paths of the files in directory whose name matches the regular expression file_filter"""
+    return [os.path.join(directory, file_name) for file_name in os.listdir(directory)
+            if re.search(file_filter, file_name, re.IGNORECASE)]
+
+def accumulator_to_data(accumulator, frequency_selector, method="mean"):
+    """Returns the statistic method of accumulator as a list of rows with the frequency column set to the
+    unique frequencies, the form of frequency_model_collapse_multiple_measurements"""
+    data = np.array(accumulator.get_statistic(method), dtype=np.float64).tolist()
+    for row, frequency in zip(data, accumulator.frequencies.tolist()):
+        row[frequency_selector] = frequency
+    return data
+
 def create_monte_carlo_reference_curve(monte_carlo_directory, **options):
     """Creates a standard curve from a montecarlo directory (from MUF). The standard curve
-    has a mean or median and a standard deviation for the uncertainty"""
-    defaults = {"method": "mean", "format": "RI", "filter": "s\d+p"}
+    has a mean or median and a standard deviation for the uncertainty. The files are parsed in parallel and
+    folded into running per frequency statistics (see FrequencyStatisticsAccumulator) so memory does not grow
+    with the number of files, every file must have the frequencies of the first. Use quantiles=[.025,.975]
+    to add quantile columns (q2.5magS11...) and exact_quantiles=False to estimate the median and quantiles
+    in constant memory"""
+    defaults = {"method": "mean", "format": "RI", "filter": "s\d+p", "quantiles": None,
+                "exact_quantiles": True, "parallel": True, "processes": True, "max_workers": None}
     reference_options = {}
     for key, value in defaults.items():
         reference_options[key] = value
     for key, value in options.items():
         reference_options[key] = value
-    file_names = os.listdir(monte_carlo_directory)
-    filtered_file_names = []
-    for file_name in file_names[:]:
-        if re.search(reference_options["filter"], file_name, re.IGNORECASE):
-            filtered_file_names.append(file_name)
-    file_names = filtered_file_names
-    # print file_names
-    initial_file = SNP(os.path.join(monte_carlo_directory, file_names[0]))
+    file_paths = reference_curve_file_paths(monte_carlo_directory, reference_options["filter"])
+    initial_file = SNP(file_paths[0])
     initial_file.change_data_format(reference_options["format"])
-    combined_table = Snp_to_AsciiDataTable(initial_file)
-
-    for file_name in file_names[1:]:
-        snp_file = SNP(os.path.join(monte_carlo_directory, file_name))
-        snp_file.change_data_format(reference_options["format"])
-        table = Snp_to_AsciiDataTable(snp_file)
-        combined_table + table
-    mean_table = frequency_model_collapse_multiple_measurements(combined_table, method=reference_options["method"])
-    standard_deviation = frequency_model_collapse_multiple_measurements(combined_table,
-                                                                        method='std')
+    initial_table = Snp_to_AsciiDataTable(initial_file)
+    initial_data = np.array(initial_table.data, dtype=np.float64)
+    frequency_selector = initial_table.column_names.index("Frequency")
+    frequencies = initial_data[:, frequency_selector]
+    quantiles = list(reference_options["quantiles"] or [])
+    if re.search('median', reference_options["method"], re.IGNORECASE):
+        quantiles.append(.5)
+    accumulator = FrequencyStatisticsAccumulator(frequencies, initial_data.shape[1], quantiles=quantiles,
+                                                 exact_quantiles=reference_options["exact_quantiles"])
+    accumulator.add(initial_data)
+    fold_reference_curve_files(file_paths[1:], accumulator, initial_table.column_names, frequencies,
+                               format=reference_options["format"], parallel=reference_options["parallel"],
+                               processes=reference_options["processes"],
+                               max_workers=reference_options["max_workers"])
+    mean_table = frequency_model_from_collapse(
+        frequency_model_collapse_options(initial_table, method=reference_options["method"]),
+        accumulator_to_data(accumulator, frequency_selector, reference_options["method"]))
+    standard_deviation = frequency_model_from_collapse(
+        frequency_model_collapse_options(initial_table, method='std'),
+        accumulator_to_data(accumulator, frequency_selector, 'std'))
     new_column_names = ['Frequency'] + ['u' + name for name in standard_deviation.column_names[1:]]
     standard_deviation.column_names = new_column_names
     reference_curve = ascii_data_table_join("Frequency", mean_table, standard_deviation)
     reference_curve.options["value_column_names"] = mean_table.column_names[1:]
     reference_curve.options["uncertainty_column_names"] = new_column_names[1:]
+    if reference_options["quantiles"]:
+        reference_curve.options["quantile_column_names"] = []
+        for quantile in reference_options["quantiles"]:
+            quantile_table = frequency_model_from_collapse(
+                frequency_model_collapse_options(initial_table, method="quantile"),
+                accumulator_to_data(accumulator, frequency_selector, quantile))
+            quantile_column_names = ['Frequency'] + ['q{0:g}'.format(100 * quantile) + name
+                                                     for name in quantile_table.column_names[1:]]
+            quantile_table.column_names = quantile_column_names
+            reference_curve = ascii_data_table_join("Frequency", reference_curve, quantile_table)
+            reference_curve.options["quantile_column_names"] += quantile_column_names[1:]
     return reference_curve
 
 def create_sensitivity_reference_curve(sensitivity_directory,nominal_file_path="../DUT_0.s2p",**options):
     """Creates a standard curve from a sensitivity_directory usually called Covariance(from MUF). The standard curve
-    has a mean or median and a RMS variance from the nominal value for the uncertainty"""
-    defaults = {"format": "RI", "filter": "s\d+p"}
+    has a mean or median and a RMS variance from the nominal value for the uncertainty. The difference of each
+    file from the nominal file is folded into a running sum of squares, every file must have the frequencies of
+    the nominal file"""
+    defaults = {"format": "RI", "filter": "s\d+p", "parallel": True, "processes": True, "max_workers": None}
     reference_options = {}
     for key, value in defaults.items():
         reference_options[key] = value
     for key, value in options.items():
         reference_options[key] = value
-    file_names = os.listdir(sensitivity_directory)
-    filtered_file_names = []
-    for file_name in file_names[:]:
-        if re.search(reference_options["filter"], file_name, re.IGNORECASE):
-            filtered_file_names.append(file_name)
-    file_names = filtered_file_names
-    # print file_names
+    file_paths = reference_curve_file_paths(sensitivity_directory, reference_options["filter"])
     nominal_file=SNP(os.path.join(sensitivity_directory, nominal_file_path))
     nominal_file.change_data_format(reference_options["format"])
-    initial_file = SNP(os.path.join(sensitivity_directory, file_names[0]))
-    initial_file.change_data_format(reference_options["format"])
-    initial_difference=frequency_model_difference(nominal_file,initial_file)
-    #print initial_difference.column_names
-    combined_table = initial_difference
-    for file_name in file_names[1:]:
-        snp_file = SNP(os.path.join(sensitivity_directory, file_name))
-        snp_file.change_data_format(reference_options["format"])
-        difference=frequency_model_difference(nominal_file,snp_file)
-        #print difference.column_names
-#         table = Snp_to_AsciiDataTable(difference)
-        combined_table + difference
-    #print combined_table.options["column_types"]
-    variance = frequency_model_collapse_multiple_measurements(combined_table,
-                                                                        method='rss')
-    new_column_names = ['Frequency'] + ['u' + name for name in variance.column_names[1:]]
+    nominal_data = np.array(nominal_file.data, dtype=np.float64)
+    column_names = nominal_file.column_names[:]
+    frequency_selector = column_names.index("Frequency")
+    frequencies = nominal_data[:, frequency_selector]
+    accumulator = FrequencyStatisticsAccumulator(frequencies, nominal_data.shape[1])
+    fold_reference_curve_files(file_paths, accumulator, column_names, frequencies, nominal_data=nominal_data,
+                               format=reference_options["format"], parallel=reference_options["parallel"],
+                               processes=reference_options["processes"],
+                               max_workers=reference_options["max_workers"])
     mean_table=Snp_to_AsciiDataTable(nominal_file)
+    variance_options = {"column_names": column_names[:], "column_types": ['float' for name in column_names],
+                        "method": "rss", "specific_descriptor": None}
+    variance = frequency_model_from_collapse(variance_options,
+                                             accumulator_to_data(accumulator, frequency_selector,
+                                                                 'rss'))
+    new_column_names = ['Frequency'] + ['u' + name for name in variance.column_names[1:]]
     variance.column_names = new_column_names
     reference_curve = ascii_data_table_join("Frequency", mean_table, variance)
     reference_curve.options["value_column_names"] = mean_table.column_names[1:]
@@ -506,6 +629,23 @@ def calrep(raw_model,**options):
     new_column_names=[]
     expansion_factor=2
     frequency_index=mean_file.column_names.index("Frequency")
+    # the type b and S NIST uncertainties are calculated for a whole column at once
+    number_rows=len(mean_file.data)
+    frequencies=np.array([row[frequency_index] for row in mean_file.data],dtype=float)
+    column_uncertainties={}
+    for column_index,column_name in enumerate(mean_file.column_names[:]):
+        if re.search("frequency",column_name,re.IGNORECASE):
+            continue
+        values=np.array([row[column_index] for row in mean_file.data],dtype=float)
+        column_uncertainties[column_index]=[]
+        for uncertainty_function in [type_b,S_NIST]:
+            uncertainties=uncertainty_function(wr_connector_type=mean_file.metadata["Connector_Type_Measurement"],
+                                               frequency=frequencies,parameter=column_name,magnitude=values,
+                                               format="mag")
+            # constant uncertainties are broadcast to one value per row
+            column_uncertainties[column_index].append([np.broadcast_to(np.asarray(uncertainty,dtype=float),
+                                                                       (number_rows,)).tolist()
+                                                       for uncertainty in uncertainties])
     for row_index,row in enumerate(mean_file.data[:]):
         new_data_row=[]
         for column_index,column_name in enumerate(mean_file.column_names[:]):
@@ -539,13 +679,12 @@ def calrep(raw_model,**options):
                 # Mean Value
                 new_data_row.append(row[column_index])
                 # Type B
-                ub=type_b(wr_connector_type=mean_file.metadata["Connector_Type_Measurement"],
-                         frequency=row[frequency_index],parameter=column_name,magnitude=row[column_index],format="mag")
+                [ub_column,ua_column]=column_uncertainties[column_index]
+                ub=[uncertainty[row_index] for uncertainty in ub_column]
                 #print("{0} is {1}".format("ub",ub))
                 new_data_row.append(ub[error_selector])
                 # Type A or SNIST
-                ua=S_NIST(wr_connector_type=mean_file.metadata["Connector_Type_Measurement"],
-                         frequency=row[frequency_index],parameter=column_name,magnitude=row[column_index],format="mag")
+                ua=[uncertainty[row_index] for uncertainty in ua_column]
                 new_data_row.append(ua[error_selector])
 
                 # Standard Deviation
@@ -724,54 +863,72 @@ def unwrap_phase(phase_list):
     return phase_list_copy
 
 
-def correct_sparameters_eight_term(sparameters_complex,eight_term_correction,reciprocal=True):
-    """Applies the eight term correction to sparameters_complex and returns
-    a correct complex list in the form of [[frequency,S11,S21,S12,S22],..]. The eight term
-    correction should be in the form [[frequency,S1_11,S1_21,S1_12,S1_22,S2_11,S2_21,S2_12,S2_22]..]
-    Use s2p.sparameter_complex as input."""
-    # first transform both lists to matrices
-    s2p_matrix_list=two_port_complex_to_matrix_form(sparameters_complex)
-    s1_list=[[row[0],row[1],row[2],row[3],row[4]] for row in eight_term_correction]
-    s2_list=[[row[0],row[5],row[6],row[7],row[8]] for row in eight_term_correction]
-    s1_matrix_list=two_port_complex_to_matrix_form(s1_list)
-    s2_matrix_list=two_port_complex_to_matrix_form(s2_list)
-    # now transform to T matrices
-    t_matrix_list=S_to_T(s2p_matrix_list)
-    x_matrix_list=S_to_T(s1_matrix_list)
-    y_matrix_list=S_to_T(s2_matrix_list)
-    # now invert x
-    x_inverse_matrix_list=invert_two_port_matrix_list(x_matrix_list)
-    y_inverse_matrix_list=invert_two_port_matrix_list(y_matrix_list)
-    # now apply the correction
-    t_corrected_list=[]
-    for index,row in enumerate(t_matrix_list):
-        frequency=row[0]
-        t_corrected=x_inverse_matrix_list[index][1]*row[1]*y_inverse_matrix_list[index][1]
-        t_corrected_list.append([frequency,t_corrected])
-    # now transform back to S
-    s_corrected_matrix_list =T_to_S(t_corrected_list)
-    # now put back into single row form
-    s_corrected_list=two_port_matrix_to_complex_form(s_corrected_matrix_list)
-    # now we take the geometric average and replace S12 and S21 with it
+@timed()
+def two_port_complex_to_matrix_array(sparameters):
+    """Returns a complex array of shape (number_frequencies,2,2) of the matrices [[S11,S12],[S21,S22]] given
+    a complex array of shape (number_frequencies,4) with columns [S11,S21,S12,S22]. It is the stacked array form of
+    two_port_complex_to_matrix_form"""
+    sparameters=np.asarray(sparameters,dtype=complex)
+    return sparameters[:,[0,2,1,3]].reshape(-1,2,2)
+
+def S_to_T_array(s_matrices):
+    """Converts a stacked array of S matrices of shape (number_frequencies,2,2) into an array of T matrices,
+    the stacked array form of S_to_T"""
+    t_matrices=np.empty_like(s_matrices)
+    t_matrices[:,0,0]=-np.linalg.det(s_matrices)/s_matrices[:,1,0]
+    t_matrices[:,0,1]=s_matrices[:,0,0]/s_matrices[:,1,0]
+    t_matrices[:,1,0]=-s_matrices[:,1,1]/s_matrices[:,1,0]
+    t_matrices[:,1,1]=1/s_matrices[:,1,0]
+    return t_matrices
+
+def T_to_S_array(t_matrices):
+    """Converts a stacked array of T matrices of shape (number_frequencies,2,2) into an array of S matrices,
+    the stacked array form of T_to_S"""
+    s_matrices=np.empty_like(t_matrices)
+    s_matrices[:,0,0]=t_matrices[:,0,1]/t_matrices[:,1,1]
+    s_matrices[:,0,1]=np.linalg.det(t_matrices)/t_matrices[:,1,1]
+    s_matrices[:,1,0]=1/t_matrices[:,1,1]
+    s_matrices[:,1,1]=-t_matrices[:,1,0]/t_matrices[:,1,1]
+    return s_matrices
+
+def correct_sparameters_eight_term_array(sparameters,s1,s2,reciprocal=True):
+    """Applies the eight term correction to a complex array sparameters of shape (number_frequencies,4) and returns
+    the corrected complex array of the same shape. The error boxes s1 and s2 are complex arrays of shape
+    (number_frequencies,4), all columns are in the order [S11,S21,S12,S22] except the returned array that has the
+    columns of correct_sparameters_eight_term. This is the stacked array form of correct_sparameters_eight_term."""
+    t_matrices=S_to_T_array(two_port_complex_to_matrix_array(sparameters))
+    x_inverse=np.linalg.inv(S_to_T_array(two_port_complex_to_matrix_array(s1)))
+    y_inverse=np.linalg.inv(S_to_T_array(two_port_complex_to_matrix_array(s2)))
+    s_corrected=T_to_S_array(np.matmul(np.matmul(x_inverse,t_matrices),y_inverse)).reshape(-1,4)
     if reciprocal:
-        s_averaged_corrected=[]
+        # S12 and S21 are averaged together in a weird way that makes phase continuous, the root is chosen
+        # based on the phase of the last root so only the choice is made in a loop
+        geometric_mean=np.sqrt(s_corrected[:,1]*s_corrected[:,2])
+        phases=np.angle(geometric_mean).tolist()
+        flipped_phases=np.angle(-geometric_mean).tolist()
+        root_select=np.ones(len(phases))
         phase_last=0
-        for row in s_corrected_list:
-            [frequency,S11,S21,S12,S22]=row
-            # S12 and S21 are averaged together in a weird way that makes phase continuous
-            geometric_mean=cmath.sqrt(S21*S12)
-            root_select=1
-            phase_new=cmath.phase(geometric_mean)
+        for index,phase_new in enumerate(phases):
             # if the phase jumps by >180 but less than 270, then pick the other root
             if abs(phase_new-phase_last)>math.pi/2 and abs(phase_new-phase_last)<3*math.pi/2:
-                root_select=-1
-            mean_S12_S21=root_select*cmath.sqrt(S21*S12)
-            s_averaged_corrected.append([frequency,S11,mean_S12_S21,mean_S12_S21,S22])
-            phase_last=cmath.phase(mean_S12_S21)
-        s_corrected_list=s_averaged_corrected
-    else:
-        pass
+                root_select[index]=-1
+                phase_last=flipped_phases[index]
+            else:
+                phase_last=phase_new
+        s_corrected[:,1]=s_corrected[:,2]=root_select*geometric_mean
+    return s_corrected
 
+def correct_sparameters_eight_term(sparameters_complex,eight_term_correction,reciprocal=True):
+    """Applies the eight term correction to sparameters_complex and returns
+    a correct complex list in the form of [[frequency,S11,S21,S12,S22],..]. The eight term
+    correction should be in the form [[frequency,S1_11,S1_21,S1_12,S1_22,S2_11,S2_21,S2_12,S2_22]..]
+    Use s2p.sparameter_complex as input."""
+    # the lists are stacked into arrays and corrected with correct_sparameters_eight_term_array
+    sparameters=np.array([row[1:5] for row in sparameters_complex],dtype=complex)
+    correction=np.array([row[1:9] for row in eight_term_correction],dtype=complex)
+    s_corrected=correct_sparameters_eight_term_array(sparameters,correction[:,0:4],correction[:,4:8],
+                                                     reciprocal=reciprocal)
+    s_corrected_list=[[row[0]]+corrected_row for row,corrected_row in zip(sparameters_complex,s_corrected.tolist())]
     return s_corrected_list
 
 def uncorrect_sparameters_eight_term(sparameters_complex,eight_term_correction,reciprocal=True):
@@ -824,6 +981,7 @@ def uncorrect_sparameters_eight_term(sparameters_complex,eight_term_correction,r
 
     return s_uncorrected_list
 
+@timed()
 def correct_sparameters_sixteen_term(sparameters_complex,sixteen_term_correction):
     """Applies the sixteen term correction to sparameters and returns a new sparameter list.
     The sparameters should be a list of [frequency, S11, S21, S12, S22] where S terms are complex numbers.
@@ -893,6 +1051,7 @@ def uncorrect_sparameters_sixteen_term(sparameters_complex,sixteen_term_correcti
                                uncorrected_s_matrix[0,1],uncorrected_s_matrix[1,1]])
     return sparameter_out
 
+@timed()
 def correct_sparameters_twelve_term(sparameters_complex,twelve_term_correction,reciprocal=True):
     """Applies the twelve term correction to sparameters and returns a new sparameter list.
     The sparameters should be a list of [frequency, S11, S21, S12, S22] where S terms are complex numbers.
@@ -967,6 +1126,7 @@ def uncorrect_sparameters_twelve_term(sparameters_complex,twelve_term_correction
         phase_last=cmath.phase(mean_S12_S21)
     return sparameter_out
 #TODO: Check that this works the way it should
+@timed()
 def correct_sparameters(sparameters,correction,**options):
     """Correction sparamters trys to return a corrected set of sparameters given uncorrected sparameters
     and a correction. Correct sparameters will accept file_name's, pyMez classes,
@@ -1564,7 +1724,7 @@ def plot_frequency_model(frequency_model, **options):
         plot_options[key] = value
     if type(frequency_model) in [pandas.DataFrame]:
         frequency_model = DataFrame_to_AsciiDataTable(frequency_model)
-    x_data = np.array(frequency_model["Frequency"])
+    x_data = model_column_array(frequency_model, "Frequency")
     y_data_columns = frequency_model.column_names[:]
     y_data_columns.remove("Frequency")
     number_plots = len(y_data_columns)
@@ -1574,7 +1734,7 @@ def plot_frequency_model(frequency_model, **options):
                                 figsize=plot_options["plot_size"], dpi=plot_options["dpi"])
     for plot_index, ax in enumerate(axes.flat):
         if plot_index < number_plots:
-            y_data = np.array(frequency_model[y_data_columns[plot_index]])
+            y_data = model_column_array(frequency_model, y_data_columns[plot_index])
             ax.plot(x_data, y_data, plot_options["plot_format"], label=y_data_columns[plot_index])
             if plot_options["display_legend"]:
                 ax.legend()
@@ -1625,7 +1785,7 @@ def plot_frequency_model_histogram(frequency_model, **options):
         plot_options[key] = value
     if type(frequency_model) in [pandas.DataFrame]:
         frequency_model = DataFrame_to_AsciiDataTable(frequency_model)
-    x_data = np.array(frequency_model["Frequency"])
+    x_data = model_column_array(frequency_model, "Frequency")
     y_data_columns = frequency_model.column_names[:]
     y_data_columns.remove("Frequency")
     number_plots = len(y_data_columns)
@@ -1636,7 +1796,7 @@ def plot_frequency_model_histogram(frequency_model, **options):
     for plot_index, ax in enumerate(axes.flat):
         if plot_index < number_plots:
             try:
-                y_data = np.array(frequency_model[y_data_columns[plot_index]])
+                y_data = model_column_array(frequency_model, y_data_columns[plot_index])
                 ax.hist(y_data)
                 if plot_options["display_legend"]:
                     ax.legend()
@@ -1691,7 +1851,7 @@ def plot_calrep(calrep_model):
             error_parameter=column_name.replace("mag","")
             error_name="u"+error_letter+"g"+error_parameter
             error=calrep_model[error_name]
-            x=calrep_model["Frequency"]
+            x=model_column_array(calrep_model,"Frequency")
             y=calrep_model[column_name]
             #print("Length of x is {0}, Length of y is {1}, Length of error is {2}".format(len(x),len(y),len(error)))
             ax.errorbar(x,y,yerr=error,fmt='k-x')
@@ -1701,7 +1861,7 @@ def plot_calrep(calrep_model):
             error_parameter=column_name.replace("arg","")
             error_name="u"+error_letter+"g"+error_parameter
             error=calrep_model[error_name]
-            x=calrep_model["Frequency"]
+            x=model_column_array(calrep_model,"Frequency")
             y=calrep_model[column_name]
             ax.errorbar(x,y,yerr=error,fmt='k-x')
             ax.set_ylabel('Phase(Degrees)',color='green')
@@ -1715,7 +1875,7 @@ def plot_calrep(calrep_model):
                 error_name="u"+error_letter+"e"+error_parameter
                 error=calrep_model[error_name]
 
-            x=calrep_model["Frequency"]
+            x=model_column_array(calrep_model,"Frequency")
             y=calrep_model[column_name]
             ax.errorbar(x,y,yerr=error,fmt='k-x')
             ax.set_ylabel('Phase(Degrees)',color='green')
@@ -1767,7 +1927,7 @@ def plot_calrep_uncertainty(calrep_model,**options):
         error_columns.append(error_columns_per_plot)
 
     # We want plots that have frequency as the x-axis and y that has an error
-    calrep_x = calrep_model["Frequency"]
+    calrep_x = model_column_array(calrep_model, "Frequency")
     number_rows = int(round(float(number_plots) / 2))
     fig, compare_axes = plt.subplots(nrows=number_rows, ncols=2, sharex='col', figsize=(8, 6), dpi=80)
     # each axis has an error column
@@ -1961,8 +2121,8 @@ def plot_calrep_results_comparison(calrep_model, results_model, **options):
         error_columns.append(error_column)
 
     # We want plots that have frequency as the x-axis and y that has an error
-    calrep_x = calrep_model["Frequency"]
-    results_x = results_model["Frequency"]
+    calrep_x = model_column_array(calrep_model, "Frequency")
+    results_x = model_column_array(results_model, "Frequency")
     number_rows = int(round(float(number_plots) / 2))
     fig, compare_axes = plt.subplots(nrows=number_rows, ncols=2, sharex='col', figsize=(8, 6), dpi=80)
     # each axis has an error column
@@ -2042,8 +2202,8 @@ def plot_calrep_results_difference_comparison(calrep_model, results_model, **opt
     if comparison_plot_options["debug"]:
         print(("{0} is {1}".format("difference_model.column_names", difference_model.column_names)))
     # We want plots that have frequency as the x-axis and y that has an error
-    difference_x = difference_model["Frequency"]
-    calrep_x = calrep_model["Frequency"]
+    difference_x = model_column_array(difference_model, "Frequency")
+    calrep_x = model_column_array(calrep_model, "Frequency")
     number_rows = int(round(float(number_plots) / 2))
     fig, compare_axes = plt.subplots(nrows=number_rows, ncols=2, sharex='col', figsize=(8, 6), dpi=80)
     # each axis has an error column
@@ -2103,7 +2263,7 @@ def plot_calrep_comparison(calrep_model_list):
                 error_parameter=column_name.replace("mag","")
                 error_name="u"+error_letter+"g"+error_parameter
                 error=calrep_model[error_name]
-                x=calrep_model["Frequency"]
+                x=model_column_array(calrep_model,"Frequency")
                 y=calrep_model[column_name]
                 ax.errorbar(x,y,yerr=error)
                 ax.set_ylabel(r'|${\Gamma} $|',color='green')
@@ -2112,7 +2272,7 @@ def plot_calrep_comparison(calrep_model_list):
                 error_parameter=column_name.replace("arg","")
                 error_name="u"+error_letter+"g"+error_parameter
                 error=calrep_model[error_name]
-                x=calrep_model["Frequency"]
+                x=model_column_array(calrep_model,"Frequency")
                 y=calrep_model[column_name]
                 ax.errorbar(x,y,yerr=error)
                 ax.set_ylabel('Phase(Degrees)',color='green')
@@ -2126,7 +2286,7 @@ def plot_calrep_comparison(calrep_model_list):
                     error_name="u"+error_letter+"e"+error_parameter
                     error=calrep_model[error_name]
 
-                x=calrep_model["Frequency"]
+                x=model_column_array(calrep_model,"Frequency")
                 y=calrep_model[column_name]
                 ax.errorbar(x,y,yerr=error)
                 ax.set_ylabel('Phase(Degrees)',color='green')
@@ -2477,9 +2637,475 @@ def plot_raw_MUF_comparison(raw_directory=r"C:\Share\35CalComp\35_ascii_results"
     return [measurements, calrep_measurements, montecarlo_reference_curve, sensitivity_reference_curve]
 #-----------------------------------------------------------------------------
 # Module Classes
+class ReferenceCurveError(Exception):
+    """Error raised when the files of a reference curve can not be combined"""
+    pass
+
+class StreamingQuantile(object):
+    """Estimates the quantile p of every element of a stream of equally shaped arrays with the P-square
+    algorithm (Jain and Chlamtac 1985), only five marker heights and positions are kept per element"""
+    def __init__(self, p):
+        self.p = float(p)
+        self.count = 0
+        self.initial_values = []
+        self.heights = None
+        self.positions = None
+        self.desired_positions = np.array([1., 1. + 2 * self.p, 1. + 4 * self.p, 3. + 2 * self.p, 5.])
+        self.increments = np.array([0., self.p / 2., self.p, (1. + self.p) / 2., 1.])
+
+    def add(self, values):
+        """Adds one observation (an array) of every element"""
+        values = np.asarray(values, dtype=np.float64)
+        self.count += 1
+        if self.heights is None:
+            self.initial_values.append(values.copy())
+            if self.count == 5:
+                self.heights = np.sort(np.stack(self.initial_values), axis=0)
+                self.positions = np.ones(self.heights.shape) * np.arange(1., 6.).reshape(
+                    (5,) + (1,) * values.ndim)
+                self.initial_values = []
+            return
+        heights = self.heights
+        positions = self.positions
+        # the cell of each new value and the extreme markers
+        cell = (values >= heights[1]).astype(int) + (values >= heights[2]) + (values >= heights[3])
+        heights[0] = np.minimum(heights[0], values)
+        heights[4] = np.maximum(heights[4], values)
+        positions += np.arange(5).reshape((5,) + (1,) * values.ndim) > cell
+        self.desired_positions += self.increments
+        # adjust the three middle markers
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for index in [1, 2, 3]:
+                difference = self.desired_positions[index] - positions[index]
+                move = ((difference >= 1) & (positions[index + 1] - positions[index] > 1)) | \
+                       ((difference <= -1) & (positions[index - 1] - positions[index] < -1))
+                if not np.any(move):
+                    continue
+                step = np.where(move, np.sign(difference), 0.)
+                parabolic = heights[index] + step / (positions[index + 1] - positions[index - 1]) * (
+                    (positions[index] - positions[index - 1] + step) * (heights[index + 1] - heights[index]) /
+                    (positions[index + 1] - positions[index]) +
+                    (positions[index + 1] - positions[index] - step) * (heights[index] - heights[index - 1]) /
+                    (positions[index] - positions[index - 1]))
+                neighbor_heights = np.where(step > 0, heights[index + 1], heights[index - 1])
+                neighbor_positions = np.where(step > 0, positions[index + 1], positions[index - 1])
+                linear = heights[index] + step * (neighbor_heights - heights[index]) / (
+                    neighbor_positions - positions[index])
+                in_order = (heights[index - 1] < parabolic) & (parabolic < heights[index + 1])
+                heights[index] = np.where(move, np.where(in_order, parabolic, linear), heights[index])
+                positions[index] = positions[index] + step
+
+    def get_quantile(self):
+        """Returns the estimated quantile as an array, it is exact for fewer than 5 observations"""
+        if self.heights is None:
+            return np.quantile(np.stack(self.initial_values), self.p, axis=0)
+        return self.heights[2].copy()
+
+class FrequencyStatisticsAccumulator(object):
+    """Keeps running per frequency statistics of a stream of arrays, one per file with a row for each of
+    frequencies and a column for each parameter: the mean and variance (Welford, merged with Chan's formula when a
+    frequency is repeated), the sum of squares for rss and rms, the sum of logs for the geometric mean and the
+    quantiles in the list quantiles. Results have one row per unique frequency in ascending order, like
+    frequency_model_collapse_multiple_measurements. If exact_quantiles is True the arrays are kept for exact
+    quantiles, otherwise StreamingQuantile estimates are used"""
+    def __init__(self, frequencies, number_columns, quantiles=None, exact_quantiles=True):
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        self.shape = (len(frequencies), number_columns)
+        self.frequencies, self.groups = np.unique(frequencies, return_inverse=True)
+        self.group_sizes = np.bincount(self.groups).reshape((-1, 1)).astype(np.float64)
+        if np.array_equal(self.frequencies, frequencies):
+            self.groups = None
+        output_shape = (len(self.frequencies), number_columns)
+        self.count = 0
+        self.mean = np.zeros(output_shape)
+        self.squared_deviations = np.zeros(output_shape)
+        self.sum_squares = np.zeros(output_shape)
+        self.sum_logs = np.zeros(output_shape)
+        self.exact_quantiles = exact_quantiles
+        self.observations = []
+        self.quantiles = {}
+        for quantile in quantiles or []:
+            if not exact_quantiles and self.groups is not None:
+                raise ReferenceCurveError("Streaming quantiles need unique frequencies, use exact_quantiles=True")
+            self.quantiles[float(quantile)] = StreamingQuantile(quantile)
+
+    def group_sum(self, values):
+        """Returns the sum of the rows of values for each unique frequency"""
+        if self.groups is None:
+            return values
+        group_sum = np.zeros(self.mean.shape)
+        np.add.at(group_sum, self.groups, values)
+        return group_sum
+
+    def add(self, values):
+        """Adds one array of values"""
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != self.shape:
+            raise ReferenceCurveError("The shape {0} is not {1}".format(values.shape, self.shape))
+        if self.groups is None:
+            self.count += 1
+            delta = values - self.mean
+            self.mean += delta / self.count
+            self.squared_deviations += delta * (values - self.mean)
+        else:
+            # merge the mean and squared deviations of this file's rows into the running values
+            file_mean = self.group_sum(values) / self.group_sizes
+            file_squared_deviations = self.group_sum((values - file_mean[self.groups]) ** 2)
+            previous_count = self.count * self.group_sizes
+            self.count += 1
+            total_count = self.count * self.group_sizes
+            delta = file_mean - self.mean
+            self.mean += delta * self.group_sizes / total_count
+            self.squared_deviations += file_squared_deviations + \
+                                       delta ** 2 * previous_count * self.group_sizes / total_count
+        self.sum_squares += self.group_sum(values * values)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.sum_logs += self.group_sum(np.log(values))
+        if self.quantiles:
+            if self.exact_quantiles:
+                self.observations.append(values.copy())
+            else:
+                for streaming_quantile in self.quantiles.values():
+                    streaming_quantile.add(values)
+
+    def get_number_observations(self):
+        """Returns the number of values for each unique frequency as a column"""
+        return self.count * self.group_sizes
+
+    def get_mean(self):
+        return self.mean.copy()
+
+    def get_variance(self):
+        """Returns the population variance (numpy.var)"""
+        return self.squared_deviations / self.get_number_observations()
+
+    def get_standard_deviation(self):
+        """Returns the population standard deviation (numpy.std)"""
+        return np.sqrt(self.get_variance())
+
+    def get_rms(self):
+        return np.sqrt(self.sum_squares / self.get_number_observations())
+
+    def get_rss(self):
+        return np.sqrt(self.sum_squares)
+
+    def get_geometric_mean(self):
+        return np.exp(self.sum_logs / self.get_number_observations())
+
+    def get_quantile(self, quantile):
+        """Returns the quantile, it must be in the quantiles given when the accumulator was created"""
+        quantile = float(quantile)
+        if quantile not in self.quantiles:
+            raise ReferenceCurveError("The quantile {0} was not accumulated".format(quantile))
+        if not self.exact_quantiles:
+            return self.quantiles[quantile].get_quantile()
+        observations = np.stack(self.observations)
+        if self.groups is None:
+            groups = [observations]
+        else:
+            groups = [observations[:, self.groups == index, :].reshape((-1, self.shape[1]))
+                      for index in range(len(self.frequencies))]
+        if quantile == .5:
+            return np.array([np.median(group, axis=0) for group in groups]).reshape(self.mean.shape)
+        return np.array([np.quantile(group, quantile, axis=0) for group in groups]).reshape(self.mean.shape)
+
+    def get_statistic(self, method="mean"):
+        """Returns the statistic named by method as in frequency_model_collapse_multiple_measurements (mean, median,
+        geometric, std, var, rms or rss) or the quantile if method is a number"""
+        if not isinstance(method, str):
+            return self.get_quantile(method)
+        if re.search('mean|av', method, re.IGNORECASE):
+            return self.get_mean()
+        elif re.search('median', method, re.IGNORECASE):
+            return self.get_quantile(.5)
+        elif re.search('geometric', method, re.IGNORECASE):
+            return self.get_geometric_mean()
+        elif re.search('st', method, re.IGNORECASE):
+            return self.get_standard_deviation()
+        elif re.search('var', method, re.IGNORECASE):
+            return self.get_variance()
+        elif re.search('rms', method, re.IGNORECASE):
+            return self.get_rms()
+        elif re.search('rss', method, re.IGNORECASE):
+            return self.get_rss()
+        else:
+            raise ReferenceCurveError("The method {0} can not be accumulated".format(method))
+
+class MUFResultsProcessor(object):
+    """Loads the nominal, covariance (sensitivity) and Monte Carlo s-parameter files referenced by a MUFMeasurement
+    (.meas file) in a process pool and keeps them as stacked arrays: nominal_data has a row per frequency and
+    a column per column_name, covariance_data and montecarlo_data have an extra first axis, one per file. The parsed
+    arrays are cached next to the .meas file (name_results.npz) and reused until the .meas or any of the files
+    change. Locations that do not exist on this machine are looked for in the name_Support directory next to
+    the .meas file."""
+    def __init__(self, measurement, **options):
+        """Initializes the processor, measurement is a MUFMeasurement or the path to a .meas file. Options are
+        format, the touchstone format of the data, cache, use_cache, cache_path and
+        the parallel, processes and max_workers options of stream_reference_curve_files"""
+        defaults = {"format": "RI", "cache": True, "use_cache": True, "cache_path": None,
+                    "parallel": True, "processes": True, "max_workers": None}
+        self.options = {}
+        for key, value in defaults.items():
+            self.options[key] = value
+        for key, value in options.items():
+            self.options[key] = value
+        if isinstance(measurement, StringType):
+            from Code.DataHandlers.MUFModels import MUFMeasurement
+            measurement = MUFMeasurement(measurement)
+        self.measurement = measurement
+        self.measurement_directory = os.path.dirname(os.path.abspath(self.measurement.path))
+        if self.options["cache_path"] is None:
+            self.options["cache_path"] = os.path.splitext(os.path.abspath(self.measurement.path))[0] + \
+                                         "_results.npz"
+        nominal_dictionary = self.measurement.get_nominal_dictionary()
+        self.nominal_path = self.resolve_location(nominal_dictionary["location"])
+        covariance_list = self.measurement.get_covariance_dictionary() or []
+        name_parameter_dictionary = self.measurement.get_name_parameter_dictionary() or {}
+        self.covariance_names = [covariance["name"] for covariance in covariance_list]
+        self.mechanism_names = [name_parameter_dictionary.get(name, name) for name in self.covariance_names]
+        self.covariance_paths = [self.resolve_location(covariance["location"]) for covariance in covariance_list]
+        montecarlo_list = self.measurement.get_montecarlo_dictionary() or []
+        self.montecarlo_names = [montecarlo["name"] for montecarlo in montecarlo_list]
+        self.montecarlo_paths = [self.resolve_location(montecarlo["location"]) for montecarlo in montecarlo_list]
+        self.load()
+
+    def resolve_location(self, location):
+        """Returns location if it exists, otherwise the same file under the _Support directory next to the
+        .meas file, or in the .meas directory"""
+        if os.path.exists(location):
+            return location
+        path_parts = re.split(r"[\\/]", location)
+        for index, part in enumerate(path_parts):
+            if re.search("_Support$", part):
+                return os.path.join(self.measurement_directory, *path_parts[index:])
+        return os.path.join(self.measurement_directory, path_parts[-1])
+
+    def get_source_paths(self):
+        """Returns the .meas path followed by the nominal, covariance and Monte Carlo file paths"""
+        return [os.path.abspath(self.measurement.path), self.nominal_path] + self.covariance_paths + \
+               self.montecarlo_paths
+
+    def get_source_times(self):
+        """Returns the modification times of get_source_paths, used to check the cache"""
+        return [os.path.getmtime(path) for path in self.get_source_paths()]
+
+    def load(self):
+        """Loads the arrays from the cache if it is current, otherwise parses all the files in parallel and
+        writes the cache"""
+        source_paths = self.get_source_paths()
+        if self.options["use_cache"] and self.load_cache():
+            self.frequency = self.nominal_data[:, self.column_names.index("Frequency")]
+            return
+        file_paths = source_paths[1:]
+        data_list = []
+        for (file_path, column_names, data) in stream_reference_curve_files(file_paths,
+                                                                            format=self.options["format"],
+                                                                            parallel=self.options["parallel"],
+                                                                            processes=self.options["processes"],
+                                                                            max_workers=self.options["max_workers"]):
+            if not data_list:
+                self.column_names = column_names
+            elif column_names != self.column_names or data.shape != data_list[0].shape or \
+                    not np.array_equal(data[:, 0], data_list[0][:, 0]):
+                raise ReferenceCurveError("The file {0} does not have the same columns and frequencies as "
+                                          "the nominal file".format(file_path))
+            data_list.append(data)
+        stacked_data = np.array(data_list)
+        number_covariance = len(self.covariance_paths)
+        self.nominal_data = stacked_data[0]
+        self.covariance_data = stacked_data[1:1 + number_covariance]
+        self.montecarlo_data = stacked_data[1 + number_covariance:]
+        self.frequency = self.nominal_data[:, self.column_names.index("Frequency")]
+        if self.options["cache"]:
+            try:
+                self.save_cache()
+            except OSError as error:
+                print("Could not write the cache {0}: {1}".format(self.options["cache_path"], error))
+
+    def load_cache(self):
+        """Reads the arrays from options["cache_path"] and returns True if the cache is current. A missing,
+        stale or unreadable cache returns False and leaves the arrays unchanged"""
+        if not os.path.exists(self.options["cache_path"]):
+            return False
+        try:
+            with np.load(self.options["cache_path"]) as cache:
+                if cache["source_paths"].tolist() != self.get_source_paths() or \
+                        not np.array_equal(cache["source_times"], self.get_source_times()):
+                    return False
+                column_names = cache["column_names"].tolist()
+                nominal_data = cache["nominal_data"]
+                covariance_data = cache["covariance_data"]
+                montecarlo_data = cache["montecarlo_data"]
+        except Exception:
+            # a truncated or otherwise corrupt cache is treated as stale and rewritten
+            return False
+        self.column_names = column_names
+        self.nominal_data = nominal_data
+        self.covariance_data = covariance_data
+        self.montecarlo_data = montecarlo_data
+        return True
+
+    def save_cache(self):
+        """Saves the parsed arrays and the paths and modification times of the files to options["cache_path"].
+        The arrays are written to a temporary file in the same directory that then replaces the cache, so an
+        interrupted write never leaves a partial cache"""
+        cache_directory = os.path.dirname(os.path.abspath(self.options["cache_path"]))
+        file_descriptor, temp_path = tempfile.mkstemp(suffix=".npz", dir=cache_directory)
+        try:
+            with os.fdopen(file_descriptor, "wb") as cache_file:
+                np.savez(cache_file, source_paths=np.array(self.get_source_paths()),
+                         source_times=np.array(self.get_source_times()), column_names=np.array(self.column_names),
+                         nominal_data=self.nominal_data, covariance_data=self.covariance_data,
+                         montecarlo_data=self.montecarlo_data)
+            os.replace(temp_path, self.options["cache_path"])
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def get_value_column_names(self):
+        """Returns the column names other than Frequency"""
+        return [name for name in self.column_names if name != "Frequency"]
+
+    def get_value_columns(self, data):
+        """Returns the columns of the last axis of data that are not Frequency"""
+        return data[..., [self.column_names.index(name) for name in self.get_value_column_names()]]
+
+    def get_sensitivity(self):
+        """Returns the difference of the nominal values and each covariance file, an array with a row per
+        mechanism (see mechanism_names), a row per frequency and a column per get_value_column_names"""
+        return self.get_value_columns(self.nominal_data) - self.get_value_columns(self.covariance_data)
+
+    def get_sensitivity_uncertainty(self):
+        """Returns the root sum of squares of the sensitivities over the mechanisms, the uncertainty of
+        create_sensitivity_reference_curve"""
+        return np.sqrt(np.sum(self.get_sensitivity() ** 2, axis=0))
+
+    def get_montecarlo_mean(self):
+        """Returns the mean over the Monte Carlo files"""
+        return np.mean(self.get_value_columns(self.montecarlo_data), axis=0)
+
+    def get_montecarlo_standard_deviation(self):
+        """Returns the population standard deviation over the Monte Carlo files"""
+        return np.std(self.get_value_columns(self.montecarlo_data), axis=0)
+
+    def get_montecarlo_quantiles(self, quantiles=[.025, .975]):
+        """Returns the quantiles over the Monte Carlo files, an array with a row per quantile"""
+        return np.quantile(self.get_value_columns(self.montecarlo_data), quantiles, axis=0)
+
+    def get_reference_curve(self, uncertainty="sensitivity"):
+        """Returns an AsciiDataTable with the Frequency, the values and u+value columns, the nominal values and
+        sensitivity uncertainty for uncertainty="sensitivity" or the Monte Carlo mean and standard deviation
+        for uncertainty="montecarlo"."""
+        if re.search("sens", uncertainty, re.IGNORECASE):
+            values = self.get_value_columns(self.nominal_data)
+            uncertainties = self.get_sensitivity_uncertainty()
+        elif re.search("monte", uncertainty, re.IGNORECASE):
+            values = self.get_montecarlo_mean()
+            uncertainties = self.get_montecarlo_standard_deviation()
+        else:
+            raise ReferenceCurveError("The uncertainty must be sensitivity or montecarlo not {0}".format(uncertainty))
+        value_column_names = self.get_value_column_names()
+        uncertainty_column_names = ["u" + name for name in value_column_names]
+        column_names = ["Frequency"] + value_column_names + uncertainty_column_names
+        data = np.hstack([self.frequency.reshape((-1, 1)), values, uncertainties]).tolist()
+        reference_curve = AsciiDataTable(None, column_names=column_names, data=data,
+                                         column_types=["float" for name in column_names])
+        reference_curve.options["value_column_names"] = value_column_names
+        reference_curve.options["uncertainty_column_names"] = uncertainty_column_names
+        return reference_curve
 
 #-----------------------------------------------------------------------------
 # Module Scripts
+def test_create_monte_carlo_reference_curve(number_files=200,noise_level=.001):
+    """Writes number_files noisy copies of thru.s2p to a temporary directory and compares the streaming
+    create_monte_carlo_reference_curve to a combined table collapsed with
+    frequency_model_collapse_multiple_measurements. Also prints the P-square estimate of the median"""
+    import tempfile
+    import shutil
+    import time
+    os.chdir(TESTS_DIRECTORY)
+    monte_carlo_directory=tempfile.mkdtemp()
+    try:
+        for file_index in range(number_files):
+            noisy_s2p=add_white_noise_s2p(S2PV1("thru.s2p"),noise_level=noise_level)
+            noisy_s2p.save(os.path.join(monte_carlo_directory,"thru_{0}.s2p".format(file_index)))
+        start=time.time()
+        reference_curve=create_monte_carlo_reference_curve(monte_carlo_directory)
+        print(("Streaming {0} files took {1:.3f} s".format(number_files,time.time()-start)))
+        start=time.time()
+        file_paths=reference_curve_file_paths(monte_carlo_directory)
+        tables=[]
+        for file_path in file_paths:
+            snp_file=SNP(file_path)
+            snp_file.change_data_format("RI")
+            tables.append(Snp_to_AsciiDataTable(snp_file))
+        combined_table=tables[0]
+        for table in tables[1:]:
+            combined_table+table
+        mean_table=frequency_model_collapse_multiple_measurements(combined_table)
+        standard_deviation=frequency_model_collapse_multiple_measurements(combined_table,method="std")
+        print(("Combining and collapsing {0} files took {1:.3f} s".format(number_files,time.time()-start)))
+        value_difference=np.max(np.abs(np.array([reference_curve[name] for name in mean_table.column_names])-
+                                       np.array(mean_table.data).T))
+        uncertainty_difference=np.max(np.abs(np.array([reference_curve["u"+name]
+                                                       for name in standard_deviation.column_names[1:]])-
+                                             np.array(standard_deviation.data).T[1:]))
+        print(("The largest difference of the mean is {0} and the standard deviation is {1}".format(
+            value_difference,uncertainty_difference)))
+        median_curve=create_monte_carlo_reference_curve(monte_carlo_directory,method="median",quantiles=[.025,.975])
+        print(("The quantile columns are {0}".format(median_curve.options["quantile_column_names"])))
+        # the P-square estimate for normal noise with the same number of files
+        samples=np.random.normal(scale=noise_level,size=(number_files,100))
+        streaming_median=StreamingQuantile(.5)
+        for sample in samples:
+            streaming_median.add(sample)
+        median_difference=np.max(np.abs(streaming_median.get_quantile()-np.median(samples,axis=0)))
+        print(("The largest difference of the P-square median from the median is {0} "
+               "for a noise level of {1}".format(median_difference,noise_level)))
+    finally:
+        shutil.rmtree(monte_carlo_directory)
+
+def test_MUFResultsProcessor(measurement_path=os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","..",
+                                                           "Documentation","Examples","jupyter",
+                                                           "MUFModels_Example_Files",
+                                                           "WR15_Line_5079_WR15_20180223_002.meas")):
+    """Loads the MUF example measurement with MUFResultsProcessor, first parsing the files and then from the
+    cache, and compares the Monte Carlo reference curve to create_monte_carlo_reference_curve"""
+    import tempfile
+    import time
+    cache_directory=tempfile.mkdtemp()
+    cache_path=os.path.join(cache_directory,"results.npz")
+    try:
+        start=time.time()
+        processor=MUFResultsProcessor(measurement_path,cache_path=cache_path)
+        print(("Parsing {0} files took {1:.3f} s".format(len(processor.get_source_paths())-1,time.time()-start)))
+        start=time.time()
+        cached_processor=MUFResultsProcessor(measurement_path,cache_path=cache_path)
+        print(("Loading from the cache took {0:.3f} s, same data {1}".format(time.time()-start,
+            np.array_equal(processor.montecarlo_data,cached_processor.montecarlo_data))))
+        # a truncated cache is treated as stale and rewritten
+        with open(cache_path,"r+b") as cache_file:
+            cache_file.truncate(os.path.getsize(cache_path)//2)
+        reparsed_processor=MUFResultsProcessor(measurement_path,cache_path=cache_path)
+        print(("After truncating the cache, same data {0}, cache rewritten {1}".format(
+            np.array_equal(processor.montecarlo_data,reparsed_processor.montecarlo_data),
+            MUFResultsProcessor(measurement_path,cache_path=cache_path).load_cache())))
+        print(("The mechanisms are {0}, the sensitivity has shape {1}".format(processor.mechanism_names,
+                                                                         processor.get_sensitivity().shape)))
+        montecarlo_directory=os.path.dirname(processor.montecarlo_paths[0])
+        montecarlo_file_names=[os.path.basename(path) for path in processor.montecarlo_paths]
+        reference_curve=create_monte_carlo_reference_curve(montecarlo_directory,
+                                                           filter="|".join(map(re.escape,montecarlo_file_names)))
+        processor_curve=processor.get_reference_curve("montecarlo")
+        difference=max([np.max(np.abs(np.array(reference_curve[name])-np.array(processor_curve[name])))
+                        for name in processor_curve.column_names])
+        print(("The largest difference from create_monte_carlo_reference_curve is {0}".format(difference)))
+    finally:
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        os.rmdir(cache_directory)
+
 def test_average_one_port_sparameters():
     os.chdir(TESTS_DIRECTORY)
     table_list=[OnePortRawModel('OnePortRawTestFileAsConverted.txt') for i in range(3)]
@@ -2571,4 +3197,5 @@ def test_compare_s2p_plots(file_list=["thru.s2p",'20160301_30ft_cable_0.s2p','Tw
 if __name__ == '__main__':
     #test_average_one_port_sparameters()
     #test_comparison()
+    test_MUFResultsProcessor()
     test_compare_s2p_plots()
\ No newline at end of file
@@ -59,85 +59,84 @@ except:
     print("The module pyMez.Code.DataHandlers.TouchstoneModels was not found or had an error,"
           "please check module or put it on the python path")
     raise ImportError
+try:
+    import numpy as np
+except:
+    print("The module numpy was not found,"
+          "please put it on the python path")
+    raise ImportError
 #-----------------------------------------------------------------------------
 # Module Constants
+W2P_SPARAMETER_WAVES=[("B1_D1","A1_D1"),("B1_D2","A2_D2"),("B2_D1","A1_D1"),("B2_D2","A2_D2")]
+"""The (numerator,denominator) wave pairs of the s2p columns returned by W2p_to_S2p. Note the order is
+[S11,S12,S21,S22], the returned s2p has S12 in the S21 column and S21 in the S12 column"""
+W2P_SWITCH_TERM_WAVES=[("A1_D2","B1_D2"),("A2_D1","B2_D1")]
+"""The (numerator,denominator) wave pairs of the port 1 (reverse) and port 2 (forward) switch terms"""
 
 #-----------------------------------------------------------------------------
 # Module Functions
+def wave_parameter_arrays(wave_parameter_model):
+    """Returns a tuple (frequency,waves,wave_names) given a W1P or W2P model, where waves is a complex array with
+    one column per wave parameter, and wave_names are the column names without the re/im prefix
+    ([A1_D1,B1_D1...]). Assumes the data columns are [Frequency,reA1_D1,imA1_D1,reB1_D1,imB1_D1...]"""
+    data=np.array(wave_parameter_model.data,dtype=float).reshape(len(wave_parameter_model.data),-1)
+    waves=data[:,1::2]+1j*data[:,2::2]
+    wave_names=[column_name[2:] for column_name in wave_parameter_model.column_names[1::2]]
+    return data[:,0],waves,wave_names
+
+def wave_ratios(waves,wave_names,wave_pairs):
+    """Returns a complex array with a column of numerator/denominator for each (numerator,denominator) in
+    wave_pairs, given a complex waves array with the columns named by wave_names"""
+    numerators=[wave_names.index(numerator) for numerator,denominator in wave_pairs]
+    denominators=[wave_names.index(denominator) for numerator,denominator in wave_pairs]
+    return waves[:,numerators]/waves[:,denominators]
+
 def SixteenTerm_to_EightTermList(s4p_model):
     """Returns two s2p's of the error boxes, with s2p number 1, the same as S11,S13,S31,S33 of error adaptor and
     s2p number 2 as S22,S24,S42,S44 of error adaptor"""
-    # sparameter_complex=[Frequency[0],S11[1],S12[2],S13[3],S14[4],S21[5],S22[6],S23[7],S24[8],S31[9],
-    # S32[10],S33[11],S34[12],S41[13],S42[14],S43[15],S44[16]]
-    s2p_1_complex=[[row[0],row[1],row[3],row[9],row[11]] for row in s4p_model.sparameter_complex]
-    s2p_2_complex=[[row[0],row[6],row[8],row[14],row[16]] for row in s4p_model.sparameter_complex]
-    s2p_1=S2PV1(sparameter_complex=s2p_1_complex)
-    s2p_2=S2PV1(sparameter_complex=s2p_2_complex)
+    # sparameters=[S11[0],S12[1],S13[2],S14[3],S21[4],S22[5],S23[6],S24[7],S31[8],
+    # S32[9],S33[10],S34[11],S41[12],S42[13],S43[14],S44[15]]
+    frequency,sparameters=sparameter_complex_to_arrays(s4p_model.sparameter_complex)
+    s2p_1=s2p_from_arrays(frequency,sparameters[:,[0,2,8,10]])
+    s2p_2=s2p_from_arrays(frequency,sparameters[:,[5,7,13,15]])
     return [s2p_1,s2p_2]
 
 def W2p_to_SwitchTerms(w2p):
     """Creates a s2p with switch terms in port1 (reverse), port2 (foward) format given a w2p of a thru."""
-    reA1_D2_index=w2p.column_names.index("reA1_D2")
-    imA1_D2_index=w2p.column_names.index("imA1_D2")
-    reB1_D2_index=w2p.column_names.index("reB1_D2")
-    imB1_D2_index=w2p.column_names.index("imB1_D2")
-    port_1=[complex(row[reA1_D2_index],row[imA1_D2_index])/complex(row[reB1_D2_index],row[imB1_D2_index]) for row in w2p.data]
-    reA2_D1_index=w2p.column_names.index("reA2_D1")
-    imA2_D1_index=w2p.column_names.index("imA2_D1")
-    reB2_D1_index=w2p.column_names.index("reB2_D1")
-    imB2_D1_index=w2p.column_names.index("imB2_D1")
-    port_2=[complex(row[reA2_D1_index],row[imA2_D1_index])/complex(row[reB2_D1_index],row[imB2_D1_index]) for row in w2p.data]
-    complex_sparameters=[]
-    for row_index,row in enumerate(w2p.data[:]):
-        new_row=[row[0],port_1[row_index],port_2[row_index]]+[complex(0,0),complex(0,0)]
-        complex_sparameters.append(new_row)
-    s2p_out=S2PV1(None,sparameter_complex=complex_sparameters)
+    frequency,waves,wave_names=wave_parameter_arrays(w2p)
+    sparameters=np.zeros((len(frequency),4),dtype=complex)
+    sparameters[:,0:2]=wave_ratios(waves,wave_names,W2P_SWITCH_TERM_WAVES)
+    s2p_out=s2p_from_arrays(frequency,sparameters)
     return s2p_out
 
 def W2p_to_S2p(w2p):
     """Creates a s2p with given a w2p assumes data columns are [Frequency,reA1_D1,imA1_D1,reB1_D1,imB1_D1...imB2_D2]
     Returns the 3 -reciever sparameters or b1/a1 etc."""
-    complex_sparameters=[]
-    for row_index,row in enumerate(w2p.data[:]):
-        # B1_D1/A1_D1
-        S11=complex(row[3],row[4])/complex(row[1],row[2])
-        # B2_D1/A1_D1
-        S21=complex(row[7],row[8])/complex(row[1],row[2])
-        # B1_D2/A2_D2
-        S12=complex(row[11],row[12])/complex(row[13],row[14])
-        # B2_D2/A2_D2
-        S22=complex(row[15],row[16])/complex(row[13],row[14])
-        new_row=[row[0],S11,S12,S21,S22]
-        complex_sparameters.append(new_row)
-    s2p_out=S2PV1(None,sparameter_complex=complex_sparameters)
+    frequency,waves,wave_names=wave_parameter_arrays(w2p)
+    s2p_out=s2p_from_arrays(frequency,wave_ratios(waves,wave_names,W2P_SPARAMETER_WAVES))
     return s2p_out
 
 def W1p_to_S1p(w1p):
     """Creates a s1p with given a w1p assumes data columns are [Frequency,reA1_D1,imA1_D1,reB1_D1,imB1_D1]
     returns a S1PV1 model with columns [Frequency,reS11,imS11]"""
-    complex_sparameters=[]
-    for row_index,row in enumerate(w1p.data[:]):
-        # B1_D1/A1_D1
-        S11=complex(row[3],row[4])/complex(row[1],row[2])
-        new_row=[row[0],S11]
-        complex_sparameters.append(new_row)
-    s1p_out=S1PV1(None,sparameter_complex=complex_sparameters)
+    frequency,waves,wave_names=wave_parameter_arrays(w1p)
+    s1p_out=s1p_from_arrays(frequency,wave_ratios(waves,wave_names,[("B1_D1","A1_D1")]))
     return s1p_out
 
 def S2p_to_S1p(s2p,column="S11"):
     """Creates an s1p from an s2p by taking column and frequency, column can be any value in ["S11","S21","S12","S22"]"""
     columns=["S11","S21","S12","S22"]
     s2p.change_data_format("RI")
-    index=columns.index(column)+1
-    sparameter_complex=[]
-    for row_index,row in enumerate(s2p.sparameter_complex[:]):
-        sparameter_complex.append([row[0],row[index]])
+    index=columns.index(column)
+    frequency,sparameters=sparameter_complex_to_arrays(s2p.sparameter_complex)
     options=s2p.options.copy()
+    # the two port row formatter does not apply to the one port data
+    options.pop("sparameter_row_formatter_string",None)
     options["column_names"]=["Frequency","reS11","imS11"]
-    options["sparameter_complex"]=sparameter_complex
+    options["option_line"]=s2p.option_line
     options["number_ports"]=1
     options["extension"]="s1p"
-    s1p_out=S1PV1(None,**options)
+    s1p_out=s1p_from_arrays(frequency,sparameters[:,index],**options)
     return s1p_out
 
 def S1ps_to_S2p(S11_s1p,S22_s1p,S21_fill_value=complex(0,0)):
@@ -148,28 +147,71 @@ def S1ps_to_S2p(S11_s1p,S22_s1p,S21_fill_value=complex(0,0)):
     S22_s1p.change_data_format("RI")
     #check the frequency lists
     if len(S11_s1p.data)!=len(S22_s1p.data):
-        raise
-    sparameter_complex=[]
-    for row_index, row in enumerate(S11_s1p.data):
-        new_row=[row[0],
-                 complex(row[1],row[2]),
-                 S21_fill_value,
-                 S21_fill_value,
-                 complex(S22_s1p.data[row_index][1],S22_s1p.data[row_index][2])]
-        sparameter_complex.append(new_row)
-    options={}
-    options["sparameter_complex"]=sparameter_complex
-    s2p=S2PV1(None,**options)
+        raise TransformationError("The s1p models have {0} and {1} frequencies, they must be the same".format(
+            len(S11_s1p.data),len(S22_s1p.data)))
+    S11_data=np.array(S11_s1p.data,dtype=float).reshape(len(S11_s1p.data),-1)
+    S22_data=np.array(S22_s1p.data,dtype=float).reshape(len(S22_s1p.data),-1)
+    sparameters=np.empty((len(S11_data),4),dtype=complex)
+    sparameters[:,0]=S11_data[:,1]+1j*S11_data[:,2]
+    sparameters[:,1:3]=S21_fill_value
+    sparameters[:,3]=S22_data[:,1]+1j*S22_data[:,2]
+    s2p=s2p_from_arrays(S11_data[:,0],sparameters)
     return s2p
 
 #-----------------------------------------------------------------------------
 # Module Classes
+class TransformationError(Exception):
+    """Error raised when the models given to a transformation are not compatible"""
+    pass
 
 #-----------------------------------------------------------------------------
 # Module Scripts
+def test_wave_parameter_transformations(w2p_file="Line_5079_WR15_Wave_Parameters_20180313_001.w2p",
+                                        w1p_file="Line_4909_WR15_Wave_Parameters_Port2_20180313_001.w1p",
+                                        s4p_file="Solution_0.s4p",number_repeats=10):
+    """Compares the array transformations to the row by row complex division they replaced and times them,
+    the test files are in pyMez/Code/DataHandlers/Tests"""
+    import time
+    from Code.DataHandlers.NISTModels import W1P,W2P
+    os.chdir(os.path.join(os.path.dirname(os.path.realpath(__file__)),"..","DataHandlers","Tests"))
+    w2p=W2P(w2p_file)
+    w1p=W1P(w1p_file)
+    s4p=SNP(s4p_file)
+    start=time.time()
+    for repeat in range(number_repeats):
+        legacy_rows=[[row[0],complex(row[3],row[4])/complex(row[1],row[2]),
+                      complex(row[11],row[12])/complex(row[13],row[14]),
+                      complex(row[7],row[8])/complex(row[1],row[2]),
+                      complex(row[15],row[16])/complex(row[13],row[14])] for row in w2p.data]
+        legacy_s2p=S2PV1(None,sparameter_complex=legacy_rows)
+    legacy_time=(time.time()-start)/number_repeats
+    start=time.time()
+    for repeat in range(number_repeats):
+        s2p=W2p_to_S2p(w2p)
+    new_time=(time.time()-start)/number_repeats
+    print(("W2p_to_S2p on {0} frequencies: row by row {1:.4f} s, arrays {2:.4f} s, same data {3}".format(
+        len(w2p.data),legacy_time,new_time,np.allclose(legacy_s2p.data,s2p.data,rtol=1e-12,atol=0))))
+    switch_terms=W2p_to_SwitchTerms(w2p)
+    print(("The first switch term row is {0}".format(switch_terms.sparameter_complex[0])))
+    s1p=W1p_to_S1p(w1p)
+    legacy_s11=[complex(row[3],row[4])/complex(row[1],row[2]) for row in w1p.data]
+    print(("W1p_to_S1p same S11 {0}".format(np.allclose([row[1] for row in s1p.sparameter_complex],
+                                                         legacy_s11,rtol=1e-12,atol=0))))
+    from Code.DataHandlers.Translations import Snp_to_AsciiDataTable
+    s1p_table=Snp_to_AsciiDataTable(s1p)
+    print(("W1p_to_S1p has the one port column names {0} and converts to an AsciiDataTable with columns {1}".format(
+        s1p.column_names==S1P_RI_COLUMN_NAMES,s1p_table.column_names)))
+    print(("The S2p_to_S1p column names are {0}".format(S2p_to_S1p(s2p,"S22").column_names)))
+    s2p_S22=S2p_to_S1p(s2p,"S22")
+    s2p_rebuilt=S1ps_to_S2p(S2p_to_S1p(s2p,"S11"),s2p_S22)
+    print(("S1ps_to_S2p(S2p_to_S1p) keeps S11 and S22 {0}".format(
+        np.array_equal(np.array(s2p_rebuilt.data)[:,[1,2,7,8]],np.array(s2p.data)[:,[1,2,7,8]]))))
+    error_boxes=SixteenTerm_to_EightTermList(s4p)
+    print(("The first error box S21 is S31 of the s4p {0}".format(
+        error_boxes[0].sparameter_complex[0][2]==s4p.sparameter_complex[0][9])))
 
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
-    pass
+    test_wave_parameter_transformations()
     
\ No newline at end of file
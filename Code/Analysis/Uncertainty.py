@@ -68,6 +68,53 @@ def standard_error(value_1,uncertainty_value_1,value_2,uncertainty_value_2=0,exp
     """calculates the standard errror (delta value/ (expansion factor * Sqrt(ua^2+ub^2)))"""
     return abs((value_2-value_1))/(math.sqrt(uncertainty_value_1**2+uncertainty_value_2**2)*expansion_factor)
 
+def data_table_columns_to_array(table,column_names,rows=None):
+    """Returns a float array with one column for each name in column_names taken from table,
+    optionally only the rows selected by the integer array rows"""
+    column_indices=[table.column_names.index(column_name) for column_name in column_names]
+    if rows is None:
+        rows=range(len(table.data))
+    data=table.data
+    array=np.array([[data[row][index] for index in column_indices] for row in rows],dtype=float)
+    return array.reshape((len(rows),len(column_indices)))
+
+def get_uncertainty_function(error_options,table_number):
+    """Returns the uncertainty function for table_number (1 or 2) from the options of standard_error_data_table,
+    the keys uncertainty_table_N_function, uncertainty_function_table_N and uncertainty_function are tried in order"""
+    for key in ["uncertainty_table_{0}_function".format(table_number),
+                "uncertainty_function_table_{0}".format(table_number),"uncertainty_function"]:
+        if error_options.get(key) is not None:
+            return error_options[key]
+    return None
+
+def uncertainty_array(table,rows,values,uncertainty_type=None,uncertainty_column_names=None,uncertainty=None,
+                      uncertainty_function=None):
+    """Returns an array of uncertainties the same shape as values, which are the value columns of the selected
+    rows of table. uncertainty_type is None (0), 'table' or 'list' (uncertainty_column_names of table),
+    'constant' or 'fixed' (uncertainty), 'fractional' (uncertainty*values) or 'function'
+    (uncertainty_function(values)). The function is called once with the whole array and element by element
+    only if it does not accept arrays"""
+    if uncertainty_type is None:
+        return np.zeros(values.shape)
+    elif re.search("table|list",uncertainty_type,re.IGNORECASE):
+        return data_table_columns_to_array(table,uncertainty_column_names[:values.shape[1]],rows)
+    elif re.search("con|fixed",uncertainty_type,re.IGNORECASE):
+        return np.full(values.shape,float(uncertainty))
+    elif re.search("fract",uncertainty_type,re.IGNORECASE):
+        return float(uncertainty)*values
+    elif re.search("func",uncertainty_type,re.IGNORECASE):
+        try:
+            errors=np.asarray(uncertainty_function(values),dtype=float)
+            if errors.shape==values.shape:
+                return errors
+            return np.broadcast_to(errors,values.shape).astype(float)
+        except (TypeError,ValueError):
+            return np.array([[uncertainty_function(value) for value in row] for row in values.tolist()],
+                            dtype=float).reshape(values.shape)
+    else:
+        return np.zeros(values.shape)
+
+@timed()
 def standard_error_data_table(table_1,table_2,**options):
     """standard error data table takes two tables and creates a table that is the standard error of the two tables,
     at least one table must have uncertainties associated with it. The input tables are assumed to have data
@@ -115,73 +162,45 @@ def standard_error_data_table(table_1,table_2,**options):
               "table_1[{0}] and table_2[{1}] at {2}".format(error_options["independent_variable_column_name"],
                                                            error_options["independent_variable_column_name"],
                                                            begin_time)))
-    x_set_table_1=set(table_1[error_options["independent_variable_column_name"]])
-    x_set_table_2=set(table_2[error_options["independent_variable_column_name"]])
-    unique_x=sorted(list(x_set_table_1.intersection(x_set_table_2)))
+    x_table_1=np.asarray(table_1[error_options["independent_variable_column_name"]])
+    x_table_2=np.asarray(table_2[error_options["independent_variable_column_name"]])
+    unique_x=np.intersect1d(x_table_1,x_table_2)
     if error_options["debug"]:
         end_time=datetime.datetime.utcnow()
         print(("finished finding intersection at {0}".format(end_time)))
         delta_time=end_time-begin_time
         print(("it took {0} to find the intersection that contained {1} points".format(delta_time,len(unique_x))))
-    if not unique_x:
+    if not len(unique_x):
         raise StandardErrorError("No points in the intersection, please either interpolate one data set or compare"
                                  "with another data set")
 
-    # next build the new data set
-    out_data=[]
-    x_column_index_table_1=table_1.column_names.index(error_options["independent_variable_column_name"])
-    x_column_index_table_2=table_2.column_names.index(error_options["independent_variable_column_name"])
-    # we choose the row by using unique_x
-    for x_value in unique_x:
-        # here if there are multiple values for x_value we ignore them
-        table_1_row=list(filter(lambda x: x[x_column_index_table_1]==x_value,table_1.data))[0]
-        # we begin a new_row
-        table_2_rows=[x for x in table_2.data if x[x_column_index_table_2]==x_value]
-        if error_options["debug"]:
-            print(("{0} is {1}".format("table_2_rows",table_2_rows)))
-        for table_2_row in table_2_rows:
-            new_row=[x_value]
-            for column_index,column_name in enumerate(error_options["value_column_names"]):
-                value_1_column_selector=table_1.column_names.index(column_name)
-                value_2_column_selector=table_2.column_names.index(column_name)
-                value_1=table_1_row[value_1_column_selector]
-                value_2=table_2_row[value_2_column_selector]
-                # now we assign the error to value 1
-                if error_options["table_1_uncertainty_type"] is None:
-                    error_1=0
-                elif re.search("table|list",error_options["table_1_uncertainty_type"],re.IGNORECASE):
-                    error_1_column_selector=table_1.column_names.index(error_options["table_1_uncertainty_column_names"][column_index])
-                    error_1=table_1_row[error_1_column_selector]
-                elif re.search("con|fixed",error_options["table_1_uncertainty_type"],re.IGNORECASE):
-                    error_1=float(error_options["uncertainty_table_1"])
-                elif re.search("fract",error_options["table_1_uncertainty_type"],re.IGNORECASE):
-                    error_1=float(error_options["uncertainty_table_1"])*value_1
-                elif re.search("func",error_options["table_1_uncertainty_type"],re.IGNORECASE):
-                    error_1=error_options["uncertainty_table_1_function"](value_1)
-                else:
-                    error_1=0
-                # now the same for table 2
-                if error_options["table_2_uncertainty_type"] is None:
-                    error_2=0
-                elif re.search("table|list",error_options["table_2_uncertainty_type"],re.IGNORECASE):
-                    error_2_column_selector=table_2.column_names.index(error_options["table_2_uncertainty_column_names"][column_index])
-                    error_2=table_2_row[error_2_column_selector]
-                elif re.search("con|fixed",error_options["table_2_uncertainty_type"],re.IGNORECASE):
-                    error_2=float(error_options["uncertainty_table_2"])
-                elif re.search("fract",error_options["table_2_uncertainty_type"],re.IGNORECASE):
-                    error_2=float(error_options["uncertainty_table_2"])*value_2
-                elif re.search("func",error_options["table_2_uncertainty_type"],re.IGNORECASE):
-                    error_2=error_options["uncertainty_table_2_function"](value_2)
-                else:
-                    error_2=0
-                # now calculate the value and append
-                try:
-                    standard_error=(value_1-value_2)/(expansion_factor*math.sqrt(error_1**2+error_2**2))
-                except:
-                    standard_error=0
-                new_row.append(standard_error)
-            out_data.append(new_row)
-        # now we handle the standard error table creation
+    # next join the tables on the sorted independent variable, a stable sort keeps the table order of repeats
+    # if there are multiple values for x_value in table_1 the first is used,
+    # every table_2 row with x_value gets a row in the result
+    order_table_1=np.argsort(x_table_1,kind="stable")
+    rows_table_1=order_table_1[np.searchsorted(x_table_1[order_table_1],unique_x,side="left")]
+    order_table_2=np.argsort(x_table_2,kind="stable")
+    rows_table_2=order_table_2[np.isin(x_table_2[order_table_2],unique_x)]
+    x_out=x_table_2[rows_table_2]
+    rows_table_1=rows_table_1[np.searchsorted(unique_x,x_out)]
+    if error_options["debug"]:
+        print(("{0} is {1}".format("rows_table_2",rows_table_2)))
+    values_1=data_table_columns_to_array(table_1,error_options["value_column_names"],rows_table_1)
+    values_2=data_table_columns_to_array(table_2,error_options["value_column_names"],rows_table_2)
+    errors=[]
+    for table_number,table,rows,values in [(1,table_1,rows_table_1,values_1),(2,table_2,rows_table_2,values_2)]:
+        errors.append(uncertainty_array(table,rows,values,
+                                        uncertainty_type=error_options["table_{0}_uncertainty_type".format(table_number)],
+                                        uncertainty_column_names=error_options[
+                                            "table_{0}_uncertainty_column_names".format(table_number)],
+                                        uncertainty=error_options["uncertainty_table_{0}".format(table_number)],
+                                        uncertainty_function=get_uncertainty_function(error_options,table_number)))
+    # now calculate all the values at once, points without an uncertainty have a standard error of 0
+    denominator=expansion_factor*np.sqrt(errors[0]**2+errors[1]**2)
+    with np.errstate(divide="ignore",invalid="ignore"):
+        standard_errors=np.where(denominator==0,0.,(values_1-values_2)/denominator)
+    out_data=[[x_value]+row for x_value,row in zip(x_out.tolist(),standard_errors.tolist())]
+    # now we handle the standard error table creation
     standard_error_column_names=[error_options["independent_variable_column_name"]]
     for column_name in error_options["value_column_names"]:
         standard_error_column_names.append("SE"+column_name)
@@ -211,8 +230,45 @@ def test_standard_error(test_list=None):
     print(("The standard_error is {0}".format(standard_error(first_value,
                                                             first_error,
                                                             second_value,second_error))))
+
+def test_standard_error_data_table(number_points=2000,repeats=3):
+    """Tests standard_error_data_table on two generated tables with number_points frequencies,
+    table_2 has every frequency repeats times (like repeated measurements of a check standard).
+    Compares each row to the scalar standard_error and prints the time to build the table"""
+    import time
+    column_names=["Frequency","magS11","argS11","uMgS11","uAgS11"]
+    frequencies=[float(index) for index in range(number_points)]
+    table_1_data=[[frequency,1.+frequency*1e-4,frequency*1e-2,.01,.5] for frequency in frequencies]
+    table_2_data=[[frequency,1.+frequency*1e-4+.002*repeat,frequency*1e-2-.1*repeat,0.,0.]
+                  for repeat in range(repeats) for frequency in frequencies[::-1]]
+    table_options={"column_names":column_names,"column_types":["float" for column in column_names]}
+    table_1=AsciiDataTable(None,data=table_1_data,**table_options)
+    table_2=AsciiDataTable(None,data=table_2_data,**table_options)
+    error_options={"value_column_names":["magS11","argS11"],
+                   "table_1_uncertainty_column_names":["uMgS11","uAgS11"],
+                   "expansion_factor":2}
+    start_time=time.time()
+    standard_error_table=standard_error_data_table(table_1,table_2,**error_options)
+    stop_time=time.time()
+    print(("standard_error_data_table for {0} x {1} rows took {2:.3f} s".format(len(table_1_data),
+                                                                                len(table_2_data),
+                                                                                stop_time-start_time)))
+    print(("The column names are {0}".format(standard_error_table.column_names)))
+    print(("The table has {0} rows".format(len(standard_error_table.data))))
+    # the second row of frequency 1 comes from the second repeat of table_2
+    row=standard_error_table.data[repeats+1]
+    table_2_row=table_2_data[number_points+number_points-2]
+    expected=[(table_1_data[1][index]-table_2_row[index])/(2*table_1_data[1][index+2]) for index in [1,2]]
+    print(("The row {0} should be {1}".format(row,[1.0]+expected)))
+    fractional_table=standard_error_data_table(table_1,table_2,table_1_uncertainty_type="fractional",
+                                               uncertainty_table_1=.01,**error_options)
+    print(("With a 1% fractional uncertainty the last row is {0}".format(fractional_table.data[-1])))
+    function_table=standard_error_data_table(table_1,table_2,table_1_uncertainty_type="function",
+                                             uncertainty_table_1_function=lambda x:abs(x)*.01+.001,
+                                             **error_options)
+    print(("With an uncertainty function the last row is {0}".format(function_table.data[-1])))
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
-    pass
+    test_standard_error_data_table()
     
\ No newline at end of file
@@ -47,6 +47,9 @@ import os
 import pickle
 import sys
 import copy
+import operator
+import string
+import functools
 #-----------------------------------------------------------------------------
 # Third Party Imports
 sys.path.append(os.path.join(os.path.dirname( __file__ ), '..','..'))
@@ -77,6 +80,17 @@ except:
     np.ndarray='np.ndarray'
     print("Numpy was not imported")
     pass
+try:
+    from Code.Utils.PerformanceUtils import timed,timing_span
+except:
+    print("The module pyMez.Code.Utils.PerformanceUtils was not found, timing spans are not recorded")
+    import contextlib
+    def timed(name=None,registry=None):
+        return lambda function:function
+    @contextlib.contextmanager
+    def timing_span(name,registry=None):
+        yield None
+    pass
 #-----------------------------------------------------------------------------
 # Module Constants
 TESTS_DIRECTORY=os.path.join(os.path.dirname(os.path.realpath(__file__)),'Tests')
@@ -84,10 +98,24 @@ TESTS_DIRECTORY=os.path.join(os.path.dirname(os.path.realpath(__file__)),'Tests'
 # General Regular Expression For matching a number
 NUMBER_MATCH_STRING=r'[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?'
 "Regular expression that matches a number of any format."
+COMPILED_PATTERNS={}
+"Registry of compiled regular expressions keyed by (pattern, flags), filled by get_compiled_pattern."
+OPTION_ELEMENT_MAPS={}
+"Registry of element name:{option key:True if the key is about the element} used by get_options_by_element."
 
 #-----------------------------------------------------------------------------
 # Module Functions
 
+def get_compiled_pattern(pattern,flags=0):
+    """Returns the compiled regular expression for pattern and flags from COMPILED_PATTERNS, compiling it
+    the first time. Use it instead of re.search(pattern,...) inside loops over lines or rows"""
+    try:
+        return COMPILED_PATTERNS[(pattern,flags)]
+    except KeyError:
+        compiled_pattern=re.compile(pattern,flags)
+        COMPILED_PATTERNS[(pattern,flags)]=compiled_pattern
+        return compiled_pattern
+
 def print_comparison(var_1,var_2):
     """If var_1==var_2 prints True, else Prints false and a string representation of the 2 vars"""
     print((var_1==var_2))
@@ -113,13 +141,62 @@ def string_list_collapse(list_of_strings,string_delimiter='\n'):
         return
     if string_delimiter is None:
         string_delimiter=""
-    out_string=''
-    for index,item in enumerate(list_of_strings):
-        if index is len(list_of_strings)-1:
-            out_string=out_string+item
-        else:
-            out_string=out_string+item+string_delimiter
+    out_string=string_delimiter.join(list_of_strings)
     return out_string
+@functools.lru_cache(maxsize=256)
+def compile_row_formatter(row_formatter_string=None,data_delimiter=None):
+    """Returns a function that makes a string from a row (list of values), the same as
+    row_formatter_string.format(*row,delimiter=data_delimiter). The delimiter is put into the template once and a
+    template of only {0}{delimiter}{1}... becomes a join. If row_formatter_string is None the values are joined with
+    data_delimiter. The functions are cached by formatter and delimiter, so a changed formatter gets a new one"""
+    if data_delimiter is None:
+        data_delimiter=','
+    if row_formatter_string is None:
+        def format_row(row):
+            return data_delimiter.join([str(item) for item in row])
+        return format_row
+    template=row_formatter_string.replace("{delimiter}",data_delimiter.replace("{","{{").replace("}","}}"))
+    try:
+        fields=list(string.Formatter().parse(template))
+    except ValueError:
+        fields=None
+    if fields is None or [field[1] for field in fields if field[1] is not None and not field[1].isdigit()]:
+        # named fields other than delimiter are left to str.format
+        def format_row(row):
+            return row_formatter_string.format(*row,delimiter=data_delimiter)
+        return format_row
+    field_names=[field[1] for field in fields]
+    plain_fields=all([field[2]=="" and field[3] is None for field in fields])
+    if fields and plain_fields and field_names==[str(index) for index in range(len(fields))] and \
+            [field[0] for field in fields]==[""]+[data_delimiter for field in fields[1:]]:
+        number_fields=len(field_names)
+        template_format=template.format
+        def format_row(row):
+            if len(row)==number_fields:
+                return data_delimiter.join(map(format,row))
+            return template_format(*row)
+        return format_row
+    template_format=template.format
+    def format_row(row):
+        return template_format(*row)
+    return format_row
+
+@functools.lru_cache(maxsize=256)
+def compile_cell_formatters(row_formatter_string,number_columns):
+    """Returns a tuple of number_columns functions that format a single value for each column of
+    row_formatter_string, the value of column i is formatted as the i-th {delimiter} separated piece with {i} changed
+    to {0}. If row_formatter_string is None every column is formatted with format"""
+    if row_formatter_string is None:
+        return tuple([format for index in range(number_columns)])
+    cell_formatters=[]
+    for index,item in enumerate(row_formatter_string.split("{delimiter}")):
+        cell_formatter_string=item.replace("{"+str(index),"{0")
+        if cell_formatter_string=="{0}":
+            cell_formatters.append(format)
+        else:
+            cell_formatters.append(cell_formatter_string.format)
+    return tuple(cell_formatters)
+
 def list_to_string(row_list,data_delimiter=None,row_formatter_string=None,begin=None,end=None):
     """Given a list of values returns a string, if row_formatter is specifed
      it uses it as a template, else uses data delimiter. Inserts data_delimiter between each list element. An optional
@@ -127,17 +204,7 @@ def list_to_string(row_list,data_delimiter=None,row_formatter_string=None,begin=
     to \n to have nothing at the end use ''
     """
     check_arg_type(row_list,ListType)
-    if data_delimiter is None:
-        data_delimiter=','
-    string_out=""
-    if row_formatter_string is None:
-        for index,item in enumerate(row_list):
-            if index is len(row_list)-1:
-                string_out=string_out+str(item)
-            else:
-                string_out=string_out+str(item)+data_delimiter
-    else:
-        string_out=row_formatter_string.format(*row_list,delimiter=data_delimiter)
+    string_out=compile_row_formatter(row_formatter_string,data_delimiter)(row_list)
     if end is None:
         end="\n"
     if begin is None:
@@ -150,22 +217,19 @@ def list_list_to_string(list_lists,data_delimiter=None,row_formatter_string=None
     """
     if line_end is None:
         line_end="\n"
+    if line_begin is None:
+        line_begin=""
     check_arg_type(list_lists,ListType)
-    string_out=""
-    for index,row in enumerate(list_lists):
-        if index==len(list_lists)-1:
-            if line_end is "\n":
-                last_end=""
-            else:
-                last_end=re.sub("\n","",line_end,count=1)
-            string_out=string_out+list_to_string(row,data_delimiter=data_delimiter,
-                                             row_formatter_string=row_formatter_string,
-                                             begin=line_begin,end=last_end)
-        else:
-            string_out=string_out+list_to_string(row,data_delimiter=data_delimiter,
-                                             row_formatter_string=row_formatter_string,
-                                             begin=line_begin,end=line_end)
-    return string_out
+    if len(list_lists)==0:
+        return ""
+    # the rows are formatted with one compiled formatter and joined once
+    format_row=compile_row_formatter(row_formatter_string,data_delimiter)
+    last_end=re.sub("\n","",line_end,count=1)
+    if line_begin:
+        lines=[line_begin+format_row(row) for row in list_lists]
+    else:
+        lines=[format_row(row) for row in list_lists]
+    return line_end.join(lines)+last_end
 
 def line_comment_string(comment,comment_begin=None,comment_end=None):
     "Creates a comment optionally wrapped with comment_begin and comment_end, meant for a single string comment "
@@ -207,7 +271,7 @@ def ensure_string(input_object,  list_delimiter="",  end_if_list=""):
             string_out=input_object
         elif isinstance(input_object,(ListType,np.ndarray)):
             if isinstance(input_object[0],(ListType,np.ndarray)):
-                string_out=list_list_to_string(input_object,data_delimiter=list_delimiter,end=end_if_list)
+                string_out=list_list_to_string(input_object,data_delimiter=list_delimiter,line_end=end_if_list)
             else:
                 string_out=list_to_string(input_object,data_delimiter=list_delimiter,end=end_if_list)
         else:
@@ -231,17 +295,16 @@ def strip_tokens(string_list,*remove_tokens):
             remove_list.append(token)
             # print remove_list
     try:
-        for item in remove_list:
-            temp_string=temp_string.replace(item,"")
-            #print temp_string
+        if remove_list:
+            # one pass over the string for all the tokens, longer tokens are tried first
+            remove_pattern="|".join([re.escape(item) for item in sorted(remove_list,key=len,reverse=True)])
+            temp_string=get_compiled_pattern(remove_pattern).sub("",temp_string)
     except:
         print("Strip Tokens Did not work")
         pass
     # spliting using "\n" seems to give an extra empty element at the end always
-    new_string_list=temp_string.splitlines()
     # now we add endlines back in for consistency
-    for index,line in enumerate(new_string_list):
-        new_string_list[index]=line+'\n'
+    new_string_list=[line+'\n' for line in temp_string.splitlines()]
     return new_string_list
 
 def strip_begin_end_tokens(string_list,begin_token=None,end_token=None):
@@ -339,9 +402,30 @@ def split_all_rows(row_list,delimiter=None,escape_character=None):
         out_list.append(split_row(row,delimiter=delimiter,escape_character=escape_character))
     return out_list
 
-def convert_row(row_list_strings,column_types=None):
+def get_column_converters(column_types):
+    """Returns a list of functions that convert a string to the python type named by each column type,
+    the same rules as convert_row. Meant to be built once for a table and used for every row"""
+    converters=[]
+    for column_type in column_types:
+        if re.match('int',column_type,re.IGNORECASE):
+            converters.append(int)
+        elif re.match('float',column_type,re.IGNORECASE):
+            converters.append(float)
+        elif re.match('str|char|object',column_type,re.IGNORECASE):
+            converters.append(str)
+        elif re.match('com',column_type,re.IGNORECASE):
+            converters.append(complex)
+        elif re.match('list',column_type,re.IGNORECASE):
+            converters.append(list)
+        elif re.match('dict',column_type,re.IGNORECASE):
+            converters.append(dict)
+        else:
+            converters.append(lambda value:value)
+    return converters
+
+def convert_row(row_list_strings,column_types=None,converters=None):
     """Converts a row list of strings to native
-    python types using a column types list"""
+    python types using a column types list, or a list of converters from get_column_converters"""
     if column_types is None:
         column_types=['str' for value in row_list_strings]
 
@@ -350,31 +434,21 @@ def convert_row(row_list_strings,column_types=None):
         raise TypeConversionError("Convert row could not convert {0} using {1}".format(row_list_strings,column_types))
         #return row_list_strings
     else:
+        if converters is None:
+            converters=get_column_converters(column_types)
         out_row=row_list_strings
-        for index,column_type in enumerate(column_types):
-            if re.match('int',column_type,re.IGNORECASE):
-                out_row[index]=int(row_list_strings[index])
-            elif re.match('float',column_type,re.IGNORECASE):
-                out_row[index]=float(row_list_strings[index])
-            elif re.match('str|char|object',column_type,re.IGNORECASE):
-                #print_comparison(row_list_strings[index],out_row[index])
-                out_row[index]=str(row_list_strings[index])
-            elif re.match('com',column_type,re.IGNORECASE):
-                out_row[index]=complex(row_list_strings[index])
-            elif re.match('list',column_type,re.IGNORECASE):
-                out_row[index]=list(row_list_strings[index])
-            elif re.match('dict',column_type,re.IGNORECASE):
-                out_row[index]=dict(row_list_strings[index])
-            else:
-                out_row[index]=row_list_strings[index]
+        out_row[:]=[converter(value) for (converter,value) in zip(converters,row_list_strings)]
     return out_row
 
 def convert_all_rows(list_rows,column_types=None):
     "Converts all the rows (list of strings) in a list of rows using column types "
     check_arg_type(list_rows,ListType)
+    converters=None
+    if column_types is not None:
+        converters=get_column_converters(column_types)
     out_list=[]
     for index,row in enumerate(list_rows):
-        out_list.append(convert_row(row,column_types))
+        out_list.append(convert_row(row,column_types,converters))
     return out_list
 
 def insert_inline_comment(list_of_strings,comment="",line_number=None,string_position=None,begin_token='(*',end_token='*)'):
@@ -399,10 +473,13 @@ def collect_inline_comments(list_of_strings,begin_token=None,end_token=None):
     Output form is ['comment',line_number,string_location] returns None  if there are none or tokens are set to None"""
     if begin_token in [None] and end_token in [None]:
         return None
-    match=re.compile('{0}(?P<inline_comments>.*){1}'.format(re.escape(begin_token),re.escape(end_token)))
+    match=get_compiled_pattern('{0}(?P<inline_comments>.*){1}'.format(re.escape(begin_token),re.escape(end_token)))
     inline_comment_list=[]
     for index,line in enumerate(list_of_strings):
-        comment_match=re.search(match,line)
+        # the substring test is much cheaper than the regular expression and most lines have no comment
+        if begin_token not in line:
+            continue
+        comment_match=match.search(line)
         if comment_match:
             inline_comment_list.append([comment_match.group('inline_comments'),index,comment_match.start()])
     if inline_comment_list:
@@ -414,10 +491,8 @@ def strip_inline_comments(list_of_strings,begin_token='(*',end_token='*)'):
     "Removes inline comments from a list of strings and returns the list of strings"
     if begin_token in [None] and end_token in [None]:
         return list_of_strings
-    match=re.compile('{0}(?P<inline_comments>.+){1}'.format(re.escape(begin_token),re.escape(end_token)))
-    out_list=[]
-    for index,line in enumerate(list_of_strings):
-        out_list.append(re.sub(match,'',line))
+    match=get_compiled_pattern('{0}(?P<inline_comments>.+){1}'.format(re.escape(begin_token),re.escape(end_token)))
+    out_list=[match.sub('',line) if begin_token in line else line for line in list_of_strings]
     return out_list
 
 
@@ -502,12 +577,9 @@ def parse_lines(string_list,**options):
         # Todo: Add the conversion to pandas
         return out_list
 
-def ascii_data_table_join(column_selector,table_1,table_2):
-    """Given a column selector (name or zero based index) and
-    two tables a data_table with extra columns is returned. The options from table 1 are inherited
-    headers and footers are added, if the tables have a different number of rows problems may occur"""
-    if len(table_1.data) != len(table_2.data):
-        raise DataDimensionError('The dim {0} is not equal to {1}'.format(len(table_1.data),len(table_2.data)))
+def join_table_headers(table_1,table_2):
+    """Returns the [header, footer] of two tables as they are combined by ascii_data_table_join, lines from both
+    tables are kept unless they are equal"""
     if table_1.header is None and table_2.header is None:
         header=None
     elif table_1.header is None:
@@ -537,13 +609,141 @@ def ascii_data_table_join(column_selector,table_1,table_2):
             footer.append(line)
         for line in table_2.footer:
             footer.append(line)
-
+    return [header,footer]
+
+def hash_join_rows(rows_1,key_1,rows_2,key_2,columns_2,how="inner",empty_value=None):
+    """Joins two lists of rows on the values in column key_1 of rows_1 and key_2 of rows_2 using a dictionary
+    of the rows_2 keys. The returned rows are a row of rows_1 followed by the columns_2 (a list of indices) of the
+    matching row of rows_2, in the order of rows_1 and every match in the order of rows_2. how is inner, left or
+    outer, missing values are empty_value and outer rows that are only in rows_2 come last"""
+    key_rows_2={}
+    for row_index,row in enumerate(rows_2):
+        key_rows_2.setdefault(row[key_2],[]).append(row_index)
+    empty_columns_2=[empty_value for column in columns_2]
+    matched_2=[False for row in rows_2]
+    out_rows=[]
+    for row in rows_1:
+        matches=key_rows_2.get(row[key_1])
+        if matches:
+            for row_index in matches:
+                row_2=rows_2[row_index]
+                out_rows.append(row+[row_2[column] for column in columns_2])
+                matched_2[row_index]=True
+        elif how in ["left","outer"]:
+            out_rows.append(row+empty_columns_2)
+    if how in ["outer"]:
+        out_rows=out_rows+unmatched_rows(rows_1,key_1,rows_2,key_2,columns_2,matched_2,empty_value)
+    return out_rows
+
+def merge_join_rows(rows_1,key_1,rows_2,key_2,columns_2,how="inner",empty_value=None):
+    """Joins two lists of rows like hash_join_rows by sorting both on the key and merging them, the returned
+    rows are in key order. The keys of both lists must be comparable"""
+    order_1=sorted(range(len(rows_1)),key=lambda row_index:rows_1[row_index][key_1])
+    order_2=sorted(range(len(rows_2)),key=lambda row_index:rows_2[row_index][key_2])
+    empty_columns_2=[empty_value for column in columns_2]
+    # like unmatched_rows an empty rows_1 pads up to and including the key column
+    number_columns_1=len(rows_1[0]) if rows_1 else key_1+1
+    empty_columns_1=[empty_value for column in range(number_columns_1)]
+    out_rows=[]
+    position_1=0
+    position_2=0
+    while position_1<len(order_1) or position_2<len(order_2):
+        if position_2>=len(order_2):
+            key=rows_1[order_1[position_1]][key_1]
+            compare=-1
+        elif position_1>=len(order_1):
+            key=rows_2[order_2[position_2]][key_2]
+            compare=1
+        else:
+            key_value_1=rows_1[order_1[position_1]][key_1]
+            key_value_2=rows_2[order_2[position_2]][key_2]
+            if key_value_1==key_value_2:
+                key=key_value_1
+                compare=0
+            elif key_value_1<key_value_2:
+                key=key_value_1
+                compare=-1
+            else:
+                key=key_value_2
+                compare=1
+        # the runs of rows with this key in each list
+        end_1=position_1
+        if compare<=0:
+            while end_1<len(order_1) and rows_1[order_1[end_1]][key_1]==key:
+                end_1+=1
+        end_2=position_2
+        if compare>=0:
+            while end_2<len(order_2) and rows_2[order_2[end_2]][key_2]==key:
+                end_2+=1
+        if compare==0:
+            for index_1 in order_1[position_1:end_1]:
+                for index_2 in order_2[position_2:end_2]:
+                    out_rows.append(rows_1[index_1]+[rows_2[index_2][column] for column in columns_2])
+        elif compare<0 and how in ["left","outer"]:
+            for index_1 in order_1[position_1:end_1]:
+                out_rows.append(rows_1[index_1]+empty_columns_2)
+        elif compare>0 and how in ["outer"]:
+            for index_2 in order_2[position_2:end_2]:
+                new_row=empty_columns_1[:]
+                new_row[key_1]=key
+                out_rows.append(new_row+[rows_2[index_2][column] for column in columns_2])
+        position_1=end_1
+        position_2=end_2
+    return out_rows
+
+def unmatched_rows(rows_1,key_1,rows_2,key_2,columns_2,matched_2,empty_value=None):
+    """Returns the rows of an outer join for the rows_2 that are not matched (matched_2[row_index] is False), the
+    columns of rows_1 are empty_value except for the key"""
+    number_columns_1=len(rows_1[0]) if rows_1 else key_1+1
+    out_rows=[]
+    for row_index,row_2 in enumerate(rows_2):
+        if not matched_2[row_index]:
+            new_row=[empty_value for column in range(number_columns_1)]
+            new_row[key_1]=row_2[key_2]
+            out_rows.append(new_row+[row_2[column] for column in columns_2])
+    return out_rows
+
+def ascii_data_table_join(column_selector,table_1,table_2,**options):
+    """Given a column selector (name or zero based index) and
+    two tables a data_table with extra columns is returned. The options from table 1 are inherited
+    headers and footers are added. By default the tables are joined row by row and must have the same number
+    of rows. Use how='inner', 'left' or 'outer' to join the rows on the values of the selected column instead,
+    with algorithm='hash' (rows in the order of table_1, outer rows only in table_2 at the end) or
+    algorithm='merge' (rows sorted by the column). Missing values are table_1.options['empty_value']"""
+    defaults={"how":None,"algorithm":"hash"}
+    join_options={}
+    for key,value in defaults.items():
+        join_options[key]=value
+    for key,value in options.items():
+        join_options[key]=value
+    if join_options["how"] is None and len(table_1.data) != len(table_2.data):
+        raise DataDimensionError('The dim {0} is not equal to {1}'.format(len(table_1.data),len(table_2.data)))
+    [header,footer]=join_table_headers(table_1,table_2)
+    if isinstance(column_selector,IntType):
+        column_selector=table_1.column_names[column_selector]
     if column_selector in table_2.column_names:
-        column_selector_2=table_2.column_names.index(column_selector)
+        column_selector_2=table_2.get_column_index(column_selector)
+
+    #Todo: make this work for tables without column_names
+    columns_2=[index for index,column in enumerate(table_2.column_names)
+               if column != table_2.column_names[column_selector_2]]
+    if join_options["how"] is None:
+        # each row is built once instead of once per added column
+        data=[row_1+[row_2[column] for column in columns_2] for row_1,row_2 in zip(table_1.data,table_2.data)]
+    else:
+        if join_options["how"] not in ["inner","left","outer"]:
+            raise TypeError("how must be None, inner, left or outer not {0}".format(join_options["how"]))
+        if re.search("merge|sort",join_options["algorithm"],re.IGNORECASE):
+            join_function=merge_join_rows
+        else:
+            join_function=hash_join_rows
+        data=join_function(table_1.data,table_1.get_column_index(column_selector),
+                           table_2.data,column_selector_2,columns_2,how=join_options["how"],
+                           empty_value=table_1.options["empty_value"])
 
     options=table_1.options.copy()
     new_table=AsciiDataTable(None,**options)
-    new_table.data=table_1.data[:]
+    new_table.data=data
     new_table.column_names=table_1.column_names[:]
     if header is None:
         new_table.header=None
@@ -553,28 +753,65 @@ def ascii_data_table_join(column_selector,table_1,table_2):
         new_table.footer=None
     else:
         new_table.footer=footer[:]
-    #Todo: make this work for tables without column_names
-    for index,column in enumerate(table_2.column_names):
-        if column == table_2.column_names[column_selector_2]:
-            pass
+    column_types=[]
+    for index in columns_2:
+        if table_2.options["column_types"] is None:
+            column_type=None
         else:
-            if table_2.options["column_types"] is None:
-                column_type=None
-            else:
-                if isinstance(table_2.options["column_types"], DictionaryType):
-                    column_type=table_2.options["column_types"][column]
-                elif isinstance(table_2.options["column_types"], ListType):
-                    column_type=table_2.options["column_types"][index]
-            column_data=table_2.get_column(column)
-            new_table.add_column(column,column_type=column_type,column_data=column_data)
-
+            if isinstance(table_2.options["column_types"], DictionaryType):
+                column_type=table_2.options["column_types"][table_2.column_names[index]]
+            elif isinstance(table_2.options["column_types"], ListType):
+                column_type=table_2.options["column_types"][index]
+        column_types.append(column_type)
+    new_table.add_columns([table_2.column_names[index] for index in columns_2],column_types=column_types)
     return new_table
 
+def concatenate_ascii_data_tables(table_list):
+    """Returns a new table of the type of the first table with the rows of every table in table_list, the tables
+    must have the same column names. The rows are collected into one new list and are shared with the input
+    tables as with add_row, unless there is an index column to renumber. The headers and footers of the other
+    tables are appended to the first ones as with +"""
+    first=table_list[0]
+    for table in table_list[1:]:
+        if table.column_names!=first.column_names:
+            raise DataDimensionError("The column names {0} are not {1}".format(table.column_names,
+                                                                                first.column_names))
+    number_columns=len(first.column_names)
+    data=[row for table in table_list for row in table.data if len(row)==number_columns]
+    if len(data)!=sum([len(table.data) for table in table_list]):
+        print(" could not add every row, dimensions do not match")
+    elements={}
+    for element in ["header","footer"]:
+        lines=first.__dict__[element]
+        if lines is not None:
+            lines=lines[:]
+        for table in table_list[1:]:
+            if table.__dict__[element] is not None and table.__dict__[element] is not first.__dict__[element]:
+                if lines is None:
+                    lines=[]
+                lines=lines+[line for line in table.__dict__[element] if line is not None]
+        elements[element]=lines
+    concatenated_table=first.copy()
+    concatenated_table.data=data
+    concatenated_table.column_names=first.column_names[:]
+    concatenated_table.header=elements["header"]
+    concatenated_table.footer=elements["footer"]
+    concatenated_table.options=first.options.copy()
+    if 'index' in first.column_names:
+        # the index column is renumbered in copies so the input tables keep their index
+        concatenated_table.data=[row[:] for row in data]
+        concatenated_table.update_index()
+    return concatenated_table
+
 def join_ascii_data_table_list(table_list):
     """Joins a list of any subclass of AsciiDataTable returns a new table of the same type, input
-    is assume to be a list of AsciiDataTable objects or any sub class. """
+    is assume to be a list of AsciiDataTable objects or any sub class. Tables with the same column names are
+    concatenated in one pass (see concatenate_ascii_data_tables)"""
     first=table_list[0]
+    if all([table.column_names==first.column_names for table in table_list[1:]]):
+        return concatenate_ascii_data_tables(table_list)
     joined_table=first.copy()
+    joined_table.data=[row[:] for row in first.data]
     for table in table_list[1:]:
         joined_table+table
     return joined_table
@@ -593,6 +830,37 @@ def structure_metadata(header_string,metadata_fact_delimiter=";",metadata_key_va
             metadata_dictionary[key]=value
     return metadata_dictionary
 
+def data_dictionary_list(column_names,cell_formatters,data):
+    """Returns a list with a dictionary {column_name:formatted value} for each row of data, cell_formatters
+    is a list of functions with one for each column (see compile_cell_formatters). Raises an IndexError if a row
+    is longer than column_names or cell_formatters"""
+    if data:
+        row_length=max(map(len,data))
+        if row_length>len(column_names) or row_length>len(cell_formatters):
+            raise IndexError("There are {0} column names and {1} cell formatters for rows of length {2}".format(
+                len(column_names),len(cell_formatters),row_length))
+    return [dict(zip(column_names,[cell_formatter(value) for cell_formatter,value in zip(cell_formatters,row)]))
+            for row in data]
+
+def select_row_columns(data,column_selectors):
+    """Returns a new list of rows with the columns given by the list of indices column_selectors,
+    the selection is done with one operator.itemgetter per row"""
+    if not column_selectors:
+        return [[] for row in data]
+    if len(column_selectors)==1:
+        column_selector=column_selectors[0]
+        return [[row[column_selector]] for row in data]
+    getter=operator.itemgetter(*column_selectors)
+    return [list(getter(row)) for row in data]
+
+def column_index_map(column_names):
+    """Returns a dictionary of {column_name:index} for the list column_names, if a name is repeated the
+    first index is kept like column_names.index"""
+    index_map={}
+    for index,column_name in enumerate(column_names):
+        index_map.setdefault(column_name,index)
+    return index_map
+
 #-----------------------------------------------------------------------------
 # Module Classes
 class DataDimensionError(Exception):
@@ -602,7 +870,65 @@ class TypeConversionError(Exception):
     """An error in the conversion of rows with provided types"""
     pass
 
-class AsciiDataTable(object):
+class ColumnCacheMixin(object):
+    """Adds a maintained column name to index map and cached column arrays to a table model with the attributes
+    column_names and data (a list of rows). The methods of the model that change columns or rows call
+    clear_column_cache and replacing data or adding and removing rows is noticed, but the cache can not see
+    values changed in place (table.data[i][j]=value or table.data[i]=new_row), callers that edit data that way
+    must call clear_column_cache before using get_column_array"""
+    def clear_column_cache(self):
+        """Discards the column name to index map and the cached column arrays"""
+        self._column_index_map=None
+        self._column_arrays={}
+
+    def get_column_index(self,column_name):
+        """Returns the index of column_name, the same as self.column_names.index(column_name) without the
+        search. The map is rebuilt when column_names has been replaced or changed"""
+        index_map=self.__dict__.get("_column_index_map")
+        if index_map is not None and self._column_index_map_source is self.column_names:
+            column_index=index_map.get(column_name)
+            if column_index is not None and column_index<len(self.column_names) and \
+                    self.column_names[column_index]==column_name:
+                return column_index
+        self._column_index_map=index_map=column_index_map(self.column_names)
+        self._column_index_map_source=self.column_names
+        try:
+            return index_map[column_name]
+        except KeyError:
+            raise ValueError("{0!r} is not in list".format(column_name))
+
+    def get_column_array(self,column_name=None,column_index=None):
+        """Returns a column as a read only numpy array given a column name or column index. The array is
+        built once and reused until a model method changes the columns or rows, data is replaced or its length
+        changes. After editing values of data in place call clear_column_cache first"""
+        if column_name is not None:
+            column_index=self.get_column_index(column_name)
+        elif column_index is None:
+            return
+        column_arrays=self.__dict__.get("_column_arrays")
+        if column_arrays is None or self.__dict__.get("_column_arrays_source") is not self.data or \
+                self._column_arrays_length!=len(self.data):
+            self._column_arrays=column_arrays={}
+            self._column_arrays_source=self.data
+            self._column_arrays_length=len(self.data)
+        if column_index not in column_arrays:
+            column_array=np.array([row[column_index] for row in self.data])
+            column_array.flags.writeable=False
+            column_arrays[column_index]=column_array
+        return column_arrays[column_index]
+
+    def get_columns_array(self,column_names):
+        """Returns the columns given by the list column_names (names or indices) as a two dimensional numpy
+        array with a column for each name, built from the cached column arrays"""
+        column_arrays=[]
+        for column_name in column_names:
+            if isinstance(column_name,IntType):
+                column_arrays.append(self.get_column_array(column_index=column_name))
+            else:
+                column_arrays.append(self.get_column_array(column_name))
+        return np.column_stack(column_arrays)
+
+class AsciiDataTable(ColumnCacheMixin):
     """ An AsciiDatable is a generalized model of a data table with optional header,
     column names,rectangular array of data, and footer """
     def __init__(self,file_path=None,**options):
@@ -892,6 +1218,7 @@ class AsciiDataTable(object):
         #print output
         return output
 
+    @timed()
     def __parse__(self):
         """Parses self.lines into its components once all the relevant begin and end lines have been set. It assumes
          that the self.__dict__[self.element[i]]=None for elements that are not defined"""
@@ -1000,8 +1327,19 @@ class AsciiDataTable(object):
     def get_options_by_element(self,element_name):
         """ returns a dictionary
          of all the options that have to do with element. Element must be header,column_names,data, or footer"""
-        keys_regarding_element=[x for x in list(self.options.keys()) if re.search(element_name,str(x),re.IGNORECASE)]
-        out_dictionary={key:self.options[key] for key in keys_regarding_element}
+        try:
+            element_map=OPTION_ELEMENT_MAPS[element_name]
+        except KeyError:
+            element_map=OPTION_ELEMENT_MAPS[element_name]={}
+        out_dictionary={}
+        for key,value in self.options.items():
+            try:
+                regarding_element=element_map[key]
+            except KeyError:
+                # each option key is matched against element_name once per session
+                regarding_element=element_map[key]=re.search(element_name,str(key),re.IGNORECASE) is not None
+            if regarding_element:
+                out_dictionary[key]=value
         #print out_dictionary
         return out_dictionary
 
@@ -1018,9 +1356,10 @@ class AsciiDataTable(object):
         else:
             try:
                 #This should be 0 but just in case
-                index_column_number=self.column_names.index('index')
+                index_column_number=self.get_column_index('index')
                 for i in range(len(self.data)):
                     self.data[i][index_column_number]=i
+                self.clear_column_cache()
             except:
                 pass
 
@@ -1041,6 +1380,7 @@ class AsciiDataTable(object):
         self.update_column_names()
         if self.data is not None:
             self.data=convert_all_rows(self.data,self.options["column_types"])
+        self.clear_column_cache()
         self.string=self.build_string()
         self.lines=self.string.splitlines()
 
@@ -1080,6 +1420,7 @@ class AsciiDataTable(object):
             self.save_schema(change_extension(path,new_extension="schema"))
         self.options=original_options
 
+    @timed()
     def build_string(self,**temp_options):
         """Builds a string representation of the data table based on self.options, or temp_options.
         Passing temp_options does not permanently change the model"""
@@ -1496,19 +1837,23 @@ class AsciiDataTable(object):
         if self==other:
             return
         if self.column_names == other.column_names:
-            for row in other.data:
-                self.add_row(row)
+            if self.data is None:
+                self.data=[]
+            number_columns=len(self.column_names)
+            rows=[row for row in other.data if len(row)==number_columns]
+            if len(rows)!=len(other.data):
+                print(" could not add the row, dimensions do not match")
+            self.data.extend(rows)
         elif len(self.data)==len(other.data):
-            for index,column in enumerate(other.column_names):
-                if column in self.column_names:
-                    pass
+            new_columns=[index for index,column in enumerate(other.column_names) if column not in self.column_names]
+            column_types=[]
+            for index in new_columns:
+                if other.options["column_types"] is not None:
+                    column_types.append(other.options["column_types"][index])
                 else:
-                    if other.column_types is not None:
-                        column_type=other.column_types[index]
-                    else:
-                        column_type='string'
-                    self.add_column(column_name=column,
-                                    column_type=column_type,column_data=other.get_column(column_name=column))
+                    column_types.append('string')
+            self.add_columns([other.column_names[index] for index in new_columns],column_types=column_types,
+                             column_data=[[row[index] for index in new_columns] for row in other.data])
         else:
             for column in other.column_names:
                 self.add_column(column)
@@ -1616,6 +1961,7 @@ class AsciiDataTable(object):
         elif isinstance(row_data,DictionaryType):
             data_list=[row_data[column_name] for column_name in self.column_names]
             self.data.append(data_list)
+        self.clear_column_cache()
 
     def remove_row(self,row_index):
         """Removes the row specified by row_index and updates the model. Note index is relative to the
@@ -1656,12 +2002,38 @@ class AsciiDataTable(object):
                                                                  '{delimiter}'+"{"+str(len(self.column_names)-1)+"}"
                 else:
                     self.options["row_formatter_string"]=self.options["row_formatter_string"]+format_string
+            self.clear_column_cache()
             #self.update_model()
         except:
             self.column_names=original_column_names
+            self.clear_column_cache()
             print("Could not add columns")
             raise
 
+    def add_columns(self,column_names,column_types=None,column_data=None,format_strings=None):
+        """Adds several columns at once, column_data is a list of rows with one value for each new column
+        (if it is None the columns were already added to data). Each row is copied once instead of once per
+        column as with add_column, column_types and the row formatter are extended like add_column"""
+        if column_data is not None:
+            if len(column_data)!=len(self.data):
+                raise DataDimensionError('The dim {0} is not equal to {1}'.format(len(column_data),len(self.data)))
+            self.data=[row+list(new_values) for row,new_values in zip(self.data,column_data)]
+        self.clear_column_cache()
+        if column_types is None:
+            column_types=[None for column_name in column_names]
+        self.column_names=self.column_names+list(column_names)
+        if self.options["column_types"]:
+            self.options["column_types"]=self.options["column_types"][:]+list(column_types)
+        if self.options["row_formatter_string"] is not None:
+            number_columns=len(self.column_names)-len(column_names)
+            new_format_strings=[]
+            for index,column_name in enumerate(column_names):
+                if format_strings is None or format_strings[index] is None:
+                    new_format_strings.append('{delimiter}'+"{"+str(number_columns+index)+"}")
+                else:
+                    new_format_strings.append(format_strings[index])
+            self.options["row_formatter_string"]=self.options["row_formatter_string"]+"".join(new_format_strings)
+
     def remove_column(self,column_name=None,column_index=None):
         """Removes the column specified by column_name or column_index and updates the model. The column is removed from
         column_names, data and if present column_types, column_descriptions and row formatter"""
@@ -1672,7 +2044,7 @@ class AsciiDataTable(object):
         else:
             raise
         if column_name:
-            column_index=self.column_names.index(column_name)
+            column_index=self.get_column_index(column_name)
         elif column_index:
             pass
         else:
@@ -1682,6 +2054,7 @@ class AsciiDataTable(object):
         self.column_names.pop(column_index)
         for row in self.data:
             row.pop(column_index)
+        self.clear_column_cache()
         if self.options["row_formatter_string"]:
             format_string="{"+str(column_index)+"}"+"{delimiter}"
             self.options["row_formatter_string"]=\
@@ -1705,6 +2078,7 @@ class AsciiDataTable(object):
             self.column_names.insert(0,'index')
             for index,row in enumerate(self.data):
                 self.data[index].insert(0,index)
+            self.clear_column_cache()
             if self.options['column_types']:
                 self.options['column_types'].insert(0,'int')
             if self.options['row_formatter_string']:
@@ -1761,8 +2135,8 @@ class AsciiDataTable(object):
             else:
                 column_selector=column_index
         else:
-            column_selector=self.column_names.index(column_name)
-        out_list=[self.data[i][column_selector] for i in range(len(self.data))]
+            column_selector=self.get_column_index(column_name)
+        out_list=[row[column_selector] for row in self.data]
         return out_list
 
     def get_unique_column_values(self,column_name=None,column_index=None):
@@ -1773,13 +2147,13 @@ class AsciiDataTable(object):
             else:
                 column_selector=column_index
         else:
-            column_selector=self.column_names.index(column_name)
-        out_list=list(set([self.data[i][column_selector] for i in range(len(self.data))]))
+            column_selector=self.get_column_index(column_name)
+        out_list=list(set([row[column_selector] for row in self.data]))
         return out_list
 
     def __getitem__(self, items):
-        """Controls how the model responds to self["Item"]"""
-        out_data=[]
+        """Controls how the model responds to self["Item"], a list of column names or indices returns
+        a list of rows with only those columns (see get_columns_array for an array)"""
         column_selectors=[]
         #print items[0]
         if isinstance(items,(StringType,IntType)):
@@ -1789,14 +2163,8 @@ class AsciiDataTable(object):
                 if isinstance(item, IntType):
                     column_selectors.append(item)
                 else:
-                    #print self.column_names
-                    column_selectors.append(self.column_names.index(item))
-            for row in self.data[:]:
-                new_row=[]
-                for selector in column_selectors:
-                    new_row.append(row[selector])
-                out_data.append(new_row)
-            return out_data
+                    column_selectors.append(self.get_column_index(item))
+            return select_row_columns(self.data,column_selectors)
 
     def get_data_dictionary_list(self,use_row_formatter_string=True):
         """Returns a python list with a row dictionary of form {column_name:data_column}"""
@@ -1804,18 +2172,10 @@ class AsciiDataTable(object):
             if self.options["row_formatter_string"] is None:
                 use_row_formatter_string=False
             if use_row_formatter_string:
-                list_formatter=[item.replace("{"+str(index),"{0")
-                                for index,item in enumerate(self.options["row_formatter_string"].split("{delimiter}"))]
+                cell_formatters=compile_cell_formatters(self.options["row_formatter_string"],len(self.column_names))
             else:
-                list_formatter=["{0}" for i in self.column_names]
-            #print self.column_names
-            #print self.data
-            #print list_formatter
-            #print len(self.column_names)==len(self.data[0])
-            #print len(list_formatter)==len(self.data[0])
-            #print type(self.data[0])
-            out_list=[{self.column_names[i]:list_formatter[i].format(value) for i,value in enumerate(line)}
-                      for line in self.data]
+                cell_formatters=compile_cell_formatters(None,len(self.column_names))
+            out_list=data_dictionary_list(self.column_names,cell_formatters,self.data)
             return out_list
         except:
             print("Could not form a data_dictionary_list, check that row_formatter_string is properly defined")
@@ -1860,7 +2220,8 @@ class AsciiDataTable(object):
             old_unit=old_prefix+unit
             new_unit=new_prefix+unit
             if column_selector in self.column_names:
-                column_selector=self.column_names.index(column_selector)
+                column_selector=self.get_column_index(column_selector)
+            self.clear_column_cache()
             for index,row in enumerate(self.data):
                 if isinstance(self.data[index][column_selector],FloatType):
                     #print "{0:e}".format(multipliers[old_prefix]/multipliers[new_prefix])
@@ -1886,7 +2247,9 @@ class AsciiDataTable(object):
             raise
     def copy(self):
         "Creates a shallow copy of the data table"
-        return copy.copy(self)
+        new_table=copy.copy(self)
+        new_table.clear_column_cache()
+        return new_table
 
 
 class KnowledgeSystem(AsciiDataTable):
@@ -1951,13 +2314,14 @@ class KnowledgeSystem(AsciiDataTable):
 
     def edit_entry(self,property_name,obligate_name,new_value):
         """Edit a value for a specific property and obligate"""
-        column_index=self.column_names.index(obligate_name)
+        column_index=self.get_column_index(obligate_name)
         row_index=self["Property"].index(property_name)
         self.data[row_index][column_index]=new_value
+        self.clear_column_cache()
 
     def get_entry(self,property_name,obligate_name):
         """returns a value for a specific property and obligate"""
-        column_index=self.column_names.index(obligate_name)
+        column_index=self.get_column_index(obligate_name)
         row_index=self["Property"].index(property_name)
         out=self.data[:][row_index][column_index]
         return out
@@ -2554,6 +2918,188 @@ def test_get_item():
     print(new_table[("Frequency",1)])
     print(new_table[["Frequency","c"]])
 
+def test_text_scanning_performance(number_lines=20000,number_calls=2000):
+    """Micro-benchmarks of string_list_collapse, strip_tokens, collect_inline_comments, strip_inline_comments
+    and get_options_by_element against the per-line re.search versions they replaced"""
+    import time
+    lines=["{0} {1} {2}\n".format(index,2*index,3*index) if index%10 else "{0} (*comment {0}*)\n".format(index)
+           for index in range(number_lines)]
+    def legacy_collapse(list_of_strings,string_delimiter):
+        out_string=''
+        for index,item in enumerate(list_of_strings):
+            if index==len(list_of_strings)-1:
+                out_string=out_string+item
+            else:
+                out_string=out_string+item+string_delimiter
+        return out_string
+    def legacy_strip_tokens(string_list,*remove_tokens):
+        temp_string=legacy_collapse(string_list,"")
+        for item in remove_tokens:
+            temp_string=temp_string.replace(item,"")
+        return [line+'\n' for line in temp_string.splitlines()]
+    def legacy_collect(list_of_strings,begin_token,end_token):
+        match=re.compile('{0}(?P<inline_comments>.*){1}'.format(re.escape(begin_token),re.escape(end_token)))
+        inline_comment_list=[]
+        for index,line in enumerate(list_of_strings):
+            comment_match=re.search(match,line)
+            if comment_match:
+                inline_comment_list.append([comment_match.group('inline_comments'),index,comment_match.start()])
+        return inline_comment_list
+    def legacy_strip(list_of_strings,begin_token,end_token):
+        match=re.compile('{0}(?P<inline_comments>.+){1}'.format(re.escape(begin_token),re.escape(end_token)))
+        return [re.sub(match,'',line) for line in list_of_strings]
+    table=AsciiDataTable(None,column_names=["a","b"],data=[[1,2]])
+    def legacy_options_by_element(element_name):
+        keys_regarding_element=[x for x in list(table.options.keys()) if re.search(element_name,str(x),re.IGNORECASE)]
+        return {key:table.options[key] for key in keys_regarding_element}
+    benchmarks=[("string_list_collapse",lambda:legacy_collapse(lines,"\n"),lambda:string_list_collapse(lines,"\n")),
+                ("strip_tokens",lambda:legacy_strip_tokens(lines,"(*","*)"),lambda:strip_tokens(lines,"(*","*)")),
+                ("collect_inline_comments",lambda:legacy_collect(lines,"(*","*)"),
+                 lambda:collect_inline_comments(lines,"(*","*)")),
+                ("strip_inline_comments",lambda:legacy_strip(lines,"(*","*)"),
+                 lambda:strip_inline_comments(lines,"(*","*)")),
+                ("get_options_by_element",lambda:[legacy_options_by_element("data") for i in range(number_calls)],
+                 lambda:[table.get_options_by_element("data") for i in range(number_calls)])]
+    for (name,legacy_function,function) in benchmarks:
+        start=time.time()
+        legacy_result=legacy_function()
+        legacy_time=time.time()-start
+        start=time.time()
+        result=function()
+        new_time=time.time()-start
+        print(("{0}: legacy {1:.4f} s, now {2:.4f} s, same result {3}".format(name,legacy_time,new_time,
+                                                                            legacy_result==result)))
+
+def test_ascii_data_table_join(number_rows=2000,number_columns=50,number_tables=20):
+    """Joins two number_columns tables row by row and on a key column with every join type and algorithm,
+    then concatenates number_tables tables, printing the times and checking the results against add_column
+    and + versions"""
+    import time
+    column_names_1=["Frequency"]+["a{0}".format(index) for index in range(number_columns)]
+    column_names_2=["Frequency"]+["b{0}".format(index) for index in range(number_columns)]
+    def make_table(column_names,frequencies):
+        return AsciiDataTable(None,column_names=column_names,column_types=["float" for name in column_names],
+                              data=[[float(frequency)]+[float(frequency*index) for index in range(len(column_names)-1)]
+                                    for frequency in frequencies])
+    table_1=make_table(column_names_1,range(number_rows))
+    table_2=make_table(column_names_2,range(number_rows))
+    start=time.time()
+    legacy_table=table_1.copy()
+    legacy_table.data=table_1.data[:]
+    legacy_table.column_names=table_1.column_names[:]
+    legacy_table.options=table_1.options.copy()
+    for column in column_names_2[1:]:
+        legacy_table.add_column(column,column_type="float",column_data=table_2.get_column(column))
+    legacy_time=time.time()-start
+    start=time.time()
+    joined_table=ascii_data_table_join("Frequency",table_1,table_2)
+    print(("Joining {0} rows of {1} columns: add_column {2:.4f} s, ascii_data_table_join {3:.4f} s, same data {4}".format(
+        number_rows,number_columns,legacy_time,time.time()-start,joined_table.data==legacy_table.data)))
+    # key joins on tables that only share every other frequency, in a different order
+    table_3=make_table(column_names_2,range(number_rows+number_rows//2,-1,-2))
+    for how in ["inner","left","outer"]:
+        results=[]
+        for algorithm in ["hash","merge"]:
+            start=time.time()
+            key_joined_table=ascii_data_table_join("Frequency",table_1,table_3,how=how,algorithm=algorithm)
+            results.append(sorted(key_joined_table.data,key=lambda row:row[0]))
+            print(("{0} {1} join: {2} rows in {3:.4f} s".format(how,algorithm,len(key_joined_table.data),
+                                                               time.time()-start)))
+        print(("The hash and merge {0} joins have the same rows {1}".format(how,results[0]==results[1])))
+    empty_joins=[sorted(join_rows([],0,table_3.data,0,[1],how="outer"),key=lambda row:row[0])
+                 for join_rows in [hash_join_rows,merge_join_rows]]
+    print(("The hash and merge outer joins of an empty table have the same rows {0}".format(
+        empty_joins[0]==empty_joins[1])))
+    tables=[make_table(column_names_1,range(number_rows)) for index in range(number_tables)]
+    start=time.time()
+    legacy_table=tables[0].copy()
+    legacy_table.data=tables[0].data[:]
+    for table in tables[1:]:
+        for row in table.data:
+            legacy_table.add_row(row)
+    legacy_time=time.time()-start
+    start=time.time()
+    concatenated_table=concatenate_ascii_data_tables(tables)
+    print(("Concatenating {0} tables: add_row {1:.4f} s, concatenate_ascii_data_tables {2:.4f} s, same data {3}".format(
+        number_tables,legacy_time,time.time()-start,concatenated_table.data==legacy_table.data)))
+    print(("The first table still has {0} rows".format(len(tables[0].data))))
+
+def test_column_cache(number_rows=2000,number_columns=50,number_calls=2000):
+    """Times column access by name with column_names.index and with get_column_index and get_column_array,
+    then checks that the cached columns follow add_column, remove_column and add_index"""
+    import time
+    column_names=["Frequency"]+["a{0}".format(index) for index in range(number_columns)]
+    table=AsciiDataTable(None,column_names=column_names,column_types=["float" for name in column_names],
+                         data=[[float(row_index)]+[float(row_index*index) for index in range(number_columns)]
+                               for row_index in range(number_rows)])
+    last_column=column_names[-1]
+    start=time.time()
+    for call in range(number_calls):
+        column_index=table.column_names.index(last_column)
+    index_time=time.time()-start
+    start=time.time()
+    for call in range(number_calls):
+        column_index=table.get_column_index(last_column)
+    map_time=time.time()-start
+    print(("{0} lookups of {1}: column_names.index {2:.4f} s, get_column_index {3:.4f} s".format(
+        number_calls,last_column,index_time,map_time)))
+    start=time.time()
+    for call in range(number_calls//100):
+        frequency=np.array(table["Frequency"])
+    list_time=time.time()-start
+    start=time.time()
+    for call in range(number_calls//100):
+        frequency=table.get_column_array("Frequency")
+    array_time=time.time()-start
+    print(("{0} Frequency arrays: np.array(table['Frequency']) {1:.4f} s, get_column_array {2:.4f} s".format(
+        number_calls//100,list_time,array_time)))
+    selected_columns=table[["Frequency",last_column]]
+    print(("Multiple column selection matches get_columns_array {0}".format(
+        np.array_equal(np.array(selected_columns),table.get_columns_array(["Frequency",last_column])))))
+    table.add_column("new",column_type="float",column_data=[1.0 for row in table.data])
+    print(("After add_column the new column is found {0}".format(
+        table.get_column_array("new").tolist()==table.get_column("new"))))
+    table.remove_column("a0")
+    print(("After remove_column a1 is column {0} and matches {1}".format(table.get_column_index("a1"),
+          table.get_column_array("a1").tolist()==[float(row_index) for row_index in range(number_rows)])))
+    table.add_index()
+    print(("After add_index Frequency is column {0} and matches {1}".format(table.get_column_index("Frequency"),
+          table.get_column_array("Frequency").tolist()==table.get_column("Frequency"))))
+    table.data[0][table.get_column_index("Frequency")]=-1.
+    table.clear_column_cache()
+    print(("After an in place edit and clear_column_cache the first Frequency is {0}".format(
+        table.get_column_array("Frequency")[0])))
+
+def test_compile_row_formatter(number_rows=20000):
+    """Checks compile_row_formatter against str.format for several row formatters and delimiters and times
+    list_list_to_string and get_data_dictionary_list on a number_rows table"""
+    import time
+    row=[1.25,2,"x"]
+    for row_formatter_string in [None,"{0}{delimiter}{1}{delimiter}{2}","{0:.2e}{delimiter}{1:>4}{delimiter}{2}",
+                                 "{2}{delimiter}{0!r}","[{0}]{delimiter}{1}{delimiter}{2}"]:
+        for data_delimiter in [",","\t","{x}"]:
+            if row_formatter_string is None:
+                expected=data_delimiter.join([str(item) for item in row])
+            else:
+                expected=row_formatter_string.format(*row,delimiter=data_delimiter)
+            compiled=compile_row_formatter(row_formatter_string,data_delimiter)(row)
+            if compiled!=expected:
+                print(("{0!r} with delimiter {1!r} gave {2!r} not {3!r}".format(row_formatter_string,data_delimiter,
+                                                                                compiled,expected)))
+    print("compile_row_formatter agrees with str.format")
+    column_names=["Frequency","magS11","argS11"]
+    table=AsciiDataTable(None,column_names=column_names,column_types=["float","float","float"],
+                         row_formatter_string="{0:.6e}{delimiter}{1:.4f}{delimiter}{2:.3f}",
+                         data=[[float(index),1./(index+1),float(index%360)] for index in range(number_rows)])
+    start=time.time()
+    table_string=list_list_to_string(table.data,data_delimiter=",",
+                                     row_formatter_string=table.options["row_formatter_string"])
+    print(("list_list_to_string of {0} rows took {1:.4f} s".format(number_rows,time.time()-start)))
+    start=time.time()
+    data_dictionary_list=table.get_data_dictionary_list()
+    print(("get_data_dictionary_list of {0} rows took {1:.4f} s, the last row is {2}".format(
+        number_rows,time.time()-start,data_dictionary_list[-1])))
+
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
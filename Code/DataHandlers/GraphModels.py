@@ -370,6 +370,7 @@ class Graph(object):
         self.display_graph.add_edge(begin_node, end_node)
         self.display_layout = networkx.spring_layout(self.display_graph)
 
+    @timed()
     def move_to(self, path, **options):
         """Changes the state of the graph by moving along the path specified"""
         defaults = {"debug": False, "verbose": False}
@@ -607,6 +608,7 @@ class Graph(object):
                     if self.get_path_options["debug"]:
                         print(("{0} is {1}".format("path_queue", path_queue)))
 
+    @timed()
     def move_to_node(self, node):
         """Moves from current_node to the specified node"""
         path = self.get_path(self.current_node, node)
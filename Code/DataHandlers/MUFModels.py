@@ -41,6 +41,10 @@ import sys
 import os
 import datetime
 from types import *
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except:
+    ProcessPoolExecutor=None
 #-----------------------------------------------------------------------------
 # Third Party Imports
 sys.path.append(os.path.join(os.path.dirname( __file__ ), '..','..'))
@@ -79,8 +83,25 @@ MODEL_DISTRIBUTION_LIST=["Rectangular","Arc-sine","Bernoulli (binary)","Gaussain
 
 #-----------------------------------------------------------------------------
 # Module Functions
-def make_parameter_table(parameter_directory):
-    """Creates a table from all the parameters in the parameter_directory, returns an AsciiDataTable"""
+def parameter_file_to_row(parameter_file):
+    """Returns the row of make_parameter_table for a .parameter file, [Parameter_Name,Value,Distribution_Type,
+    Width,Standard_Uncertainty,Units]. This is the unit of work when the files are read in parallel"""
+    parameter=MUFParameter(parameter_file)
+    row=[re.split(r"[\\/]",parameter.get_mechanism_name())[-1].split(".")[0],
+         parameter.get_value(),parameter.get_distribution_type(),
+         parameter.get_distribution_width(),parameter.get_standard_uncertainty(),
+         parameter.get_units()]
+    return row
+
+def make_parameter_table(parameter_directory,**options):
+    """Creates a table from all the parameters in the parameter_directory, returns an AsciiDataTable. The files
+    are read in a pool of max_workers processes unless parallel=False"""
+    defaults={"parallel":True,"max_workers":None}
+    table_options={}
+    for key,value in defaults.items():
+        table_options[key]=value
+    for key,value in options.items():
+        table_options[key]=value
     file_names=os.listdir(parameter_directory)
     parameter_files=[]
     for file_name in file_names:
@@ -88,21 +109,67 @@ def make_parameter_table(parameter_directory):
         if re.search("parameter",extension,re.IGNORECASE) and extension not in ["parameterviewer"] :
             parameter_files.append(os.path.join(parameter_directory,file_name))
     #print("{0} is {1}".format("parameter_files",parameter_files))
-    parameter_models=[MUFParameter(file_name) for file_name in parameter_files]
+    if table_options["parallel"] and ProcessPoolExecutor is not None and len(parameter_files)>1:
+        with ProcessPoolExecutor(max_workers=table_options["max_workers"]) as executor:
+            rows=list(executor.map(parameter_file_to_row,parameter_files))
+    else:
+        rows=[parameter_file_to_row(parameter_file) for parameter_file in parameter_files]
     column_names=["Parameter_Name","Value","Distribution_Type","Width","Standard_Uncertainty","Units"]
     data=[]
-    for index,parameter in enumerate(parameter_models):
-        print(("Parameter Number: {0}, Name:{1}".format(index,parameter.get_mechanism_name()) ))
-        row=[os.path.split(parameter.get_mechanism_name())[-1].split(".")[0],
-             parameter.get_value(),parameter.get_distribution_type(),
-             parameter.get_distribution_width(),parameter.get_standard_uncertainty(),
-             parameter.get_units()]
+    for index,row in enumerate(rows):
+        print(("Parameter Number: {0}, Name:{1}".format(index,row[0]) ))
         data.append(row)
     data_table=AsciiDataTable(column_names=column_names,data=data)
     return data_table
 
 
 
+def read_complex_file(file_path):
+    """Reads a .complex file, tab separated rows of Frequency,re,im.., and returns a float array with a row per
+    line. The numbers are converted in one call instead of line by line"""
+    in_file = open(file_path, 'r')
+    first_line = in_file.readline()
+    text = first_line + in_file.read()
+    in_file.close()
+    number_columns = len(first_line.split("\t"))
+    return np.array(text.split(), dtype=float).reshape((-1, number_columns))
+
+def complex_variation_parameter(re_data):
+    """Returns 100 times the largest absolute second difference, re[i+2]-2*re[i+1]+re[i], of the array re_data"""
+    re_data = np.asarray(re_data, dtype=float)
+    return 100 * np.max(np.abs(re_data[2:] - 2.0 * re_data[1:-1] + re_data[:-2]))
+
+def complex_file_statistics(file_path):
+    """Returns [file_path,variation_parameter,re_mean,re_std,re_max] for a .complex file, the unit of work of
+    screen_complex_files"""
+    re_data = read_complex_file(file_path)[:, 1]
+    return [file_path, float(complex_variation_parameter(re_data)), float(np.mean(re_data)),
+            float(np.std(re_data)), float(np.max(re_data))]
+
+def screen_complex_files(complex_files, **options):
+    """Ranks .complex files by variation parameter, largest first. complex_files is a directory or a list of
+    paths, the files are read in a pool of max_workers processes unless parallel=False. Returns an AsciiDataTable
+    with the columns File, Variation_Parameter, re_Mean, re_Std and re_Max"""
+    defaults = {"filter": "\.complex$", "parallel": True, "max_workers": None, "chunksize": 16}
+    screen_options = {}
+    for key, value in defaults.items():
+        screen_options[key] = value
+    for key, value in options.items():
+        screen_options[key] = value
+    if isinstance(complex_files, StringType):
+        complex_files = [os.path.join(complex_files, file_name) for file_name in sorted(os.listdir(complex_files))
+                         if re.search(screen_options["filter"], file_name, re.IGNORECASE)]
+    if screen_options["parallel"] and ProcessPoolExecutor is not None and len(complex_files) > 1:
+        with ProcessPoolExecutor(max_workers=screen_options["max_workers"]) as executor:
+            rows = list(executor.map(complex_file_statistics, complex_files, chunksize=screen_options["chunksize"]))
+    else:
+        rows = [complex_file_statistics(file_path) for file_path in complex_files]
+    rows.sort(key=lambda row: row[1], reverse=True)
+    column_names = ["File", "Variation_Parameter", "re_Mean", "re_Std", "re_Max"]
+    data_table = AsciiDataTable(None, column_names=column_names, data=rows,
+                                column_types=["string", "float", "float", "float", "float"])
+    return data_table
+
 #-----------------------------------------------------------------------------
 # Module Classes
 class MUFParameter(XMLBase):
@@ -289,7 +356,8 @@ class MUFMeasurement(XMLBase):
             names=[x.attrib["Text"] for x in self.etree.findall(".//PerturbedSParams/Item/SubItem[@Index='0']")]
             mechanisms=[x.attrib["Text"] for x in self.etree.findall(".//PerturbedSParams/Item/SubItem[@Index='2']")]
             for index,name in enumerate(names):
-                split_parameter_name=os.path.split(mechanisms[index])[-1]
+                # the locations are usually windows paths, so split on either separator
+                split_parameter_name=re.split(r"[\\/]",mechanisms[index])[-1]
                 parameter_name=split_parameter_name.split(".")[0]
                 out_dictionary[name]=parameter_name
             return out_dictionary
@@ -330,8 +398,7 @@ class MUFMeasurement(XMLBase):
         "Returns a single dictionary with nominal name and location"
         nominal_dictionary={}
         try:
-            location=map(lambda x: x.attrib["Text"],
-                      self.etree.findall(".//MeasSParams/Item/SubItem[@Index='1']"))[0]
+            location=[x.attrib["Text"] for x in self.etree.findall(".//MeasSParams/Item/SubItem[@Index='1']")][0]
             name=os.path.split(location)[-1].split(".")[0]
             nominal_dictionary["location"]=location
             nominal_dictionary["name"]=name
@@ -354,7 +421,10 @@ class MUFSolution(XMLBase):
 
 
 class MUFComplexModel(AsciiDataTable):
-    """MUFComplexModel is built for the .complex files used in eps etc """
+    """MUFComplexModel is built for the .complex files used in eps etc. The numbers are also kept as arrays,
+    data_array (float, one column per column in the file) and complex_array (complex, one column per re,im pair),
+    they are snapshots of data, call update_arrays after changing data to refresh them and the column cache.
+    The statistics are computed from the live re column of data"""
 
     def __init__(self, file_path, **options):
         """Initializes the class MUFComplexModel"""
@@ -376,44 +446,53 @@ class MUFComplexModel(AsciiDataTable):
         if file_path is not None:
             self.path = file_path
             self.__read_and_fix__()
+            # the data are already floats, so the conversion and string building of update_model are skipped
+            self.options["validate"] = True
         AsciiDataTable.__init__(self, None, **self.options)
         if file_path is not None:
             self.path = file_path
+            self.update_column_names()
+        else:
+            self.update_arrays()
 
     def __read_and_fix__(self):
         """Reads in the data and fixes any problems with delimiters, etc"""
-        in_file = open(self.path, 'r')
-        lines = []
-        for line in in_file:
-            lines.append([float(x) for x in line.split("\t")])
-        in_file.close()
-        self.options["data"] = lines
-        self.complex_data = []
-        for row in self.options["data"]:
-            frequency = [row[0]]
-            complex_numbers = row[1:]
-            # print np.array(complex_numbers[1::2])
-            complex_array = np.array(complex_numbers[0::2]) + 1.j * np.array(complex_numbers[1::2])
-            self.complex_data.append(frequency + complex_array.tolist())
+        self.data_array = read_complex_file(self.path)
+        self.options["data"] = self.data_array.tolist()
+        self.complex_array = self.data_array[:, 1::2] + 1.j * self.data_array[:, 2::2]
+        self.complex_data = list(map(list, zip(self.data_array[:, 0].tolist(),
+                                               *[column.tolist() for column in self.complex_array.T])))
+
+    def update_arrays(self):
+        """Rebuilds data_array, complex_array and complex_data from data and clears the column cache"""
+        self.clear_column_cache()
+        if not self.data:
+            self.data_array = np.zeros((0, len(self.column_names or [])))
+            self.complex_array = np.zeros((0, len(self.column_names or []) // 2), dtype=complex)
+            self.complex_data = []
+            return
+        self.data_array = np.array(self.data, dtype=float).reshape((len(self.data), -1))
+        self.complex_array = self.data_array[:, 1::2] + 1.j * self.data_array[:, 2::2]
+        self.complex_data = list(map(list, zip(self.data_array[:, 0].tolist(),
+                                               *[column.tolist() for column in self.complex_array.T])))
+
+    def get_re_array(self):
+        """Returns the current re column of data as a float array"""
+        return np.array(self["re"], dtype=float)
 
     def get_variation_parameter(self):
-        try:
-            re_data = self["re"][:]
-            re_data_var = [re_data[i + 2] - 2.0 * re_data[i + 1] + re_data[i] for i in range(len(re_data) - 2)]
-            self.variation_parameter = 100 * max([abs(x) for x in re_data_var])
-        except:
-            raise
-            self.variation_parameter = 0
+        """Returns 100 times the largest absolute second difference of the re column"""
+        self.variation_parameter = complex_variation_parameter(self.get_re_array())
         return self.variation_parameter
 
     def get_re_std(self):
-        return np.std(self["re"])
+        return np.std(self.get_re_array())
 
     def get_re_mean(self):
-        return np.mean(self["re"])
+        return np.mean(self.get_re_array())
 
     def get_re_max(self):
-        return np.max(self["re"])
+        return np.max(self.get_re_array())
 
     def show(self, **options):
         fig, ax1 = plt.subplots()
@@ -457,7 +536,39 @@ if CLR:
             print(("The script took {0} seconds to run".format(runtime.seconds)))
 
 
+def test_screen_complex_files(number_files=200,number_frequencies=801):
+    """Writes number_files noisy .complex files to a temporary directory, compares MUFComplexModel statistics to
+    the python loops they replaced and times screen_complex_files serially and in parallel"""
+    import tempfile
+    import shutil
+    import time
+    complex_directory=tempfile.mkdtemp()
+    try:
+        frequency=np.linspace(1,110,number_frequencies)
+        for file_index in range(number_files):
+            re_data=2+.01*np.sin(frequency/(3+file_index%7))+np.random.normal(scale=1e-4*(1+file_index%5),
+                                                                             size=number_frequencies)
+            im_data=-.01+np.random.normal(scale=1e-4,size=number_frequencies)
+            out_file=open(os.path.join(complex_directory,"EPS_{0}.complex".format(file_index)),"w")
+            for row in zip(frequency,re_data,im_data):
+                out_file.write("{0:.10g}\t{1:.12g}\t{2:.12g}\n".format(*row))
+            out_file.close()
+        complex_model=MUFComplexModel(os.path.join(complex_directory,"EPS_0.complex"))
+        re_data=complex_model["re"]
+        legacy_variation=100*max([abs(re_data[i+2]-2.0*re_data[i+1]+re_data[i]) for i in range(len(re_data)-2)])
+        print(("The variation parameter is {0}, the python loop gives {1}".format(
+            complex_model.get_variation_parameter(),legacy_variation)))
+        for parallel in [False,True]:
+            start=time.time()
+            screen_table=screen_complex_files(complex_directory,parallel=parallel)
+            print(("Screening {0} files with parallel={1} took {2:.3f} s".format(number_files,parallel,
+                                                                               time.time()-start)))
+        print(("The largest variation is {0} for {1}".format(screen_table.data[0][1],
+                                                            os.path.basename(screen_table.data[0][0]))))
+    finally:
+        shutil.rmtree(complex_directory)
+
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    test_screen_complex_files()
\ No newline at end of file
@@ -67,6 +67,11 @@ except:
     print("The module pyMez.Code.DataHandlers.TouchstoneModels was not found,"
           "please put it on the python path")
     raise ImportError
+try:
+    from Code.Utils.BatchUtils import BatchConverter
+except:
+    print("The module pyMez.Code.Utils.BatchUtils was not found,"
+          "convert_all_two_ports_script will not work")
 
 try:
     import numpy as np
@@ -1674,6 +1679,7 @@ class W1P(AsciiDataTable):
         if self.data:
             self.complex_data = []
             self.complex_column_names = ["Frequency"] + [x.replace("re", "") for x in self.column_names[1::2]]
+            self.complex_column_index = column_index_map(self.complex_column_names)
             for row in self.data[:]:
                 row = [float(x) for x in row]
                 frequency = row[0]
@@ -1686,16 +1692,16 @@ class W1P(AsciiDataTable):
         """Returns a list of amplitudes of the complex wave parameter specified by parameter_name,
         or column_index"""
         if not column_index:
-            column_index = self.complex_column_names.index(parameter_name)
-        amplitudes = [abs(x[column_index]) for x in self.complex_data[:]]
+            column_index = self.complex_column_index[parameter_name]
+        amplitudes = [abs(x[column_index]) for x in self.complex_data]
         return amplitudes
 
     def get_phase(self, parameter_name=None, column_index=None):
         """Returns a list of amplitudes of the complex wave parameter specified by parameter_name,
         or column_index"""
         if not column_index:
-            column_index = self.complex_column_names.index(parameter_name)
-        amplitudes = [180. / np.pi * cmath.phase(x[column_index]) for x in self.complex_data[:]]
+            column_index = self.complex_column_index[parameter_name]
+        amplitudes = [180. / np.pi * cmath.phase(x[column_index]) for x in self.complex_data]
         return amplitudes
 
     def __read_and_fix__(self):
@@ -1858,6 +1864,7 @@ class W2P(AsciiDataTable):
         if self.data:
             self.complex_data = []
             self.complex_column_names = ["Frequency"] + [x.replace("re", "") for x in self.column_names[1::2]]
+            self.complex_column_index = column_index_map(self.complex_column_names)
             for row in self.data[:]:
                 row = [float(x) for x in row]
                 frequency = row[0]
@@ -1870,16 +1877,16 @@ class W2P(AsciiDataTable):
         """Returns a list of amplitudes of the complex wave parameter specified by parameter_name,
         or column_index"""
         if not column_index:
-            column_index = self.complex_column_names.index(parameter_name)
-        amplitudes = [abs(x[column_index]) for x in self.complex_data[:]]
+            column_index = self.complex_column_index[parameter_name]
+        amplitudes = [abs(x[column_index]) for x in self.complex_data]
         return amplitudes
 
     def get_phase(self, parameter_name=None, column_index=None):
         """Returns a list of amplitudes of the complex wave parameter specified by parameter_name,
         or column_index"""
         if not column_index:
-            column_index = self.complex_column_names.index(parameter_name)
-        amplitudes = [180. / np.pi * cmath.phase(x[column_index]) for x in self.complex_data[:]]
+            column_index = self.complex_column_index[parameter_name]
+        amplitudes = [180. / np.pi * cmath.phase(x[column_index]) for x in self.complex_data]
         return amplitudes
 
     def __read_and_fix__(self):
@@ -1998,29 +2005,49 @@ class W2P(AsciiDataTable):
 
 #-----------------------------------------------------------------------------
 # Module Scripts
-def convert_all_two_ports_script(top_directory=None,output_directory=None):
-    """Script reads all file names in all sub directories looking for ones that end in c, and tries to open
-    file_name.asc and save it in the output directory"""
-    TOP_DIRECTORY=r'C:\Share\ascii.dut'
+def two_port_calrep_file_paths(top_directory):
+    """Returns the .asc files under top_directory that belong to a two port calrep, found by looking for file names
+    that end in c (name+c.txt) and keeping name.asc if it exists"""
     # This pattern will find any names that have c in them
-    TWO_PORT_PATTERN=re.compile('(?P<two_port_name>\w+)c',re.IGNORECASE)
-    # now we test the os.walk function
-    # This has a memory leak I am not sure but I suspect it is jupyter's fault
-    for root,directory,file_names in os.walk(TOP_DIRECTORY):
-        #print file_names
+    two_port_pattern=re.compile(r'(?P<two_port_name>\w+)c',re.IGNORECASE)
+    excluded_names=['de.asc','00.asc','dir.asc','IL.asc',"L2.asc","L1.asc"]
+    asc_file_paths=set()
+    for root,directory,file_names in os.walk(top_directory):
         for file_name in file_names:
-            file_name=file_name.split('.')[0]
-            match=re.search(TWO_PORT_PATTERN,file_name)
-            try:
-                if match:
-                    asc_file_name=match.groupdict()["two_port_name"]+".asc"
-                    print(asc_file_name)
-                    if asc_file_name in ['de.asc','00.asc','dir.asc','IL.asc',"L2.asc","L1.asc"]:raise
-                    converted_file=TwoPortCalrepModel(os.path.join(root,asc_file_name))
-                    #print converted_file.joined_table.header
-                    del converted_file
-            except:
-                pass
+            match=re.search(two_port_pattern,file_name.split('.')[0])
+            if match:
+                asc_file_name=match.groupdict()["two_port_name"]+".asc"
+                asc_file_path=os.path.join(root,asc_file_name)
+                if asc_file_name not in excluded_names and os.path.isfile(asc_file_path):
+                    asc_file_paths.add(asc_file_path)
+    return sorted(asc_file_paths)
+
+def convert_all_two_ports_script(top_directory=None,output_directory=None,**options):
+    """Script reads all file names in all sub directories looking for ones that end in c, opens
+    file_name.asc as a TwoPortCalrepModel and saves the joined table as file_name.txt in output_directory.
+    If output_directory is None nothing is written unless dry_run=False is passed, then the tables are saved next to
+    the .asc files. Existing outputs are kept unless overwrite=True. The files are converted in parallel by
+    BatchConverter, options such as parallel, max_workers, chunksize and journal_path are passed to it. Returns the
+    throughput summary or the plan for a dry run"""
+    if top_directory is None:
+        top_directory=r'C:\Share\ascii.dut'
+    defaults={"dry_run":output_directory is None,"output_format":"txt","overwrite":False}
+    script_options={}
+    for key,value in defaults.items():
+        script_options[key]=value
+    for key,value in options.items():
+        script_options[key]=value
+    dry_run=script_options.pop("dry_run")
+    if output_directory is None and script_options.get("journal_path") is None:
+        script_options["journal_path"]=os.path.join(top_directory,"Two_Port_Conversion_Journal.txt")
+    script_options.setdefault("input_root",top_directory)
+    converter=BatchConverter(two_port_calrep_file_paths(top_directory),TwoPortCalrepModel,
+                             output_directory=output_directory,**script_options)
+    if dry_run:
+        return converter.dry_run()
+    summary=converter.run()
+    converter.print_summary()
+    return summary
 
 def test_OnePortCalrepModel(file_path_1='700437.txt',file_path_2="700437.asc"):
     os.chdir(TESTS_DIRECTORY)
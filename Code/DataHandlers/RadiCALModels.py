@@ -25,6 +25,7 @@ Requirements
 + [types](https://docs.python.org/2/library/types.html)
 + [pyMez](https://github.com/aricsanders/pyMez)
 + [h5py][http://www.h5py.org/]
++ [numpy](https://docs.scipy.org/doc/)
 
 
 Help
@@ -67,9 +68,39 @@ except:
     raise
 #-----------------------------------------------------------------------------
 # Module Constants
-
+RADICAL_FREQUENCY_PATH="RadiCalData/StatistiCalData/F"
+"""Location of the frequency vector in a radical data file"""
+RADICAL_S2P_PATHS={"uncorrected_short":"RadiCalData/StatistiCalData/S",
+                   "uncorrected_Rs":"RadiCalData/StatistiCalData/Rs",
+                   "corrected_Rs":"RadiCalData/Ref/TRL/Models/Rs"}
+"""Locations of the data sets that RadicalDataModel loads as S2PV1 attributes"""
+RADICAL_DUT_PATH="RadiCalData/Dut/Calibrated"
+"""Location of the cell of references to the calibrated DUT"""
+RADICAL_PROPAGATION_CONSTANT_PATH="RadiCalData/Ref/TRL/PropConst"
+"""Location of the propagation constant"""
+RADICAL_LAZY_ATTRIBUTES=["frequency_list","uncorrected_short","uncorrected_Rs","corrected_Rs","corrected_DUT",
+                         "propagation_constant"]
+"""Attributes of RadicalDataModel that are loaded from the data file the first time they are accessed"""
 #-----------------------------------------------------------------------------
 # Module Functions
+def radical_dataset_to_array(radical_data_set,radical_data_file=None):
+    """Returns a numpy array given a radical data set, a path to the data set in radical_data_file or an array.
+    Compound data sets of a real and imaginary double (type "|V16") are viewed as complex128 without copying
+    each element, as are arrays whose last dimension is a (real,imaginary) pair of floats."""
+    if isinstance(radical_data_set,StringType):
+        radical_data_set=radical_data_file[radical_data_set]
+    if isinstance(radical_data_set,h5py.Dataset):
+        radical_data_set=radical_data_set[()]
+    data_array=np.asarray(radical_data_set)
+    if data_array.dtype.names is not None and len(data_array.dtype.names)==2:
+        real_name,imaginary_name=data_array.dtype.names
+        if data_array.dtype==np.dtype([(real_name,'<f8'),(imaginary_name,'<f8')]):
+            return np.ascontiguousarray(data_array).view(np.complex128)
+        return data_array[real_name]+1j*data_array[imaginary_name]
+    elif np.issubdtype(data_array.dtype,np.floating) and data_array.ndim==3 and data_array.shape[-1]==2:
+        return data_array[...,0]+1j*data_array[...,1]
+    return data_array
+
 def radical_dataset_to_s2p(radical_data_set,frequency_list,**options):
     """Takes a radical data set that is of the form <HDF5 dataset "S1": shape (4, 512), type "|V16"> and outputs
     an S2PV1 python model. Requires frequency_list=np.array(radical_data_file["RadiCalData/StatistiCalData/F"])[0].tolist()
@@ -80,16 +111,8 @@ def radical_dataset_to_s2p(radical_data_set,frequency_list,**options):
         s2p_options[key]=value
     for key,value in options.items():
         s2p_options[key]=value
-    input_data=np.array(radical_data_set)
-    sparameters=[]
-    for index,item in enumerate(frequency_list):
-        [S11,S21,S12,S22]=[complex(input_data[0][index][0],input_data[0][index][1]),
-                           complex(input_data[1][index][0],input_data[1][index][1]),
-                           complex(input_data[2][index][0],input_data[2][index][1]),
-                           complex(input_data[3][index][0],input_data[3][index][1])]
-        new_row=[item,S11,S21,S12,S22]
-        sparameters.append(new_row)
-    new_s2p=S2PV1(None,sparameter_complex=sparameters,**s2p_options)
+    sparameters=radical_dataset_to_array(radical_data_set)[:,:len(frequency_list)].T
+    new_s2p=s2p_from_arrays(frequency_list,sparameters,**s2p_options)
     return new_s2p
 
 
@@ -98,50 +121,48 @@ def radical_frequency_to_frequency_list(radical_frequency, radical_data_file=Non
     radical data file
     or the data set radical_data_file["RadiCalData/StatistiCalData/F"] and returns a python list of frequencies"""
     try:
-        if type(radical_frequency) in StringTypes:
-            frequency_list = np.array(radical_data_file[radical_frequency])[0].tolist()
+        if isinstance(radical_frequency,StringType):
+            frequency_list = radical_data_file[radical_frequency][0].tolist()
         elif type(radical_frequency) in [h5py._hl.dataset.Dataset]:
-            frequency_list = np.array(radical_frequency)[0].tolist()
+            frequency_list = radical_frequency[0].tolist()
         elif type(radical_frequency) in [h5py._hl.files.File]:
-            frequency_list = np.array(radical_frequency["RadiCalData/StatistiCalData/F"])[0].tolist()
+            frequency_list = radical_frequency[RADICAL_FREQUENCY_PATH][0].tolist()
+        return frequency_list
     except:
         print(("Could not change {0} to a python list".format(radical_frequency)))
 
+def radical_error_boxes_to_arrays(radical_s1, radical_s2, radical_data_file=None):
+    """Takes two radical error boxes (data sets, paths in radical_data_file or arrays) and returns a tuple (s1,s2) of
+    complex arrays of shape (number_frequencies,4) with the columns in the order of the radical data set. The arrays
+    are the error box inputs of SParameter.correct_sparameters_eight_term_array"""
+    error_boxes=[]
+    for name,radical_error_box in [("S1",radical_s1),("S2",radical_s2)]:
+        if not isinstance(radical_error_box,(StringType,h5py.Dataset,np.ndarray)):
+            raise TypeError("{0} is the wrong type".format(name))
+        error_boxes.append(radical_dataset_to_array(radical_error_box,radical_data_file).T)
+    return tuple(error_boxes)
 
+def find_radical_error_box_paths(radical_data_file):
+    """Returns a list of [S1 path, S2 path] for every group of radical_data_file that has both an S1 and an S2
+    data set, in the order they are found"""
+    error_box_paths=[]
+    def add_error_box(name,item):
+        if isinstance(item,h5py.Dataset) and name.split("/")[-1]=="S1":
+            s2_path=name[:-2]+"S2"
+            if isinstance(radical_data_file.get(s2_path),h5py.Dataset):
+                error_box_paths.append([name,s2_path])
+    radical_data_file.visititems(add_error_box)
+    return error_box_paths
 def radical_error_boxes_to_eight_term_complex(radical_s1, radical_s2, radical_frequency_list, radical_data_file=None):
     """Takes two radical error boxes and a frequency_list (in python format run radical_frequency_to_frequency_list first)
     and converts them into a python list structure
     [[f,S1_11,S1_12,S1_21,S1_22,S2_11,S2_12,S2_21,S_22]] where each component of a matrix is a complex number.
     This list is designed to be used as an input for correct_sparameters_eight_term"""
     try:
-        # fist convert the S1 to a numpy array the dimensions are 4 x number of frequencies x 2
-        if type(radical_s1) in StringTypes:
-            s1_numpy_array = np.array(radical_data_file[radical_s1])
-        elif type(radical_s1) in [h5py._hl.dataset.Dataset]:
-            s1_numpy_array = np.array(radical_s1)
-        elif type(radical_s1) in [np.ndarray]:
-            s1_numpy_array = radical_s1
-        else:
-            raise TypeError("S1 is the wrong type")
-        # second convert the S2 to a numpy array are 4 x number of frequencies x 2
-        if type(radical_s2) in StringTypes:
-            s2_numpy_array = np.array(radical_data_file[radical_s2])
-        elif type(radical_s2) in [h5py._hl.dataset.Dataset]:
-            s2_numpy_array = np.array(radical_s2)
-        elif type(radical_s2) in [np.ndarray]:
-            s2_numpy_array = radical_s2
-        else:
-            raise TypeError("S2 is the wrong type")
-        # now arrange each item as complex()
-        eight_term_complex_list = []
-        for frequency_index, frequency in enumerate(radical_frequency_list):
-            new_row = [frequency]
-            s1_row = [s1_numpy_array[i][frequency_index] for i in range(len(s1_numpy_array))]
-            s1_complex_row = [complex(x[0], x[1]) for x in s1_row]
-            s2_row = [s2_numpy_array[i][frequency_index] for i in range(len(s2_numpy_array))]
-            s2_complex_row = [complex(x[0], x[1]) for x in s2_row]
-            new_row = new_row + s1_complex_row + s2_complex_row
-            eight_term_complex_list.append(new_row)
+        s1_array,s2_array=radical_error_boxes_to_arrays(radical_s1,radical_s2,radical_data_file)
+        number_frequencies=len(radical_frequency_list)
+        columns=np.hstack([s1_array[:number_frequencies],s2_array[:number_frequencies]]).T.tolist()
+        eight_term_complex_list=list(map(list,zip(radical_frequency_list,*columns)))
         return eight_term_complex_list
     except:
         print("Could not convert the S1, S2 as given")
@@ -165,9 +186,11 @@ def return_hd5_keys(hd5_group):
 # Module Classes
 class RadicalDataModel():
     """RadicalDataModel is a container for data generated by the matlab program radical
-    copyright 2011, Nathan Orloff. Typically the file is found in Radical_Solutions/RadicalData.mat or renamed"""
+    copyright 2011, Nathan Orloff. Typically the file is found in Radical_Solutions/RadicalData.mat or renamed.
+    The attributes frequency_list, uncorrected_short, uncorrected_Rs, corrected_Rs, corrected_DUT and
+    propagation_constant are read from the file the first time they are used."""
     def __init__(self,file_path=None,**options):
-        defaults={}
+        defaults={"error_box_paths":None}
         self.options={}
         for key,value in defaults.items():
             self.options[key]=value
@@ -177,25 +200,100 @@ class RadicalDataModel():
             pass
         else:
             self.data_file=h5py.File(file_path,"r")
-            # load the frequency list
-            self.frequency_list=np.array(self.data_file["RadiCalData/StatistiCalData/F"])[0].tolist()
-            # create some s2p file attributes for easy access
-            self.uncorrected_short=radical_dataset_to_s2p(self.data_file["RadiCalData/StatistiCalData/S"],
-                                                          self.frequency_list)
-            self.uncorrected_Rs=radical_dataset_to_s2p(self.data_file["RadiCalData/StatistiCalData/Rs"],
-                                                       self.frequency_list)
-            self.corrected_Rs=radical_dataset_to_s2p(self.data_file["RadiCalData/Ref/TRL/Models/Rs"],
-                                                       self.frequency_list)
-            self.corrected_DUT=radical_dataset_to_s2p(self.data_file[self.data_file[np.array(self.data_file["RadiCalData/Dut/Calibrated"])[0][0]][0][0]],
-                      self.frequency_list)
-            self.propagation_constant=np.array(self.data_file["RadiCalData/Ref/TRL/PropConst"])
+
+    def __getattr__(self,name):
+        """Loads the attributes in RADICAL_LAZY_ATTRIBUTES on first access, after that they are ordinary
+        attributes"""
+        if name not in RADICAL_LAZY_ATTRIBUTES or "data_file" not in self.__dict__:
+            raise AttributeError("{0} has no attribute {1}".format(self.__class__.__name__,name))
+        if name=="frequency_list":
+            value=self.data_file[RADICAL_FREQUENCY_PATH][0].tolist()
+        elif name=="propagation_constant":
+            value=radical_dataset_to_array(RADICAL_PROPAGATION_CONSTANT_PATH,self.data_file)
+        elif name=="corrected_DUT":
+            dut_reference=self.data_file[self.data_file[RADICAL_DUT_PATH][0][0]][0][0]
+            value=radical_dataset_to_s2p(self.data_file[dut_reference],self.frequency_list)
+        else:
+            value=radical_dataset_to_s2p(self.data_file[RADICAL_S2P_PATHS[name]],self.frequency_list)
+        self.__dict__[name]=value
+        return value
+
+    def get_error_boxes(self,s1_path=None,s2_path=None):
+        """Returns the error boxes at s1_path and s2_path (defaults to the option error_box_paths) as a tuple of
+        complex arrays of shape (number_frequencies,4), ready for SParameter.correct_sparameters_eight_term_array.
+        If error_box_paths is None the file must have exactly one S1, S2 pair (see find_radical_error_box_paths),
+        otherwise a ValueError is raised"""
+        if s1_path is None or s2_path is None:
+            if self.options["error_box_paths"] is not None:
+                [s1_path,s2_path]=self.options["error_box_paths"]
+            else:
+                error_box_paths=find_radical_error_box_paths(self.data_file)
+                if len(error_box_paths)!=1:
+                    raise ValueError("Found the error boxes {0}, pass s1_path and s2_path or set the option "
+                                     "error_box_paths".format(error_box_paths))
+                [s1_path,s2_path]=error_box_paths[0]
+        return radical_error_boxes_to_arrays(s1_path,s2_path,self.data_file)
+
     def show(self):
         """Displays corrected DUT as s2p"""
         self.corrected_DUT.show()
 #-----------------------------------------------------------------------------
 # Module Scripts
+def test_RadicalDataModel(number_frequencies=512):
+    """Writes a small radical like file with "|V16" data sets, checks that RadicalDataModel loads its attributes
+    on first access and compares the complex views to the per element complex(x[0],x[1]) conversion"""
+    import tempfile
+    import time
+    compound_type=np.dtype([('real','<f8'),('imag','<f8')])
+    def make_compound(shape):
+        compound_data=np.empty(shape,dtype=compound_type)
+        compound_data['real']=np.random.randn(*shape)
+        compound_data['imag']=np.random.randn(*shape)
+        return compound_data
+    file_handle,file_path=tempfile.mkstemp(suffix=".mat")
+    os.close(file_handle)
+    data_file=h5py.File(file_path,"w")
+    data_file[RADICAL_FREQUENCY_PATH]=np.linspace(1,50,number_frequencies)[np.newaxis,:]
+    for path in list(RADICAL_S2P_PATHS.values())+["RadiCalData/Ref/TRL/S1","RadiCalData/Ref/TRL/S2"]:
+        data_file[path]=make_compound((4,number_frequencies))
+    data_file[RADICAL_PROPAGATION_CONSTANT_PATH]=make_compound((1,number_frequencies))
+    reference_type=h5py.special_dtype(ref=h5py.Reference)
+    dut=data_file.create_dataset("#refs#/dut",data=make_compound((4,number_frequencies)))
+    cell=data_file.create_dataset("#refs#/cell",(1,1),dtype=reference_type)
+    cell[0,0]=dut.ref
+    calibrated=data_file.create_dataset(RADICAL_DUT_PATH,(1,1),dtype=reference_type)
+    calibrated[0,0]=cell.ref
+    data_file.close()
+    start=time.time()
+    radical=RadicalDataModel(file_path,error_box_paths=["RadiCalData/Ref/TRL/S1","RadiCalData/Ref/TRL/S2"])
+    print(("Opening took {0:.4f} s, loaded attributes {1}".format(time.time()-start,
+                                                                  [name for name in RADICAL_LAZY_ATTRIBUTES
+                                                                   if name in radical.__dict__])))
+    start=time.time()
+    dut_s2p=radical.corrected_DUT
+    print(("Loading corrected_DUT took {0:.4f} s".format(time.time()-start)))
+    input_data=np.array(radical.data_file[RADICAL_S2P_PATHS["uncorrected_Rs"]])
+    legacy_rows=[[frequency]+[complex(input_data[i][index][0],input_data[i][index][1]) for i in range(4)]
+                 for index,frequency in enumerate(radical.frequency_list)]
+    print(("uncorrected_Rs is the same as the per element conversion {0}".format(
+        radical.uncorrected_Rs.sparameter_complex==legacy_rows)))
+    s1,s2=radical.get_error_boxes()
+    eight_term=radical_error_boxes_to_eight_term_complex("RadiCalData/Ref/TRL/S1","RadiCalData/Ref/TRL/S2",
+                                                         radical.frequency_list,radical.data_file)
+    print(("The error boxes have shape {0} and {1}, the eight term list has {2} rows of {3} and the same values {4}".format(
+        s1.shape,s2.shape,len(eight_term),len(eight_term[0]),
+        np.array_equal(np.array([row[1:] for row in eight_term]),np.hstack([s1,s2])))))
+    unconfigured_radical=RadicalDataModel(file_path)
+    found_s1,found_s2=unconfigured_radical.get_error_boxes()
+    unconfigured_radical.data_file.close()
+    print(("Without error_box_paths the error boxes {0} are found and are the same {1}".format(
+        find_radical_error_box_paths(radical.data_file),np.array_equal(found_s1,s1) and np.array_equal(found_s2,s2))))
+    print(("The propagation constant is {0} with shape {1}".format(radical.propagation_constant.dtype,
+                                                                    radical.propagation_constant.shape)))
+    radical.data_file.close()
+    os.remove(file_path)
 
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    test_RadicalDataModel()
\ No newline at end of file
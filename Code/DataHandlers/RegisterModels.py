@@ -0,0 +1,712 @@
+#-----------------------------------------------------------------------------
+# Name:        RegisterModels
+# Purpose:     To hold file registers and metadata stores that are backed by a database
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+"""
+RegisterModels holds FileRegisterDatabase and MetadataDatabase, sqlite3 backed versions of the XML classes
+FileRegister and Metadata in pyMez.Code.DataHandlers.XMLModels. They have the same methods and the same
+hierarchical Id scheme (IP address followed by a type digit and sibling number for every part of the path),
+but a register is a single database file that is changed in place. Ids are generated with indexed queries
+instead of scans of every registered URL, add_tree adds a whole directory in one transaction,
+file names are searchable with full text queries and both classes still read and write the XML formats
+so existing registers and style sheets keep working.
+
+Examples
+--------
+    #!python
+    >> register=FileRegisterDatabase()
+    >> register.add_tree(TESTS_DIRECTORY)
+    >> register.full_text_search("Table")
+    >> register.save_XML("Resource_Registry.xml")
+    >> metadata=MetadataDatabase(register)
+    >> metadata.get_file_node(register.full_text_search("Table")[0])
+    >> metadata.add_element_to_current_node(XML_tag="Note",value="A data table")
+
+Requirements
+------------
++ [sys](https://docs.python.org/2/library/sys.html)
++ [os](https://docs.python.org/2/library/os.html)
++ [sqlite3](https://docs.python.org/3/library/sqlite3.html)
++ [lxml](http://lxml.de/)
++ [pyMez](https://github.com/aricsanders/pyMez)
+
+Help
+---------------
+<a href="./index.html">`pyMez.Code.DataHandlers`</a>
+<div>
+<a href="../../../pyMez_Documentation.html">Documentation Home</a> |
+<a href="../../index.html">API Documentation Home</a> |
+<a href="../../../Examples/html/Examples_Home.html">Examples Home</a> |
+<a href="../../../Reference_Index.html">Index</a>
+</div>
+"""
+
+#-----------------------------------------------------------------------------
+# Standard Imports
+import sys
+import os
+import re
+import datetime
+import sqlite3
+import time
+try:
+    import urllib.parse as urlparse
+except ImportError:
+    import urlparse
+
+#-----------------------------------------------------------------------------
+# Third Party Imports
+sys.path.append(os.path.join(os.path.dirname( __file__ ), '..','..'))
+try:
+    from lxml import etree
+except:
+    print("The module lxml is required for RegisterModels, please install it")
+    raise
+try:
+    from Code.DataHandlers.XMLModels import FileRegister,Metadata,condition_URL,URL_to_path,\
+        get_host_information,get_XSLT_transform,add_harvested_metadata,DRIVER_FILE_EXTENSIONS,TESTS_DIRECTORY,\
+        DEFAULT_REGISTER_STYLE,DEFAULT_METADATA_STYLE
+except:
+    print("The module pyMez.Code.DataHandlers.XMLModels was not found or had an error,"
+          "please check module or put it on the python path")
+    raise
+try:
+    from Code.Utils.GetMetadata import harvest_metadata
+except:
+    print("The module pyMez.Code.Utils.GetMetadata was not found or had an error,"
+          "MetadataDatabase.harvest_metadata will be broken")
+try:
+    from Code.Utils.Names import auto_name
+except:
+    print("The function auto_name in pyMez.Code.Utils.Names was not found or had an error")
+    raise
+
+#-----------------------------------------------------------------------------
+# Module Constants
+REGISTER_SCHEMA=["CREATE TABLE IF NOT EXISTS Files (File_Index INTEGER PRIMARY KEY, Id TEXT UNIQUE, "
+                 "Host TEXT, Date TEXT, URL TEXT UNIQUE, Type TEXT, Name TEXT)",
+                 "CREATE TABLE IF NOT EXISTS Id_Nodes (Node_Index INTEGER PRIMARY KEY, Node_Id TEXT UNIQUE, "
+                 "Parent_Id TEXT, Name TEXT, Node TEXT, Number INTEGER)",
+                 "CREATE INDEX IF NOT EXISTS Id_Nodes_Name ON Id_Nodes (Parent_Id, Name)",
+                 "CREATE INDEX IF NOT EXISTS Id_Nodes_Number ON Id_Nodes (Parent_Id, Number)"]
+"SQL statements that create the tables of a FileRegisterDatabase. Id_Nodes has one row per node of the Id tree."
+FULL_TEXT_SCHEMA=["CREATE VIRTUAL TABLE IF NOT EXISTS File_Names USING fts5(Name, content='Files', "
+                  "content_rowid='File_Index')",
+                  "CREATE TRIGGER IF NOT EXISTS Files_Insert AFTER INSERT ON Files BEGIN "
+                  "INSERT INTO File_Names (rowid, Name) VALUES (new.File_Index, new.Name); END",
+                  "CREATE TRIGGER IF NOT EXISTS Files_Delete AFTER DELETE ON Files BEGIN "
+                  "INSERT INTO File_Names (File_Names, rowid, Name) VALUES ('delete', old.File_Index, old.Name); END"]
+"SQL statements that create the full text index of file names, only used if sqlite3 has fts5."
+METADATA_SCHEMA=["CREATE TABLE IF NOT EXISTS Metadata (Metadata_Index INTEGER PRIMARY KEY, Id TEXT, "
+                 "Tag TEXT, XML TEXT)",
+                 "CREATE INDEX IF NOT EXISTS Metadata_Id ON Metadata (Id, Tag)"]
+"SQL statements that create the table of metadata elements of a MetadataDatabase."
+FILE_ATTRIBUTES=['Id','Host','Date','URL','Type']
+"The attributes of a File element in the order FileRegister writes them."
+TYPE_CODES={'1':"Directory",'2':"Ordinary",'3':"Driver"}
+"The Type attribute for the first digit of the last node in an Id."
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def get_Id_prefixes(Id):
+    """Returns a list of the Ids of every node in the path to Id, starting with the first node
+    after the IP address and ending with Id"""
+    parts=Id.split('.')
+    return ['.'.join(parts[:index]) for index in range(5,len(parts)+1)]
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class DatabaseDictionary():
+    """A read only dictionary view of two columns of a table, the lookups are queries so
+    nothing is held in memory. If value_function is given it is applied to each value"""
+    def __init__(self,connection,table,key_column,value_column,value_function=None):
+        self.connection=connection
+        self.table=table
+        self.key_column=key_column
+        self.value_column=value_column
+        self.value_function=value_function
+
+    def __getitem__(self,key):
+        row=self.connection.execute("SELECT {0} FROM {1} WHERE {2}=?".format(self.value_column,self.table,
+                                                                          self.key_column),(key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        if self.value_function is None:
+            return row[0]
+        return self.value_function(row[0])
+
+    def __contains__(self,key):
+        return self.connection.execute("SELECT 1 FROM {0} WHERE {1}=?".format(self.table,self.key_column),
+                                       (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM {0}".format(self.table)).fetchone()[0]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def get(self,key,default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [row[0] for row in self.connection.execute("SELECT {0} FROM {1} ORDER BY rowid".format(
+            self.key_column,self.table))]
+
+    def values(self):
+        values=[row[0] for row in self.connection.execute("SELECT {0} FROM {1} ORDER BY rowid".format(
+            self.value_column,self.table))]
+        if self.value_function is None:
+            return values
+        return [self.value_function(value) for value in values]
+
+    def items(self):
+        return list(zip(self.keys(),self.values()))
+
+class FileRegisterDatabase():
+    """ A file register kept in a sqlite3 database. It has the methods of
+    pyMez.Code.DataHandlers.XMLModels.FileRegister and gives the same Ids, self.Id_dictionary is a
+    view of the database. If file_path ends in .xml the XML register is imported into a database with the
+    same name and the extension .db.
+        !#python
+        defaults={"style_sheet":DEFAULT_REGISTER_STYLE,
+                  "specific_descriptor":'Resource',
+                  "general_descriptor":'Registry',
+                  "directory":None,
+                  "extension":'db'}"""
+    def __init__(self,file_path=None,**options):
+        """ Initializes the FileRegisterDatabase Class."""
+        defaults={"style_sheet":DEFAULT_REGISTER_STYLE,
+                  "specific_descriptor":'Resource',
+                  "general_descriptor":'Registry',
+                  "directory":None,
+                  "extension":'db'
+                  }
+        self.options={}
+        for key,value in defaults.items():
+            self.options[key]=value
+        for key,value in options.items():
+            self.options[key]=value
+        XML_register=None
+        if file_path is None:
+            self.path=auto_name(self.options["specific_descriptor"],
+                                self.options["general_descriptor"],
+                                self.options["directory"],
+                                self.options["extension"])
+            if self.options["directory"] is not None:
+                self.path=os.path.join(self.options["directory"],self.path)
+        elif re.search(r'\.xml$',file_path,re.IGNORECASE):
+            XML_register=file_path
+            self.path=re.sub(r'\.xml$','.db',file_path,flags=re.IGNORECASE)
+        else:
+            self.path=file_path
+        self.connection=sqlite3.connect(self.path)
+        self.in_transaction=False
+        for statement in REGISTER_SCHEMA:
+            self.connection.execute(statement)
+        try:
+            for statement in FULL_TEXT_SCHEMA:
+                self.connection.execute(statement)
+            self.full_text_capable=True
+        except sqlite3.OperationalError:
+            # sqlite3 was built without fts5, full_text_search falls back to LIKE
+            self.full_text_capable=False
+        self.connection.commit()
+        self.Id_dictionary=DatabaseDictionary(self.connection,"Files","URL","Id")
+        if XML_register is not None:
+            self.add_XML(XML_register)
+
+    def __str__(self):
+        return self.to_XML()
+
+    def commit(self):
+        """Commits pending changes unless they are part of a larger transaction such as add_tree"""
+        if not self.in_transaction:
+            self.connection.commit()
+
+    def create_Id(self,URL):
+        """ Returns a new Id for URL or the existing Id if URL is registered. Gives the same Id as
+        FileRegister.create_Id, every directory in the path reuses the node of a registered directory
+        with the same name and new nodes are numbered one more than their last sibling"""
+        existing_Id=self.Id_dictionary.get(condition_URL(URL))
+        if existing_Id is not None:
+            return existing_Id
+        parsed_URL=urlparse.urlparse(condition_URL(URL))
+        # if it is empty assume local host
+        temp_Id=get_host_information(parsed_URL[1])[2][0]
+        path_list=parsed_URL[2].split('/')
+        file_extension=path_list[-1].split('.')[-1]
+        for place,part in enumerate(path_list):
+            if place<len(path_list)-1:
+                row=self.connection.execute("SELECT Node FROM Id_Nodes WHERE Parent_Id=? AND Name=? "
+                                            "ORDER BY Node_Index DESC LIMIT 1",(temp_Id,part)).fetchone()
+                if row is not None:
+                    new_node=row[0]
+                else:
+                    new_node='1'+str(self.get_next_node_number(temp_Id))
+            else:
+                if file_extension in DRIVER_FILE_EXTENSIONS:
+                    new_node_type='3'
+                elif os.path.isdir(parsed_URL[2]):
+                    new_node_type='1'
+                else:
+                    new_node_type='2'
+                new_node=new_node_type+str(self.get_next_node_number(temp_Id))
+            temp_Id=temp_Id+'.'+new_node
+        return temp_Id
+
+    def get_next_node_number(self,parent_Id):
+        """Returns one more than the largest sibling number under parent_Id, 1 if it has no children"""
+        row=self.connection.execute("SELECT MAX(Number) FROM Id_Nodes WHERE Parent_Id=?",(parent_Id,)).fetchone()
+        if row[0] is None:
+            return 1
+        return row[0]+1
+
+    def add_Id_nodes(self,URL,Id):
+        """Adds the nodes of Id to the Id tree, naming each with the matching part of the path of URL"""
+        path_list=URL_to_path(URL,form='list')
+        parent_Id='.'.join(Id.split('.')[:4])
+        for part,node_Id in zip(path_list,get_Id_prefixes(Id)):
+            node=node_Id.split('.')[-1]
+            self.connection.execute("INSERT OR IGNORE INTO Id_Nodes (Node_Id,Parent_Id,Name,Node,Number) "
+                                    "VALUES (?,?,?,?,?)",(node_Id,parent_Id,part,node,int(node[1:])))
+            parent_Id=node_Id
+
+    def add_entry(self,URL):
+        """ Adds an entry to the current File Register """
+        URL=condition_URL(URL)
+        if URL in self.Id_dictionary:
+            print('Already there')
+            return
+        Id=self.create_Id(URL)
+        Type=TYPE_CODES.get(Id.split('.')[-1][0],"Other")
+        parsed_URL=urlparse.urlparse(URL)
+        if parsed_URL[1] in ['']:  # if it is empty assume local host
+            Host=get_host_information()[0]
+        else:
+            Host=parsed_URL[1]
+        self.connection.execute("INSERT INTO Files (Id,Host,Date,URL,Type,Name) VALUES (?,?,?,?,?,?)",
+                                (Id,Host,datetime.datetime.utcnow().isoformat(),URL,Type,
+                                 os.path.split(URL)[1]))
+        self.add_Id_nodes(URL,Id)
+        self.commit()
+
+    def add_tree(self,root,**options):
+        """ Adds a directory and all sub folders and sub directories in one transaction, **options
+        provides a way to {'ignore','.pyc|etc'} or {'only','.png|.bmp'}"""
+        default_options={'ignore':None,'only':None,'print_ignored_files':True,
+                         'directories_only':False,'files_only':False}
+        tree_options=default_options
+        for option,value in options.items():
+            tree_options[option]=value
+        root_URL=condition_URL(root)
+        path=URL_to_path(root_URL)
+        self.in_transaction=True
+        try:
+            for (home,directories,files) in os.walk(path):
+                for directory in directories:
+                    if tree_options['files_only']:
+                        if tree_options['print_ignored_files']:
+                            print("ignoring %s because it is not a file"%directory)
+                    elif tree_options['ignore'] is not None and re.search(tree_options['ignore'],directory):
+                        if tree_options['print_ignored_files']:
+                            print("ignoring %s because it matches the ignore option"%directory)
+                    elif tree_options['only'] is not None and not re.search(tree_options['only'],directory):
+                        if tree_options['print_ignored_files']:
+                            print("ignoring %s because it does not match the only option"%directory)
+                    else:
+                        self.add_entry(condition_URL(os.path.join(home,directory)))
+                for file in files:
+                    if tree_options['directories_only']:
+                        if tree_options['print_ignored_files']:
+                            print("ignoring %s because it is not a directory"%file)
+                    elif tree_options['ignore'] is not None and re.search(tree_options['ignore'],file):
+                        if tree_options['print_ignored_files']:
+                            print("ignoring %s because it matches the ignore option"%file)
+                    elif tree_options['only'] is not None and not re.search(tree_options['only'],file):
+                        if tree_options['print_ignored_files']:
+                            print("ignoring %s because it does not match the only option"%file)
+                    else:
+                        self.add_entry(condition_URL(os.path.join(home,file)))
+        except:
+            self.connection.rollback()
+            raise
+        finally:
+            self.in_transaction=False
+        self.connection.commit()
+
+    def remove_entry(self,URL=None,Id=None):
+        """ Removes an entry in the current File Register """
+        if not URL is None:
+            URL=condition_URL(URL)
+            Id=self.Id_dictionary[URL]
+        elif Id not in self.get_URL_dictionary():
+            raise KeyError(Id)
+        self.connection.execute("DELETE FROM Files WHERE Id=?",(Id,))
+        # nodes that are no longer part of a registered Id stop counting as siblings, as in FileRegister
+        for node_Id in reversed(get_Id_prefixes(Id)):
+            if self.connection.execute("SELECT 1 FROM Files WHERE Id=? OR (Id>? AND Id<?) LIMIT 1",
+                                       (node_Id,node_Id+'.',node_Id+'/')).fetchone() is None:
+                self.connection.execute("DELETE FROM Id_Nodes WHERE Node_Id=?",(node_Id,))
+        self.commit()
+
+    def get_URL_dictionary(self):
+        """Returns a view of the register as an Id:URL dictionary"""
+        return DatabaseDictionary(self.connection,"Files","Id","URL")
+
+    def get_data(self):
+        """Gets a list of lists that represent the data in the file register"""
+        return [list(row) for row in self.connection.execute(
+            "SELECT {0} FROM Files ORDER BY File_Index".format(",".join(FILE_ATTRIBUTES)))]
+
+    def get_data_dictionary_list(self):
+        """Returns a list of dictionaries that have the data in the file register attributes"""
+        return [dict(zip(FILE_ATTRIBUTES,row)) for row in self.get_data()]
+
+    def full_text_search(self,query):
+        """Returns a list of URLs whose file names match the full text query, for example 'Table',
+        'Tab*' or 'Data AND Table'. The name is split into words at punctuation so 'Data_Table_1.xml'
+        matches 'Table'. Without fts5 it returns the URLs with names that contain query"""
+        if self.full_text_capable:
+            cursor=self.connection.execute("SELECT Files.URL FROM File_Names JOIN Files ON "
+                                           "Files.File_Index=File_Names.rowid WHERE File_Names MATCH ? "
+                                           "ORDER BY rank",(query,))
+        else:
+            cursor=self.connection.execute("SELECT URL FROM Files WHERE Name LIKE ? ORDER BY File_Index",
+                                           ('%'+query+'%',))
+        return [row[0] for row in cursor]
+
+    def add_XML(self,file_register):
+        """Adds the entries of a FileRegister or a FileRegister XML file keeping their Ids"""
+        if not isinstance(file_register,FileRegister):
+            file_register=FileRegister(file_register)
+        with self.connection:
+            for node in file_register.etree.iter('File'):
+                URL=node.get('URL','')
+                if URL in self.Id_dictionary:
+                    continue
+                self.connection.execute("INSERT INTO Files (Id,Host,Date,URL,Type,Name) VALUES (?,?,?,?,?,?)",
+                                        tuple([node.get(attribute,'') for attribute in FILE_ATTRIBUTES])+
+                                        (os.path.split(URL)[1],))
+                self.add_Id_nodes(URL,node.get('Id',''))
+
+    def to_FileRegister(self):
+        """Returns the register as a pyMez.Code.DataHandlers.XMLModels.FileRegister"""
+        file_register=FileRegister(None,**{"style_sheet":self.options["style_sheet"],
+                                           "directory":self.options["directory"]})
+        file_register.path=re.sub(r'\.db$','.xml',self.path)
+        root=file_register.etree
+        for row in self.get_data():
+            etree.SubElement(root,'File',dict(zip(FILE_ATTRIBUTES,row)))
+        file_register.Id_dictionary=dict([(row[3],row[0]) for row in self.get_data()])
+        return file_register
+
+    def to_XML(self):
+        """Returns the register as a FileRegister XML string"""
+        return str(self.to_FileRegister())
+
+    def save_XML(self,path=None):
+        """Saves the register as a FileRegister XML file, defaults to self.path with the extension .xml"""
+        file_register=self.to_FileRegister()
+        file_register.save(path)
+        return file_register.path if path is None else path
+
+    def save(self,path=None):
+        """Commits all changes, if path is given the database is copied to path or saved as a
+        FileRegister XML file if path ends in .xml"""
+        self.connection.commit()
+        if path is None or path==self.path:
+            return
+        if re.search(r'\.xml$',path,re.IGNORECASE):
+            self.save_XML(path)
+        else:
+            destination=sqlite3.connect(path)
+            self.connection.backup(destination)
+            destination.close()
+
+    def to_HTML(self,XSLT=None):
+        """ Returns HTML string by applying a XSL to the FileRegister XML"""
+        if XSLT is None:
+            XSLT=self.options['style_sheet']
+        return self.to_FileRegister().to_HTML(XSLT=XSLT)
+
+    def close(self):
+        """Commits and closes the database connection"""
+        self.connection.commit()
+        self.connection.close()
+
+class MetadataDatabase():
+    """ Metadata for the files in a FileRegisterDatabase stored in the same database. It has the methods of
+    pyMez.Code.DataHandlers.XMLModels.Metadata, self.current_node is a lxml File element with the metadata
+    as children. Metadata changes must go through add_element_to_current_node and
+    remove_element_in_current_node to be stored. file_path is a FileRegisterDatabase or the path to one,
+    options["metadata_file"] can be a Metadata XML file or instance to import
+        !#python
+        defaults={"style_sheet":DEFAULT_METADATA_STYLE,
+                  "metadata_file":None}"""
+    def __init__(self,file_path=None,**options):
+        """ Intializes the class MetadataDatabase"""
+        defaults={"style_sheet":DEFAULT_METADATA_STYLE,
+                  "metadata_file":None
+                  }
+        self.options={}
+        for key,value in defaults.items():
+            self.options[key]=value
+        for key,value in options.items():
+            self.options[key]=value
+        if isinstance(file_path,FileRegisterDatabase):
+            self.FileRegister=file_path
+        else:
+            self.FileRegister=FileRegisterDatabase(file_path)
+        self.path=self.FileRegister.path
+        self.connection=self.FileRegister.connection
+        for statement in METADATA_SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+        self.URL_dictionary=self.FileRegister.get_URL_dictionary()
+        self.name_dictionary=DatabaseDictionary(self.connection,"Files","Id","Name")
+        self.node_dictionary=DatabaseDictionary(self.connection,"Files","URL","URL",self.get_node)
+        if self.options["metadata_file"] is not None:
+            self.add_XML(self.options["metadata_file"])
+        first_URL=self.connection.execute("SELECT URL FROM Files ORDER BY File_Index LIMIT 1").fetchone()
+        if first_URL is None:
+            self.current_node=None
+        else:
+            self.current_node=self.get_node(first_URL[0])
+
+    def __str__(self):
+        return self.to_XML()
+
+    def get_node(self,URL):
+        """Returns a new File element for URL with its metadata elements as children"""
+        row=self.connection.execute("SELECT {0} FROM Files WHERE URL=?".format(",".join(FILE_ATTRIBUTES)),
+                                    (URL,)).fetchone()
+        if row is None:
+            raise KeyError(URL)
+        node=etree.Element('File',dict(zip(FILE_ATTRIBUTES,row)))
+        for (XML,) in self.connection.execute("SELECT XML FROM Metadata WHERE Id=? ORDER BY Metadata_Index",
+                                              (row[0],)):
+            node.append(etree.fromstring(XML))
+        return node
+
+    def search_name(self,name=None,re_flags=re.IGNORECASE):
+        """ Returns a list of URL's that have an element matching name"""
+        if re_flags in [None,'']:
+            re_flags=0
+        expression=re.compile(name,flags=re_flags)
+        self.connection.create_function("REGEXP_SEARCH",1,lambda URL:expression.search(URL) is not None)
+        return [row[0] for row in self.connection.execute(
+            "SELECT URL FROM Files WHERE REGEXP_SEARCH(URL) ORDER BY File_Index")]
+
+    def full_text_search(self,query):
+        """Returns a list of URLs whose file names match the full text query, see
+        FileRegisterDatabase.full_text_search"""
+        return self.FileRegister.full_text_search(query)
+
+    def get_file_node(self,URL=None,Id=None):
+        """ Returns the file node specified by URL or Id"""
+        self.set_current_node(URL=URL,Id=Id)
+        return self.current_node
+
+    def set_current_node(self,URL=None,Id=None):
+        """ Sets the current file node to the one specified by URL or Id"""
+        if not URL is None:
+            URL=condition_URL(URL)
+            self.current_node=self.get_node(URL)
+        elif not Id is None:
+            self.current_node=self.get_node(self.URL_dictionary[Id])
+
+    def add_element_to_current_node(self,XML_tag=None,value=None,node=None,**Atributes):
+        """Adds a metadata element to the current file node"""
+        if node is None:
+            new_element=etree.Element(XML_tag)
+        elif hasattr(node,'toxml'):
+            # a xml.dom.minidom node from a legacy caller
+            new_element=etree.fromstring(node.toxml(encoding="utf-8"))
+        else:
+            new_element=node
+        if not value is None:
+            new_element.text=str(value)
+        for (key,value) in Atributes.items():
+            new_element.set(key,str(value))
+        self.current_node.append(new_element)
+        self.connection.execute("INSERT INTO Metadata (Id,Tag,XML) VALUES (?,?,?)",
+                                (self.current_node.get('Id'),new_element.tag,
+                                 etree.tostring(new_element,encoding="unicode")))
+        self.FileRegister.commit()
+
+    def remove_element_in_current_node(self,element_name):
+        """Removes all metadata elements with the same tagname
+         in the current file node"""
+        for node in self.current_node.findall(element_name):
+            self.current_node.remove(node)
+        self.connection.execute("DELETE FROM Metadata WHERE Id=? AND Tag=?",
+                                (self.current_node.get('Id'),element_name))
+        self.FileRegister.commit()
+
+    def harvest_metadata(self,**options):
+        """Reads the system, image and python metadata of every registered file in parallel and stores it in
+        one transaction, see pyMez.Code.Utils.GetMetadata.harvest_metadata for the options. Files that can
+        not be read or whose node can not be found are skipped with a message"""
+        path_URL_dictionary=dict([(URL_to_path(URL),URL) for URL in self.FileRegister.Id_dictionary.keys()])
+        self.FileRegister.in_transaction=True
+        try:
+            for (path,harvested_metadata) in harvest_metadata(list(path_URL_dictionary.keys()),**options):
+                try:
+                    add_harvested_metadata(self,path_URL_dictionary[path],harvested_metadata)
+                except (KeyError,ValueError) as error:
+                    print(('No metadata for {0}: {1}'.format(path_URL_dictionary[path],error)))
+        except:
+            self.connection.rollback()
+            raise
+        finally:
+            self.FileRegister.in_transaction=False
+        self.connection.commit()
+
+    def add_XML(self,metadata):
+        """Adds the metadata elements of a Metadata or a Metadata XML file to the files with the same Id"""
+        if not isinstance(metadata,Metadata):
+            metadata=Metadata(self.FileRegister.to_FileRegister(),**{"metadata_file":metadata})
+        with self.connection:
+            for file_node in metadata.etree.iter('File'):
+                for element in file_node:
+                    if not isinstance(element.tag,str):
+                        continue
+                    self.connection.execute("INSERT INTO Metadata (Id,Tag,XML) VALUES (?,?,?)",
+                                            (file_node.get('Id'),element.tag,
+                                             etree.tostring(element,encoding="unicode",with_tail=False)))
+
+    def to_Metadata(self):
+        """Returns the metadata as a pyMez.Code.DataHandlers.XMLModels.Metadata"""
+        metadata=Metadata(self.FileRegister.to_FileRegister(),**{"style_sheet":self.options["style_sheet"]})
+        for file_node in metadata.etree.iter('File'):
+            for (XML,) in self.connection.execute("SELECT XML FROM Metadata WHERE Id=? ORDER BY Metadata_Index",
+                                                  (file_node.get('Id'),)):
+                file_node.append(etree.fromstring(XML))
+        return metadata
+
+    def to_XML(self):
+        """Returns the metadata as a Metadata XML string"""
+        return str(self.to_Metadata())
+
+    def save_XML(self,path=None):
+        """Saves the metadata as a Metadata XML file, defaults to the register path with _Metadata.xml"""
+        metadata=self.to_Metadata()
+        metadata.save(path)
+        return metadata.path if path is None else path
+
+    def save(self,path=None):
+        """Commits all changes, see FileRegisterDatabase.save"""
+        if path is not None and re.search(r'\.xml$',path,re.IGNORECASE):
+            self.connection.commit()
+            self.save_XML(path)
+        else:
+            self.FileRegister.save(path)
+
+    def to_HTML(self,XSLT=None):
+        """ Returns HTML string by applying a XSL to the Metadata XML"""
+        if XSLT is None:
+            XSLT=self.options['style_sheet']
+        return self.to_Metadata().to_HTML(XSLT=XSLT)
+
+    def current_node_to_HTML(self,XSLT=None):
+        """Returns a HTML document from the current node"""
+        if XSLT is None:
+            XSLT=self.options['style_sheet']
+        XSL_transform=get_XSLT_transform(XSLT)
+        HTML=XSL_transform(self.current_node)
+        return HTML
+
+    def print_current_node(self):
+        """ Prints the current node """
+        print(etree.tostring(self.current_node,encoding="unicode"))
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_FileRegisterDatabase(root=None):
+    """Registers root with FileRegister and FileRegisterDatabase and checks that they give the same Ids"""
+    import tempfile
+    import shutil
+    if root is None:
+        root=TESTS_DIRECTORY
+    # FileRegister writes its own file to the working directory, keep it out of root
+    register_directory=tempfile.mkdtemp()
+    os.chdir(register_directory)
+    file_register=FileRegister()
+    register_database=FileRegisterDatabase(":memory:")
+    start=time.time()
+    file_register.add_tree(root,print_ignored_files=False)
+    XML_time=time.time()-start
+    start=time.time()
+    register_database.add_tree(root,print_ignored_files=False)
+    database_time=time.time()-start
+    XML_Ids=dict([(node.get('URL'),node.get('Id')) for node in file_register.etree.iter('File')])
+    database_Ids=dict(register_database.Id_dictionary.items())
+    print(("{0} entries, the Ids are the same: {1}".format(len(database_Ids),XML_Ids==database_Ids)))
+    print(("FileRegister.add_tree {0:.3f} s, FileRegisterDatabase.add_tree {1:.3f} s".format(XML_time,
+                                                                                          database_time)))
+    print(("Full text search for 'Table' found {0} files".format(len(register_database.full_text_search("Table")))))
+    URL=list(XML_Ids.keys())[-1]
+    register_database.remove_entry(URL)
+    file_register.remove_entry(URL)
+    register_database.add_entry(URL)
+    file_register.add_entry(URL)
+    print(("The Id of a removed and added file is the same: {0}".format(
+        file_register.Id_dictionary[URL]==register_database.Id_dictionary[URL])))
+    print(("The exported XML has the same Ids: {0}".format(
+        register_database.to_FileRegister().Id_dictionary==file_register.Id_dictionary)))
+    os.chdir(TESTS_DIRECTORY)
+    shutil.rmtree(register_directory)
+
+def test_MetadataDatabase():
+    """Adds and removes metadata elements and exports them to the Metadata format"""
+    register_database=FileRegisterDatabase(":memory:")
+    register_database.add_tree(TESTS_DIRECTORY,print_ignored_files=False)
+    metadata=MetadataDatabase(register_database)
+    URL=metadata.full_text_search("Table")[0]
+    metadata.get_file_node(URL)
+    metadata.add_element_to_current_node(XML_tag="Note",value="A data table",Author="Test")
+    metadata.add_element_to_current_node(XML_tag="Keyword",value="Table")
+    metadata.remove_element_in_current_node("Keyword")
+    metadata.set_current_node(URL)
+    metadata.print_current_node()
+    exported=metadata.to_Metadata()
+    print(("The exported Metadata has the note: {0}".format(
+        exported.node_dictionary[URL].find('Note') is not None)))
+    metadata.harvest_metadata()
+    print(("Harvested System_Metadata for {0} files".format(metadata.connection.execute(
+        "SELECT COUNT(*) FROM Metadata WHERE Tag='System_Metadata'").fetchone()[0])))
+
+def test_FileRegisterDatabase_performance(number_files=20000,directory=None):
+    """Creates number_files empty files in a temporary directory tree and times FileRegisterDatabase.add_tree"""
+    import tempfile
+    import shutil
+    if directory is None:
+        directory=tempfile.mkdtemp()
+    for index in range(number_files):
+        sub_directory=os.path.join(directory,"Folder_{0:03d}".format(index%100))
+        if not os.path.isdir(sub_directory):
+            os.mkdir(sub_directory)
+        open(os.path.join(sub_directory,"File_{0:06d}.txt".format(index)),"w").close()
+    register_database=FileRegisterDatabase(":memory:")
+    start=time.time()
+    register_database.add_tree(directory,print_ignored_files=False)
+    add_time=time.time()-start
+    start=time.time()
+    result=register_database.full_text_search("File_000100*")
+    search_time=time.time()-start
+    print(("Registered {0} entries in {1:.3f} s, full text search took {2:.5f} s and found {3}".format(
+        len(register_database.Id_dictionary),add_time,search_time,len(result))))
+    shutil.rmtree(directory)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_FileRegisterDatabase()
+    test_MetadataDatabase()
+    #test_FileRegisterDatabase_performance()
@@ -22,6 +22,11 @@ information on statistical can be found at
 # Standard Imports
 import sys
 import os
+import re
+try:
+    from concurrent.futures import ProcessPoolExecutor
+except:
+    ProcessPoolExecutor=None
 #-----------------------------------------------------------------------------
 # Third Party Imports
 sys.path.append(os.path.join(os.path.dirname( __file__ ), '..','..'))
@@ -52,8 +57,99 @@ SOLUTION_VECTOR_COLUMN_NAMES=["Frequency","rePort1S1_11","imPort1S1_11","rePort1
                               "imXTalkVNA-VNA","reXTalkVNA-DUT","imXTalkVNA-DUT","reXTalkDUT-VNA","imXTalkDUT-VNA",
                               "reXTalkDUT-DUT","imXTalkDUT-DUT"]
 "Column names for the solution vector returned by statistiCAL"
+MENU_FILE_LINE_NUMBERS=[3,4,5]+[(standard_number-1)*51+57+variable for standard_number in range(1,41)
+                                for variable in range(3,7)]
+"Line numbers in a StatistiCAL menu that hold file names, the estimates of lines 3-5 and variables 3-6 of each standard"
 #-----------------------------------------------------------------------------
 # Module Functions
+def read_solution_vector_file(file_path):
+    """Reads a StatistiCAL solution vector file and returns a float array with a row per frequency. The numbers
+    are converted in one call instead of line by line"""
+    in_file=open(file_path,'r')
+    lines=[line for line in in_file.read().splitlines() if line.strip()]
+    in_file.close()
+    number_columns=len(lines[0].split())
+    try:
+        return np.array(" ".join(lines).split(),dtype=float).reshape((len(lines),number_columns))
+    except ValueError:
+        raise StatistiCALError("The data in {0} was not fully formed. Please make sure that all rows are the same "
+                               "length. If the file is not properly formed, then run statisticAL again (make sure "
+                               "you ShowStatistiCAL first)".format(file_path))
+
+def solution_vector_to_error_terms(solution_array,reciprocal=True):
+    """Takes a float array of solution vector rows and returns frequency, the complex solution with a column per
+    element and the error boxes S1 and S2 as complex arrays with columns [S11,S21,S12,S22]. If reciprocal is False
+    S2_21 and S2_12 are separated using k=sqrt(S2_21/S2_12)"""
+    solution_array=np.asarray(solution_array,dtype=float)
+    frequency=solution_array[:,0]
+    complex_solution=solution_array[:,1::2]+1.j*solution_array[:,2::2]
+    s1=complex_solution[:,[0,2,2,1]]
+    a=complex_solution[:,5]
+    if reciprocal:
+        s2=np.stack([complex_solution[:,3],a,a,complex_solution[:,4]],axis=1)
+    else:
+        b=complex_solution[:,6]
+        s2=np.stack([complex_solution[:,3],a*b,a/b,complex_solution[:,4]],axis=1)
+    return frequency,complex_solution,s1,s2
+
+def solution_file_to_error_terms(file_path,reciprocal=True):
+    """Reads a StatistiCAL solution vector file and returns frequency, complex_solution, S1 and S2 as arrays,
+    the unit of work of solution_files_to_error_terms"""
+    return solution_vector_to_error_terms(read_solution_vector_file(file_path),reciprocal)
+
+def _solution_file_to_reciprocal_error_terms(file_path):
+    return solution_file_to_error_terms(file_path,True)
+
+def _solution_file_to_nonreciprocal_error_terms(file_path):
+    return solution_file_to_error_terms(file_path,False)
+
+def solution_files_to_error_terms(file_paths,**options):
+    """Reads many StatistiCAL solution vector files and returns frequency and the stacked arrays complex_solution,
+    S1 and S2 with shape (number of files, number of frequencies, columns). The files are read in a pool of
+    max_workers processes unless parallel=False, all files must share the same frequency list"""
+    defaults={"reciprocal":True,"parallel":True,"max_workers":None,"chunksize":4}
+    batch_options={}
+    for key,value in defaults.items():
+        batch_options[key]=value
+    for key,value in options.items():
+        batch_options[key]=value
+    file_paths=list(file_paths)
+    if not file_paths:
+        raise StatistiCALError("No solution vector files were given")
+    if batch_options["reciprocal"]:
+        reader=_solution_file_to_reciprocal_error_terms
+    else:
+        reader=_solution_file_to_nonreciprocal_error_terms
+    if batch_options["parallel"] and ProcessPoolExecutor is not None and len(file_paths)>1:
+        with ProcessPoolExecutor(max_workers=batch_options["max_workers"]) as executor:
+            results=list(executor.map(reader,file_paths,chunksize=batch_options["chunksize"]))
+    else:
+        results=[reader(file_path) for file_path in file_paths]
+    frequency=results[0][0]
+    for file_path,result in zip(file_paths,results):
+        if result[0].shape!=frequency.shape or not np.allclose(result[0],frequency):
+            raise StatistiCALError("The frequencies of {0} do not match those of {1}".format(file_path,
+                                                                                           file_paths[0]))
+    complex_solution=np.stack([result[1] for result in results])
+    s1=np.stack([result[2] for result in results])
+    s2=np.stack([result[3] for result in results])
+    return frequency,complex_solution,s1,s2
+
+def rebase_file_name(file_name,new_directory):
+    """Replaces the directory of a windows or posix style file_name with new_directory"""
+    base_name=re.split(r"[\\/]",file_name)[-1]
+    return os.path.join(new_directory,base_name)
+
+def rebase_menu_lines(menu_lines,new_directory):
+    """Returns a copy of the list menu_lines with the directory of every file name line replaced by new_directory"""
+    menu_lines=list(menu_lines)
+    for line_number in MENU_FILE_LINE_NUMBERS:
+        if line_number>len(menu_lines):
+            break
+        value=str(menu_lines[line_number-1])
+        if re.search(r"[\\/]",value):
+            menu_lines[line_number-1]=rebase_file_name(value,new_directory)
+    return menu_lines
 
 #-----------------------------------------------------------------------------
 # Module Classes
@@ -521,10 +617,7 @@ Number of calibration standards
 
     def __str__(self):
         "Controls the behavior of the menu when a string function such as print is called"
-        out_string=""
-        for value in self.menu_data[:]:
-            out_string=out_string+str(value)+"\n"
-        return out_string
+        return "".join([str(value)+"\n" for value in self.menu_data])
     def save(self,file_path=None):
         """Saves the menu to file_path, defaults to self.path attribute"""
         if file_path is None:
@@ -838,7 +931,66 @@ Number of calibration standards
 
     def rebase_file_names(self,new_directory):
         """Replaces all file name directories with new_directory"""
-        pass
+        self.menu_data[:]=rebase_menu_lines(self.menu_data,new_directory)
+
+    def get_line_changes(self,other_menu):
+        """Returns a dictionary of {line_number:value} for every line of other_menu that differs from this menu,
+        the diff that StatistiCALMenuTemplate applies"""
+        changes={}
+        for index,value in enumerate(other_menu.menu_data):
+            if index>=len(self.menu_data) or str(self.menu_data[index])!=str(value):
+                changes[index+1]=value
+        return changes
+
+
+class StatistiCALMenuTemplate(object):
+    """Makes many StatistiCAL menus from one parsed base menu. Each menu is described by line-level changes,
+    a dictionary of {line_number:value}, that are applied to a copy of the base lines so the base file is read
+    only once. base_menu is a StatistiCALMenuModel or a path to a menu file"""
+    def __init__(self,base_menu):
+        "Initializes StatistiCALMenuTemplate"
+        if isinstance(base_menu,StatistiCALMenuModel):
+            self.base_menu=base_menu
+        else:
+            self.base_menu=StatistiCALMenuModel(base_menu)
+        self.base_lines=[str(value) for value in self.base_menu.menu_data]
+
+    def get_lines(self,line_changes=None,new_directory=None):
+        """Returns the base lines as strings with line_changes applied, if new_directory is not None the file names
+        are rebased after the changes are applied"""
+        lines=self.base_lines[:]
+        if line_changes:
+            for line_number,value in line_changes.items():
+                lines[int(line_number)-1]=str(value)
+        if new_directory is not None:
+            lines=rebase_menu_lines(lines,new_directory)
+        return lines
+
+    def make_menu(self,line_changes=None,file_path=None,new_directory=None):
+        """Returns a new StatistiCALMenuModel with line_changes applied to the base menu, file_path sets
+        the path of the new menu"""
+        new_menu=StatistiCALMenuModel()
+        new_menu.menu_data=self.get_lines(line_changes,new_directory)
+        new_menu.path=file_path
+        return new_menu
+
+    def make_menus(self,line_changes_list,file_paths=None):
+        """Returns a list of StatistiCALMenuModels, one for each dictionary in line_changes_list"""
+        if file_paths is None:
+            file_paths=[None for line_changes in line_changes_list]
+        return [self.make_menu(line_changes,file_path) for line_changes,file_path in zip(line_changes_list,
+                                                                                         file_paths)]
+
+    def save_menus(self,line_changes_list,file_paths,new_directory=None):
+        """Writes a menu for each dictionary in line_changes_list to the matching path in file_paths, returns
+        file_paths"""
+        if len(line_changes_list)!=len(file_paths):
+            raise StatistiCALError("There must be one file path for each set of line changes")
+        for line_changes,file_path in zip(line_changes_list,file_paths):
+            out_file=open(file_path,'w')
+            out_file.write("".join([line+"\n" for line in self.get_lines(line_changes,new_directory)]))
+            out_file.close()
+        return file_paths
 
 
 class StatistiCALSolutionModel(AsciiDataTable):
@@ -902,55 +1054,27 @@ class StatistiCALSolutionModel(AsciiDataTable):
         if file_path is not None:
             self.path=file_path
             self.__read_and_fix__()
+            # the data are already floats, so the conversion and string building of update_model are skipped
+            self.options["validate"]=True
         AsciiDataTable.__init__(self,None,**self.options)
         if file_path is not None:
             self.path=file_path
 
     def __read_and_fix__(self):
-            """Reads in the data and fixes any problems with delimiters, etc"""
-            in_file=open(self.path,'r')
-            lines=[]
-            for line in in_file:
-                lines.append([float(x) for x in line.rstrip().lstrip().split(" ")])
-            in_file.close()
-            self.options["data"]=lines
-            self.complex_data=[]
-            self.S1=[]
-            self.S2=[]
-            self.eight_term_correction=[]
-            try:
-                for row in  self.options["data"]:
-                    frequency=[row[0]]
-                    # take all rows that are not frequency
-                    complex_numbers=row[1:]
-                    #print np.array(complex_numbers[1::2])
-                    # create a complex data type
-                    complex_array=np.array(complex_numbers[0::2])+1.j*np.array(complex_numbers[1::2])
-                    #print(len(complex_array.tolist()))
-                    self.complex_data.append(frequency+complex_array.tolist())
-                    # fill S1 and S2 for later
-                    # S1=frequency,S1_11,S1_21,_S1_12,S1_22
-                    S1=frequency+[complex_array[0],complex_array[2],complex_array[2],complex_array[1]]
-                    self.S1.append(S1)
-                    a=complex_array[5]
-                    b=complex_array[6]
-                    # S2=frequency,S2_11,S2_21,_S2_12,S2_22
-                    if self.options["reciprocal"]:
-                        S2=frequency+[complex_array[3],a,a,complex_array[4]]
-                        self.S2.append(S2)
-                        eight_term=frequency+[complex_array[0],complex_array[2],complex_array[2],complex_array[1]]+[complex_array[3],a,a,complex_array[4]]
-                        self.eight_term_correction.append(eight_term)
-                    else:
-                        S2=frequency+[complex_array[3],a*b,a/b,complex_array[4]]
-                        self.S2.append(S2)
-                        eight_term=frequency+[complex_array[0],complex_array[2],complex_array[2],complex_array[1]]+[complex_array[3],a*b,a/b,complex_array[4]]
-                        self.eight_term_correction.append(eight_term)
-                    #print("The len(frequency+complex_array.tolist()) is {0}".format(len(frequency+complex_array.tolist())))
-            except IndexError:
-                print("The data was not fully formed. Please make sure that all rows are the same length."
-                      "If the file is not properly formed, then run statisticAL again (make sure "
-                      "you ShowStatistiCAL first)")
-                raise
+        """Reads in the data and fixes any problems with delimiters, etc"""
+        solution_array=read_solution_vector_file(self.path)
+        frequency,complex_solution,s1,s2=solution_vector_to_error_terms(solution_array,
+                                                                        self.options["reciprocal"])
+        self.solution_array=solution_array
+        self.complex_array=complex_solution
+        self.S1_array=s1
+        self.S2_array=s2
+        self.options["data"]=solution_array.tolist()
+        frequency_list=[[f] for f in frequency.tolist()]
+        self.complex_data=[f+row for f,row in zip(frequency_list,complex_solution.tolist())]
+        self.S1=[f+row for f,row in zip(frequency_list,s1.tolist())]
+        self.S2=[f+row for f,row in zip(frequency_list,s2.tolist())]
+        self.eight_term_correction=[f+row for f,row in zip(frequency_list,np.hstack([s1,s2]).tolist())]
 #-----------------------------------------------------------------------------
 # Module Scripts
 if WINDOWS_WRAPPER:
@@ -974,9 +1098,29 @@ def test_StatistiCALSolutionModel(file_path="Solution_Plus.txt"):
     print(("The solution is {0}".format(new_solution)))
     print(("{0} is {1}".format("new_solution.complex_data",new_solution.complex_data)))
     print(("{0} is {1}".format("new_solution.S1",new_solution.S1)))
+
+def test_solution_files_to_error_terms(file_names=["Solution_Plus.txt","Solution_Plus.txt","Solution_Plus.txt"]):
+    """Tests the batch reading of solution vectors and the template generation of StatistiCAL menus"""
+    os.chdir(TESTS_DIRECTORY)
+    frequency,complex_solution,s1,s2=solution_files_to_error_terms(file_names)
+    print(("The stacked S1 has shape {0} and S2 has shape {1}".format(s1.shape,s2.shape)))
+    single_solution=StatistiCALSolutionModel(file_names[0])
+    print(("The batch S1 equals the StatistiCALSolutionModel S1 is {0}".format(
+        np.allclose(s1[0],np.array(single_solution.S1)[:,1:]))))
+    base_menu=StatistiCALMenuModel()
+    base_menu.set_tier(1)
+    base_menu.set_standard(1,**{"1":0,"2":1,"3":r"C:\Data\thru.s2p"})
+    template=StatistiCALMenuTemplate(base_menu)
+    menus=template.make_menus([{2:capacitance} for capacitance in [1.0,1.1,1.2]])
+    print(("The capacitances of the new menus are {0}".format([menu.get_capacitance() for menu in menus])))
+    print(("The line changes of the last menu are {0}".format(base_menu.get_line_changes(menus[-1]))))
+    menus[-1].rebase_file_names(os.path.join(TESTS_DIRECTORY,"Menus"))
+    print(("The rebased thru file name is {0}".format(menus[-1].get_line(60))))
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
-    test_StatistiCALWrapper()
+    if WINDOWS_WRAPPER:
+        test_StatistiCALWrapper()
     #test_CalibrateDUTWrapper()
     #test_StatistiCALSolutionModel("Solution_Plus_2.txt")
+    test_solution_files_to_error_terms()
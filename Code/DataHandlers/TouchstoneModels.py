@@ -72,6 +72,12 @@ COMMENT_PATTERN="![\s]*(?P<Comment>.+)\n"
 "Regular expression for comments in touchstone files."
 EXTENSION_PATTERN="s(?P<Number_Ports>\d+)p"
 "Regular expresion for snp extensions."
+OPTION_LINE_REGEX=get_compiled_pattern(OPTION_LINE_PATTERN,re.IGNORECASE)
+"Compiled case insensitive OPTION_LINE_PATTERN used when scanning the lines of a file."
+COMMENT_REGEX=get_compiled_pattern(COMMENT_PATTERN,re.IGNORECASE)
+"Compiled case insensitive COMMENT_PATTERN used when scanning the lines of a file."
+FLOAT_DELIMITER_REGEX=get_compiled_pattern("[\s|,]+")
+"Compiled pattern for the white space or comma delimiters between numbers in a data line."
 FREQUENCY_UNITS=["Hz","kHz","MHz","GHz"]
 "Common frequency units .in touchstone files"
 PARAMETERS=["S","Y","Z","G","H"]
@@ -282,7 +288,7 @@ def parse_combined_float_list(float_string_list):
     all values data types are assumed to be floats returned as floats"""
     parsed_data=[]
     for row in float_string_list:
-        new_row=[float(x) for x in re.split("[\s|,]+",row.rstrip().lstrip().replace("\n","\t"))]
+        new_row=[float(x) for x in FLOAT_DELIMITER_REGEX.split(row.rstrip().lstrip().replace("\n","\t"))]
         parsed_data.append(new_row)
     return parsed_data
 
@@ -345,12 +351,66 @@ def s2p_difference(s2p_one,s2p_two,**options):
     new_s2p=S2PV1(None,**difference_options)
     return new_s2p
 
+def sparameter_complex_to_arrays(sparameter_complex):
+    """Returns a tuple (frequency,sparameters) of numpy arrays given a list of complex rows
+    [[Frequency,S11,S21...]...], frequency has shape (number_frequencies,) and sparameters is a complex array
+    with one column per parameter in the order of the rows"""
+    complex_array=np.array(sparameter_complex,dtype=complex)
+    if complex_array.ndim<2:
+        return np.zeros(0),np.zeros((0,0),dtype=complex)
+    return complex_array[:,0].real.copy(),complex_array[:,1:]
+
+def sparameter_arrays_to_data(frequency,sparameters,format="RI"):
+    """Returns a float array of touchstone data rows given a frequency array and a complex array with one column
+    per parameter. The columns are [Frequency,reS11,imS11..] for RI, [Frequency,magS11,argS11..] for MA and
+    [Frequency,dbS11,argS11..] for DB, all angles are in degrees. This is the array form of change_data_format"""
+    frequency=np.asarray(frequency,dtype=float)
+    sparameters=np.asarray(sparameters,dtype=complex).reshape(len(frequency),-1)
+    data=np.empty((len(frequency),1+2*sparameters.shape[1]))
+    data[:,0]=frequency
+    format_code=format[:2].lower()
+    if format_code=='ri':
+        data[:,1::2]=sparameters.real
+        data[:,2::2]=sparameters.imag
+    elif format_code in ['ma','db']:
+        magnitude=np.abs(sparameters)
+        if format_code=='db':
+            with np.errstate(divide='ignore'):
+                magnitude=20.*np.log10(magnitude)
+        data[:,1::2]=magnitude
+        data[:,2::2]=(180./math.pi)*np.angle(sparameters)
+    else:
+        raise TypeError("The format must be one of {0}".format(FORMATS))
+    return data
+
+def sparameter_arrays_to_model(model,frequency,sparameters,**options):
+    """Returns a new touchstone model of class model (S1PV1 or S2PV1) given a frequency array and a complex array
+    with one column per parameter. The data and sparameter_complex attributes are built in one step from the
+    arrays, in the format of the option_line option, so the constructor does not convert row by row."""
+    option_line=options.get("option_line","# GHz S RI R 50")
+    data_format=OPTION_LINE_REGEX.search(option_line).groupdict()["Format"]
+    frequency=np.asarray(frequency,dtype=float)
+    sparameters=np.asarray(sparameters,dtype=complex).reshape(len(frequency),-1)
+    sparameter_columns=[column.tolist() for column in sparameters.T]
+    options["sparameter_complex"]=list(map(list,zip(frequency.tolist(),*sparameter_columns)))
+    options["data"]=sparameter_arrays_to_data(frequency,sparameters,data_format).tolist()
+    return model(None,**options)
+
+def s1p_from_arrays(frequency,s11,**options):
+    """Returns a S1PV1 model given a frequency array and a complex S11 array, options are passed to S1PV1"""
+    return sparameter_arrays_to_model(S1PV1,frequency,s11,**options)
+
+def s2p_from_arrays(frequency,sparameters,**options):
+    """Returns a S2PV1 model given a frequency array and a complex array of shape (number_frequencies,4) with the
+    columns in the order [S11,S21,S12,S22], options are passed to S2PV1"""
+    return sparameter_arrays_to_model(S2PV1,frequency,sparameters,**options)
+
 #-----------------------------------------------------------------------------
 # Module Classes
 
 # TODO: make a SNPBase class that has save, change_frequency_units,get_column, __str__, methods
 # TODO: This doesnt work because .__init__ is so different for each class
-class SNPBase():
+class SNPBase(ColumnCacheMixin):
     """SNPBase is a class with methods that are common across all the Touchstone models.
     It is only meant as a base class to inherit, not to instantiate by itself"""
     def __init__(self):
@@ -397,12 +457,11 @@ class SNPBase():
             if self.options["sparameter_row_formatter_string"] is None:
                 use_row_formatter_string=False
             if use_row_formatter_string:
-                list_formatter=[item.replace("{"+str(index),"{0")
-                                for index,item in enumerate(self.options["sparameter_row_formatter_string"].split("{delimiter}"))]
+                cell_formatters=compile_cell_formatters(self.options["sparameter_row_formatter_string"],
+                                                        len(self.column_names))
             else:
-                list_formatter=["{0}" for i in self.column_names]
-            out_list=[{self.column_names[i]:list_formatter[i].format(value) for i,value in enumerate(line)}
-                      for line in self.data]
+                cell_formatters=compile_cell_formatters(None,len(self.column_names))
+            out_list=data_dictionary_list(self.column_names,cell_formatters,self.data)
             return out_list
         except:raise
 
@@ -430,7 +489,8 @@ class SNPBase():
             old_unit=old_prefix+unit
             new_unit=new_prefix+unit
             if column_selector in self.column_names:
-                column_selector=self.column_names.index(column_selector)
+                column_selector=self.get_column_index(column_selector)
+            self.clear_column_cache()
             for index,row in enumerate(self.data[:]):
                 if type(self.data[index][column_selector]) in [FloatType,LongType]:
                     #print "{0:e}".format(multipliers[old_prefix]/multipliers[new_prefix])
@@ -483,12 +543,11 @@ class SNPBase():
             else:
                 column_selector=column_index
         else:
-            column_selector=self.column_names.index(column_name)
-        out_list=[self.data[i][column_selector] for i in range(len(self.data))]
+            column_selector=self.get_column_index(column_name)
+        out_list=[row[column_selector] for row in self.data]
         return out_list
     def __getitem__(self, items):
         """Controls how the model responds to self["Item"]"""
-        out_data=[]
         column_selectors=[]
         #print items[0]
         if type(items) in [StringType,IntType]:
@@ -505,14 +564,8 @@ class SNPBase():
                 if isinstance(item, IntType):
                     column_selectors.append(item)
                 else:
-                    #print self.column_names
-                    column_selectors.append(self.column_names.index(item))
-            for row in self.data[:]:
-                new_row=[]
-                for selector in column_selectors:
-                    new_row.append(row[selector])
-                out_data.append(new_row)
-            return out_data
+                    column_selectors.append(self.get_column_index(item))
+            return select_row_columns(self.data,column_selectors)
 
     def show(self, **options):
         """Plots any table with frequency as its x-axis and column_names as the x-axis in a
@@ -647,14 +700,14 @@ class S1PV1(SNPBase):
             for key,value in match.groupdict().items():
                 self.__dict__[key.lower()]=value
             if re.match('db',self.format,re.IGNORECASE):
-                self.column_names=S2P_DB_COLUMN_NAMES
-                self.row_pattern=make_row_match_string(S2P_DB_COLUMN_NAMES)
+                self.column_names=S1P_DB_COLUMN_NAMES
+                self.row_pattern=make_row_match_string(S1P_DB_COLUMN_NAMES)
             elif re.match('ma',self.format,re.IGNORECASE):
-                self.column_names=S2P_MA_COLUMN_NAMES
-                self.row_pattern=make_row_match_string(S2P_MA_COLUMN_NAMES)
+                self.column_names=S1P_MA_COLUMN_NAMES
+                self.row_pattern=make_row_match_string(S1P_MA_COLUMN_NAMES)
             elif re.match('ri',self.format,re.IGNORECASE):
-                self.column_names=S2P_RI_COLUMN_NAMES
-                self.row_pattern=make_row_match_string(S2P_RI_COLUMN_NAMES)
+                self.column_names=S1P_RI_COLUMN_NAMES
+                self.row_pattern=make_row_match_string(S1P_RI_COLUMN_NAMES)
             # now we handle the cases if data or sparameter_complex is specified
             if self.data is [] and self.sparameter_complex is[]:
                 pass
@@ -680,6 +733,7 @@ class S1PV1(SNPBase):
             else:
                 self.path=self.options["path"]
 
+    @timed()
     def __read_and_fix__(self):
         """Reads a s2pv1 file and fixes any problems with delimiters. Since s2p files may use
         any white space or combination of white space as data delimiters it reads the data and creates
@@ -709,11 +763,12 @@ class S1PV1(SNPBase):
         self.option_line=default_option_line
         add_option_line=1
         for index,line in enumerate(self.lines):
-            if re.search(OPTION_LINE_PATTERN,line,re.IGNORECASE):
+            option_match=OPTION_LINE_REGEX.search(line)
+            if option_match:
                 #print line
                 self.option_line=line.replace("\n","")
                 self.options["option_line_line"]=index
-                match=re.search(OPTION_LINE_PATTERN,line,re.IGNORECASE)
+                match=option_match
                 add_option_line=0
 
 
@@ -735,11 +790,12 @@ class S1PV1(SNPBase):
         self.sparameter_complex=[]
         self.options["sparameter_begin_line"]=self.options["sparameter_end_line"]=0
         data_lines=[]
+        row_regex=get_compiled_pattern(self.row_pattern)
         for index,line in enumerate(stripped_lines):
-            if re.search(self.row_pattern,line):
+            row_match=row_regex.search(line)
+            if row_match:
                 data_lines.append(index)
-                #print re.search(self.row_pattern,line).groupdict()
-                row_data=re.search(self.row_pattern,line).groupdict()
+                row_data=row_match.groupdict()
                 self.add_sparameter_row(row_data=row_data)
                 self.add_sparameter_complex_row(row_data=row_data)
         if data_lines != []:
@@ -773,17 +829,16 @@ class S1PV1(SNPBase):
                 else:
                     inline_comments.append(comment)
         # now start writting data at first empty line after the option line
+        format_sparameter_row=compile_row_formatter(self.options["sparameter_row_formatter_string"],
+                                                    self.options["data_delimiter"])
+        comment_lines=set(comment_lines)
         for index,line in enumerate(out_lines):
             if index==self.options["option_line_line"]:
                 pass
             elif index in comment_lines:
                 pass
             elif self.data not in [[],None] and index>=self.options["sparameter_begin_line"] and index <=self.options["sparameter_end_line"]:
-                # print out_lines
-                #print index
-                out_lines[index]=self.options["sparameter_row_formatter_string"].format(
-                    delimiter=self.options["data_delimiter"],
-                    *self.data[index-self.options["sparameter_begin_line"]])
+                out_lines[index]=format_sparameter_row(self.data[index-self.options["sparameter_begin_line"]])
         if inline_comments:
             for comment in inline_comments:
                 out_lines=insert_inline_comment(out_lines,comment=comment[0],
@@ -835,20 +890,22 @@ class S1PV1(SNPBase):
         out_row=[]
         try:
             if isinstance(row_data, StringType):
-                row_data=re.search(self.row_pattern,row_data).groupdict()
+                row_data=get_compiled_pattern(self.row_pattern).search(row_data).groupdict()
             elif isinstance(row_data, ListType):
                 row_data={self.column_names[index]:row_data[index] for index in range(3)}
             if not isinstance(row_data, DictionaryType):
                 raise
             row_data={key:float(value) for key,value in row_data.items()}
+            # equivalent to re.match(format,self.format,re.IGNORECASE) without a regular expression per row
+            format_code=self.format[:2].lower()
             # now row data is in dictionary form with known keys, the tranformation is only based on self.format
-            if re.match('db',self.format,re.IGNORECASE):
+            if format_code=='db':
                 S11=cmath.rect(10.**(row_data["dbS11"]/20.),(math.pi/180.)*row_data["argS11"])
                 out_row=[row_data["Frequency"],S11]
-            elif re.match('ma',self.format,re.IGNORECASE):
+            elif format_code=='ma':
                 S11=cmath.rect(row_data["magS11"],(math.pi/180.)*row_data["argS11"])
                 out_row=[row_data["Frequency"],S11]
-            elif re.match('ri',self.format,re.IGNORECASE):
+            elif format_code=='ri':
                 S11=complex(row_data["reS11"],row_data["imS11"])
                 out_row=[row_data["Frequency"],S11]
             return out_row
@@ -858,6 +915,7 @@ class S1PV1(SNPBase):
 
 
 
+    @timed()
     def change_data_format(self,new_format=None):
         """Changes the data format to new_format. Format must be one of the following: 'DB','MA','RI'
         standing for Decibel-Angle, Magnitude-Angle or Real-Imaginary as per the touchstone specification
@@ -869,36 +927,24 @@ class S1PV1(SNPBase):
             self.option_line=self.option_line.replace(old_format,"DB")
             self.column_names=S1P_DB_COLUMN_NAMES
             self.row_pattern=make_row_match_string(S1P_DB_COLUMN_NAMES)
-            for row_index,row in enumerate(self.data):
-                frequency=self.sparameter_complex[row_index][0]
-                dbS11=20.*math.log(abs(self.sparameter_complex[row_index][1]),10.)
-                argS11=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][1])
-                self.data[row_index]=[frequency,dbS11,argS11]
-
         elif re.match('ma',new_format,re.IGNORECASE):
             self.format="MA"
             self.option_line=self.option_line.replace(old_format,"MA")
             self.column_names=S1P_MA_COLUMN_NAMES
             self.row_pattern=make_row_match_string(S1P_MA_COLUMN_NAMES)
-            for row_index,row in enumerate(self.data):
-                frequency=self.sparameter_complex[row_index][0]
-                magS11=abs(self.sparameter_complex[row_index][1])
-                argS11=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][1])
-                self.data[row_index]=[frequency,magS11,argS11]
-
         elif re.match('ri',new_format,re.IGNORECASE):
             self.format="RI"
             self.option_line=self.option_line.replace(old_format,"RI")
             self.column_names=S1P_RI_COLUMN_NAMES
             self.row_pattern=make_row_match_string(S1P_RI_COLUMN_NAMES)
-            for row_index,row in enumerate(self.data):
-                frequency=self.sparameter_complex[row_index][0]
-                reS11=self.sparameter_complex[row_index][1].real
-                imS11=self.sparameter_complex[row_index][1].imag
-                self.data[row_index]=[frequency,reS11,imS11]
         else:
             print("Could not change data format the specified format was not DB, MA, or RI")
             return
+        # the data rows are derived from sparameter_complex in one array operation
+        if self.sparameter_complex:
+            frequency,sparameters=sparameter_complex_to_arrays(self.sparameter_complex)
+            self.data[:]=sparameter_arrays_to_data(frequency,sparameters,self.format).tolist()
+        self.clear_column_cache()
 
 
 
@@ -991,6 +1037,7 @@ class S2PV1(SNPBase):
             else:
                 self.path=self.options["path"]
 
+    @timed()
     def __read_and_fix__(self):
         """Reads a s2pv1 file and fixes any problems with delimiters. Since s2p files may use
         any white space or combination of white space as data delimiters it reads the data and creates
@@ -1020,11 +1067,12 @@ class S2PV1(SNPBase):
         self.option_line=default_option_line
         add_option_line=1
         for index,line in enumerate(self.lines):
-            if re.search(OPTION_LINE_PATTERN,line,re.IGNORECASE):
+            option_match=OPTION_LINE_REGEX.search(line)
+            if option_match:
                 #print line
                 self.option_line=line.replace("\n","")
                 self.options["option_line_line"]=index
-                match=re.search(OPTION_LINE_PATTERN,line,re.IGNORECASE)
+                match=option_match
                 add_option_line=0
         # set the attributes associated with the option line
         for key,value in match.groupdict().items():
@@ -1049,16 +1097,20 @@ class S2PV1(SNPBase):
         self.options["noiseparameter_begin_line"]=self.options["noiseparameter_end_line"]=0
         data_lines=[]
         noise_lines=[]
+        row_regex=get_compiled_pattern(self.row_pattern)
+        noiseparameter_row_regex=get_compiled_pattern(self.noiseparameter_row_pattern)
         for index,line in enumerate(stripped_lines):
-            if re.search(self.row_pattern,line):
+            row_match=row_regex.search(line)
+            if row_match:
                 data_lines.append(index)
-                #print re.search(self.row_pattern,line).groupdict()
-                row_data=re.search(self.row_pattern,line).groupdict()
+                row_data=row_match.groupdict()
                 self.add_sparameter_row(row_data=row_data)
                 self.add_sparameter_complex_row(row_data=row_data)
-            elif re.match(self.noiseparameter_row_pattern,line):
+                continue
+            noise_match=noiseparameter_row_regex.match(line)
+            if noise_match:
                 noise_lines.append(index)
-                row_data=re.match(self.noiseparameter_row_pattern,line).groupdict()
+                row_data=noise_match.groupdict()
                 self.add_noiseparameter_row(row_data=row_data)
         if data_lines != []:
             self.options["sparameter_begin_line"]=min(data_lines)+add_option_line
@@ -1099,23 +1151,21 @@ class S2PV1(SNPBase):
                     inline_comments.append(comment)
         #print("{0} is {1}".format('out_lines',out_lines))
         # now start writting data at first empty line after the option line
+        format_sparameter_row=compile_row_formatter(self.options["sparameter_row_formatter_string"],
+                                                    self.options["data_delimiter"])
+        comment_lines=set(comment_lines)
         for index,line in enumerate(out_lines):
             if index==self.options["option_line_line"]:
                 pass
             elif index in comment_lines:
                 pass
             elif self.data not in [[],None] and index>=self.options["sparameter_begin_line"] and index <=self.options["sparameter_end_line"]:
-                # print out_lines
-                #print index
-                out_lines[index]=self.options["sparameter_row_formatter_string"].format(
-                    delimiter=self.options["data_delimiter"],
-                    *self.data[index-self.options["sparameter_begin_line"]])
+                out_lines[index]=format_sparameter_row(self.data[index-self.options["sparameter_begin_line"]])
 
             elif self.noiseparameter_data not in [[],None] and index>=self.options["noiseparameter_begin_line"] and index <=self.options["noiseparameter_end_line"]:
-                #print out_lines
-                #print (index-self.options["noiseparameter_begin_line"])
-                out_lines[index]=self.options["nosieparameter_row_formatter_string"].format(
-                    delimiter=self.options["data_delimiter"],*self.noiseparameter_data[index-self.options["noiseparameter_begin_line"]])
+                out_lines[index]=compile_row_formatter(self.options["nosieparameter_row_formatter_string"],
+                                                       self.options["data_delimiter"])(
+                    self.noiseparameter_data[index-self.options["noiseparameter_begin_line"]])
         #print("{0} is {1}".format('out_lines',out_lines))
         #print("{0} is {1}".format('inline_comments',inline_comments))
         if inline_comments:
@@ -1173,26 +1223,28 @@ class S2PV1(SNPBase):
         out_row=[]
         try:
             if isinstance(row_data, StringType):
-                row_data=re.search(self.row_pattern,row_data).groupdict()
+                row_data=get_compiled_pattern(self.row_pattern).search(row_data).groupdict()
             elif isinstance(row_data, ListType):
                 row_data={self.column_names[index]:row_data[index] for index in range(9)}
             if not isinstance(row_data, DictionaryType):
                 raise
             row_data={key:float(value) for key,value in row_data.items()}
+            # equivalent to re.match(format,self.format,re.IGNORECASE) without a regular expression per row
+            format_code=self.format[:2].lower()
             # now row data is in dictionary form with known keys, the tranformation is only based on self.format
-            if re.match('db',self.format,re.IGNORECASE):
+            if format_code=='db':
                 S11=cmath.rect(10.**(row_data["dbS11"]/20.),(math.pi/180.)*row_data["argS11"])
                 S21=cmath.rect(10.**(row_data["dbS21"]/20.),(math.pi/180.)*row_data["argS21"])
                 S12=cmath.rect(10.**(row_data["dbS12"]/20.),(math.pi/180.)*row_data["argS12"])
                 S22=cmath.rect(10.**(row_data["dbS22"]/20.),(math.pi/180.)*row_data["argS22"])
                 out_row=[row_data["Frequency"],S11,S21,S12,S22]
-            elif re.match('ma',self.format,re.IGNORECASE):
+            elif format_code=='ma':
                 S11=cmath.rect(row_data["magS11"],(math.pi/180.)*row_data["argS11"])
                 S21=cmath.rect(row_data["magS21"],(math.pi/180.)*row_data["argS21"])
                 S12=cmath.rect(row_data["magS12"],(math.pi/180.)*row_data["argS12"])
                 S22=cmath.rect(row_data["magS22"],(math.pi/180.)*row_data["argS22"])
                 out_row=[row_data["Frequency"],S11,S21,S12,S22]
-            elif re.match('ri',self.format,re.IGNORECASE):
+            elif format_code=='ri':
                 S11=complex(row_data["reS11"],row_data["imS11"])
                 S21=complex(row_data["reS21"],row_data["imS21"])
                 S12=complex(row_data["reS12"],row_data["imS12"])
@@ -1222,6 +1274,7 @@ class S2PV1(SNPBase):
         self.options["noiseparameter_end_line"]+=1
 
 
+    @timed()
     def change_data_format(self,new_format=None):
         """Changes the data format to new_format. Format must be one of the following: 'DB','MA','RI'
         standing for Decibel-Angle, Magnitude-Angle or Real-Imaginary as per the touchstone specification
@@ -1233,56 +1286,27 @@ class S2PV1(SNPBase):
             self.option_line=self.option_line.replace(old_format,"DB")
             self.column_names=S2P_DB_COLUMN_NAMES
             self.row_pattern=make_row_match_string(S2P_DB_COLUMN_NAMES)
-            for row_index,row in enumerate(self.sparameter_complex):
-                frequency=self.sparameter_complex[row_index][0]
-                dbS11=20.*math.log(abs(self.sparameter_complex[row_index][1]),10.)
-                argS11=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][1])
-                dbS21=20.*math.log(abs(self.sparameter_complex[row_index][2]),10.)
-                argS21=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][2])
-                dbS12=20.*math.log(abs(self.sparameter_complex[row_index][3]),10.)
-                argS12=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][3])
-                dbS22=20.*math.log(abs(self.sparameter_complex[row_index][4]),10.)
-                argS22=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][4])
-                self.data[row_index]=[frequency,dbS11,argS11,dbS21,argS21,dbS12,argS12,dbS22,argS22]
-
         elif re.match('ma',new_format,re.IGNORECASE):
             self.format="MA"
             self.option_line=self.option_line.replace(old_format,"MA")
             self.column_names=S2P_MA_COLUMN_NAMES
             self.row_pattern=make_row_match_string(S2P_MA_COLUMN_NAMES)
-            for row_index,row in enumerate(self.sparameter_complex):
-                frequency=self.sparameter_complex[row_index][0]
-                magS11=abs(self.sparameter_complex[row_index][1])
-                argS11=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][1])
-                magS21=abs(self.sparameter_complex[row_index][2])
-                argS21=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][2])
-                magS12=abs(self.sparameter_complex[row_index][3])
-                argS12=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][3])
-                magS22=abs(self.sparameter_complex[row_index][4])
-                argS22=(180./math.pi)*cmath.phase(self.sparameter_complex[row_index][4])
-                self.data[row_index]=[frequency,magS11,argS11,magS21,argS21,magS12,argS12,magS22,argS22]
-
         elif re.match('ri',new_format,re.IGNORECASE):
             self.format="RI"
             self.option_line=self.option_line.replace(old_format,"RI")
             self.column_names=S2P_RI_COLUMN_NAMES
             self.row_pattern=make_row_match_string(S2P_RI_COLUMN_NAMES)
-            for row_index,row in enumerate(self.sparameter_complex):
-                frequency=self.sparameter_complex[row_index][0]
-                reS11=self.sparameter_complex[row_index][1].real
-                imS11=self.sparameter_complex[row_index][1].imag
-                reS21=self.sparameter_complex[row_index][2].real
-                imS21=self.sparameter_complex[row_index][2].imag
-                reS12=self.sparameter_complex[row_index][3].real
-                imS12=self.sparameter_complex[row_index][3].imag
-                reS22=self.sparameter_complex[row_index][4].real
-                imS22=self.sparameter_complex[row_index][4].imag
-                self.data[row_index]=[frequency,reS11,imS11,reS21,imS21,reS12,imS12,reS22,imS22]
         else:
             print("Could not change data format the specified format was not DB, MA, or RI")
             return
+        # the data rows are derived from sparameter_complex in one array operation
+        if self.sparameter_complex:
+            frequency,sparameters=sparameter_complex_to_arrays(self.sparameter_complex)
+            self.data[:]=sparameter_arrays_to_data(frequency,sparameters,self.format).tolist()
+        self.clear_column_cache()
 
 
+    @timed()
     def correct_switch_terms(self,switch_terms=None,switch_terms_format='port'):
         """Corrects sparameter data for switch terms. Switch terms must be a list with a row of format
         [Frequency,SWF,SWR] where SWF is the complex foward switch term (SWport2),
@@ -1444,6 +1468,7 @@ class SNP(SNPBase):
                                                                       *row[offset:offset+span]))
         #print("{0} is {1}".format("len(self.sparameter_lines)",len(self.sparameter_lines)))
         self.options["column_types"]=["float" for column in self.column_names[:]]
+    @timed()
     def __read_and_fix__(self):
         """Reads a snp v1 file and fixes any problems with delimiters. Since snp files may use
         any white space or combination of white space as data delimiters it reads the data and creates
@@ -1466,9 +1491,9 @@ class SNP(SNPBase):
                 removed_lines.append(index)
                 continue
             #if the line is an option line collect it
-            elif re.search(OPTION_LINE_PATTERN,line,re.IGNORECASE):
+            elif OPTION_LINE_REGEX.search(line):
                 continue
-            elif re.match(COMMENT_PATTERN,line,re.IGNORECASE):
+            elif COMMENT_REGEX.match(line):
                 continue
             else:
                 self.data_lines.append(line)
@@ -1494,11 +1519,12 @@ class SNP(SNPBase):
         self.option_line=default_option_line
         add_option_line=1
         for index,line in enumerate(self.lines):
-            if re.search(OPTION_LINE_PATTERN,line,re.IGNORECASE):
+            option_match=OPTION_LINE_REGEX.search(line)
+            if option_match:
                 #print line
                 self.option_line=line.replace("\n","")
                 self.options["option_line_line"]=index
-                match=re.search(OPTION_LINE_PATTERN,line,re.IGNORECASE)
+                match=option_match
                 add_option_line=0
         # set the attributes associated with the option line
         for key,value in match.groupdict().items():
@@ -1626,21 +1652,23 @@ class SNP(SNPBase):
             if not isinstance(row_data, DictionaryType):
                 raise
             row_data={key:float(value) for key,value in row_data.items()}
+            # equivalent to re.match(format,self.format,re.IGNORECASE) without a regular expression per row
+            format_code=self.format[:2].lower()
             # now row data is in dictionary form with known keys, the tranformation is only based on self.format
             if self.number_ports==2:
-                if re.match('db',self.format,re.IGNORECASE):
+                if format_code=='db':
                     S11=cmath.rect(10.**(row_data["dbS11"]/20.),(math.pi/180.)*row_data["argS11"])
                     S21=cmath.rect(10.**(row_data["dbS21"]/20.),(math.pi/180.)*row_data["argS21"])
                     S12=cmath.rect(10.**(row_data["dbS12"]/20.),(math.pi/180.)*row_data["argS12"])
                     S22=cmath.rect(10.**(row_data["dbS22"]/20.),(math.pi/180.)*row_data["argS22"])
                     out_row=[row_data["Frequency"],S11,S21,S12,S22]
-                elif re.match('ma',self.format,re.IGNORECASE):
+                elif format_code=='ma':
                     S11=cmath.rect(row_data["magS11"],(math.pi/180.)*row_data["argS11"])
                     S21=cmath.rect(row_data["magS21"],(math.pi/180.)*row_data["argS21"])
                     S12=cmath.rect(row_data["magS12"],(math.pi/180.)*row_data["argS12"])
                     S22=cmath.rect(row_data["magS22"],(math.pi/180.)*row_data["argS22"])
                     out_row=[row_data["Frequency"],S11,S21,S12,S22]
-                elif re.match('ri',self.format,re.IGNORECASE):
+                elif format_code=='ri':
                     S11=complex(row_data["reS11"],row_data["imS11"])
                     S21=complex(row_data["reS21"],row_data["imS21"])
                     S12=complex(row_data["reS12"],row_data["imS12"])
@@ -1648,7 +1676,7 @@ class SNP(SNPBase):
                     out_row=[row_data["Frequency"],S11,S21,S12,S22]
                 return out_row
             elif self.number_ports!=2:
-                if re.match('ri',self.format,re.IGNORECASE):
+                if format_code=='ri':
                     re_values=self.column_names[1::2]
                     im_values=self.column_names[2::2]
                     complex_values=[]
@@ -1656,7 +1684,7 @@ class SNP(SNPBase):
                         complex_s=complex(row_data[value],row_data[im_values[index]])
                         complex_values.append(complex_s)
                     out_row=[row_data["Frequency"]]+complex_values
-                elif re.match('ma',self.format,re.IGNORECASE):
+                elif format_code=='ma':
                     mag_values=self.column_names[1::2]
                     arg_values=self.column_names[2::2]
                     complex_values=[]
@@ -1664,7 +1692,7 @@ class SNP(SNPBase):
                         complex_s=cmath.rect(row_data[value],(math.pi/180.)*row_data[arg_values[index]])
                         complex_values.append(complex_s)
                     out_row=[row_data["Frequency"]]+complex_values
-                elif re.match('db',self.format,re.IGNORECASE):
+                elif format_code=='db':
                     db_values=self.column_names[1::2]
                     arg_values=self.column_names[2::2]
                     complex_values=[]
@@ -1676,6 +1704,7 @@ class SNP(SNPBase):
         except:
             print("Could not convert row to a complex row")
             raise
+    @timed()
     def change_data_format(self,new_format=None):
         """Changes the data format to new_format. Format must be one of the following: 'DB','MA','RI'
         standing for Decibel-Angle, Magnitude-Angle or Real-Imaginary as per the touchstone specification
@@ -1736,6 +1765,7 @@ class SNP(SNPBase):
         else:
             print("Could not change data format the specified format was not DB, MA, or RI")
             return
+        self.clear_column_cache()
     def show(self,**options):
         """Shows the touchstone file"""
         defaults={"display_legend":True,
@@ -1960,6 +1990,38 @@ def test_add_comment(file_path="thru.s2p"):
     s2p.add_comment("A new comment")
     print(s2p)
 
+def test_touchstone_parsing_performance(number_frequencies=20000):
+    """Micro-benchmarks of the line scanning in S2PV1 and SNP on a generated s2p file, comparing the
+    compiled single pass row and option line matching with the per-line re.search calls it replaced"""
+    import time
+    import tempfile
+    lines=["! A generated file\n","# GHz S RI R 50\n"]
+    for index in range(number_frequencies):
+        lines.append(" ".join(["{0:.6g}".format(0.1+index*0.001)]+["{0:.6g}".format(0.01*(index%7)-j*0.002)
+                                                                  for j in range(8)])+"\n")
+    file_handle,file_path=tempfile.mkstemp(suffix=".s2p")
+    os.close(file_handle)
+    out_file=open(file_path,"w")
+    out_file.writelines(lines)
+    out_file.close()
+    row_pattern=make_row_match_string(S2P_RI_COLUMN_NAMES)
+    start=time.time()
+    legacy_rows=[re.search(row_pattern,line).groupdict() for line in lines if re.search(row_pattern,line)]
+    legacy_options=[line for line in lines if re.search(OPTION_LINE_PATTERN,line,re.IGNORECASE)]
+    legacy_time=time.time()-start
+    start=time.time()
+    row_regex=get_compiled_pattern(row_pattern)
+    rows=[match.groupdict() for match in map(row_regex.search,lines) if match]
+    options=[line for line in lines if OPTION_LINE_REGEX.search(line)]
+    new_time=time.time()-start
+    print(("Row and option line matching: legacy {0:.4f} s, now {1:.4f} s, same result {2}".format(
+        legacy_time,new_time,legacy_rows==rows and legacy_options==options)))
+    for model in [S2PV1,SNP]:
+        start=time.time()
+        table=model(file_path)
+        print(("{0} read {1} frequencies in {2:.4f} s".format(model.__name__,len(table.data),time.time()-start)))
+    os.remove(file_path)
+
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
@@ -167,6 +167,10 @@ INKSCAPE_PATH=r'C:\Program Files (x86)\Inkscape\inkscape.exe'
 "Path to the Inkscape executable."
 WKHTML_PATH=r'C:\Program Files\wkhtmltopdf\bin\wkhtmltopdf.exe'
 "Path to the wkhtmltopdf executable."
+COLUMN_TYPE_DTYPES=[("int",np.int64),("float",np.float64),("com",np.complex128),("bool",np.bool_)]
+"AsciiDataTable column type prefixes and the numpy dtype used for them, other column types become object arrays."
+NUMERIC_DTYPE_KINDS="biufc"
+"numpy dtype kinds that are kept as typed arrays, anything else is held as an object array."
 
 
 #-----------------------------------------------------------------------------
@@ -330,7 +334,14 @@ def AsciiDataTable_to_XmlDataTable(ascii_data_table,**options):
             for index,line in enumerate(ascii_data_table.footer):
                 key="Footer_{0:0>3}".format(index)
                 data_description[key]=line
-    data_dictionary={"Data_Description":data_description,"Data":ascii_data_table.get_data_dictionary_list()}
+    if ascii_data_table.options["row_formatter_string"] is None:
+        # the rows go straight to the bulk writer with the table's schema
+        data=ascii_data_table.data
+        XML_options["column_names"]=ascii_data_table.column_names
+        XML_options["column_types"]=ascii_data_table.options["column_types"]
+    else:
+        data=ascii_data_table.get_data_dictionary_list()
+    data_dictionary={"Data_Description":data_description,"Data":data}
     XML_options["data_dictionary"]=data_dictionary
     new_xml_data_table=DataTable(None,**XML_options)
     return new_xml_data_table
@@ -343,7 +354,21 @@ def XmlBase_to_XsltResultString(xml_model,**options):
         transform_options[key]=value
     for key,value in options.items():
         transform_options[key]=value
-    return xml_model.to_HTML(**transform_options)
+    return xml_model.to_HTML(XSLT=transform_options["style_sheet"])
+
+def XmlBaseList_to_XsltResultStringList(xml_model_list,**options):
+    """Applies one style sheet to a list of xml models and returns a list of HTML strings. The style sheet is
+    compiled once, **{"parallel":True} renders the models in a thread pool"""
+    defaults={"style_sheet":os.path.join(TESTS_DIRECTORY,XSLT_REPOSITORY,"DEFAULT_STYLE.xsl"),
+              "parallel":False,
+              "max_workers":None}
+    transform_options={}
+    for key,value in defaults.items():
+        transform_options[key]=value
+    for key,value in options.items():
+        transform_options[key]=value
+    return batch_to_HTML(xml_model_list,XSLT=transform_options["style_sheet"],
+                         parallel=transform_options["parallel"],max_workers=transform_options["max_workers"])
 
 def XmlBase_to_XsltResultFile(xml_model,**options):
     """Uses the xml_model's save_HTML method to return a HTML file"""
@@ -366,10 +391,76 @@ def XmlLog_to_AsciiDataTable(xml_log):
     ascii=AsciiDataTable(column_names=column_names,data=data,column_types=column_types)
     return ascii
 
+def column_type_to_dtype(column_type):
+    """Returns the numpy dtype for an AsciiDataTable column type ('float','int','complex',...) or None if the
+    column should be an object column or its type is not known"""
+    if column_type is None:
+        return None
+    for (pattern,dtype) in COLUMN_TYPE_DTYPES:
+        if get_compiled_pattern(pattern,re.IGNORECASE).match(str(column_type)):
+            return dtype
+    return None
+
+def column_to_NumpyArray(column,column_type=None):
+    """Converts a column list to a typed numpy array using column_type, the list is converted in one call
+    to numpy. Columns that are not numeric become object arrays holding the original python values"""
+    dtype=column_type_to_dtype(column_type)
+    try:
+        array=np.array(column,dtype=dtype)
+        if array.ndim==1 and array.dtype.kind in NUMERIC_DTYPE_KINDS:
+            return array
+    except (TypeError,ValueError,OverflowError):
+        pass
+    array=np.empty(len(column),dtype=object)
+    array[:]=column
+    return array
+
+def AsciiDataTable_to_NumpyColumnDictionary(data_table):
+    """Converts the data of an AsciiDataTable to a dictionary of column_name:typed 1-D numpy array. If every
+    column is numeric the table is converted in a single call and the columns are views of one 2-D array,
+    otherwise each column is converted once with column_to_NumpyArray"""
+    column_names=data_table.column_names
+    column_types=data_table.options.get("column_types")
+    if column_types is None:
+        column_types=[None for column_name in column_names]
+    if not data_table.data:
+        return dict([(column_name,np.array([],dtype=column_type_to_dtype(column_types[index])))
+                     for index,column_name in enumerate(column_names)])
+    dtypes=set([column_type_to_dtype(column_type) for column_type in column_types])
+    if len(dtypes)==1:
+        try:
+            block=np.array(data_table.data,dtype=dtypes.pop())
+            if block.ndim==2 and block.shape[1]==len(column_names) and block.dtype.kind in NUMERIC_DTYPE_KINDS:
+                return dict([(column_name,block[:,index]) for index,column_name in enumerate(column_names)])
+        except (TypeError,ValueError,OverflowError):
+            pass
+    columns=list(zip(*data_table.data))
+    return dict([(column_name,column_to_NumpyArray(columns[index],column_types[index]))
+                 for index,column_name in enumerate(column_names)])
+
+def NumpyColumnDictionary_to_AsciiDataTable(column_dictionary,**options):
+    """Converts a dictionary of column_name:1-D numpy array to an AsciiDataTable, each column is turned into
+    python values with one tolist call. options are passed to AsciiDataTable, column_names defaults to the
+    keys of the dictionary"""
+    conversion_options={"column_names":list(column_dictionary.keys())}
+    for key,value in options.items():
+        conversion_options[key]=value
+    columns=[np.asarray(column_dictionary[column_name]) for column_name in conversion_options["column_names"]]
+    if "column_types" not in options:
+        conversion_options["column_types"]=[str(column.dtype) for column in columns]
+    conversion_options["data"]=[list(row) for row in zip(*[column.tolist() for column in columns])]
+    new_table=AsciiDataTable(None,**conversion_options)
+    return new_table
+
 def AsciiDataTable_to_DataFrame(ascii_data_table):
     """Converts an AsciiDataTable to a pandas.DataFrame
-    discarding any header or footer information"""
-    data_frame=pandas.DataFrame(data=ascii_data_table.data,columns=ascii_data_table.column_names)
+    discarding any header or footer information. The columns are typed numpy arrays that the
+    DataFrame uses without copying again"""
+    column_dictionary=AsciiDataTable_to_NumpyColumnDictionary(ascii_data_table)
+    if len(column_dictionary)!=len(ascii_data_table.column_names):
+        # repeated column names can not be held in a dictionary
+        return pandas.DataFrame(data=ascii_data_table.data,columns=ascii_data_table.column_names)
+    data_frame=pandas.DataFrame(column_dictionary,columns=ascii_data_table.column_names,copy=False)
     return data_frame
 
 def AsciiDataTable_to_DataFrameDictionary(AsciiDataTable):
@@ -406,13 +497,12 @@ def AsciiDataTable_to_NumpyArray(data_table,exclude_columns=None):
     """Converts a table's data into a 1-D np.array"""
     column_names=data_table.column_names[:]
     if exclude_columns:
-        for column_name in column_names:
-            if column_name in exclude_columns:
-                column_names.remove(column_name)
-    data_list=[]
-    for column_name in column_names:
-        data_list=data_list+data_table[column_name]
-    numpy_array=np.array(data_list)
+        column_names=[column_name for column_name in column_names if column_name not in exclude_columns]
+    column_indices=[data_table.column_names.index(column_name) for column_name in column_names]
+    if not data_table.data:
+        return np.array([])
+    # convert the selected columns in a single call, laid end to end
+    numpy_array=np.array([[row[index] for row in data_table.data] for index in column_indices]).ravel()
     return numpy_array
 
 def DataFrameDictionary_to_ExcelFile(DataFrame_dict,excel_file_name="Test.xlsx"):
@@ -578,8 +668,15 @@ def DataFrame_to_AsciiDataTable(pandas_data_frame,**options):
         conversion_options[key]=value
 
     conversion_options["column_names"]=pandas_data_frame.columns.tolist()[:]
-    conversion_options["data"]=pandas_data_frame.values.tolist()[:]
     conversion_options["column_types"]=[str(x) for x in pandas_data_frame.dtypes.tolist()[:]]
+    if len(set(conversion_options["column_types"]))<=1:
+        # a single dtype is one block that converts to python values in one call
+        conversion_options["data"]=pandas_data_frame.to_numpy().tolist()
+    else:
+        # converting column by column avoids a 2-D object array of every value
+        columns=[pandas_data_frame.iloc[:,index].to_numpy().tolist()
+                 for index in range(len(conversion_options["column_names"]))]
+        conversion_options["data"]=[list(row) for row in zip(*columns)]
 
     new_table=AsciiDataTable(None,**conversion_options)
     return new_table
@@ -1933,6 +2030,45 @@ def test_AsciiDataTable_to_DataFrame(input_file="700437.asc"):
     data_frame.to_excel('one_port.xlsx', sheet_name='Sheet1')
     #print data_frame
 
+def test_NumpyInterop_performance(cell_numbers=(10**5,10**6,10**7),number_columns=10):
+    """Times AsciiDataTable_to_DataFrame, DataFrame_to_AsciiDataTable and AsciiDataTable_to_NumpyArray against
+    the nested list conversions they replaced for tables with cell_numbers cells"""
+    import time
+    for cell_number in cell_numbers:
+        number_rows=cell_number//number_columns
+        column_names=["Column_{0}".format(index) for index in range(number_columns)]
+        data=np.random.random_sample((number_rows,number_columns)).tolist()
+        table=AsciiDataTable(None,column_names=column_names,column_types=["float" for name in column_names],
+                             data=data)
+        start=time.time()
+        legacy_data_frame=pandas.DataFrame(data=table.data,columns=table.column_names)
+        legacy_to_time=time.time()-start
+        start=time.time()
+        data_frame=AsciiDataTable_to_DataFrame(table)
+        to_time=time.time()-start
+        start=time.time()
+        legacy_table=AsciiDataTable(None,column_names=legacy_data_frame.columns.tolist()[:],
+                                    data=legacy_data_frame.values.tolist()[:],
+                                    column_types=[str(x) for x in legacy_data_frame.dtypes.tolist()[:]])
+        legacy_from_time=time.time()-start
+        start=time.time()
+        new_table=DataFrame_to_AsciiDataTable(data_frame)
+        from_time=time.time()-start
+        start=time.time()
+        legacy_array=[]
+        for column_name in column_names[:3]:
+            legacy_array=legacy_array+table[column_name]
+        legacy_array=np.array(legacy_array)
+        legacy_array_time=time.time()-start
+        start=time.time()
+        array=AsciiDataTable_to_NumpyArray(table,exclude_columns=column_names[3:])
+        array_time=time.time()-start
+        print(("{0} cells: to DataFrame {1:.3f} s (was {2:.3f} s), to AsciiDataTable {3:.3f} s (was {4:.3f} s), "
+               "to 1-D array of 3 columns {5:.3f} s (was {6:.3f} s), same results {7}".format(
+            cell_number,to_time,legacy_to_time,from_time,legacy_from_time,array_time,legacy_array_time,
+            data_frame.equals(legacy_data_frame) and new_table.data==legacy_table.data and
+            np.array_equal(array,legacy_array))))
+
 def test_S2P_to_XmlDataTable(file_path="thru.s2p"):
     os.chdir(TESTS_DIRECTORY)
     s2p_file=S2PV1(file_path)
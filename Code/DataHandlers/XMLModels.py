@@ -57,6 +57,12 @@ try:
 except ImportError:
 	import urlparse 
 import socket                                      # To determine IPs and Hosts
+import copy
+import threading
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor=None
 from types import *                                # For Data Type testing
 import fnmatch
 #-----------------------------------------------------------------------------
@@ -151,6 +157,15 @@ NODE_TYPE_DICTIONARY={'ELEMENT_NODE':1, 'ATTRIBUTE_NODE':2, 'TEXT_NODE':3, \
 'NOTATION_NODE':12}
 """A dictionary of XML node types, where the key is the node type and the value is an integer that corresponds to
 node types in lxml module."""
+XML_ATTRIBUTE_ESCAPES=str.maketrans({"&":"&amp;","<":"&lt;",">":"&gt;",'"':"&quot;",
+                                     "\n":"&#10;","\r":"&#13;","\t":"&#9;"})
+"Translation table that escapes text for a double quoted XML attribute value."
+XSLT_CACHE={}
+"Compiled XSLT transforms keyed by (absolute style sheet path, modification time), see get_XSLT_transform."
+XSLT_CACHE_LOCK=threading.Lock()
+"Lock that guards XSLT_CACHE."
+HOST_CACHE={}
+"Cache of socket.gethostbyaddr results keyed by host name, '' is the local host."
 #-----------------------------------------------------------------------------
 # Module Functions
 
@@ -175,11 +190,9 @@ def join_xml(new_root="root",xml_document_list=None,**options):
     else:
         for index,xml_document in enumerate(xml_document_list):
             #print xml_document
-            new_entry=xml.document.documentElement.cloneNode(True)
-            Index_attribute=xml_document.document.createAttribute('Index')
-            new_entry.setAttributeNode(Index_attribute)
-            new_entry.setAttribute('Index',str(index))
-            new_xml.document.documentElement.appendChild(new_entry)
+            new_entry=copy.deepcopy(xml_document.etree)
+            new_entry.set('Index',str(index))
+            new_xml.etree.append(new_entry)
         return new_xml
 def make_xml_element(tag,text=None,**attribute_dictionary):
     """Returns an lxml.html.HtmlElement given a tag, content and attribute dictionary
@@ -246,23 +259,216 @@ def get_XML_text(tag_name,path=None,text=None):
      text)
     return tag_match.group('XML_text')
 
+def iter_log_entries(file_path,start_Index=None,stop_Index=None):
+    """Yields the entries of a saved XMLLog one at a time as dictionaries with the keys Index, Date and Entry
+    (like XMLLog.get_table) plus the text of any child elements. Uses lxml.etree.iterparse and releases each
+    element after it is read, so a log can be browsed without loading it. start_Index and stop_Index limit
+    the entries to start_Index<=Index<stop_Index"""
+    for event,element in etree.iterparse(file_path,events=("end",),tag="Entry"):
+        try:
+            Index=int(element.get("Index",""))
+        except ValueError:
+            Index=None
+        if (start_Index is None or (Index is not None and Index>=start_Index)) and \
+                (stop_Index is None or (Index is not None and Index<stop_Index)):
+            row={"Index":element.get("Index",""),"Date":element.get("Date",""),"Entry":element.text}
+            for child in element:
+                if isinstance(child.tag,StringType):
+                    row[child.tag]=child.text
+            yield row
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+def convert_column(column,column_type=None):
+    """Converts a list of attribute strings to column_type. The type names follow
+    GeneralModels.convert_row (int, float, str/char/object, complex), empty strings (and "None" from older
+    files) become None for the numeric types and any other type leaves the column as strings"""
+    if column_type is None or re.match('str|char|object',column_type,re.IGNORECASE):
+        return column
+    elif re.match('int',column_type,re.IGNORECASE):
+        type_function=int
+    elif re.match('float',column_type,re.IGNORECASE):
+        type_function=float
+    elif re.match('com',column_type,re.IGNORECASE):
+        type_function=complex
+    else:
+        return column
+    try:
+        return list(map(type_function,column))
+    except ValueError:
+        return [type_function(value) if value not in ('','None') else None for value in column]
+
+def data_rows_to_XML_string(data_list,column_names,column_types=None):
+    """Returns the <Data><Tuple .../></Data> block for a list of list rows as a string, built with a single
+    format template per row. Columns with a column_types of int, float or complex are written as is, with None
+    written as an empty attribute that convert_column reads back as None, all other columns are converted with
+    str and escaped"""
+    escape_columns=[not (column_types and re.match('int|float|com',column_types[index],re.IGNORECASE))
+                    for index in range(len(column_names))]
+    template="<Tuple "+" ".join(['{0}="%s"'.format(column_name) for column_name in column_names])+"/>"
+    rows=[]
+    if not any(escape_columns):
+        for row in data_list:
+            if any([value is None for value in row]):
+                row=['' if value is None else value for value in row]
+            rows.append(template%tuple(row))
+    else:
+        for row in data_list:
+            rows.append(template%tuple([str(value).translate(XML_ATTRIBUTE_ESCAPES) if escape
+                                        else ('' if value is None else value)
+                                        for value,escape in zip(row,escape_columns)]))
+    return "<Data>"+"".join(rows)+"</Data>"
+
+def read_data_table_columns(file_path,column_names=None,column_types=None):
+    """Reads the Tuple elements of a saved DataTable into a dictionary of column name:list of values without
+    building the tree, using lxml.etree.iterparse. The column names come from column_names or the attributes
+    of the first Tuple, column_types converts each column (see convert_column)"""
+    raw_columns=None
+    for event,element in etree.iterparse(file_path,events=("end",),tag="Tuple"):
+        if raw_columns is None:
+            if column_names is None:
+                column_names=list(element.keys())
+            raw_columns=[[] for column_name in column_names]
+            appends=[(column.append,column_name) for column,column_name in zip(raw_columns,column_names)]
+        get=element.get
+        for append,column_name in appends:
+            append(get(column_name,''))
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    columns={}
+    if raw_columns is None:
+        return columns
+    for index,column_name in enumerate(column_names):
+        if column_types:
+            columns[column_name]=convert_column(raw_columns[index],column_types[index])
+        else:
+            columns[column_name]=raw_columns[index]
+    return columns
+
+def get_XSLT_transform(style_sheet):
+    """Returns a compiled lxml.etree.XSLT for the style sheet at style_sheet. The transforms are shared by the
+    whole process and keyed by the absolute path and modification time, so an edited style sheet is
+    compiled again the next time it is used"""
+    if os.path.isfile(style_sheet):
+        path=os.path.abspath(style_sheet)
+        key=(path,os.path.getmtime(style_sheet))
+    else:
+        path=style_sheet
+        key=(style_sheet,None)
+    with XSLT_CACHE_LOCK:
+        transform=XSLT_CACHE.get(key)
+    if transform is None:
+        transform=etree.XSLT(etree.parse(style_sheet))
+        with XSLT_CACHE_LOCK:
+            for old_key in [old_key for old_key in XSLT_CACHE.keys() if old_key[0]==path]:
+                del XSLT_CACHE[old_key]
+            XSLT_CACHE[key]=transform
+    return transform
+
+def clear_XSLT_cache():
+    """Removes all of the compiled transforms from XSLT_CACHE"""
+    with XSLT_CACHE_LOCK:
+        XSLT_CACHE.clear()
+
+def batch_to_HTML(xml_documents,XSLT=None,**options):
+    """Returns a list of HTML strings, one for each item in xml_documents, which can be XMLBase instances,
+    lxml elements or paths to XML files. All of the documents use the style sheet XSLT, or their own
+    options['style_sheet'] if XSLT is None, and each style sheet is compiled once. Passing
+    **{'parallel':True,'max_workers':n} renders in a thread pool (lxml releases the GIL while transforming),
+    passing **{'file_paths':[...]} also saves each HTML string to the matching path"""
+    defaults={"parallel":False,"max_workers":None,"file_paths":None}
+    batch_options={}
+    for key,value in defaults.items():
+        batch_options[key]=value
+    for key,value in options.items():
+        batch_options[key]=value
+
+    def render(xml_document):
+        if isinstance(xml_document,XMLBase):
+            tree=xml_document.etree
+            style_sheet=XSLT or xml_document.options['style_sheet']
+        elif isinstance(xml_document,StringType):
+            tree=etree.parse(xml_document)
+            style_sheet=XSLT
+        else:
+            tree=xml_document
+            style_sheet=XSLT
+        return str(get_XSLT_transform(style_sheet)(tree))
+
+    if batch_options["parallel"] and ThreadPoolExecutor is not None:
+        with ThreadPoolExecutor(max_workers=batch_options["max_workers"]) as executor:
+            HTML_list=list(executor.map(render,xml_documents))
+    else:
+        HTML_list=[render(xml_document) for xml_document in xml_documents]
+    if batch_options["file_paths"]:
+        for file_path,HTML in zip(batch_options["file_paths"],HTML_list):
+            out_file=open(file_path,'w')
+            out_file.write(HTML)
+            out_file.close()
+    return HTML_list
+
 def URL_to_path(URL,form='string'):
     """Takes an URL and returns a path as form.
     Argument form may be 'string' or 'list'"""
     path=urlparse.urlparse(URL)[2]
+    # file:///C:/... gives /C:/..., a windows drive has no leading /
+    if re.match('/[A-Za-z]:',path):
+        path=path[1:]
     if form in ['string', 'str', 's']:
         return path
     elif form in ['list','ls','li']:
         path_list=path.split('/')
         return path_list
 
+def get_host_information(host=''):
+    """Returns the (host name, alias list, address list) of host as given by socket.gethostbyaddr,
+    an empty host is the local host. Results are kept in HOST_CACHE so registering many files
+    on one host does only one lookup, clear it if the network configuration changes"""
+    try:
+        return HOST_CACHE[host]
+    except KeyError:
+        if host in ['',None]:
+            host_information=socket.gethostbyaddr(socket.gethostname())
+        else:
+            host_information=socket.gethostbyaddr(host)
+        HOST_CACHE[host]=host_information
+        return host_information
+
 def condition_URL(URL):
     """ Function that makes sure URL's have a / format and assigns host as
-    local host if there is not one. Also gives paths a file protocol."""
-    parsed_URL=urlparse.urlparse(URL.replace('\\','/'))
+    local host if there is not one. Also gives paths a file protocol. Windows paths become file:C:/...,
+    absolute POSIX paths keep their root as file:///path and relative paths become file:path"""
+    URL=URL.replace('\\','/')
+    parsed_URL=urlparse.urlparse(URL)
     if not (parsed_URL[0] in ['file','http','ftp']):
-        parsed_URL=urlparse.urlparse('file:'+URL.replace('\\','/'))
-    return str(urlparse.urlunparse(parsed_URL).replace('///',''))
+        parsed_URL=urlparse.urlparse('file:'+URL)
+    if parsed_URL[0]=='file' and not parsed_URL[1] and not parsed_URL[2].startswith('/'):
+        return str('file:'+parsed_URL[2])
+    return str(re.sub('^file:///?(?=[A-Za-z]:)','file:',urlparse.urlunparse(parsed_URL)))
+def add_harvested_metadata(metadata,URL,harvested_metadata):
+    """Replaces the System_Metadata, File_Metadata, Image_Metadata and Python_Docstring elements of the file
+    node for URL in metadata (a Metadata or anything with the same node methods) with the
+    dictionary from pyMez.Code.Utils.GetMetadata.harvest_metadata, tags that are None are left alone"""
+    metadata.get_file_node(URL)
+    if harvested_metadata.get('System_Metadata') is not None:
+        metadata.remove_element_in_current_node('System_Metadata')
+        metadata.add_element_to_current_node(XML_tag='System_Metadata',**harvested_metadata['System_Metadata'])
+    for tag in ['File_Metadata','Image_Metadata']:
+        if harvested_metadata.get(tag) is None:
+            continue
+        new_info_node=etree.Element(tag)
+        for key,value in harvested_metadata[tag].items():
+            new_node=etree.SubElement(new_info_node,key)
+            new_node.text=str(value).replace(chr(30),'')
+        metadata.remove_element_in_current_node(tag)
+        metadata.add_element_to_current_node(node=new_info_node)
+    if harvested_metadata.get('Python_Docstring') is not None:
+        metadata.remove_element_in_current_node('Python_Docstring')
+        metadata.add_element_to_current_node(XML_tag='Python_Docstring',
+                                             value=str(harvested_metadata['Python_Docstring']))
+
 def determine_instrument_type_from_string(string):
     """ Given a string returns the instrument type"""
 
@@ -339,8 +545,10 @@ class HTMLEcho():
         return str(self.text)
 class XMLBase():
     """ The XMLBase Class is designed to be a container for xml data. It opens and parses any well formed XML
-    document, putting an lxml.document object in self.document. In addition it has helper methods for standard
-    operations including display as a string.
+    document, putting the lxml root element in self.etree. self.etree is the only tree that is kept, self.document
+    is a xml.dom.minidom view of it that is built on first use for legacy code. Changes made through self.document
+    are folded back into self.etree the next time self.etree is used. In addition it has helper methods
+    for standard operations including display as a string.
     """
     def __init__(self,file_path=None,**options):
         "Initializes the XML Base Class "
@@ -359,6 +567,8 @@ class XMLBase():
             self.options[key]=value
         for key,value in options.items():
             self.options[key]=value
+        self._etree=None
+        self._document=None
         # Define Method Aliases if they are available
         if METHOD_ALIASES:
             for command in alias(self):
@@ -366,16 +576,18 @@ class XMLBase():
         #if the file path is not supplied create a new xml sheet
         if file_path is None:
             if self.options["content"]:
-                self.document = xml.dom.minidom.parseString(self.options["content"])
+                content=self.options["content"]
+                if isinstance(content,StringType):
+                    content=content.encode("utf-8")
+                self.etree=etree.fromstring(content)
                 self.options["content"]=None
             else:
-                impl=getDOMImplementation()
-                self.document=impl.createDocument(None,self.options['root'],None)
+                self.etree=etree.Element(self.options['root'])
             # Should be a relative path for
             if self.options["style_sheet"] is not None:
-                new_node=self.document.createProcessingInstruction('xml-stylesheet',
+                new_node=etree.ProcessingInstruction('xml-stylesheet',
                 'type="text/xsl" href="{0}"'.format(self.options['style_sheet']))
-                self.document.insertBefore(new_node,self.document.documentElement)
+                self.etree.addprevious(new_node)
             if DEFAULT_FILE_NAME is None:
                 self.path=auto_name(self.options["specific_descriptor"],
                                     self.options["general_descriptor"],
@@ -385,22 +597,33 @@ class XMLBase():
                 # Just a backup plan if the python path is messed up
                 self.path=DEFAULT_FILE_NAME
         else:
-            try:
-                try:
-                    file_in = open(file_path, 'r', encoding="utf-8")
-                except:
-                    file_in = open(file_path, 'r')
-                self.document = xml.dom.minidom.parse(file_in)
-                file_in.close()
-                self.path = file_path
-            except:
-                file_in = open(file_path, 'r', encoding="utf-8")
-                content = str(file_in.read())
-                # print("File Content is {0}".format(content))
-                self.etree = etree.fromstring(content)
-                self.document = xml.dom.minidom.parseString(etree.tostring(self.etree, encoding="unicode"))
+            self.etree=etree.parse(file_path).getroot()
+            self.path=file_path
+
+    def _get_etree(self):
+        """Returns the root element, folding in any changes made through the legacy self.document first"""
+        if self._document is not None:
+            self.update_etree()
+        return self._etree
+
+    def _set_etree(self,element):
+        """Sets the root element and drops any legacy self.document view of the old tree"""
+        self._document=None
+        self._etree=element
+
+    etree=property(_get_etree,_set_etree)
+
+    def _get_document(self):
+        """Returns a xml.dom.minidom view of self.etree, it is only built when a legacy caller asks for it"""
+        if self._document is None:
+            self._document=xml.dom.minidom.parseString(etree.tostring(self._etree.getroottree()))
+        return self._document
+
+    def _set_document(self,document):
+        """Sets the tree from a xml.dom.minidom document"""
+        self._document=document
 
-        self.etree=etree.fromstring(self.document.toxml())
+    document=property(_get_document,_set_document)
 
     def __getitem__(self, item):
         """This returns the items found by using xpath as a string.
@@ -422,12 +645,23 @@ class XMLBase():
             return out_list
 
     def update_etree(self):
-        "Updates the attribute etree. Should be called anytime the xml content is changed"
-        self.etree = etree.fromstring(self.document.toxml())
+        """Folds changes made through self.document back into self.etree. Only needed after the legacy
+        self.document view is changed, any later use of self.etree calls it automatically"""
+        if self._document is not None:
+            document=self._document
+            self._document=None
+            self._etree=etree.fromstring(document.toxml(encoding="utf-8"))
+            self.update_indices()
 
     def update_document(self):
-        """Updates the attribute document from the self.etree. """
-        self.document=xml.dom.minidom.parseString(etree.tostring(self.etree))
+        """Drops the self.document view so that it is rebuilt from self.etree the next time it is used.
+        Should be called if self.etree is changed while a legacy caller holds self.document"""
+        self._document=None
+
+    def update_indices(self):
+        """Rebuilds any lookup tables that hold elements of self.etree. Called when self.etree is replaced by
+        update_etree, subclasses that keep such tables override it"""
+        pass
 
     def save(self,path=None):
         """" Saves as an XML file"""
@@ -443,9 +677,8 @@ class XMLBase():
             if XSLT is None:
                 # For some reason an absolute path tends to break here, maybe a spaces in file names problem
                 XSLT=self.options['style_sheet']
-            XSL_data=etree.parse(XSLT)
-            XSL_transform=etree.XSLT(XSL_data)
-            HTML=XSL_transform(etree.XML(self.document.toxml()))
+            XSL_transform=get_XSLT_transform(XSLT)
+            HTML=XSL_transform(self.etree)
             return str(HTML)
 
         def save_HTML(self,file_path=None,XSLT=None):
@@ -471,13 +704,13 @@ class XMLBase():
             tagName=tagName.replace('>','')
             return tagName
         if mode in ['text','txt','cmd line','cmd']:
-            for node in self.document.getElementsByTagName('Entry'):
-                print('Entry Index: %s \tDate: %s'%(node.getAttribute('Index'),
-                node.getAttribute('Date')))
-                print(node.firstChild.nodeValue)
+            for node in self.etree.iter('Entry'):
+                print('Entry Index: %s \tDate: %s'%(node.get('Index',''),
+                node.get('Date','')))
+                print(node.text)
         elif re.search('xml',mode,re.IGNORECASE):
-            for node in self.document.getElementsByTagName('Entry'):
-                print(node.toprettyxml())
+            for node in self.etree.iter('Entry'):
+                print(etree.tostring(node,pretty_print=True,encoding="unicode"))
         elif re.search('Window|wx',mode,re.IGNORECASE):
             try:
                 import wx
@@ -492,158 +725,212 @@ class XMLBase():
             app.MainLoop()
 
     def __str__(self):
-        """Controls how XMLBAse is returned when a string function is called. Changed to using self.etree instead
-        of self.document for better unicode support"""
-        self.update_etree()
-        try:
-            string_representation = etree.tostring(self.etree,encoding="unicode")
-
-        except:
-            string_representation = self.document.toprettyxml()
-        return str(string_representation)
+        """Controls how XMLBAse is returned when a string function is called. Serializes self.etree directly"""
+        return etree.tostring(self.etree,encoding="unicode")
 
 class XMLLog(XMLBase):
-    """ Data container for a general XMLLog"""
+    """ Data container for a general XMLLog. By default save only appends the entries added since the last save.
+    Changes made with the log methods are tracked, but if self.etree is edited directly call update_indices (or
+    entry_changed for an edited entry) before saving, otherwise only a change in the number of elements is
+    noticed and edits to saved entries are not written"""
     def __init__(self,file_path=None,**options):
         """ Intializes the XMLLog"""
         # We add the defaults for the log pass and the options along
         defaults={"root":'Log',
                   'style_sheet':DEFAULT_LOG_STYLE,
                   'entry_style_sheet':DEFAULT_LOG_STYLE,
-                  'specific_descriptor':'XML','general_descriptor':'Log'}
+                  'specific_descriptor':'XML','general_descriptor':'Log',
+                  'append_only_save':True}
         self.options={}
         for key,value in defaults.items():
             self.options[key]=value
         for key,value in options.items():
             self.options[key]=value
         XMLBase.__init__(self,file_path,**self.options)
-        # TODO: Check how scalable a dictionary of nodes is
-        self.Index_node_dictionary=dict([(str(node.getAttribute('Index')),
-        node) for node in \
-        self.document.getElementsByTagName('Entry')])   
+        # Entries added since the last save, save writes only these if the file on disk is otherwise current
+        self.unsaved_entries=[]
+        self.saved_path=file_path
+        self.rewrite_on_save=False
+        self.saved_length=len(self.etree)
+        self.update_Index_node_dictionary()
         self.current_entry={}
-                   
+
     def add_entry(self,entry=None):
         """ Adds an entry element to the current log"""
-        root=self.document.documentElement
+        root=self.etree
         if entry is None:
-            new_entry=self.document.createElement('Entry')
-            value=''
+            new_entry=etree.Element('Entry')
         elif isinstance(entry, str):
             if re.search('<Entry>(.)+</Entry>',entry):
-                new_document=xml.dom.minidom.parseString(entry)
-                new_entry=new_document.documentElement
+                new_entry=etree.fromstring(entry)
             else:
-                new_document=xml.dom.minidom.parseString('<Entry>'
-                +entry+'</Entry>')
-                new_entry=new_document.documentElement
+                new_entry=etree.fromstring('<Entry>'+entry+'</Entry>')
+        elif hasattr(entry,'toxml'):
+            # a xml.dom.minidom node from a legacy caller
+            new_entry=etree.fromstring(entry.toxml(encoding="utf-8"))
         else:
             new_entry=entry
-        # Find the max of Index's and add 1 to make a new Index
-        if len(self.Index_node_dictionary)==0:
+        # The new Index is one more than the running max of Index's
+        if self.max_Index is None:
             new_Index='1'
         else:
-            max_Index=max([int(Index) for Index in list(self.Index_node_dictionary.keys())])
-            new_Index=str(max_Index+1)
+            new_Index=str(self.max_Index+1)
         # Add the Index attribute to the new entry
-        Index_attribute=self.document.createAttribute('Index')
-        new_entry.setAttributeNode(Index_attribute)
-        new_entry.setAttribute('Index',str(new_Index))
-        if new_entry.getAttribute('Date'):
+        new_entry.set('Index',str(new_Index))
+        if new_entry.get('Date'):
             pass
         else:
             # Add the Date attribute, this is the time when the entry was logged
             date=datetime.datetime.utcnow().isoformat()
-            Date_attribute=self.document.createAttribute('Date')
-            new_entry.setAttributeNode(Date_attribute)
-            new_entry.setAttribute('Date',str(date))
-        # Now append the new Child        
-        root.appendChild(new_entry)
-        self.update_Index_node_dictionary()
-        
-        try:
-            value=new_entry.childNodes[0].data
-        except:
-            value=''
-             
-        self.current_entry={'Tag':'Entry','Value':value,'Index':new_entry.getAttribute('Index'),
-        'Date':new_entry.getAttribute('Date')} 
-        
+            new_entry.set('Date',str(date))
+        # Now append the new Child
+        root.append(new_entry)
+        self.add_to_Index_node_dictionary(new_entry)
+        self.unsaved_entries.append(new_entry)
+
+        value=new_entry.text or ''
+        self.current_entry={'Tag':'Entry','Value':value,'Index':new_entry.get('Index'),
+        'Date':new_entry.get('Date')}
+
     def edit_entry(self,old_Index,new_value=None,new_Index=None,new_Date=None):
         """Edits and existing entry by replacing the existing values with new ones"""
         node=self.get_entry(str(old_Index))
+        self.entry_changed(node)
         if not new_value is None:
-            new_text_node=self.document.createTextNode(new_value)
-            try:
-                old_text_node=node.childNodes[0]
-                node.removeChild(old_text_node)
-            except: pass
-            node.appendChild(new_text_node)
-            
+            node.text=new_value
         elif not new_Index is None:
-            node.setAttribute('Index',new_Index)
+            node.set('Index',new_Index)
+            del self.Index_node_dictionary[str(old_Index)]
+            self.add_to_Index_node_dictionary(node)
         elif not new_Date is None:
-            node.setAttribute('Date',new_Date)
-        self.current_entry={'Tag':'Entry','Value':node.childNodes[0].data,'Index':node.getAttribute('Index'),
-        'Date':node.getAttribute('Date')}    
-                
+            node.set('Date',new_Date)
+        self.current_entry={'Tag':'Entry','Value':node.text,'Index':node.get('Index'),
+        'Date':node.get('Date')}
+
     def get_entry(self,Index):
         """ Returns the entry selcted by Index"""
         return self.Index_node_dictionary[str(Index)]
-    
+
     def set_current_entry(self,Index=-1):
         """Sets self.current_entry """
         entry=self.Index_node_dictionary[str(Index)]
-        try:
-            value=entry.childNodes[0].data
-        except:
-            value=''
-        self.current_entry={'Tag':'Entry','Value':value,'Index':entry.getAttribute('Index'),
-        'Date':entry.getAttribute('Date')}            
+        value=entry.text or ''
+        self.current_entry={'Tag':'Entry','Value':value,'Index':entry.get('Index'),
+        'Date':entry.get('Date')}
     def remove_entry(self,Index):
         """ Removes the entry using the Index attribute"""
-        root=self.document.documentElement
-        root.removeChild(self.Index_node_dictionary[Index])
-        self.update_Index_node_dictionary()
-        
+        root=self.etree
+        node=self.Index_node_dictionary.pop(str(Index))
+        if node in self.unsaved_entries:
+            self.unsaved_entries.remove(node)
+        else:
+            self.rewrite_on_save=True
+        root.remove(node)
+        if self.max_Index is not None and int(Index)>=self.max_Index:
+            # only removing the last entry needs a rescan
+            self.max_Index=max([int(key) for key in self.Index_node_dictionary.keys()]) \
+                if self.Index_node_dictionary else None
+
     def add_description(self,description=None):
         """ Adds an entry with Index='-1' which holds data about the log itself"""
-        root=self.document.documentElement
-        new_entry=self.document.createElement('Entry')
+        root=self.etree
+        new_entry=etree.SubElement(root,'Entry')
         if not description is None:
-            text_node=self.document.createTextNode(description)
-            new_entry.appendChild(text_node)
+            new_entry.text=description
         # Add the Index attribute to the new entry
-        Index_attribute=self.document.createAttribute('Index')
-        new_entry.setAttributeNode(Index_attribute)
-        new_entry.setAttribute('Index',str(-1))
+        new_entry.set('Index',str(-1))
         # Add the Date attribute, this is the time when the entry was logged
         date=datetime.datetime.utcnow().isoformat()
-        Date_attribute=self.document.createAttribute('Date')
-        new_entry.setAttributeNode(Date_attribute)
-        new_entry.setAttribute('Date',str(date))
-        # Now append the new Child        
-        root.appendChild(new_entry)
-        self.update_Index_node_dictionary()
-            
+        new_entry.set('Date',str(date))
+        self.add_to_Index_node_dictionary(new_entry)
+        self.unsaved_entries.append(new_entry)
+
     def update_Index_node_dictionary(self):
-        """ Re-Returns the attribute self.Index_node_dictionary, using the current
-        definition of self.document"""
-        self.Index_node_dictionary=dict([(str(node.getAttribute('Index')),
+        """ Re-Returns the attribute self.Index_node_dictionary and self.max_Index, using the current
+        definition of self.etree"""
+        self.Index_node_dictionary=dict([(str(node.get('Index','')),
         node) for node in \
-        self.document.getElementsByTagName('Entry')])
-    # if the XSLT engine loaded then define a transformation to HTML    
+        self.etree.iter('Entry')])
+        self.max_Index=None
+        for Index in self.Index_node_dictionary.keys():
+            try:
+                if self.max_Index is None or int(Index)>self.max_Index:
+                    self.max_Index=int(Index)
+            except ValueError:
+                pass
+
+    def add_to_Index_node_dictionary(self,node):
+        """Adds a single entry to self.Index_node_dictionary and keeps the running self.max_Index"""
+        Index=node.get('Index','')
+        self.Index_node_dictionary[Index]=node
+        try:
+            if self.max_Index is None or int(Index)>self.max_Index:
+                self.max_Index=int(Index)
+        except ValueError:
+            pass
+
+    def update_indices(self):
+        """Rebuilds self.Index_node_dictionary after self.etree is replaced, the next save rewrites the file"""
+        self.update_Index_node_dictionary()
+        self.unsaved_entries=[]
+        self.rewrite_on_save=True
+
+    def entry_changed(self,node):
+        """Marks that an entry has been changed in place. Changing an entry that is already on disk means
+        the next save has to rewrite the whole file"""
+        if not node in self.unsaved_entries:
+            self.rewrite_on_save=True
+
+    def save(self,path=None):
+        """Saves the log. If the log was opened from or last saved to path and the only changes since are new
+        entries, the new Entry elements are written over the closing root tag of the file instead of
+        re-serializing the whole log. If the root has a different number of elements than the saved file plus
+        the new entries it was changed outside of the log methods and the whole file is rewritten. Set
+        options["append_only_save"]=False to always rewrite the file"""
+        if path is None:
+            path=self.path
+        if self.options["append_only_save"] and not self.rewrite_on_save and self.saved_path==path \
+                and os.path.isfile(path) and len(self.etree)==self.saved_length+len(self.unsaved_entries):
+            if not self.unsaved_entries or self.append_unsaved_entries(path):
+                self.unsaved_entries=[]
+                self.saved_length=len(self.etree)
+                return
+        XMLBase.save(self,path)
+        self.saved_path=path
+        self.rewrite_on_save=False
+        self.unsaved_entries=[]
+        self.saved_length=len(self.etree)
+
+    def append_unsaved_entries(self,path):
+        """Writes self.unsaved_entries to the end of the saved log at path, just before the closing root tag.
+        Returns False and writes nothing if the closing tag is not the last thing in the file"""
+        closing_tag="</{0}>".format(self.etree.tag).encode("utf-8")
+        with open(path,'r+b') as file_out:
+            file_out.seek(0,os.SEEK_END)
+            file_size=file_out.tell()
+            tail_size=min(file_size,4096)
+            file_out.seek(file_size-tail_size)
+            tail=file_out.read()
+            position=tail.rfind(closing_tag)
+            if position<0 or tail[position+len(closing_tag):].strip():
+                return False
+            new_text=b"".join([etree.tostring(entry,encoding="utf-8") for entry in self.unsaved_entries])
+            file_out.seek(file_size-tail_size+position)
+            file_out.truncate()
+            file_out.write(new_text+tail[position:])
+        return True
+
+    # if the XSLT engine loaded then define a transformation to HTML
     if XSLT_CAPABLE:
         def current_entry_to_HTML(self,XSLT=None):
             """ Returns HTML string by applying a XSL to the XML document"""
             if XSLT is None:
                 XSLT=self.options['entry_style_sheet']
-            XSL_data=etree.parse(XSLT)
-            XSL_transform=etree.XSLT(XSL_data)
+            XSL_transform=get_XSLT_transform(XSLT)
             current_entry_XML=self.Index_node_dictionary[self.current_entry['Index']]
-            HTML=XSL_transform(etree.XML(current_entry_XML.toxml())) 
-            return HTML         
-    
+            HTML=XSL_transform(current_entry_XML)
+            return HTML
+
     # TODO: Make show and display function work well
     def previous_entry(self):
         """Sets current entry to the one before"""
@@ -695,13 +982,13 @@ class XMLLog(XMLBase):
             tagName=tagName.replace('>','')
             return tagName
         if mode in ['text','txt','cmd line','cmd']:
-            for node in self.document.getElementsByTagName('Entry'):
-                print('Entry Index: %s \tDate: %s'%(node.getAttribute('Index'),
-                node.getAttribute('Date')))
-                print(node.firstChild.nodeValue)
+            for node in self.etree.iter('Entry'):
+                print('Entry Index: %s \tDate: %s'%(node.get('Index',''),
+                node.get('Date','')))
+                print(node.text)
         elif re.search('xml',mode,re.IGNORECASE):
-            for node in self.document.getElementsByTagName('Entry'):
-                print(node.toprettyxml())
+            for node in self.etree.iter('Entry'):
+                print(etree.tostring(node,pretty_print=True,encoding="unicode"))
         elif re.search('Window|wx',mode,re.IGNORECASE):
             try:
                 import wx
@@ -718,19 +1005,19 @@ class XMLLog(XMLBase):
     def __add__(object,right):
         """Controls Behavior of two XMLLogs added using the + operator"""
         new_log=object
-        for entry in right.document.getElementsByTagName('Entry'):
-            if entry.getAttribute('Index')=='-1':
-                pass    
+        for entry in right.etree.iter('Entry'):
+            if entry.get('Index')=='-1':
+                pass
             else:
-                new_log.add_entry(entry)
+                new_log.add_entry(copy.deepcopy(entry))
         return new_log
 
     def get_table(self):
         "Returns the XML data as a list of python dictionaries"
-        node_list=self.document.getElementsByTagName("Entry")
-        table=[{"Index": node.getAttribute("Index"),
-          "Date": node.getAttribute("Date"),
-          "Entry": node.childNodes[0].nodeValue} for node in node_list]
+        node_list=self.etree.iter("Entry")
+        table=[{"Index": node.get("Index",""),
+          "Date": node.get("Date",""),
+          "Entry": node.text} for node in node_list]
         return table
 
 class ChangeXMLLog(XMLLog):
@@ -773,11 +1060,10 @@ class EndOfDayXMLLog(XMLLog):
             node=self.get_entry(Index)
         except:
             raise
+        self.entry_changed(node)
         for tag,value in entry.items():
-            new_element=self.document.createElement(tag)
-            new_text=self.document.createTextNode(str(value))
-            new_element.appendChild(new_text)
-            node.appendChild(new_element)
+            new_element=etree.SubElement(node,tag)
+            new_element.text=str(value)
     def add_EndOfDayXMLLog_description(self,program_name=None):
         """ Adds a description of the log as element Index=-1"""
         description="""This is a End of day log. It consists of entries with
@@ -800,6 +1086,9 @@ class DataTable(XMLBase):
         """ Intializes the DataTable Class. Passing **{'data_table':[mylist]} Returns a
         table with x1 and x2 as column names. Passing **{'data_dictionary':{'Data_Description':{'Tag':'Text',etc},
         'Data':[{'x':1,'y':2},{'x':2,'y':3}]
+        The optional schema **{'column_names':['x','y'],'column_types':['float','int']} names the attributes
+        of list rows and converts self.data and get_columns to those types, types follow
+        GeneralModels.convert_row (int, float, str, complex)
          """
         # the general idea is <Data_Description/><Data><Tuple i=''/></Data>
 
@@ -810,7 +1099,9 @@ class DataTable(XMLBase):
                   "specific_descriptor":'Data',
                   "general_descriptor":'Table',
                   "directory":None,
-                  "extension":'xml'
+                  "extension":'xml',
+                  "column_names":None,
+                  "column_types":None
                   }
         self.options={}
         for key,value in defaults.items():
@@ -823,7 +1114,7 @@ class DataTable(XMLBase):
             data_table=self.options['data_table']
             if len(data_table)>0:
                 data_node=self.list_to_XML(data_table)
-                self.document.documentElement.appendChild(data_node)
+                self.etree.append(data_node)
         except: pass
         try:
             data_dictionary=self.options['data_dictionary']
@@ -833,75 +1124,82 @@ class DataTable(XMLBase):
                     if re.search('description',key,re.IGNORECASE):
                         #This is the flat dictionary handling code {"Data_Description:{key:value}}
                         #Need one that is {"Data_Description":{"Context":{key:value}}}
-                        new_entry=self.document.createElement(key)
+                        new_entry=etree.SubElement(self.etree,key)
                         for tag,element_text in value.items():
+                            new_tag=etree.SubElement(new_entry,tag)
                             if isinstance(element_text, DictionaryType):
-                                new_tag=self.document.createElement(tag)
-                                new_entry.appendChild(new_tag)
                                 for inner_tag,inner_element_text in element_text.items():
-                                    new_inner_tag=self.document.createElement(inner_tag)
-                                    new_inner_text=self.document.createTextNode(inner_element_text)
-                                    new_inner_tag.appendChild(new_inner_text)
-                                    new_tag.appendChild(new_inner_tag)
+                                    new_inner_tag=etree.SubElement(new_tag,inner_tag)
+                                    new_inner_tag.text=str(inner_element_text)
                             else:
-                                new_tag=self.document.createElement(tag)
-                                new_text=self.document.createTextNode(element_text)
-                                new_tag.appendChild(new_text)
-                                new_entry.appendChild(new_tag)
-                        self.document.documentElement.appendChild(new_entry)
+                                new_tag.text=str(element_text)
                     if re.search('data',key,re.IGNORECASE) and not re.search('Description',key,re.IGNORECASE):
                         new_entry=self.list_to_XML(value)
-                        self.document.documentElement.appendChild(new_entry)
+                        self.etree.append(new_entry)
         except:pass
         self.attribute_names=self.get_attribute_names()
-        node_list=self.document.getElementsByTagName('Tuple')
-        self.data=[[node.getAttribute(attribute_name) for
-            attribute_name in self.attribute_names] for node in node_list]
+        if self.options["column_types"]:
+            columns=self.get_columns()
+            self.data=[list(row) for row in zip(*[columns[name] for name in self.attribute_names])]
+        else:
+            node_list=self.etree.iter('Tuple')
+            self.data=[[node.get(attribute_name,'') for
+                attribute_name in self.attribute_names] for node in node_list]
 
     def list_to_XML(self,data_list):
-        """ Converts a list to XML document"""
-        data_node=self.document.createElement('Data')
-        #self.document.documentElement.appendChild(data_node)
+        """ Converts a list to XML document. List rows use options['column_names'] as attribute names
+        if it is set and X0, X1, ... if not"""
+        column_names=self.options["column_names"]
+        if column_names and data_list and all([isinstance(row,(list,tuple)) and len(row)==len(column_names)
+                                               for row in data_list]):
+            try:
+                return etree.fromstring(data_rows_to_XML_string(data_list,column_names,
+                                                                self.options["column_types"]))
+            except etree.XMLSyntaxError:
+                # a value in a numeric column needed escaping, build the rows one at a time
+                pass
+        data_node=etree.Element('Data')
         for row in data_list:
             if isinstance(row,(list,tuple)):
-                new_entry=self.document.createElement('Tuple')
-                for j,datum in enumerate(row):
-                    x_attribute=self.document.createAttribute('X%s'%j)
-                    new_entry.setAttributeNode(x_attribute)
-                    new_entry.setAttribute('X%s'%j,str(datum))
-                data_node.appendChild(new_entry)
+                if column_names is None or len(column_names)<len(row):
+                    column_names=['X%s'%j for j in range(len(row))]
+                etree.SubElement(data_node,'Tuple',dict(zip(column_names,list(map(str,row)))))
             elif isinstance(row, DictionaryType):
-                new_entry=self.document.createElement('Tuple')
-                for key,datum in row.items():
-                    x_attribute=self.document.createAttribute(key)
-                    new_entry.setAttributeNode(x_attribute)
-                    new_entry.setAttribute(key,str(datum))
-                data_node.appendChild(new_entry)
+                etree.SubElement(data_node,'Tuple',
+                                 dict([(key,str(datum)) for key,datum in row.items()]))
         return data_node
 
     def get_attribute_names(self):
-        """ Returns the attribute names in the first tuple element in the 'data' element """
-        attribute_names=[]
-        data_nodes=self.document.getElementsByTagName('Data')
-        #print("{0} is {1}".format("data_nodes",data_nodes))
-        first_tuple_node=data_nodes[0].childNodes[1]
-        text=first_tuple_node.toprettyxml()
-        text_list=text.split(' ')
-        #print(text_list)
-        for item in text_list:
-            try:
-                match=re.search('(?P<attribute_name>\w+)=',item)
-                name=match.group('attribute_name')
-                #print(name)
-                attribute_names.append(name)
-            except:pass
-        return attribute_names
+        """ Returns the column names from options['column_names'] or the attribute names in the first
+        tuple element in the 'data' element """
+        if self.options["column_names"]:
+            return list(self.options["column_names"])
+        first_tuple_node=self.etree.find('.//Data/Tuple')
+        if first_tuple_node is None:
+            return []
+        return list(first_tuple_node.keys())
+
+    def get_columns(self,attribute_names=None,column_types=None):
+        """Returns the data as a dictionary of attribute name:list of values. The values are converted using
+        column_types, which defaults to options['column_types']"""
+        if attribute_names is None:
+            attribute_names=self.attribute_names
+        if column_types is None:
+            column_types=self.options["column_types"]
+        node_list=list(self.etree.iter('Tuple'))
+        columns={}
+        for index,attribute_name in enumerate(attribute_names):
+            column=[node.get(attribute_name,'') for node in node_list]
+            if column_types:
+                column=convert_column(column,column_types[index])
+            columns[attribute_name]=column
+        return columns
 
     def to_list(self,attribute_name):
         """ Outputs the data as a list given a data column (attribute) name"""
         try:
-            node_list=self.document.getElementsByTagName('Tuple')
-            data_list=[node.getAttribute(attribute_name) for node in node_list]
+            node_list=self.etree.iter('Tuple')
+            data_list=[node.get(attribute_name,'') for node in node_list]
             return data_list
         except:
             return None
@@ -911,8 +1209,8 @@ class DataTable(XMLBase):
         if not attribute_names:
             attribute_names=self.get_attribute_names()
         try:
-            node_list=self.document.getElementsByTagName('Tuple')
-            data_list=[tuple([node.getAttribute(attribute_name) for
+            node_list=self.etree.iter('Tuple')
+            data_list=[tuple([node.get(attribute_name,'') for
             attribute_name in attribute_names]) for node in node_list]
             return data_list
         except:
@@ -921,17 +1219,16 @@ class DataTable(XMLBase):
     def get_header(self,style='txt'):
         """ Returns a header from the data description if there is one"""
         try:
-            node_list=self.document.getElementsByTagName('Data_Description')
-            data_description=node_list[0]
+            data_description=self.etree.find('.//Data_Description')
             out=''
             if style in ['txt','text','ascii']:
-                for child in data_description.childNodes:
-                    try:
-                        out=out+'%s: %s'%(child.nodeName,child.firstChild.nodeValue)+'\n'
-                    except:pass
+                for child in data_description:
+                    if not isinstance(child.tag,StringType) or (child.text is None and len(child)==0):
+                        continue
+                    out=out+'%s: %s'%(child.tag,child.text)+'\n'
                 return out
             elif re.search('xml',style,flags=re.IGNORECASE):
-                out=data_description.toprettyxml()
+                out=etree.tostring(data_description,pretty_print=True,encoding="unicode")
                 return out
         except:
             raise
@@ -960,23 +1257,21 @@ class FileRegister(XMLBase):
             self.options[key] = value
         XMLBase.__init__(self, file_path, **self.options)
 
-        self.Id_dictionary = dict([(str(node.getAttribute('URL')),
-                                    str(node.getAttribute('Id'))) for node in
-                                   self.document.getElementsByTagName('File')])
+        self.Id_dictionary = dict([(str(node.get('URL', '')),
+                                    str(node.get('Id', ''))) for node in
+                                   self.etree.iter('File')])
 
     def create_Id(self, URL):
         """ Returns or returns the existing Id element of a URL"""
         parsed_URL = urlparse.urlparse(condition_URL(URL))
         try:  # Look in self.Id_dictionary, if it is not there catch
             # the exception KeyError and generate an Id.
-            return self.Id_dictionary[URL.replace('///', '')]
+            return self.Id_dictionary[condition_URL(URL)]
         except KeyError:
             # The Id is not in the existing list so start buliding Id.
             # Determine the IP Address of the host in the URL
-            if parsed_URL[1] in ['', '']:  # if it is empty assume local host
-                IP_address = socket.gethostbyaddr(socket.gethostname())[2][0]
-            else:
-                IP_address = socket.gethostbyaddr(parsed_URL[1])[2][0]
+            # if it is empty assume local host
+            IP_address = get_host_information(parsed_URL[1])[2][0]
             Id_cache = {}
             # We begin with all the entries with the same IP address
             for (key, value) in self.Id_dictionary.items():
@@ -1073,16 +1368,13 @@ class FileRegister(XMLBase):
             print('Already there')
             return
         # the xml entry is <File Date="" Host="" Type="" Id="" URL=""/>
-        File_Registry = self.document.documentElement
-        new_entry = self.document.createElement('File')
+        File_Registry = self.etree
+        new_entry = etree.Element('File')
         # Make all the new attributes
         attributes = ['Id', 'Host', 'Date', 'URL', 'Type']
-        new_attributes = dict([(attribute,
-                                self.document.createAttribute(attribute)) for attribute in \
-                               attributes])
         # Add the new attributes to the new entry
         for attribute in attributes:
-            new_entry.setAttributeNode(new_attributes[attribute])
+            new_entry.set(attribute, '')
         # Now assign the values
         attribute_values = {}
         attribute_values['URL'] = URL
@@ -1099,20 +1391,20 @@ class FileRegister(XMLBase):
             attribute_values['Type'] = "Other"
         parsed_URL = urlparse.urlparse(condition_URL(URL))
         if parsed_URL[1] in ['', '']:  # if it is empty assume local host
-            attribute_values['Host'] = socket.gethostbyaddr(socket.gethostname())[0]
+            attribute_values['Host'] = get_host_information()[0]
         else:
             attribute_values['Host'] = parsed_URL[1]
 
         # Now set them all in the actual attribute
         for (key, value) in attribute_values.items():
-            new_entry.setAttribute(key, value)
-        File_Registry.appendChild(new_entry)
+            new_entry.set(key, value)
+        File_Registry.append(new_entry)
         # Finally update the self.Id_dictionary
         # Added boolean switch to speed up adding a lot of entries
 
-        self.Id_dictionary = dict([(str(node.getAttribute('URL')),
-                                    str(node.getAttribute('Id'))) for node in
-                                   self.document.getElementsByTagName('File')])
+        self.Id_dictionary = dict([(str(node.get('URL', '')),
+                                    str(node.get('Id', ''))) for node in
+                                   self.etree.iter('File')])
 
     # TODO : Add an input filter that guesses at what you inputed
 
@@ -1177,38 +1469,37 @@ class FileRegister(XMLBase):
         except:
             raise
         # After all the files are added update the Id_dictionary
-        self.Id_dictionary = dict([(str(node.getAttribute('URL')),
-                                    str(node.getAttribute('Id'))) for node in
-                                   self.document.getElementsByTagName('File')])
+        self.Id_dictionary = dict([(str(node.get('URL', '')),
+                                    str(node.get('Id', ''))) for node in
+                                   self.etree.iter('File')])
 
     def remove_entry(self, URL=None, Id=None):
         """ Removes an entry in the current File Register """
-        File_Registry = self.document.documentElement
+        File_Registry = self.etree
         if not URL is None:
             URL = condition_URL(URL)
-            URL_FileNode_dictionary = dict([(node.getAttribute('URL'),
-                                             node) for node in self.document.getElementsByTagName('File')])
-            File_Registry.removeChild(URL_FileNode_dictionary[URL])
+            URL_FileNode_dictionary = dict([(node.get('URL', ''),
+                                             node) for node in self.etree.iter('File')])
+            File_Registry.remove(URL_FileNode_dictionary[URL])
         else:
-            Id_FileNode_dictionary = dict([(node.getAttribute('Id'),
-                                            node) for node in self.document.getElementsByTagName('File')])
-            File_Registry.removeChild(Id_FileNode_dictionary[Id])
+            Id_FileNode_dictionary = dict([(node.get('Id', ''),
+                                            node) for node in self.etree.iter('File')])
+            File_Registry.remove(Id_FileNode_dictionary[Id])
         # Finally update the self.Id_dictionary
-        self.Id_dictionary = dict([(str(node.getAttribute('URL')),
-                                    str(node.getAttribute('Id'))) for node in \
-                                   self.document.getElementsByTagName('File')])
+        self.Id_dictionary = dict([(str(node.get('URL', '')),
+                                    str(node.get('Id', ''))) for node in
+                                   self.etree.iter('File')])
 
     def get_data(self):
         """Gets a list of lists that represent the data in the file register"""
-        node_list = self.document.getElementsByTagName("File")
-        data = [[attribute[1] for attribute in list(item.attributes.items())] for item in node_list]
+        node_list = self.etree.iter("File")
+        data = [list(item.values()) for item in node_list]
         return data
 
     def get_data_dictionary_list(self):
         """Returns a list of dictionaries that have the data in the file register attributes"""
-        node_list = self.document.getElementsByTagName("File")
-        data_dictionary_list = [{attribute[0]: attribute[1] for attribute in list(item.attributes.items())} for item in
-                                node_list]
+        node_list = self.etree.iter("File")
+        data_dictionary_list = [dict(item.attrib) for item in node_list]
         return data_dictionary_list
 
 class Metadata(XMLBase):
@@ -1235,7 +1526,9 @@ class Metadata(XMLBase):
         FileRegistry=file_path
         Metadata_File=self.options['metadata_file']
         # Process the file register
-        if isinstance(FileRegistry, InstanceType):
+        self._etree=None
+        self._document=None
+        if isinstance(FileRegistry, XMLBase):
             self.FileRegister=FileRegistry
         elif isinstance(FileRegistry,StringType):
             self.FileRegister=FileRegister(FileRegistry)
@@ -1248,44 +1541,46 @@ class Metadata(XMLBase):
             Metadata_name=FileRegister_name.replace('.'+FileRegister_ext,
             '_Metadata.'+FileRegister_ext)
             self.path=FileRegister_path.replace(FileRegister_name,Metadata_name)
-            self.document=self.FileRegister.document
-            # delete old processing instructions
-            for node in self.document.childNodes:
-                if node.nodeType is 7:
-                    self.document.removeChild(node)
-                    node.unlink()
+            # copying the root element leaves the old processing instructions behind
+            self.etree=copy.deepcopy(self.FileRegister.etree)
             # add in the default xsl
-            new_node=self.document.createProcessingInstruction(
+            new_node=etree.ProcessingInstruction(
                 'xml-stylesheet',
                 'type="text/xsl" href="%s"'%self.options['style_sheet'])
-            self.document.insertBefore(new_node,self.document.documentElement)
+            self.etree.addprevious(new_node)
             # make sure there is a fileregister reference
             FR_Path=self.FileRegister.path
-            new_node=self.document.createProcessingInstruction(\
+            new_node=etree.ProcessingInstruction(\
             'xml-FileRegistry',\
             'href=\"%s\"'%(self.FileRegister.path))
-            self.document.insertBefore(new_node,self.document.documentElement)
+            self.etree.addprevious(new_node)
         else:
             # The metadata file exists as a saved file or an instance
-            if isinstance(Metadata_File, InstanceType):
-                self.document=Metadata_File.document
+            if isinstance(Metadata_File, XMLBase):
+                self.etree=copy.deepcopy(Metadata_File.etree)
                 self.path=Metadata_File.path
             elif isinstance(Metadata_File,StringType):
-                XMLBase.__init__(self,file_path,**self.options)
+                XMLBase.__init__(self,Metadata_File,**self.options)
 
         # TODO: This dictionary of nodes worries me-- it may not scale well
-        self.node_dictionary=dict([(str(node.getAttribute('URL')),
-            node) for node in
-            self.document.getElementsByTagName('File')])
+        self.current_node=None
+        self.update_indices()
+
+        self.current_node=list(self.node_dictionary.values())[0]
+
+    def update_indices(self):
+        """Rebuilds self.node_dictionary, self.URL_dictionary and self.name_dictionary from self.etree"""
+        file_nodes=list(self.etree.iter('File'))
+        self.node_dictionary=dict([(str(node.get('URL','')),
+            node) for node in file_nodes])
 
-        self.URL_dictionary=dict([(str(node.getAttribute('Id')),
-            str(node.getAttribute('URL'))) for node in
-            self.document.getElementsByTagName('File')])
+        self.URL_dictionary=dict([(str(node.get('Id','')),
+            str(node.get('URL',''))) for node in file_nodes])
 
         self.name_dictionary=dict([(Id,os.path.split(self.URL_dictionary[Id])[1])
             for Id in list(self.URL_dictionary.keys())])
-
-        self.current_node=list(self.node_dictionary.values())[0]
+        if self.current_node is not None:
+            self.current_node=self.node_dictionary.get(str(self.current_node.get('URL','')))
 
     def search_name(self,name=None,re_flags=re.IGNORECASE):
         """ Returns a list of URL's that have an element matching name"""
@@ -1305,9 +1600,8 @@ class Metadata(XMLBase):
             if XSLT is None:
                 # For some reason an absolute path tends to break here, maybe a spaces in file names problem
                 XSLT=self.options['style_sheet']
-            XSL_data=etree.parse(XSLT)
-            XSL_transform=etree.XSLT(XSL_data)
-            HTML=XSL_transform(etree.XML(self.document.toxml()))
+            XSL_transform=get_XSLT_transform(XSLT)
+            HTML=XSL_transform(self.etree)
             return HTML
 
     def get_file_node(self,URL=None,Id=None):
@@ -1331,27 +1625,25 @@ class Metadata(XMLBase):
     def add_element_to_current_node(self,XML_tag=None,value=None,node=None,**Atributes):
         """Adds a metadata element to the current file node"""
         if node is None:
-            new_element=self.document.createElement(XML_tag)
+            new_element=etree.Element(XML_tag)
+        elif hasattr(node,'toxml'):
+            # a xml.dom.minidom node from a legacy caller
+            new_element=etree.fromstring(node.toxml(encoding="utf-8"))
         else:
             new_element=node
         if not value is None:
-            new_text=self.document.createTextNode(str(value))
-            new_element.appendChild(new_text)
-        attributes=[key for key in list(Atributes.keys())]
-        new_attributes=dict([(attribute,
-        self.document.createAttribute(attribute)) for attribute in \
-        attributes])
+            new_element.text=str(value)
         for (key,value) in Atributes.items():
-            new_element.setAttribute(key,str(value))
-        self.current_node.appendChild(new_element)
+            new_element.set(key,str(value))
+        self.current_node.append(new_element)
 
     def remove_element_in_current_node(self,element_name):
         """Removes all metadata elements with the same tagname
          in the current file node"""
-        nodes_to_remove=self.current_node.getElementsByTagName(element_name)
+        nodes_to_remove=self.current_node.findall(element_name)
         try:
             for node in nodes_to_remove:
-                self.current_node.removeChild(node)
+                self.current_node.remove(node)
         except:pass
 
     if XSLT_CAPABLE:
@@ -1360,14 +1652,13 @@ class Metadata(XMLBase):
             if XSLT is None:
                 # For some reason an absolute path tends to break here, maybe a spaces in file names problem
                 XSLT=self.options['style_sheet']
-            XSL_data=etree.parse(XSLT)
-            XSL_transform=etree.XSLT(XSL_data)
-            HTML=XSL_transform(etree.XML(self.current_node.toxml()))
+            XSL_transform=get_XSLT_transform(XSLT)
+            HTML=XSL_transform(self.current_node)
             return HTML
 
     def print_current_node(self):
         """ Prints the current node """
-        print(self.current_node.toxml())
+        print(etree.tostring(self.current_node,encoding="unicode"))
 
 class InstrumentSheet(XMLBase):
     """ Class that handles the xml instrument sheet. An instrument sheet is an xml file with static metadata about
@@ -1391,26 +1682,22 @@ class InstrumentSheet(XMLBase):
 
 
         XMLBase.__init__(self,file_path,**self.options)
-        self.root=self.document.documentElement
+        self.root=self.etree
         # Now use the xml to declare some attributes
-        specific_description=self.document.getElementsByTagName('Specific_Information')
+        specific_description=self.etree.iter('Specific_Information')
         for information_node in specific_description:
-            if information_node.nodeType is NODE_TYPE_DICTIONARY['ELEMENT_NODE']:
-                for node in information_node.childNodes:
-                    if node.nodeType is NODE_TYPE_DICTIONARY['ELEMENT_NODE']:
-                        if node.childNodes:
-                            tag_name=node.tagName
-                            text_value=node.childNodes[0].data
-                            if not text_value in [None,'']:
-                                string='self.%s="%s"'%(tag_name.lower(),text_value)
-                                #print string
-                                exec('%s'%string)
+            for node in information_node:
+                if isinstance(node.tag,StringType):
+                    tag_name=node.tag
+                    text_value=node.text
+                    if not text_value in [None,'']:
+                        setattr(self,tag_name.lower(),text_value)
          #Commands
         self.commands=[]
-        commands=self.document.getElementsByTagName('Commands')[0]
-        for command in commands.childNodes:
-            if command.nodeType is NODE_TYPE_DICTIONARY['ELEMENT_NODE']:
-                self.commands.append(command.getAttribute('Command'))
+        commands=self.etree.find('.//Commands')
+        for command in commands:
+            if isinstance(command.tag,StringType):
+                self.commands.append(command.get('Command',''))
         try:
             self.image=self.get_image_path()
         except:
@@ -1422,27 +1709,22 @@ class InstrumentSheet(XMLBase):
         specific_match=re.compile('Specific',re.IGNORECASE)
         general_match=re.compile('General',re.IGNORECASE)
         if re.search(specific_match,description):
-            description_node=self.document.getElementsByTagName('Specific_Information')[0]
+            description_node=self.etree.find('.//Specific_Information')
         elif re.search(general_match,description):
-            description_node=self.document.getElementsByTagName('General_Information')[0]
-        new_entry=self.document.createElement(tag_name)
+            description_node=self.etree.find('.//General_Information')
+        new_entry=etree.SubElement(description_node,tag_name)
         if not text is None:
-            text_node=self.document.createTextNode(tag_name)
-            new_entry.appendChild(text_node)
+            new_entry.text=text
         for key,value in attribute_dictionary.items():
-            new_attribute=self.document.creatAttribute(key)
-            new_entry.setAttributeNode(new_attribute)
-            new_entry.setAttribute(key,str(value))
-        description_node.appendChild(new_entry)
+            new_entry.set(key,str(value))
 
     def get_query_dictionary(self):
         """ Returns a set:query dictionary if there is a State_Commands element"""
         try:
-            state_commands=self.document.getElementsByTagName('State_Commands')[0]
-            state_query_dictionary=dict([(str(node.getAttribute('Set')
-            ),str(node.getAttribute('Query')))
-            for node in state_commands.childNodes if node.nodeType is \
-            NODE_TYPE_DICTIONARY['ELEMENT_NODE']])
+            state_commands=self.etree.findall('.//State_Commands')[0]
+            state_query_dictionary=dict([(str(node.get('Set','')
+            ),str(node.get('Query','')))
+            for node in state_commands if isinstance(node.tag,StringType)])
             return state_query_dictionary
         except:
             raise
@@ -1451,8 +1733,8 @@ class InstrumentSheet(XMLBase):
         """Tries to return the image path, requires image to be in
         <Image href="http://132.163.53.152:8080/home_media/img/Fischione_1040.jpg"/> format"""
         # Take the first thing called Image
-        image_node=self.document.getElementsByTagName('Image')[0]
-        image_path=image_node.getAttribute('href')
+        image_node=self.etree.findall('.//Image')[0]
+        image_path=image_node.get('href','')
         return image_path
 
 
@@ -1489,19 +1771,13 @@ class InstrumentState(XMLBase):
             self.options[key] = value
 
         XMLBase.__init__(self, file_path, **self.options)
-        self.state_node = self.document.createElement('State')
-        self.document.documentElement.appendChild(self.state_node)
+        self.state_node = etree.SubElement(self.etree, 'State')
 
         if self.options["state_dictionary"]:
             for key, value in self.options["state_dictionary"].items():
-                new_entry = self.document.createElement('Tuple')
-                set_attribute = self.document.createAttribute('Set')
-                value_attribute = self.document.createAttribute('Value')
-                new_entry.setAttributeNode(set_attribute)
-                new_entry.setAttributeNode(value_attribute)
-                new_entry.setAttribute('Set', key)
-                new_entry.setAttribute('Value', str(value))
-                self.state_node.appendChild(new_entry)
+                new_entry = etree.SubElement(self.state_node, 'Tuple')
+                new_entry.set('Set', key)
+                new_entry.set('Value', str(value))
         if self.options["state_table"]:
             if "Index" in list(self.options["state_table"][0].keys()):
                 table = sorted(self.options["state_table"], key=lambda x: x["Index"])
@@ -1509,37 +1785,32 @@ class InstrumentState(XMLBase):
                 table = self.options["state_table"]
 
             for row in table[:]:
-                new_entry = self.document.createElement('Tuple')
+                new_entry = etree.SubElement(self.state_node, 'Tuple')
                 for key, value in row.items():
-                    set_attribute = self.document.createAttribute(key)
-                    new_entry.setAttributeNode(set_attribute)
-                    new_entry.setAttribute(key, "{0}".format(value))
-                self.state_node.appendChild(new_entry)
+                    new_entry.set(key, "{0}".format(value))
 
         # this is not the most direct way to define it but it is the most robust I think
-        # self.state_node=self.document.getElementsByTagName('State')[0]
+        # self.state_node=self.etree.findall('.//State')[0]
         # This should be in State_Description as State_Timestamp?
         if self.options["date"] in ['now']:
             # Add the Date attribute, this is the time when the state was created
             self.add_state_description()
-            timestamp_element = self.document.createElement("State_Timestamp")
-            text = str(datetime.datetime.utcnow().isoformat())
-            timestamp_element.appendChild(self.document.createTextNode(text))
-            state_description = self.document.getElementsByTagName("State_Description")[0]
-            state_description.appendChild(timestamp_element)
-        self.state_dictionary = dict([(str(node.getAttribute('Set')),
-                                       node.getAttribute('Value')) for node in \
-                                      self.state_node.getElementsByTagName('Tuple')])
+            state_description = self.etree.findall(".//State_Description")[0]
+            timestamp_element = etree.SubElement(state_description, "State_Timestamp")
+            timestamp_element.text = str(datetime.datetime.utcnow().isoformat())
+        self.state_dictionary = dict([(str(node.get('Set', '')),
+                                       node.get('Value', '')) for node in \
+                                      self.state_node.iter('Tuple')])
+
+    def update_indices(self):
+        """Points self.state_node at the last State element of self.etree"""
+        self.state_node = self.etree.findall('State')[-1]
 
     def add_state_description(self):
         """Adds the tag named State_Description
         """
-        state_description = self.document.createElement("State_Description")
-        if len(self.document.childNodes) == 0:
-            self.document.documentElement.appendChild(state_description)
-        elif not re.match("State_Description", self.document.childNodes[0].nodeName, re.IGNORECASE) and len(
-                self.document.childNodes) > 0:
-            self.document.documentElement.appendChild(state_description)
+        if self.etree.find("State_Description") is None:
+            etree.SubElement(self.etree, "State_Description")
         else:
             print("State_Description already exists, tag was not added ")
             pass
@@ -1548,22 +1819,20 @@ class InstrumentState(XMLBase):
         """Adds the description_dictionary to State_Description. Description dictionary is a key value pair
         describing the state. """
         try:
-            state_description = self.document.getElementsByTagName('State_Description')[0]
+            state_description = self.etree.findall('.//State_Description')[0]
         except:
             self.add_state_description()
-            state_description = self.document.getElementsByTagName('State_Description')[0]
+            state_description = self.etree.findall('.//State_Description')[0]
         for key, value in description_dictionary.items():
-            element = self.document.createElement("{0}".format(key))
-            text = self.document.createTextNode("{0}".format(value))
-            element.appendChild(text)
-            state_description.appendChild(element)
+            element = etree.SubElement(state_description, "{0}".format(key))
+            element.text = "{0}".format(value)
 
     def get_timestamp(self):
         """Tries to return the timestamp stored as an attribute date in the tag State"""
         # Take the first thing called Image
         try:
-            timestamp_node = self.document.getElementsByTagName('State_Timestamp')[0]
-            timestamp = timestamp_node.childNodes[0].nodeValue
+            timestamp_node = self.etree.findall('.//State_Timestamp')[0]
+            timestamp = timestamp_node.text
             return timestamp
         except:
             print("No Timestamp Found")
@@ -1571,31 +1840,20 @@ class InstrumentState(XMLBase):
 
     def get_attribute_names(self):
         """ Returns the attribute names in the first tuple element in the 'data' element """
-        attribute_names = []
-        data_nodes = self.document.getElementsByTagName('State')
-        first_tuple_node = data_nodes[0].childNodes[1]
-        text = first_tuple_node.toprettyxml()
-        text_list = text.split(' ')
-        # print text_list
-        for item in text_list:
-            try:
-                match = re.search('(?P<attribute_name>\w+)=', item)
-                name = match.group('attribute_name')
-                # print name
-                attribute_names.append(name)
-            except:
-                pass
-        return attribute_names
+        first_tuple_node = self.etree.find('.//State/Tuple')
+        if first_tuple_node is None:
+            return []
+        return list(first_tuple_node.keys())
 
     def get_state_list_dictionary(self):
         """Gets the state data in a list of dictionaries. This is the equivelent to a table"""
         out_list = []
-        tuple_list = self.document.getElementsByTagName("Tuple")
+        tuple_list = self.etree.iter("Tuple")
         attributes = self.get_attribute_names()[:]
         for node in tuple_list:
             new_row = {}
             for attribute in attributes:
-                new_row[attribute] = node.getAttribute(attribute)
+                new_row[attribute] = node.get(attribute, '')
             out_list.append(new_row)
         return out_list
 
@@ -1678,6 +1936,42 @@ def test_log_addition():
     print('Log_1+Log_2 Contents: using print')
     print(log_1+log_2)
 
+def test_XMLLog_append_performance(number_entries=100000,save_every=1000):
+    """Times adding number_entries to a XMLLog, saving every save_every entries, with the append only save
+    and with a full rewrite on every save. Then browses the saved log with iter_log_entries"""
+    import time
+    import tempfile
+    import shutil
+    log_directory=tempfile.mkdtemp()
+    os.chdir(log_directory)
+    for append_only_save in [True,False]:
+        new_log=XMLLog(None,**{"append_only_save":append_only_save})
+        start=time.perf_counter()
+        for index in range(number_entries):
+            new_log.add_entry("Entry number {0}".format(index))
+            if index%save_every==save_every-1:
+                new_log.save()
+        new_log.save()
+        print(("append_only_save={0}: {1} entries saved every {2} in {3:.3f} s".format(append_only_save,
+                number_entries,save_every,time.perf_counter()-start)))
+    start=time.perf_counter()
+    number_read=0
+    for row in iter_log_entries(new_log.path,start_Index=number_entries-10):
+        number_read+=1
+    print(("iter_log_entries found the last {0} entries in {1:.3f} s".format(number_read,
+            time.perf_counter()-start)))
+    reopened_log=XMLLog(new_log.path)
+    print(("The saved log has {0} entries, the last Index is {1}".format(len(reopened_log.Index_node_dictionary),
+                                                                        reopened_log.max_Index)))
+    # removing an element directly from the tree falls back to a full rewrite on the next save
+    reopened_log.etree.remove(reopened_log.etree[-1])
+    reopened_log.add_entry("Entry after a direct edit")
+    reopened_log.save()
+    print(("After a direct edit the saved log has {0} entries".format(
+        len(list(XMLLog(reopened_log.path).etree.iter('Entry'))))))
+    os.chdir(TESTS_DIRECTORY)
+    shutil.rmtree(log_directory)
+
 def test_EndOfDayXMLLog():
     """ Script to test that daily logs work properly"""
     os.chdir(TESTS_DIRECTORY)
@@ -1733,6 +2027,27 @@ def test_to_HTML():
     print('*'*80)
     print(new_log.to_HTML())
 
+def test_batch_to_HTML(number_documents=500):
+    """Times rendering number_documents instrument states with a style sheet compiled for every document,
+    with batch_to_HTML and with batch_to_HTML in a thread pool"""
+    import time
+    os.chdir(TESTS_DIRECTORY)
+    style_sheet=os.path.join(TESTS_DIRECTORY,DEFAULT_INSTRUMENT_STATE_STYLE)
+    states=[InstrumentState(None,**{"state_dictionary":{"SOUR:VOLT":index,"SOUR:CURR":.001*index},
+                                    "style_sheet":style_sheet}) for index in range(number_documents)]
+    start=time.perf_counter()
+    for state in states:
+        str(etree.XSLT(etree.parse(style_sheet))(state.etree))
+    print(("Compiling the style sheet for each of {0} states took {1:.3f} s".format(number_documents,
+                                                                                   time.perf_counter()-start)))
+    start=time.perf_counter()
+    HTML_list=batch_to_HTML(states)
+    print(("batch_to_HTML took {0:.3f} s".format(time.perf_counter()-start)))
+    start=time.perf_counter()
+    parallel_HTML_list=batch_to_HTML(states,parallel=True)
+    print(("batch_to_HTML in parallel took {0:.3f} s".format(time.perf_counter()-start)))
+    print(("The results are the same: {0}".format(HTML_list==parallel_HTML_list)))
+
 def test_DataTable():
     """ Tests the DataTable Class"""
     test_data=[tuple([2*i+j for i in range(3)]) for j in range(5)]
@@ -1759,6 +2074,35 @@ def test_DataTable():
     new_table_3.get_header()
     print(new_table_4)
 
+def test_DataTable_performance(number_rows=100000):
+    """Times writing and reading a number_rows DataTable with the bulk writer and typed column readers against
+    the row dictionary path"""
+    import time
+    os.chdir(TESTS_DIRECTORY)
+    column_names=["Frequency","reS11","imS11","Index"]
+    column_types=["float","float","float","int"]
+    rows=[[1.+index*.001,.5/(index+1),-.25/(index+1),index] for index in range(number_rows)]
+    start=time.perf_counter()
+    dictionary_rows=[dict(zip(column_names,row)) for row in rows]
+    dictionary_table=DataTable(None,**{"data_dictionary":{"Data":dictionary_rows}})
+    print(("Writing {0} rows as dictionaries took {1:.3f} s".format(number_rows,time.perf_counter()-start)))
+    start=time.perf_counter()
+    new_table=DataTable(None,**{"data_table":rows,"column_names":column_names,"column_types":column_types})
+    print(("Writing {0} rows with the bulk writer took {1:.3f} s".format(number_rows,time.perf_counter()-start)))
+    print(("The two tables are the same: {0}".format(str(new_table)==str(dictionary_table))))
+    new_table.save()
+    start=time.perf_counter()
+    DataTable(new_table.path)
+    print(("Opening the saved table took {0:.3f} s".format(time.perf_counter()-start)))
+    start=time.perf_counter()
+    columns=read_data_table_columns(new_table.path,column_types=column_types)
+    print(("read_data_table_columns took {0:.3f} s, the last Index is {1}".format(time.perf_counter()-start,
+                                                                                 columns["Index"][-1])))
+    os.remove(new_table.path)
+    missing_table=DataTable(None,**{"data_table":[[1.,None,.5,None],[2.,.1,.2,3]],"column_names":column_names,
+                                    "column_types":column_types})
+    print(("Missing values are read back as {0}".format(missing_table.data)))
+
 def test_get_header():
     """ Test of the get header function of the DataTable Class """
     test_dictionary={'Data_Description':{'x':'X Distance in microns.',
@@ -1792,6 +2136,43 @@ def test_get_attribute_names(sheet_name='Data_Table_021311_1.xml'):
             row=measurement.to_list(name)[index] +'\t'+row
         print(row)
 
+def test_XMLBase_performance(file_names=None,number_repeats=5,scale_factor=100):
+    """Times opening and printing the Data_Table_*.xml test files with the lxml only XMLBase against the old
+    minidom parse, toxml and lxml re-parse. The Tuple elements of each file are repeated scale_factor times
+    to make a multi-megabyte table"""
+    import time
+    import tempfile
+    os.chdir(TESTS_DIRECTORY)
+    if file_names is None:
+        file_names=sorted(fnmatch.filter(os.listdir(TESTS_DIRECTORY),'Data_Table_*.xml'))
+    for file_name in file_names:
+        table=XMLBase(file_name)
+        data_node=table.etree.find('.//Data')
+        if data_node is not None and scale_factor>1:
+            tuples=list(data_node)
+            for i in range(scale_factor-1):
+                data_node.extend([copy.deepcopy(node) for node in tuples])
+        scaled_file=tempfile.NamedTemporaryFile(suffix='.xml',delete=False)
+        scaled_file.write(etree.tostring(table.etree.getroottree(),encoding="utf-8"))
+        scaled_file.close()
+        file_size=os.path.getsize(scaled_file.name)/1024.
+        start=time.perf_counter()
+        for i in range(number_repeats):
+            document=xml.dom.minidom.parse(scaled_file.name)
+            tree=etree.fromstring(document.toxml(encoding="utf-8"))
+            # __str__ used to call update_etree before serializing
+            tree=etree.fromstring(document.toxml(encoding="utf-8"))
+            etree.tostring(tree,encoding="unicode")
+        legacy_time=(time.perf_counter()-start)/number_repeats
+        start=time.perf_counter()
+        for i in range(number_repeats):
+            new_xml=XMLBase(scaled_file.name)
+            str(new_xml)
+        lxml_time=(time.perf_counter()-start)/number_repeats
+        os.remove(scaled_file.name)
+        print(("{0}: {1:.1f} kB, minidom + lxml {2:.4f} s, lxml only {3:.4f} s, {4:.1f} times faster".format(
+            file_name,file_size,legacy_time,lxml_time,legacy_time/lxml_time)))
+
 def test_FileRegister():
     "Tests the FileRegister Class"
     os.chdir(TESTS_DIRECTORY)
@@ -1808,78 +2189,31 @@ def test_Metadata(File_Registry=None,Metadata_File=None):
     print(new_Metadata.current_node_to_HTML())
     #new_Metadata.save()
 
-def metadata_robot(file_registry=None,metadata=None):
+def metadata_robot(file_registry=None,metadata=None,**options):
     """ This robot checks for system metadata for the files in file_register
     and adds them to metadata without repeats (first removes old data with the
     same tagname). If no metadata file is given it just writes them to a file in
-     the same folder as file_register"""
+     the same folder as file_register. The files are read in parallel by harvest_metadata, **options are
+     passed to it, {"cache":MetadataCache(path)} skips files that did not change since the last run. A file
+     that can not be read or is not in the metadata file is skipped with a message"""
     if file_registry is None:
         os.chdir(TESTS_DIRECTORY)
         file_registry=r'Resource_Registry_20160518_001.xml'
     file_register=FileRegister(file_registry)
-    if metadata is None:
-        metadata_file=Metadata(file_register,**{"metadata_file":metadata})
-    else:
-        metadata_file=Metadata(file_register,**{"metadata_file":metadata})
-
-    for URL in list(metadata_file.FileRegister.Id_dictionary.keys()):
-        try:
-            system_metadata=get_system_metadata(URL_to_path(URL))
-            metadata_file.get_file_node(URL)
-            metadata_file.remove_element_in_current_node('System_Metadata')
-            metadata_file.add_element_to_current_node(XML_tag='System_Metadata',**system_metadata)
-        except:
-            print('No system metadata for %s'%URL)
-            pass
+    metadata_file=Metadata(file_register,**{"metadata_file":metadata})
+    path_URL_dictionary=dict([(URL_to_path(URL),URL) for URL in list(metadata_file.FileRegister.Id_dictionary.keys())])
+    for (path,harvested_metadata) in harvest_metadata(list(path_URL_dictionary.keys()),**options):
         try:
-            file_metadata=get_file_metadata(URL_to_path(URL))
-
-
-            new_file_info_node=metadata_file.document.createElement('File_Metadata')
-            for key,value in file_metadata.items():
-                new_node=metadata_file.document.createElement(key)
-                new_text=metadata_file.document.createTextNode(str(value))
-                new_node.appendChild(new_text)
-                new_file_info_node.appendChild(new_node)
-            metadata_file.remove_element_in_current_node('File_Metadata')
-            metadata_file.add_element_to_current_node(node=new_file_info_node)
-
+            add_harvested_metadata(metadata_file,path_URL_dictionary[path],harvested_metadata)
         except:
-            print('no file data for %s'%URL)
-            pass
-        try:
-            image_metadata=get_image_metadata(URL_to_path(URL))
-            if not image_metadata is None:
-                new_image_info_node=metadata_file.document.createElement('Image_Metadata')
-                for key,value in image_metadata.items():
-                    new_node=metadata_file.document.createElement(key)
-                    print(key,str(value))
-                    print(str(value) in ['','&#30;',chr(30)])
-                    new_text=metadata_file.document.createTextNode(str(value).replace(chr(30),''))
-                    new_node.appendChild(new_text)
-                    new_image_info_node.appendChild(new_node)
-                metadata_file.remove_element_in_current_node('Image_Metadata')
-                metadata_file.add_element_to_current_node(node=new_image_info_node)
-                print(' Image data')
-        except:
-            print('no image metadata for %s'%URL)
-
-            pass
-        try:
-            python_metadata=get_python_metadata(URL_to_path(URL))
-            #print python_metadata
-            metadata_file.get_file_node(URL)
-            metadata_file.remove_element_in_current_node('Python_Docstring')
-            metadata_file.add_element_to_current_node(XML_tag='Python_Docstring',
-            value=str(python_metadata['Python_Docstring']))
-        except:pass
+            print(('No metadata for %s'%path_URL_dictionary[path]))
     metadata_file.save()
 
 def test_InstrumentSheet():
     """ A test of the InstrumentSheet class"""
     instrument_sheet=InstrumentSheet(os.path.join(PYMEASURE_ROOT,'Instruments',INSTRUMENT_SHEETS[0]))
-    tags=instrument_sheet.document.getElementsByTagName('Instrument_Type')
-    value=[node.childNodes[0].data for node in tags]
+    tags=instrument_sheet.etree.iter('Instrument_Type')
+    value=[node.text for node in tags]
     print(value)
     print(dir(instrument_sheet))
     print(instrument_sheet.get_image_path())
@@ -41,6 +41,15 @@ from types import *
 from ctypes import *
 import datetime,time
 import sys
+import json
+import struct
+import collections
+import threading
+import functools
+try:
+    import queue
+except:
+    import Queue as queue
 
 #-------------------------------------------------------------------------------
 # Third Party Imports
@@ -98,6 +107,17 @@ try:
 except:
     print("Could not load numpy")
     pass
+try:
+    from Code.Utils.PerformanceUtils import timed,timing_span
+except:
+    print("Could not load Code.Utils.PerformanceUtils, timing spans are not recorded")
+    import contextlib
+    def timed(name=None,registry=None):
+        return lambda function:function
+    @contextlib.contextmanager
+    def timing_span(name,registry=None):
+        yield None
+    pass
 #-------------------------------------------------------------------------------
 # Module Constants
 ACTIVE_COMPONENTS=[PIL_AVAILABLE,DATA_SHEETS,METHOD_ALIASES]
@@ -106,6 +126,23 @@ INSTRUMENTS_DEFINED=[]
 #TODO Make PYMEASURE_ROOT be read from the settings folder
 PYMEASURE_ROOT=os.path.join(os.path.dirname( __file__ ), '..','..')
 VNA_FREQUENCY_UNIT_MULTIPLIERS={"Hz":1.,"kHz":10.**3,"MHz":10.**6,"GHz":10.**9,"THz":10.**12}
+EMULATION_DEFAULT_STATE={"SENS:SWE:TYPE":"LIN","SENS:FREQ:START":"1000000000.0","SENS:FREQ:STOP":"10000000000.0",
+                         "SENS:SWE:POIN":"201","SENS:BAND":"100000","SOUR:POW":"-20","OUTP":"1","FORM":"ASC,0",
+                         "ACQ:POINTS":"1024","TIM:SCAL":"4.096e-08","TIM:POS":"2.4e-08","TRIG:SOUR":"FPAN",
+                         "TRIG:SLOP":"POS","WAV:SOUR":"CHAN1","UNIT:POW":"W","SENS:FREQ":"1000000000.0",
+                         "FETC":"0.001"}
+"Values returned by a scripted EmulationInstrument for setting queries that have not been written or scripted"
+HISTORY_ACTIONS=["self.write","self.read"]
+"Actions recorded in an InstrumentHistory, stored as their index"
+HISTORY_RECORD_HEADER=struct.Struct("<dBii")
+"Binary history log record header: timestamp, action, argument length and response length (-1 is None)"
+STREAM_MAGIC=b"PYMEZSTR"
+"First bytes of a binary AcquisitionStream file, followed by a uint32 header length and a json header"
+STREAM_RECORD_HEADER=struct.Struct("<dII")
+"Binary AcquisitionStream record header: timestamp, number of rows and number of columns of float64 data"
+EMULATION_UNIT_MULTIPLIERS={"ps":10.**-12,"ns":10.**-9,"us":10.**-6,"ms":10.**-3,"s":1.,"m":10.**-3,"mv":10.**-3,
+                            "mV":10.**-3,"V":1.,"Hz":1.,"kHz":10.**3,"MHz":10.**6,"GHz":10.**9}
+"Unit suffixes that an EmulationInstrument removes from written values, so that :TIM:POS 50ns is returned as 5e-08"
 
 [EMULATION_S2P,EMULATION_S1P,EMULATION_W1P,EMULATION_W2P,EMULATION_SWITCH_TERMS]=[None,None,None,None,None]
 try:
@@ -127,10 +164,14 @@ def emulation_data(data=None):
     self.emulation_mode=True.
     For example just add @emulation_data(data_to_return) before an instrument method. This decorator also
     is conditional that the emulated data can be found. If there is a problem then it only returns the method
-    undecorated"""
+    undecorated. If the emulated resource is scripted (resource.full_emulation=True) the method runs against the
+    emulated resource instead."""
     def method_decorator(method):
+        @functools.wraps(method)
         def return_data(self,*args,**kwargs):
-            if self.emulation_mode and not data==None:
+            if self.emulation_mode and getattr(self.resource,"full_emulation",False):
+                return method(self,*args,**kwargs)
+            elif self.emulation_mode and not data==None:
                 return data
             elif data==None:
                 print("No data was present to return in emulation_mode, returning None instead.")
@@ -140,6 +181,23 @@ def emulation_data(data=None):
         return return_data
     return method_decorator
 
+def scpi_short_form(command_header):
+    """Returns the short, upper case form of a SCPI command header so that 'CALCulate:PARameter:SELect',
+    ':calc:par:sel' and 'CALC:PAR:SEL' all return 'CALC:PAR:SEL'. Mixed case mnemonics are reduced to their leading
+    upper case letters and any numeric suffix, a trailing ? is preserved."""
+    query=command_header.endswith("?")
+    command_header=command_header.rstrip("?").lstrip(":")
+    mnemonics=[]
+    for mnemonic in command_header.split(":"):
+        short_match=re.match("(?P<short>[A-Z*]{2,})[a-z]+(?P<suffix>\d*)$",mnemonic)
+        if short_match:
+            mnemonic=short_match.group("short")+short_match.group("suffix")
+        mnemonics.append(mnemonic.upper())
+    out=":".join(mnemonics)
+    if query:
+        out=out+"?"
+    return out
+
 def whos_there():
     """Whos_there is a function that prints the idn string for all
     GPIB instruments connected"""
@@ -252,6 +310,124 @@ def fix_segment_table(segment_table):
             segment_table[i + 1]["number_points"] -= 1
         i += 1
     return segment_table
+def pack_history_record(timestamp,action_code,argument=None,response=None):
+    """Returns a binary history log record, a HISTORY_RECORD_HEADER followed by the utf-8 encoded argument and
+    response"""
+    encoded=[]
+    for value in [argument,response]:
+        if value is None:
+            encoded.append(None)
+        else:
+            encoded.append(str(value).encode('utf-8'))
+    lengths=[-1 if value is None else len(value) for value in encoded]
+    return HISTORY_RECORD_HEADER.pack(timestamp,action_code,*lengths)+b"".join([value for value in encoded
+                                                                                 if value is not None])
+
+def read_history_log(log_path,start=None,stop=None):
+    """Reads a binary history log written by InstrumentHistory and yields dictionaries of the form
+    {"Timestamp","Action","Argument","Response"} with start <= Timestamp <= stop"""
+    in_file=open(log_path,'rb')
+    try:
+        while True:
+            header=in_file.read(HISTORY_RECORD_HEADER.size)
+            if len(header)<HISTORY_RECORD_HEADER.size:
+                break
+            [timestamp,action_code,argument_length,response_length]=HISTORY_RECORD_HEADER.unpack(header)
+            values=[]
+            for length in [argument_length,response_length]:
+                if length<0:
+                    values.append(None)
+                else:
+                    values.append(in_file.read(length).decode('utf-8'))
+            if (start is None or timestamp>=start) and (stop is None or timestamp<=stop):
+                yield {"Timestamp":timestamp,"Action":HISTORY_ACTIONS[action_code],
+                       "Argument":values[0],"Response":values[1]}
+    finally:
+        in_file.close()
+
+def read_acquisition_stream_header(file_path):
+    """Returns the header of a file written by AcquisitionStream as a dictionary with keys column_names,
+    option_line and metadata"""
+    in_file=open(file_path,'rb')
+    start=in_file.read(len(STREAM_MAGIC))
+    if start==STREAM_MAGIC:
+        header_length=struct.unpack("<I",in_file.read(4))[0]
+        header=json.loads(in_file.read(header_length).decode('utf-8'))
+    else:
+        in_file.seek(0)
+        header={"column_names":None,"option_line":None,"metadata":None}
+        for line in in_file:
+            line=line.decode('utf-8').strip()
+            if line.startswith("#"):
+                header["option_line"]=line
+            elif re.match("!\\s*Sweep",line):
+                break
+            elif line.startswith("!"):
+                header["column_names"]=line[1:].split()
+    in_file.close()
+    return header
+
+def tail_acquisition_stream(file_path,poll_interval=.1,timeout=None):
+    """Yields (timestamp,data) for every complete record in a file written by AcquisitionStream, data is a 2-d
+    numpy array of rows. The file is followed as it grows until no new record appears for timeout seconds,
+    if timeout is None it follows the file until the generator is closed. Use timeout=0 to read the records already
+    on disk."""
+    in_file=open(file_path,'rb')
+    try:
+        binary=in_file.read(len(STREAM_MAGIC))==STREAM_MAGIC
+        if binary:
+            header_length=struct.unpack("<I",in_file.read(4))[0]
+            in_file.read(header_length)
+        else:
+            in_file.seek(0)
+        buffer=b""
+        sweep=None
+        rows=[]
+        last_data_time=time.time()
+        while True:
+            chunk=in_file.read()
+            new_records=[]
+            buffer=buffer+chunk
+            if binary:
+                while len(buffer)>=STREAM_RECORD_HEADER.size:
+                    [timestamp,number_rows,number_columns]=STREAM_RECORD_HEADER.unpack_from(buffer)
+                    record_length=STREAM_RECORD_HEADER.size+8*number_rows*number_columns
+                    if len(buffer)<record_length:
+                        break
+                    data=np.frombuffer(buffer,dtype='<f8',count=number_rows*number_columns,
+                                       offset=STREAM_RECORD_HEADER.size).reshape(number_rows,number_columns)
+                    new_records.append((timestamp,data))
+                    buffer=buffer[record_length:]
+            else:
+                lines=buffer.split(b"\n")
+                buffer=lines.pop()
+                for line in lines:
+                    line=line.decode('utf-8').strip()
+                    sweep_match=re.match("!\\s*Sweep\\s+\\d+\\s+(?P<timestamp>\\S+)\\s+(?P<number_rows>\\d+)",line)
+                    if sweep_match:
+                        sweep=[float(sweep_match.group("timestamp")),int(sweep_match.group("number_rows"))]
+                        rows=[]
+                    elif sweep is not None and line and not line.startswith("!"):
+                        rows.append([float(value) for value in line.split()])
+                        if len(rows)==sweep[1]:
+                            new_records.append((sweep[0],np.array(rows)))
+                            sweep=None
+            for record in new_records:
+                yield record
+            if new_records:
+                last_data_time=time.time()
+            elif timeout is not None and time.time()-last_data_time>=timeout:
+                break
+            else:
+                time.sleep(poll_interval)
+    finally:
+        in_file.close()
+
+def read_acquisition_stream(file_path):
+    """Reads a file written by AcquisitionStream and returns a tuple of the header dictionary and a list of
+    (timestamp,data) records"""
+    return read_acquisition_stream_header(file_path),list(tail_acquisition_stream(file_path,timeout=0))
+
 #-------------------------------------------------------------------------------
 # Class Definitions
 
@@ -259,15 +435,248 @@ class VisaInstrumentError(Exception):
     def __init__(self,*args):
         Exception.__init__(self,*args)
 
+class AcquisitionStreamError(Exception):
+    def __init__(self,*args):
+        Exception.__init__(self,*args)
+
+
+class InstrumentHistory():
+    """InstrumentHistory is a bounded command history shared by EmulationInstrument and VisaInstrument. Entries
+    are stored in a ring buffer of fixed capacity as (timestamp,action,argument,response) tuples with numeric
+    timestamps (time.time()) and interned command strings, the oldest entries are dropped when the capacity is
+    reached. If log_path is specified every entry is also appended to a binary log on disk that can be read back with
+    read_history_log. Iterating or indexing the history returns dictionaries of the form
+    {"Timestamp","Action","Argument","Response"}."""
+    def __init__(self,capacity=10000,log_path=None):
+        """Initializes the history with a capacity and an optional binary log path"""
+        self.capacity=capacity
+        self.entries=collections.deque(maxlen=capacity)
+        self.log_path=log_path
+        self.log_file=None
+        if log_path is not None:
+            self.log_file=open(log_path,'ab')
+
+    def append(self,action,argument=None,response=None,timestamp=None):
+        """Appends an entry to the history, action is 'self.write','self.read' or a history dictionary"""
+        if isinstance(action,dict):
+            [timestamp,argument,response,action]=[action.get("Timestamp"),action.get("Argument"),
+                                                  action.get("Response"),action["Action"]]
+            if isinstance(timestamp,str):
+                timestamp=None
+        if timestamp is None:
+            timestamp=time.time()
+        action_code=HISTORY_ACTIONS.index(action)
+        if argument is not None:
+            argument=sys.intern(str(argument))
+        self.entries.append((timestamp,action_code,argument,response))
+        if self.log_file is not None:
+            self.log_file.write(pack_history_record(timestamp,action_code,argument,response))
+            self.log_file.flush()
+
+    def entry_to_dictionary(self,entry):
+        """Returns a history entry tuple as a dictionary"""
+        return {"Timestamp":entry[0],"Action":HISTORY_ACTIONS[entry[1]],"Argument":entry[2],"Response":entry[3]}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield self.entry_to_dictionary(entry)
+
+    def __getitem__(self, index):
+        if isinstance(index,slice):
+            return [self.entry_to_dictionary(entry) for entry in list(self.entries)[index]]
+        return self.entry_to_dictionary(self.entries[index])
+
+    def to_list(self):
+        """Returns the history as a list of dictionaries"""
+        return list(self)
+
+    def get_window(self,start=None,stop=None):
+        """Returns the entries with start <= Timestamp <= stop as a list of dictionaries. Start and stop are
+        time.time() values, None means unbounded"""
+        return [self.entry_to_dictionary(entry) for entry in self.entries
+                if (start is None or entry[0]>=start) and (stop is None or entry[0]<=stop)]
+
+    def dump(self,file_path,start=None,stop=None):
+        """Dumps the entries between start and stop to a json file that can be replayed by an
+        EmulationInstrument with the option history=file_path"""
+        out_file=open(file_path,'w')
+        json.dump(self.get_window(start,stop),out_file)
+        out_file.close()
+        return file_path
+
+    def replay(self,instrument,start=None,stop=None):
+        """Re-issues the write commands between start and stop to instrument, returns the number of commands
+        written"""
+        number_commands=0
+        for entry in self.get_window(start,stop):
+            if entry["Action"]=="self.write":
+                instrument.write(entry["Argument"])
+                number_commands+=1
+        return number_commands
+
+    def clear(self):
+        """Removes all entries from the ring buffer, the binary log is unchanged"""
+        self.entries.clear()
+
+    def close(self):
+        """Closes the binary log"""
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file=None
+
+class AcquisitionStream():
+    """AcquisitionStream appends acquired sweeps or frames to an open file on a background writer thread.
+    Data is handed to the writer with put() through a bounded queue (put blocks if the writer falls behind) and each
+    record is flushed as soon as it is written, so a crash only loses the records still in the queue and readers can
+    follow the file with tail_acquisition_stream while acquisition continues. file_format is "binary", a
+    STREAM_MAGIC header followed by float64 records, or "touchstone", a text file with an option line, column names
+    and one block of rows per sweep that starts with a '! Sweep <index> <timestamp> <number_rows>' comment. Records
+    are appended to an existing file only if it has the same file_format and column_names, otherwise an
+    AcquisitionStreamError is raised."""
+    def __init__(self,file_path,column_names,**options):
+        """Initializes and starts the stream writer"""
+        defaults={"file_format":"binary","queue_size":16,"option_line":None,"metadata":None,
+                  "data_delimiter":" ","comment_begin":"!"}
+        self.options={}
+        for key,value in defaults.items():
+            self.options[key]=value
+        for key,value in options.items():
+            self.options[key]=value
+        self.path=file_path
+        self.column_names=column_names
+        self.check_header()
+        self.number_records=0
+        self.error=None
+        self.queue=queue.Queue(maxsize=self.options["queue_size"])
+        self.writer=threading.Thread(target=self.__write_records__)
+        self.writer.daemon=True
+        self.writer.start()
+
+    def check_header(self):
+        """Raises AcquisitionStreamError if the file already has records with a different file_format or
+        column_names"""
+        if not os.path.isfile(self.path) or os.path.getsize(self.path)==0:
+            return
+        with open(self.path,'rb') as in_file:
+            binary=in_file.read(len(STREAM_MAGIC))==STREAM_MAGIC
+        if binary!=bool(re.search("bin",self.options["file_format"],re.IGNORECASE)):
+            raise AcquisitionStreamError("{0} is not a {1} stream, use a new file".format(self.path,
+                                                                                     self.options["file_format"]))
+        existing_column_names=read_acquisition_stream_header(self.path)["column_names"]
+        if existing_column_names!=list(self.column_names):
+            raise AcquisitionStreamError("{0} has the columns {1} not {2}, use a new file".format(
+                self.path,existing_column_names,list(self.column_names)))
+
+    def __write_header__(self,out_file):
+        """Writes the header if the file is empty"""
+        if out_file.tell()>0:
+            return
+        if re.search("bin",self.options["file_format"],re.IGNORECASE):
+            header=json.dumps({"column_names":self.column_names,"option_line":self.options["option_line"],
+                               "metadata":self.options["metadata"]}).encode('utf-8')
+            out_file.write(STREAM_MAGIC+struct.pack("<I",len(header))+header)
+        else:
+            lines=[]
+            if self.options["option_line"]:
+                lines.append(self.options["option_line"])
+            lines.append(self.options["comment_begin"]+" "+self.options["data_delimiter"].join(self.column_names))
+            out_file.write(("\n".join(lines)+"\n").encode('utf-8'))
+
+    def __write_records__(self):
+        """The writer thread, writes records from the queue until it gets None"""
+        out_file=None
+        try:
+            out_file=open(self.path,'ab')
+            self.__write_header__(out_file)
+            out_file.flush()
+            while True:
+                item=self.queue.get()
+                if item is None:
+                    break
+                [timestamp,data]=item
+                if re.search("bin",self.options["file_format"],re.IGNORECASE):
+                    out_file.write(STREAM_RECORD_HEADER.pack(timestamp,data.shape[0],data.shape[1])+
+                                   data.astype('<f8').tobytes())
+                else:
+                    lines=["{0} Sweep {1} {2!r} {3}".format(self.options["comment_begin"],self.number_records,
+                                                           timestamp,data.shape[0])]
+                    for row in data.tolist():
+                        lines.append(self.options["data_delimiter"].join([repr(value) for value in row]))
+                    out_file.write(("\n".join(lines)+"\n").encode('utf-8'))
+                out_file.flush()
+                self.number_records+=1
+        except Exception as error:
+            self.error=error
+            # drain the queue so that put does not block forever
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+        finally:
+            if out_file is not None:
+                out_file.close()
+
+    def put(self,data,timestamp=None):
+        """Queues a 2-d list or array of rows to be appended to the stream"""
+        if self.error is not None:
+            raise self.error
+        if timestamp is None:
+            timestamp=time.time()
+        data=np.array(data,dtype=float)
+        if data.ndim==1:
+            data=data.reshape(1,-1)
+        self.queue.put((timestamp,data))
+
+    def close(self):
+        """Writes the remaining records and closes the stream"""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        if self.error is not None:
+            raise self.error
 
 class EmulationInstrument(InstrumentSheet):
-    """ General Class to communicate with COMM and GPIB instruments
-    This is a blend of the pyvisa resource and an xml description. """
+    """ General Class to emulate COMM and GPIB instruments when no communications bus is present.
+    This is a blend of a scripted visa resource and an xml description. By default every read returns a
+    'Buffer Read at <timestamp>' string, if a response_script, a recorded history or an emulation_s2p is specified
+    the instrument keeps an emulated state, answers setting queries with the last written value, replays scripted
+    or recorded responses and generates sweep data for VNA traces (CALC:DATA?) and scope frames (:WAV:DATA?).
+    Communication time is modeled as latency + bytes/bandwidth, accumulated in the attribute elapsed_time and only
+    slept if simulate_latency is True.
+
+    Options
+    -------
+    response_script: a dictionary {"QUERY?":response or [response_1,response_2,..]} or the path to a json file of the
+    same form. Lists of responses are returned in order, the last one repeats.
+    history: a list of history dictionaries {"Timestamp","Action","Argument","Response"} or the path to a json file
+    written by save_history, query and response pairs are replayed in order.
+    emulation_s2p: a S2PV1 used to generate S-parameter and wave-parameter sweep data.
+    latency: seconds per query, write_latency: seconds per write, bandwidth: bytes per second or None.
+    full_emulation: if True emulates the state and sweep data without a script, history or emulation_s2p.
+    history_capacity: the number of entries kept in the InstrumentHistory, history_log: an optional binary log path,
+    buffer_capacity: the number of entries kept in write_buffer and read_buffer.
+    """
 
     def __init__(self, resource_name=None, **options):
-        """ Intializes the VisaInstrument Class"""
+        """ Intializes the EmulationInstrument Class"""
         defaults = {"state_directory": os.getcwd(),
-                    "instrument_description_directory": os.path.join(PYMEASURE_ROOT, 'Instruments')}
+                    "instrument_description_directory": os.path.join(PYMEASURE_ROOT, 'Instruments'),
+                    "response_script": None,
+                    "history": None,
+                    "emulation_s2p": None,
+                    "latency": .001,
+                    "write_latency": 0.,
+                    "bandwidth": None,
+                    "simulate_latency": True,
+                    "default_response": None,
+                    "full_emulation": False,
+                    "history_capacity": 10000,
+                    "history_log": None,
+                    "buffer_capacity": 1000}
         self.options = {}
         for key, value in defaults.items():
             self.options[key] = value
@@ -286,7 +695,7 @@ class EmulationInstrument(InstrumentSheet):
                 self.DEFAULT_STATE_QUERY_DICTIONARY = {}
                 self.info_found = False
                 self.instrument_address = resource_name
-                self.name = resource_name.replace(":", "_")
+                self.name = str(resource_name).replace(":", "_")
                 pass
         else:
             self.info_found = False
@@ -299,32 +708,248 @@ class EmulationInstrument(InstrumentSheet):
         else:
             self.description = {'Instrument_Description': self.instrument_address}
 
-        self.state_buffer = []
         self.STATE_BUFFER_MAX_LENGTH = 10
-        self.write_buffer=[]
-        self.read_buffer=[]
-        self.history=[]
-        #self.resource_manager = visa.ResourceManager()
-        # Call the visa instrument class-- this gives ask,write,read
-        #self.resource = self.resource_manager.open_resource(self.instrument_address)
+        self.state_buffer = collections.deque(maxlen=self.STATE_BUFFER_MAX_LENGTH)
+        self.write_buffer=collections.deque(maxlen=self.options["buffer_capacity"])
+        self.read_buffer=collections.deque(maxlen=self.options["buffer_capacity"])
+        self.history=InstrumentHistory(capacity=self.options["history_capacity"],
+                                       log_path=self.options["history_log"])
+        self.timeout=2000
+        self.elapsed_time=0.
+        self.output_queue=[]
+        self.trace_definitions={}
+        self.emulated_state=dict(EMULATION_DEFAULT_STATE)
+        self.scripted_responses={}
+        self.emulation_s2p=self.options["emulation_s2p"]
+        self.full_emulation=self.options["full_emulation"]
+        if self.options["response_script"] is not None:
+            self.load_response_script(self.options["response_script"])
+        if self.options["history"] is not None:
+            self.load_history(self.options["history"])
+        if self.emulation_s2p is not None:
+            self.full_emulation=True
+            frequency_list=self.get_s2p_frequency_list()
+            self.emulated_state["SENS:FREQ:START"]=str(frequency_list[0])
+            self.emulated_state["SENS:FREQ:STOP"]=str(frequency_list[-1])
+            self.emulated_state["SENS:SWE:POIN"]=str(len(frequency_list))
         self.current_state = self.get_state()
 
+    def load_response_script(self,response_script):
+        """Adds a response script to the scripted responses. The script is a dictionary of the form
+        {"QUERY?":response or [response_1,response_2,..]} or a path to a json file with the same form"""
+        if isinstance(response_script,str):
+            in_file=open(response_script,'r')
+            response_script=json.load(in_file)
+            in_file.close()
+        for query,responses in response_script.items():
+            if not isinstance(responses,list):
+                responses=[responses]
+            self.scripted_responses[self.__normalize_command__(query)]=[str(x) for x in responses]
+        self.full_emulation=True
+
+    def load_history(self,history):
+        """Adds the query/response pairs in a recorded history to the scripted responses. The history is an
+        InstrumentHistory, a list of dictionaries of the form {"Timestamp","Action","Argument","Response"}, a path to a
+        json file written by save_history or a path to a binary history log"""
+        if isinstance(history,str):
+            if re.search("json$",history,re.IGNORECASE):
+                in_file=open(history,'r')
+                history=json.load(in_file)
+                in_file.close()
+            else:
+                history=read_history_log(history)
+        last_query=None
+        for entry in history:
+            if re.search("write",entry["Action"]) and "?" in str(entry["Argument"]):
+                last_query=[part for part in str(entry["Argument"]).split(";") if "?" in part][-1]
+                last_query=self.__normalize_command__(last_query)
+            elif re.search("read",entry["Action"]) and last_query is not None:
+                if last_query not in self.scripted_responses:
+                    self.scripted_responses[last_query]=[]
+                self.scripted_responses[last_query].append(str(entry["Response"]))
+                last_query=None
+        self.full_emulation=True
+
+    def save_history(self,file_path=None):
+        """Saves the command history as a json file that can be replayed with the option history=file_path"""
+        if file_path is None:
+            file_path=auto_name(specific_descriptor=self.name,general_descriptor="History",
+                                directory=self.options["state_directory"],extension='json')
+            file_path=os.path.join(self.options["state_directory"],file_path)
+        out_file=open(file_path,'w')
+        json.dump(self.history.to_list(),out_file)
+        out_file.close()
+        return file_path
+
+    def __normalize_command__(self,command):
+        """Returns the command as [short form header] + [' ' + arguments]"""
+        parts=command.strip().split(None,1)
+        if not parts:
+            return ""
+        header=scpi_short_form(parts[0])
+        if len(parts)>1:
+            return header+" "+parts[1].strip()
+        return header
+
+    def __model_latency__(self,latency,message):
+        """Adds the modeled transfer time of message to elapsed_time and sleeps if simulate_latency is True"""
+        transfer_time=latency
+        if self.options["bandwidth"]:
+            transfer_time+=len(message)/float(self.options["bandwidth"])
+        self.elapsed_time+=transfer_time
+        if self.options["simulate_latency"] and transfer_time>0:
+            time.sleep(transfer_time)
+
+    def __process_command__(self,command):
+        """Updates the emulated state for a setting command or queues the response for a query"""
+        command=self.__normalize_command__(command)
+        if not command:
+            return
+        parts=command.split(None,1)
+        header=parts[0]
+        argument=""
+        if len(parts)>1:
+            argument=parts[1]
+        if header.endswith("?"):
+            self.output_queue.append(self.__query_response__(header,argument))
+        else:
+            unit_match=re.match("(?P<value>[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?)\s*(?P<unit>[a-zA-Z]+)$",argument)
+            if unit_match and unit_match.group("unit") in EMULATION_UNIT_MULTIPLIERS:
+                argument=str(float(unit_match.group("value"))*EMULATION_UNIT_MULTIPLIERS[unit_match.group("unit")])
+            self.emulated_state[header]=argument
+            if header in ["CALC:PAR:DEF","CALC1:PAR:DEF"]:
+                definition=argument.split(",",1)
+                if len(definition)>1:
+                    self.trace_definitions[definition[0].strip("'\" ")]=definition[1].strip()
+
+    def __query_response__(self,header,argument=""):
+        """Returns the emulated response to a query"""
+        full_query=(header+" "+argument).strip()
+        for key in [full_query,header]:
+            if key in self.scripted_responses:
+                responses=self.scripted_responses[key]
+                if len(responses)>1:
+                    return responses.pop(0)
+                return responses[0]
+        if not self.full_emulation:
+            return None
+        if re.match("CALC\\d*:DATA",header):
+            selected_trace=self.emulated_state.get("CALC:PAR:SEL",
+                                                   self.emulated_state.get("CALC1:PAR:SEL","S11"))
+            return self.get_trace_string(selected_trace.strip("'\" "))
+        elif re.match("WAV:DATA",header):
+            return ",".join(["{0:.6e}".format(x) for x in self.get_waveform()])
+        elif header in ["*OPC?"]:
+            return "1"
+        elif header in ["*IDN?"]:
+            return "pyMez,EmulationInstrument,{0},0".format(self.instrument_address)
+        elif header in ["CALC:PAR:CAT?"]:
+            return ",".join(["{0},{1}".format(name,definition)
+                             for name,definition in self.trace_definitions.items()])
+        elif header.rstrip("?") in self.emulated_state:
+            return self.emulated_state[header.rstrip("?")]
+        return self.options["default_response"]
+
+    def get_s2p_frequency_list(self):
+        """Returns the frequency list of the emulation_s2p in Hz"""
+        multiplier=1.
+        for unit,unit_multiplier in VNA_FREQUENCY_UNIT_MULTIPLIERS.items():
+            if unit.upper()==self.emulation_s2p.frequency_units.upper():
+                multiplier=unit_multiplier
+        return [row[0]*multiplier for row in self.emulation_s2p.sparameter_complex]
+
+    def get_frequency_list(self):
+        """Returns the emulated frequency list in Hz as determined by the emulated sweep settings"""
+        number_points=int(float(self.emulated_state["SENS:SWE:POIN"]))
+        start=float(self.emulated_state["SENS:FREQ:START"])
+        stop=float(self.emulated_state["SENS:FREQ:STOP"])
+        if re.search("LOG",self.emulated_state["SENS:SWE:TYPE"],re.IGNORECASE):
+            return np.logspace(np.log10(start),np.log10(stop),num=number_points).tolist()
+        return np.linspace(start,stop,number_points).tolist()
+
+    def get_sparameter(self,parameter="S11"):
+        """Returns the complex sparameter [S11,S21,S12,S22] interpolated from emulation_s2p onto the emulated
+        frequency list, if there is no emulation_s2p it returns an ideal thru"""
+        frequency_list=np.array(self.get_frequency_list())
+        if self.emulation_s2p is None:
+            if parameter in ["S21","S12"]:
+                return np.ones(len(frequency_list),dtype=complex)
+            return np.zeros(len(frequency_list),dtype=complex)
+        column=["S11","S21","S12","S22"].index(parameter)+1
+        s2p_frequency=np.array(self.get_s2p_frequency_list())
+        s2p_values=np.array([row[column] for row in self.emulation_s2p.sparameter_complex])
+        if len(s2p_frequency)==len(frequency_list):
+            return s2p_values
+        return np.interp(frequency_list,s2p_frequency,s2p_values.real)+\
+               1j*np.interp(frequency_list,s2p_frequency,s2p_values.imag)
+
+    def get_trace_values(self,trace_name):
+        """Returns the complex values of a trace. Trace names or definitions of the form S11, A1_D2, B2_D1,
+        or 'R1,1' and 'B,2' (a receiver and a drive port) are emulated as the waves of an ideal source
+        (a=1 at the drive port) incident on the emulation_s2p"""
+        definition=self.trace_definitions.get(trace_name,trace_name)
+        number_points=len(self.get_frequency_list())
+        sparameter_match=re.match("S(\\d)(\\d)",definition,re.IGNORECASE)
+        wave_match=re.match("(?P<wave>[AB])(?P<port>\\d)_D(?P<drive>\\d)",trace_name,re.IGNORECASE)
+        receiver_match=re.match("(?P<receiver>R\\d|[A-D])\\s*(,\\s*(?P<drive>\\d))?$",definition,re.IGNORECASE)
+        if sparameter_match:
+            return self.get_sparameter("S{0}{1}".format(*sparameter_match.groups()))
+        elif wave_match:
+            [wave,port,drive]=[wave_match.group("wave").upper(),int(wave_match.group("port")),
+                               int(wave_match.group("drive"))]
+        elif receiver_match:
+            receiver=receiver_match.group("receiver").upper()
+            drive=int(receiver_match.group("drive") or 1)
+            if receiver.startswith("R"):
+                [wave,port]=["A",int(receiver[1:])]
+            else:
+                [wave,port]=["B","ABCD".index(receiver)+1]
+        else:
+            return np.zeros(number_points,dtype=complex)
+        if wave=="A":
+            return np.ones(number_points,dtype=complex)*float(port==drive)
+        if port in [1,2] and drive in [1,2]:
+            return self.get_sparameter("S{0}{1}".format(port,drive))
+        return np.zeros(number_points,dtype=complex)
+
+    def get_trace_string(self,trace_name):
+        """Returns the trace as the comma separated real,imaginary string returned by CALC:DATA? SDATA"""
+        values=self.get_trace_values(trace_name)
+        interleaved=np.empty(2*len(values))
+        interleaved[0::2]=values.real
+        interleaved[1::2]=values.imag
+        return ",".join(["{0:.12e}".format(x) for x in interleaved])
+
+    def get_waveform(self,channel=None):
+        """Returns an emulated scope frame for the channel selected by :WAV:SOUR, a sinusoid with a period of
+        10 divisions and an amplitude of 10 mV per channel"""
+        if channel is None:
+            channel=int(re.sub("[^\\d]","",self.emulated_state["WAV:SOUR"]) or 1)
+        number_points=int(float(self.emulated_state["ACQ:POINTS"]))
+        phase=np.linspace(0,2*np.pi,number_points,endpoint=False)
+        return (.01*channel*np.sin(phase)).tolist()
+
     def write(self, command):
         "Writes command to instrument"
-        now=datetime.datetime.utcnow().isoformat()
         self.write_buffer.append(command)
-        self.history.append({"Timestamp":now,"Action":"self.write",
-                             "Argument":command,"Response":None})
-
+        self.history.append("self.write",command)
+        # like a SCPI instrument, a new command message clears any unread responses
+        self.output_queue=[]
+        for sub_command in command.split(";"):
+            self.__process_command__(sub_command)
+        self.__model_latency__(self.options["write_latency"],command)
 
     def read(self):
         "Reads from the instrument"
         now=datetime.datetime.utcnow().isoformat()
-        out="Buffer Read at {0}".format(now)
+        out=None
+        if self.output_queue:
+            out=self.output_queue.pop(0)
+        if out is None:
+            out="Buffer Read at {0}".format(now)
         self.read_buffer.append(out)
-        time.sleep(.001)
-        self.history.append({"Timestamp":now,"Action":"self.read",
-                             "Argument":None,"Response":out})
+        self.__model_latency__(self.options["latency"],out)
+        self.history.append("self.read",None,out)
         return out
 
     def query(self, command):
@@ -332,30 +957,30 @@ class EmulationInstrument(InstrumentSheet):
         self.write(command)
         return self.read()
 
-
     def ask(self, command):
         "Writes command and then reads a response"
         return self.query(command)
 
+    def query_binary_values(self,command,datatype='h'):
+        """Writes command and returns the response as a list of integers, the emulated equivalent of
+        pyvisa's query_binary_values for 16 bit words"""
+        response=self.query(command)
+        try:
+            return [int(float(x)*2**15) for x in response.split(",")]
+        except:
+            return []
+
     def set_state(self, state_dictionary=None, state_table=None):
         """ Sets the instrument to the state specified by Command:Value pairs"""
         if state_dictionary:
-            if len(self.state_buffer) + 1 < self.STATE_BUFFER_MAX_LENGTH:
-                self.state_buffer.append(self.get_state())
-            else:
-                self.state_buffer.pop(1)
-                self.state_buffer.insert(-1, self.get_state())
+            self.state_buffer.append(self.current_state)
             for state_command, value in state_dictionary.items():
                 self.write(state_command + ' ' + str(value))
             self.current_state = self.get_state()
         if state_table:
             if "Index" in list(state_table[0].keys()):
                 state_table = sorted(state_table, key=lambda x: x["Index"])
-            if len(self.state_buffer) + 1 < self.STATE_BUFFER_MAX_LENGTH:
-                self.state_buffer.append(self.get_state())
-            else:
-                self.state_buffer.pop(1)
-                self.state_buffer.insert(-1, self.get_state())
+            self.state_buffer.append(self.current_state)
             # now we need to write the command
             for state_row in state_table:
                 # a state row has a set and value
@@ -434,16 +1059,22 @@ class EmulationInstrument(InstrumentSheet):
 
     def close(self):
         """Closes the VISA session"""
+        self.history.close()
         print("Emulation Instrument has been closed")
         
 class VisaInstrument(InstrumentSheet):
     """ General Class to communicate with COMM and GPIB instruments
     This is a blend of the pyvisa resource and an xml description. If there is no device connected
-     enters into a emulation mode. Where all the commands are logged as .history and the attribute emulation_mode=True"""
+     enters into a emulation mode. Where all the commands are logged as .history and the attribute emulation_mode=True.
+     In both modes .history is a bounded InstrumentHistory of capacity history_capacity that is optionally logged to
+     the binary file history_log."""
     def __init__(self,resource_name=None,**options):
         """ Initializes the VisaInstrument Class"""
         defaults={"state_directory":os.getcwd(),
-                  "instrument_description_directory":os.path.join(PYMEASURE_ROOT,'Instruments')}
+                  "instrument_description_directory":os.path.join(PYMEASURE_ROOT,'Instruments'),
+                  "emulation_options":None,
+                  "history_capacity":10000,
+                  "history_log":None}
         self.options={}
         for key,value in defaults.items():
             self.options[key]=value
@@ -475,57 +1106,71 @@ class VisaInstrument(InstrumentSheet):
         else:
             self.description={'Instrument_Description':self.instrument_address}
         
-        self.state_buffer=[]
         self.STATE_BUFFER_MAX_LENGTH=10
-        try:
-            self.resource_manager=visa.ResourceManager()
-            # Call the visa instrument class-- this gives ask,write,read
-            self.resource=self.resource_manager.open_resource(self.instrument_address)
-            self.emulation_mode = False
-        except:
-            print("Unable to load resource entering emulation mode ...")
-            self.resource=EmulationInstrument(self.instrument_address)
+        self.state_buffer=collections.deque(maxlen=self.STATE_BUFFER_MAX_LENGTH)
+        # if emulation_options are specified the instrument is emulated even if a resource is present
+        self.emulation_mode=self.options["emulation_options"] is not None
+        if not self.emulation_mode:
+            try:
+                self.resource_manager=visa.ResourceManager()
+                # Call the visa instrument class-- this gives ask,write,read
+                self.resource=self.resource_manager.open_resource(self.instrument_address)
+                self.history=InstrumentHistory(capacity=self.options["history_capacity"],
+                                               log_path=self.options["history_log"])
+            except:
+                print("Unable to load resource entering emulation mode ...")
+                self.emulation_mode=True
+        if self.emulation_mode:
+            emulation_options={"history_capacity":self.options["history_capacity"],
+                               "history_log":self.options["history_log"]}
+            if self.options["emulation_options"]:
+                emulation_options.update(self.options["emulation_options"])
+            self.resource=EmulationInstrument(self.instrument_address,**emulation_options)
             self.history=self.resource.history
-            self.emulation_mode=True
         self.current_state=self.get_state()
         
 
+    @timed()
     def write(self,command):
         "Writes command to instrument"
+        # in emulation_mode the resource records its own history
+        if not self.emulation_mode:
+            self.history.append("self.write",command)
         return self.resource.write(command)
 
+    @timed()
     def read(self):
         "Reads from the instrument"
-        return self.resource.read()
+        out=self.resource.read()
+        if not self.emulation_mode:
+            self.history.append("self.read",None,out)
+        return out
 
+    @timed()
     def query(self,command):
         "Writes command and then reads a response"
-        return self.resource.query(command)
+        out=self.resource.query(command)
+        if not self.emulation_mode:
+            self.history.append("self.write",command)
+            self.history.append("self.read",None,out)
+        return out
 
     def ask(self,command):
         "Writes command and then reads a response"
-        return self.resource.query(command)
+        return self.query(command)
 
     def set_state(self,state_dictionary=None,state_table=None):
         """ Sets the instrument to the state specified by state_dictionary={Command:Value,..} pairs, or a list of dictionaries
         of the form state_table=[{"Set":Command,"Value":Value},..]"""
         if state_dictionary:
-            if len(self.state_buffer)+1<self.STATE_BUFFER_MAX_LENGTH:
-                self.state_buffer.append(self.get_state())
-            else:
-                self.state_buffer.pop(1)
-                self.state_buffer.insert(-1,self.get_state())
+            self.state_buffer.append(self.current_state)
             for state_command,value in state_dictionary.items():
                 self.write(state_command+' '+str(value))
             self.current_state=self.get_state()
         if state_table:
             if "Index" in list(state_table[0].keys()):
                 state_table=sorted(state_table,key=lambda x:x["Index"])
-            if len(self.state_buffer)+1<self.STATE_BUFFER_MAX_LENGTH:
-                self.state_buffer.append(self.get_state())
-            else:
-                self.state_buffer.pop(1)
-                self.state_buffer.insert(-1,self.get_state())
+            self.state_buffer.append(self.current_state)
             # now we need to write the command
             for state_row in state_table:
                 # a state row has a set and value
@@ -612,7 +1257,11 @@ class VisaInstrument(InstrumentSheet):
 
     def close(self):
         """Closes the VISA session"""
-        self.resource_manager.close()
+        if self.emulation_mode:
+            self.resource.close()
+        else:
+            self.history.close()
+            self.resource_manager.close()
 
 
 class VNA(VisaInstrument):
@@ -630,7 +1279,7 @@ class VNA(VisaInstrument):
         for key, value in options.items():
             self.options[key] = value
         VisaInstrument.__init__(self, resource_name, **self.options)
-        if self.emulation_mode:
+        if self.emulation_mode and not self.resource.full_emulation:
             self.power = -20
             self.IFBW = 10
             self.frequency_units = self.options["frequency_units"]
@@ -1053,6 +1702,7 @@ class VNA(VisaInstrument):
         for trace in traces:
             self.write("DISP:WIND{0}:TRAC{1}:DEL".format(window, trace))
 
+    @timed()
     @emulation_data(EMULATION_SWITCH_TERMS)
     def measure_switch_terms(self, **options):
         """Measures switch terms and returns a s2p table in forward and reverse format. To return in port format
@@ -1135,6 +1785,7 @@ class VNA(VisaInstrument):
         s2p.change_frequency_units(self.frequency_units)
         return s2p
 
+    @timed()
     @emulation_data(EMULATION_S2P)
     def measure_sparameters(self, **options):
         """Triggers a single sparameter measurement for all 4 parameters and returns a SP2V1 object"""
@@ -1355,6 +2006,7 @@ class VNA(VisaInstrument):
             self.frequency_list = []
         return self.frequency_list[:]
 
+    @timed()
     @emulation_data(EMULATION_W1P)
     def measure_w1p(self, **options):
         """Triggers a single w1p measurement for a specified
@@ -1426,6 +2078,7 @@ class VNA(VisaInstrument):
         w1p = AsciiDataTable(None, **options)
         return w1p
 
+    @timed()
     @emulation_data(EMULATION_W2P)
     def measure_w2p(self, **options):
         """Triggers a single w2p measurement for a specified
@@ -1507,6 +2160,53 @@ class VNA(VisaInstrument):
         w2p = W2P(None, **options)
         return w2p
 
+    def stream_sweeps(self,number_sweeps=1,**options):
+        """Measures number_sweeps sweeps and appends each one to an AcquisitionStream file as it is acquired,
+        instead of building the measurements in memory. The option measurement is 'sparameters', 'switch_terms',
+        'w1p' or 'w2p', measure_options are passed to the measure method, file_format is 'binary' or 'touchstone' and
+        sweep_interval is the time in seconds to wait between sweeps. Returns the path of the stream file, which
+        can be followed with tail_acquisition_stream while the acquisition runs."""
+        defaults={"measurement":"sparameters","measure_options":{},"file_path":None,"file_format":"binary",
+                  "queue_size":16,"sweep_interval":0,"directory":self.options["state_directory"]}
+        self.stream_options={}
+        for key,value in defaults.items():
+            self.stream_options[key]=value
+        for key,value in options.items():
+            self.stream_options[key]=value
+        measure_methods={"sparameters":self.measure_sparameters,"switch_terms":self.measure_switch_terms,
+                         "w1p":self.measure_w1p,"w2p":self.measure_w2p}
+        measure_method=measure_methods[self.stream_options["measurement"]]
+        if re.search("bin",self.stream_options["file_format"],re.IGNORECASE):
+            extension="bin"
+        elif self.stream_options["measurement"] in ["w1p","w2p"]:
+            extension=self.stream_options["measurement"]
+        else:
+            extension="s2p"
+        file_path=self.stream_options["file_path"]
+        if file_path is None:
+            file_path=auto_name(specific_descriptor=self.name,general_descriptor="Stream",
+                                directory=self.stream_options["directory"],extension=extension)
+            file_path=os.path.join(self.stream_options["directory"],file_path)
+        stream=None
+        try:
+            for sweep_index in range(number_sweeps):
+                measurement=measure_method(**self.stream_options["measure_options"])
+                if stream is None:
+                    option_line=getattr(measurement,"option_line",None)
+                    stream=AcquisitionStream(file_path,measurement.column_names[:],
+                                             file_format=self.stream_options["file_format"],
+                                             queue_size=self.stream_options["queue_size"],
+                                             option_line=option_line,
+                                             metadata={"Instrument_Description":str(self.description),
+                                                       "measurement":self.stream_options["measurement"]})
+                stream.put(measurement.data)
+                if self.stream_options["sweep_interval"]:
+                    time.sleep(self.stream_options["sweep_interval"])
+        finally:
+            if stream is not None:
+                stream.close()
+        return file_path
+
 class PowerMeter(VisaInstrument):
     """Controls power meters"""
     def initialize(self):
@@ -1565,8 +2265,11 @@ class HighSpeedOscope(VisaInstrument):
             initialize_options[key] = value
         pass
 
+    @timed()
     def measure_waves(self, **options):
-        """Returns data for a measurement in an AsciiDataTable"""
+        """Returns data for a measurement in an AsciiDataTable. If the option stream_path is specified each frame is
+        appended to an AcquisitionStream file (stream_format 'binary' or 'touchstone') as it is acquired, the frames are
+        not kept in memory and the stream path is returned instead of a table"""
         defaults = {"number_frames": 1, "number_points": self.get_number_points(),
                     "timebase_scale": self.get_timebase_scale(), "channels": [1, 2, 3, 4],
                     "initial_time_offset": self.get_time_position(), "timeout_measurement": 10000,
@@ -1574,6 +2277,7 @@ class HighSpeedOscope(VisaInstrument):
                     "specific_descriptor": "Scope", "general_descriptor": "Measurement", "add_header": False,
                     "output_table_options": {"data_delimiter": "\t", "treat_header_as_comment": True},
                     "download_format":"ASCII","verbose_timing":False,
+                    "stream_path":None,"stream_format":"binary","stream_queue_size":16
                     }
         self.measure_options = {}
         for key, value in defaults.items():
@@ -1614,6 +2318,13 @@ class HighSpeedOscope(VisaInstrument):
             time_difference=setup_timer-start_timer
             print(("The setup of the sweep finished at {0} and took {1} seconds".format(setup_timer,time_difference)))
         frames_data = []
+        stream = None
+        if self.measure_options["stream_path"]:
+            stream_column_names = ["Time"]+[channel_string_list[channel - 1]
+                                            for channel in self.measure_options["channels"]]
+            stream = AcquisitionStream(self.measure_options["stream_path"], stream_column_names,
+                                       file_format=self.measure_options["stream_format"],
+                                       queue_size=self.measure_options["stream_queue_size"])
         for frame_index in range(self.measure_options["number_frames"]):
             if self.measure_options["verbose_timing"]:
                 frame_timer=datetime.datetime.now()
@@ -1658,13 +2369,14 @@ class HighSpeedOscope(VisaInstrument):
                 # get data for channel 1
                 self.write(':WAV:SOUR CHAN{0}'.format(channel_read))
                 # get data
-                if re.search("asc", self.measure_options["download_format"], re.IGNORECASE):
-                    data_column = self.resource.query(':WAV:DATA?')
-                    data_column = data_column.replace("\n", "").replace("1-", "-").split(",")
-                else:
-                    # This downloads the data as signed 16bit ints
-                    # Need a conversion to volts
-                    data_column=self.resource.query_binary_values(':WAV:DATA?', datatype='h')
+                with timing_span("HighSpeedOscope.download_channel"):
+                    if re.search("asc", self.measure_options["download_format"], re.IGNORECASE):
+                        data_column = self.resource.query(':WAV:DATA?')
+                        data_column = data_column.replace("\n", "").replace("1-", "-").split(",")
+                    else:
+                        # This downloads the data as signed 16bit ints
+                        # Need a conversion to volts
+                        data_column=self.resource.query_binary_values(':WAV:DATA?', datatype='h')
 
 
                 new_frame.append(data_column)
@@ -1672,7 +2384,18 @@ class HighSpeedOscope(VisaInstrument):
                 if self.measure_options["verbose_timing"]:
                     timer = datetime.datetime.now()
                     print(("Finshed Data Acquistion for Channel {0} at {1}".format(channel_read,timer)))
-            frames_data.append(new_frame)
+            if stream is not None:
+                frame_times = [self.measure_options["initial_time_offset"] +
+                               (row_index + frame_index * len(new_frame[0])) * time_step
+                               for row_index in range(len(new_frame[0]))]
+                stream.put(np.array([frame_times] + [[float(x) for x in column] for column in new_frame]).T)
+            else:
+                frames_data.append(new_frame)
+
+        if stream is not None:
+            stream.close()
+            self.resource.timeout = timeout
+            return self.measure_options["stream_path"]
 
 
         if self.measure_options["verbose_timing"]:
@@ -1688,13 +2411,14 @@ class HighSpeedOscope(VisaInstrument):
         if self.measure_options["verbose_timing"]:
             timer = datetime.datetime.now()
             print(("Data reshaping step1 ended at {0}".format(timer)))
-        for frame_index, frame in enumerate(frames_data):
-            for column_index, column in enumerate(frame):
-                for row_index, row in enumerate(column):
-                    number_rows = len(column)
-                    # print("{0} is {1}".format("([row_index+frame_index*number_rows],[column_index],[frame_index])",
-                    #([row_index + frame_index * number_rows], [column_index], [frame_index])))
-                    measurement_data[row_index + frame_index * number_rows][column_index] =frames_data[frame_index][column_index][row_index]
+        with timing_span("HighSpeedOscope.reshape_frames"):
+            for frame_index, frame in enumerate(frames_data):
+                for column_index, column in enumerate(frame):
+                    for row_index, row in enumerate(column):
+                        number_rows = len(column)
+                        # print("{0} is {1}".format("([row_index+frame_index*number_rows],[column_index],[frame_index])",
+                        #([row_index + frame_index * number_rows], [column_index], [frame_index])))
+                        measurement_data[row_index + frame_index * number_rows][column_index] =frames_data[frame_index][column_index][row_index]
 
         if self.measure_options["verbose_timing"]:
             timer = datetime.datetime.now()
@@ -1895,6 +2619,83 @@ def test_VisaInstrument(address="GPIB::21"):
     print(instrument.state_buffer)
     print(instrument.commands)
 
+def test_EmulationInstrument(address="GPIB::16"):
+    """Tests a VNA with a scripted EmulationInstrument, measures sparameters and wave parameters from the
+    emulation s2p, saves the history and replays it"""
+    vna=VNA(address,emulation_options={"emulation_s2p":EMULATION_S2P,"simulate_latency":False,
+                                       "bandwidth":10.**6})
+    vna.initialize()
+    start_time=time.time()
+    s2p=vna.measure_sparameters()
+    print(("The sparameter measurement took {0} s with {1} s of modeled bus time".format(time.time()-start_time,
+                                                                                     vna.resource.elapsed_time)))
+    print(("The first row of the emulated measurement is {0}".format(s2p.sparameter_complex[0])))
+    print(("The first row of the emulation s2p is {0}".format(EMULATION_S2P.sparameter_complex[0])))
+    vna.initialize(parameters="w2p")
+    w2p=vna.measure_w2p()
+    print(("The w2p has {0} rows and columns {1}".format(len(w2p.data),w2p.column_names)))
+    history_path=vna.resource.save_history(os.path.join(os.getcwd(),"Emulation_History.json"))
+    replay=VisaInstrument(address,emulation_options={"history":history_path,"simulate_latency":False})
+    print(("The replayed power is {0}".format(replay.query("SOUR:POW?"))))
+    os.remove(history_path)
+
+def test_InstrumentHistory(capacity=100):
+    """Tests the bounded InstrumentHistory with a binary log, dumps and replays a time window"""
+    log_path=os.path.join(os.getcwd(),"Instrument_History_Log.bin")
+    instrument=VisaInstrument("GPIB::16",emulation_options={"full_emulation":True,"simulate_latency":False,
+                                                            "history_capacity":capacity,"history_log":log_path})
+    start_time=time.time()
+    for i in range(capacity):
+        instrument.write("SOUR:POW {0}".format(-i))
+        instrument.query("SOUR:POW?")
+    print(("The history has {0} entries with a capacity of {1}".format(len(instrument.history),capacity)))
+    print(("The last entry is {0}".format(instrument.history[-1])))
+    window=instrument.history.get_window(start_time,time.time())
+    print(("The window has {0} entries".format(len(window))))
+    logged=list(read_history_log(log_path))
+    print(("The binary log has {0} entries".format(len(logged))))
+    new_instrument=VisaInstrument("GPIB::16",emulation_options={"full_emulation":True,"simulate_latency":False})
+    number_commands=instrument.history.replay(new_instrument,start_time)
+    print(("Replayed {0} commands, the power is now {1}".format(number_commands,new_instrument.query("SOUR:POW?"))))
+    instrument.close()
+    os.remove(log_path)
+
+def test_AcquisitionStream(number_sweeps=5):
+    """Tests streaming VNA sweeps and scope frames to disk from emulated instruments while a thread tails
+    the stream file"""
+    import tempfile
+    import shutil
+    stream_directory=tempfile.mkdtemp()
+    stream_path=os.path.join(stream_directory,"Acquisition_Stream_Test.bin")
+    tailed_records=[]
+    def follow_stream():
+        # the stream file is created by the writer thread once the first sweep is measured
+        while not os.path.isfile(stream_path) or os.path.getsize(stream_path)==0:
+            time.sleep(.01)
+        for timestamp,data in tail_acquisition_stream(stream_path,poll_interval=.01,timeout=1):
+            tailed_records.append(data.shape)
+    follower=threading.Thread(target=follow_stream)
+    follower.start()
+    vna=VNA("GPIB::16",emulation_options={"emulation_s2p":EMULATION_S2P,"simulate_latency":False})
+    vna.initialize()
+    vna.stream_sweeps(number_sweeps,file_path=stream_path)
+    follower.join()
+    print(("The tail followed {0} records of shape {1}".format(len(tailed_records),tailed_records[0])))
+    header,records=read_acquisition_stream(stream_path)
+    print(("The stream header is {0}".format(header)))
+    print(("The header matches the records: {0}".format(len(header["column_names"])==records[0][1].shape[1])))
+    try:
+        AcquisitionStream(stream_path,["Frequency"]).close()
+    except AcquisitionStreamError as error:
+        print(("Appending different columns raises: {0}".format(error)))
+    os.remove(stream_path)
+    scope=HighSpeedOscope("GPIB::7",emulation_options={"full_emulation":True,"simulate_latency":False})
+    scope.measure_waves(number_frames=number_sweeps,channels=[1,2],stream_path=stream_path,
+                        stream_format="touchstone")
+    header,records=read_acquisition_stream(stream_path)
+    print(("The scope stream has {0} frames with columns {1}".format(len(records),header["column_names"])))
+    shutil.rmtree(stream_directory)
+
 #-------------------------------------------------------------------------------
 # Module Runner       
 
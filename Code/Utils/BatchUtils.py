@@ -0,0 +1,384 @@
+#-----------------------------------------------------------------------------
+# Name:        BatchUtils
+# Purpose:     To convert many files with pyMez models in parallel
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" BatchUtils has a general runner for converting a set of files with a pyMez model. The files are given as a
+directory (with an optional regular expression filter) or a glob, each one is opened with a model class, optionally
+passed through a transform (for example a function in pyMez.Code.DataHandlers.Translations) and saved in an output
+format. The work is split into chunks that run in a pool of processes, every finished file is written to a
+journal so an interrupted batch can be resumed, and a summary of files/s and MB/s is returned at the end.
+A dry run returns the plan without converting anything.
+
+ Examples
+--------
+    #!python
+    >>converter=BatchConverter("C:/Data/**/*.s2p",S2PV1,transform=Snp_to_AsciiDataTable,
+                               output_directory="C:/Data/Tables",output_format="txt")
+    >>converter.dry_run()
+    >>summary=converter.run()
+
+   Help
+---------------
+<a href="./index.html">`pyMez.Code.Utils`</a>
+<div>
+<a href="../../../pyMez_Documentation.html">Documentation Home</a> |
+<a href="../../index.html">API Documentation Home</a> |
+<a href="../../../Examples/html/Examples_Home.html">Examples Home</a> |
+<a href="../../../Reference_Index.html">Index</a>
+</div>"""
+
+#-----------------------------------------------------------------------------
+# Standard Imports
+import os
+import re
+import sys
+import glob
+import json
+import time
+import datetime
+try:
+    from concurrent.futures import ProcessPoolExecutor,as_completed
+except:
+    ProcessPoolExecutor=None
+#-----------------------------------------------------------------------------
+# Third Party Imports
+sys.path.append(os.path.join(os.path.dirname( __file__ ), '..','..'))
+
+#-----------------------------------------------------------------------------
+# Module Constants
+TESTS_DIRECTORY=os.path.join(os.path.dirname(os.path.realpath(__file__)),'Tests')
+"Directory for the files used by the module scripts"
+DEFAULT_JOURNAL_NAME="Batch_Conversion_Journal.txt"
+"Name of the journal written in the output directory when no journal_path is given"
+#-----------------------------------------------------------------------------
+# Module Functions
+def batch_file_paths(input_files,filter=None):
+    """Returns a sorted list of file paths given input_files, a directory that is walked recursively,
+    a glob pattern (** is allowed) or a list of paths. If filter is not None only file names that match the
+    regular expression filter are returned"""
+    if isinstance(input_files,(list,tuple)):
+        file_paths=list(input_files)
+    elif os.path.isdir(input_files):
+        file_paths=[]
+        for root,directories,file_names in os.walk(input_files):
+            for file_name in file_names:
+                file_paths.append(os.path.join(root,file_name))
+    else:
+        file_paths=glob.glob(input_files,recursive=True)
+    file_paths=[file_path for file_path in file_paths if os.path.isfile(file_path)]
+    if filter is not None:
+        filter_pattern=re.compile(filter,re.IGNORECASE)
+        file_paths=[file_path for file_path in file_paths
+                    if re.search(filter_pattern,os.path.basename(file_path))]
+    return sorted(set(file_paths))
+
+def batch_input_root(input_files):
+    """Returns the directory that input_files (a directory, glob or list of paths) are under, for a glob it is
+    the part of the pattern before the first wildcard and for a list the common directory of the paths. Returns
+    None for an empty list or paths on different drives"""
+    if isinstance(input_files,(list,tuple)):
+        if not input_files:
+            return None
+        try:
+            return os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in input_files])
+        except ValueError:
+            return None
+    input_root=input_files
+    while glob.has_magic(input_root):
+        input_root=os.path.dirname(input_root)
+    return input_root or os.curdir
+
+def batch_output_path(input_path,output_directory=None,output_format=None,input_root=None):
+    """Returns the output path for input_path, the file name is kept and its extension is changed to
+    output_format if it is not None. If output_directory is None the file is placed next to the input,
+    otherwise at the same path relative to output_directory as input_path has relative to input_root (just the
+    file name if input_root is None or input_path is not under it)"""
+    if output_directory is None:
+        output_directory=os.path.dirname(input_path)
+    elif input_root is not None:
+        relative_directory=os.path.relpath(os.path.dirname(os.path.abspath(input_path)),
+                                           os.path.abspath(input_root))
+        if relative_directory!=os.curdir and not relative_directory.startswith(os.pardir):
+            output_directory=os.path.join(output_directory,relative_directory)
+    file_name=os.path.basename(input_path)
+    if output_format is not None:
+        file_name=os.path.splitext(file_name)[0]+"."+output_format.replace(".","")
+    return os.path.join(output_directory,file_name)
+
+def convert_file(task):
+    """Converts a single file described by the dictionary task, the unit of work of BatchConverter.
+    task has the keys input_path, output_path, model_class, model_options and transform. The file is opened
+    with model_class(input_path,**model_options), passed through transform if it is not None and saved with the
+    save method of the result (str() of the result is written for objects without one). Returns a journal record,
+    errors are recorded with status failed instead of raised so one bad file does not stop a batch"""
+    start=time.time()
+    record={"input_path":task["input_path"],"output_path":task["output_path"],
+            "bytes":os.path.getsize(task["input_path"]),"input_modified":os.path.getmtime(task["input_path"])}
+    try:
+        output_directory=os.path.dirname(task["output_path"])
+        if output_directory and not os.path.isdir(output_directory):
+            os.makedirs(output_directory,exist_ok=True)
+        model=task["model_class"](task["input_path"],**task["model_options"])
+        if task["transform"] is not None:
+            model=task["transform"](model)
+        if hasattr(model,"save"):
+            model.save(task["output_path"])
+        else:
+            out_file=open(task["output_path"],"w")
+            out_file.write(str(model))
+            out_file.close()
+        record["status"]="converted"
+        record["error"]=None
+    except Exception as error:
+        record["status"]="failed"
+        record["error"]="{0}: {1}".format(type(error).__name__,error)
+    record["seconds"]=time.time()-start
+    return record
+
+def convert_file_chunk(tasks):
+    """Converts every task in the list tasks with convert_file and returns the list of journal records"""
+    return [convert_file(task) for task in tasks]
+
+def read_batch_journal(journal_path):
+    """Reads a batch journal, one json record per line, and returns a dictionary of {input_path:record} with
+    the last record of each file. Lines that can not be read, for example from an interrupted write, are skipped"""
+    records={}
+    if journal_path is None or not os.path.isfile(journal_path):
+        return records
+    in_file=open(journal_path,"r")
+    for line in in_file:
+        try:
+            record=json.loads(line)
+            records[record["input_path"]]=record
+        except (ValueError,KeyError):
+            pass
+    in_file.close()
+    return records
+
+def throughput_summary(records,seconds,number_skipped=0):
+    """Returns a dictionary summarizing the journal records of a batch that took seconds, with the number
+    of files converted, failed and skipped and the throughput in files/s and MB/s"""
+    number_converted=len([record for record in records if record["status"]=="converted"])
+    number_bytes=sum([record["bytes"] for record in records])
+    if seconds>0:
+        files_per_second=len(records)/seconds
+        megabytes_per_second=number_bytes/seconds/10.**6
+    else:
+        files_per_second=0.
+        megabytes_per_second=0.
+    return {"files":len(records),"converted":number_converted,"failed":len(records)-number_converted,
+            "skipped":number_skipped,"megabytes":number_bytes/10.**6,"seconds":seconds,
+            "files_per_second":files_per_second,"megabytes_per_second":megabytes_per_second}
+
+#-----------------------------------------------------------------------------
+# Module Classes
+class BatchConverter(object):
+    """BatchConverter converts every file given by input_files (a directory, glob or list of paths) with
+    model_class. The options are output_directory (the inputs keep their paths relative to input_root, which
+    defaults to the directory of input_files), input_root, output_format (extension of the output files),
+    transform (a function of the model that returns the object to save), model_options (passed to model_class),
+    filter (regular expression for file names), parallel, max_workers, chunksize (files per scheduled chunk),
+    journal_path, resume (skip files the journal lists as converted and unchanged) and overwrite (convert files
+    whose output already exists). model_class and transform must be importable at module level to be sent to
+    the worker processes"""
+    def __init__(self,input_files,model_class,**options):
+        "Initializes BatchConverter"
+        defaults={"output_directory":None,"input_root":None,"output_format":None,"transform":None,"model_options":{},
+                  "filter":None,"parallel":True,"max_workers":None,"chunksize":8,"journal_path":None,
+                  "resume":True,"overwrite":True}
+        self.options={}
+        for key,value in defaults.items():
+            self.options[key]=value
+        for key,value in options.items():
+            self.options[key]=value
+        self.input_files=input_files
+        self.input_root=self.options["input_root"]
+        if self.input_root is None:
+            self.input_root=batch_input_root(input_files)
+        self.model_class=model_class
+        self.journal_path=self.options["journal_path"]
+        if self.journal_path is None:
+            if self.options["output_directory"] is not None:
+                self.journal_path=os.path.join(self.options["output_directory"],DEFAULT_JOURNAL_NAME)
+            elif isinstance(input_files,str) and os.path.isdir(input_files):
+                self.journal_path=os.path.join(input_files,DEFAULT_JOURNAL_NAME)
+        self.summary=None
+
+    def get_file_paths(self):
+        """Returns the list of input files, without the journal"""
+        file_paths=batch_file_paths(self.input_files,self.options["filter"])
+        if self.journal_path is not None:
+            file_paths=[file_path for file_path in file_paths
+                        if os.path.abspath(file_path)!=os.path.abspath(self.journal_path)]
+        return file_paths
+
+    def plan(self):
+        """Returns a list of dictionaries with input_path, output_path, bytes and action for every input file.
+        action is convert, or skip with the reason in reason (already converted in the journal, output exists or
+        the output is the same as the output of an earlier input)"""
+        journal_records={}
+        if self.options["resume"]:
+            journal_records=read_batch_journal(self.journal_path)
+        plan=[]
+        output_inputs={}
+        for input_path in self.get_file_paths():
+            output_path=batch_output_path(input_path,self.options["output_directory"],self.options["output_format"],
+                                          self.input_root)
+            step={"input_path":input_path,"output_path":output_path,"bytes":os.path.getsize(input_path),
+                  "action":"convert","reason":None}
+            output_key=os.path.normcase(os.path.abspath(output_path))
+            record=journal_records.get(input_path)
+            if output_key in output_inputs:
+                step["action"]="skip"
+                step["reason"]="duplicate output of {0}".format(output_inputs[output_key])
+            elif record is not None and record["status"]=="converted" and os.path.isfile(record["output_path"]) \
+                    and record["input_modified"]==os.path.getmtime(input_path):
+                step["action"]="skip"
+                step["reason"]="converted in journal"
+            elif not self.options["overwrite"] and os.path.isfile(output_path):
+                step["action"]="skip"
+                step["reason"]="output exists"
+            output_inputs.setdefault(output_key,input_path)
+            plan.append(step)
+        return plan
+
+    def dry_run(self):
+        """Prints and returns the plan without converting any files"""
+        plan=self.plan()
+        number_convert=len([step for step in plan if step["action"]=="convert"])
+        for step in plan:
+            if step["action"]=="convert":
+                print(("convert {0} -> {1}".format(step["input_path"],step["output_path"])))
+            else:
+                print(("skip {0} ({1})".format(step["input_path"],step["reason"])))
+        print(("{0} files to convert ({1:.3f} MB), {2} to skip".format(
+            number_convert,sum([step["bytes"] for step in plan if step["action"]=="convert"])/10.**6,
+            len(plan)-number_convert)))
+        return plan
+
+    def get_tasks(self,plan=None):
+        """Returns the convert_file tasks for the steps of plan that are to be converted"""
+        if plan is None:
+            plan=self.plan()
+        return [{"input_path":step["input_path"],"output_path":step["output_path"],"model_class":self.model_class,
+                 "model_options":self.options["model_options"],"transform":self.options["transform"]}
+                for step in plan if step["action"]=="convert"]
+
+    def run(self):
+        """Converts the planned files and returns the throughput summary. The tasks are scheduled in chunks of
+        chunksize files on a pool of max_workers processes (or run here if parallel is False) and each record
+        is appended to the journal as its chunk finishes"""
+        start=time.time()
+        plan=self.plan()
+        tasks=self.get_tasks(plan)
+        number_skipped=len(plan)-len(tasks)
+        chunksize=max(1,int(self.options["chunksize"]))
+        chunks=[tasks[index:index+chunksize] for index in range(0,len(tasks),chunksize)]
+        if self.options["output_directory"] is not None and not os.path.isdir(self.options["output_directory"]):
+            os.makedirs(self.options["output_directory"])
+        journal_file=None
+        if self.journal_path is not None:
+            journal_file=open(self.journal_path,"a")
+        records=[]
+        try:
+            if self.options["parallel"] and ProcessPoolExecutor is not None and len(chunks)>1:
+                with ProcessPoolExecutor(max_workers=self.options["max_workers"]) as executor:
+                    futures=[executor.submit(convert_file_chunk,chunk) for chunk in chunks]
+                    for future in as_completed(futures):
+                        self.__write_records__(future.result(),records,journal_file)
+            else:
+                for chunk in chunks:
+                    self.__write_records__(convert_file_chunk(chunk),records,journal_file)
+        finally:
+            if journal_file is not None:
+                journal_file.close()
+        self.records=records
+        self.summary=throughput_summary(records,time.time()-start,number_skipped)
+        return self.summary
+
+    def __write_records__(self,chunk_records,records,journal_file):
+        """Adds the records of a finished chunk to records and the journal"""
+        for record in chunk_records:
+            record["finished"]=datetime.datetime.now().isoformat()
+            records.append(record)
+            if journal_file is not None:
+                journal_file.write(json.dumps(record)+"\n")
+        if journal_file is not None:
+            journal_file.flush()
+
+    def get_failed(self):
+        """Returns the records of the last run that failed"""
+        return [record for record in self.records if record["status"]=="failed"]
+
+    def print_summary(self):
+        """Prints the summary of the last run"""
+        if self.summary is None:
+            print("The batch has not been run")
+            return
+        print(("{files} files ({converted} converted, {failed} failed, {skipped} skipped), {megabytes:.3f} MB in "
+               "{seconds:.3f} s: {files_per_second:.1f} files/s, {megabytes_per_second:.3f} MB/s".format(
+            **self.summary)))
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_BatchConverter(number_copies=24,parallel=True):
+    """Converts number_copies copies of a test s2p file to AsciiDataTable text files, checks the dry run, the
+    journal based resume and prints the throughput"""
+    import shutil
+    import tempfile
+    from Code.DataHandlers.TouchstoneModels import S2PV1
+    from Code.DataHandlers.Translations import Snp_to_AsciiDataTable
+    test_file=os.path.join(os.path.dirname(os.path.realpath(__file__)),'..','DataHandlers','Tests','thru.s2p')
+    work_directory=tempfile.mkdtemp()
+    try:
+        input_directory=os.path.join(work_directory,"Input")
+        output_directory=os.path.join(work_directory,"Output")
+        os.makedirs(input_directory)
+        for index in range(number_copies):
+            shutil.copy(test_file,os.path.join(input_directory,"thru_{0:03d}.s2p".format(index)))
+        with open(os.path.join(input_directory,"broken.s2p"),"w") as broken_file:
+            broken_file.write("not a touchstone file\n1 2\n")
+        converter=BatchConverter(os.path.join(input_directory,"*.s2p"),S2PV1,transform=Snp_to_AsciiDataTable,
+                                 output_directory=output_directory,output_format="txt",parallel=parallel,
+                                 chunksize=4)
+        plan=converter.dry_run()
+        print(("The dry run planned {0} files and wrote {1} outputs".format(len(plan),
+                                                                           len(os.listdir(work_directory))-1)))
+        converter.run()
+        converter.print_summary()
+        print(("The failed files are {0}".format([os.path.basename(record["input_path"])
+                                                   for record in converter.get_failed()])))
+        resumed_converter=BatchConverter(os.path.join(input_directory,"*.s2p"),S2PV1,
+                                         transform=Snp_to_AsciiDataTable,output_directory=output_directory,
+                                         output_format="txt",parallel=parallel)
+        resumed_converter.run()
+        resumed_converter.print_summary()
+        # files with the same name in different sub directories keep their own outputs
+        for sub_directory in ["Port_1","Port_2"]:
+            os.makedirs(os.path.join(input_directory,sub_directory))
+            shutil.copy(test_file,os.path.join(input_directory,sub_directory,"thru.s2p"))
+        shutil.copy(test_file,os.path.join(input_directory,"Port_2","thru.S2P"))
+        tree_output_directory=os.path.join(work_directory,"Tree_Output")
+        tree_converter=BatchConverter(input_directory,S2PV1,transform=Snp_to_AsciiDataTable,filter=r"^thru\.s2p$",
+                                      output_directory=tree_output_directory,output_format="txt",parallel=parallel)
+        tree_plan=tree_converter.plan()
+        print(("The same named files are planned as {0}".format(
+            [(os.path.relpath(step["output_path"],tree_output_directory),step["action"],step["reason"] is not None)
+             for step in tree_plan])))
+        tree_converter.run()
+        print(("The converted tree has {0}".format(sorted([os.path.relpath(os.path.join(root,file_name),
+                                                                            tree_output_directory)
+                                                           for root,directories,file_names in
+                                                           os.walk(tree_output_directory)
+                                                           for file_name in file_names if file_name.endswith("txt")
+                                                           and file_name!=DEFAULT_JOURNAL_NAME]))))
+    finally:
+        shutil.rmtree(work_directory)
+
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_BatchConverter()
@@ -23,6 +23,11 @@ Help
 import os,sys
 import datetime
 import re
+import json
+try:
+    from concurrent.futures import ThreadPoolExecutor,wait,FIRST_COMPLETED
+except ImportError:
+    ThreadPoolExecutor=None
 #-------------------------------------------------------------------------------
 # Third party imports
 
@@ -57,6 +62,8 @@ OS_STAT_FIELDS=['mode','ino','device','number_links','user_id','group_id',
 'size','acess_time','mod_time','creation_time']
 GET_STATS_FIELDS=['author','title','subject','keywords','comments','category']
 TESTS_DIRECTORY=os.path.join(os.path.dirname(os.path.realpath(__file__)),'Tests')
+HARVEST_TAGS=['System_Metadata','File_Metadata','Image_Metadata','Python_Docstring']
+"The metadata element names that harvest_metadata fills, in the order metadata_robot adds them"
 
 #-------------------------------------------------------------------------------
 # Module Functions
@@ -131,15 +138,22 @@ def get_stats(path):
         enumerate(GET_STATS_FIELDS)])
         return stat_dictionary
     
-def get_system_metadata(path):
-    """ Returns a dictionary of the data found with os.stat """
-    metadata_dictionary=dict([(Field,os.stat(path)[index]) for index,Field in \
+def stat_to_metadata(stat_result):
+    """ Returns the dictionary of OS_STAT_FIELDS for a os.stat result, times are in iso format"""
+    metadata_dictionary=dict([(Field,stat_result[index]) for index,Field in
     enumerate(OS_STAT_FIELDS)])
     for key,value in metadata_dictionary.items():
         if 'time' in key:
             metadata_dictionary[key]=\
             datetime.datetime.fromtimestamp(value).isoformat()
     return metadata_dictionary
+
+def get_system_metadata(path,stat_result=None):
+    """ Returns a dictionary of the data found with os.stat, pass stat_result if the file
+    was already stat'ed (for instance by os.scandir)"""
+    if stat_result is None:
+        stat_result=os.stat(path)
+    return stat_to_metadata(stat_result)
 def get_file_metadata(path):
     """ Returns Windows File System information using com"""
     metadata_dictionary={}
@@ -157,12 +171,11 @@ def get_image_metadata(path):
         del(im)
         if EXIF_AVAILABLE:
             try:
-                f=open(path,'rb')
-                EXIF_dictionary=EXIF.process_file(f)
-                
+                with open(path,'rb') as f:
+                    EXIF_dictionary=EXIF.process_file(f)
                 for key,value in EXIF_dictionary.items():
-                    metadata_dictionary[key.replace(' ','_')]=value 
-            except: pass              
+                    metadata_dictionary[key.replace(' ','_')]=value
+            except: pass
         return metadata_dictionary
     else:
         return None
@@ -172,30 +185,26 @@ def get_python_metadata(path):
     file_extension=path.split('.')[-1].lower()
     if not file_extension == 'py':
         return
-    else: 
-        f=open(path,'r')
-        quote_number=0
-        string=''
-        for line in f.readlines():
-            if '#' in line:
-                pass
-            elif '\"""' in line:
-                if quote_number<2:
-                    quote_number=line.count('\"\"\"')+quote_number
-                    string=string+line
-                elif quote_number==2:
-                    return {'Python_Docstring':string}
+    else:
+        # read line by line so only the head of the file is read
+        with open(path,'r') as f:
+            quote_number=0
+            string=''
+            for line in f:
+                if '#' in line:
+                    pass
+                elif '\"""' in line:
+                    if quote_number<2:
+                        quote_number=line.count('\"\"\"')+quote_number
+                        string=string+line
+                    elif quote_number==2:
+                        return {'Python_Docstring':string}
 
     
 def get_metadata(path):
     """ Gets system or file metadata """
     # First we get the easy stuff --- Do the formating later
-    metadata_dictionary=dict([(Field,os.stat(path)[index]) for index,Field in \
-    enumerate(OS_STAT_FIELDS)])
-    for key,value in metadata_dictionary.items():
-        if 'time' in key:
-            metadata_dictionary[key]=\
-            datetime.datetime.fromtimestamp(value).isoformat()
+    metadata_dictionary=get_system_metadata(path)
     # Now for the detailed stuff
     try: 
         for key,value in get_stats(path).items():
@@ -211,7 +220,182 @@ def get_metadata(path):
                   
     return metadata_dictionary
 
-                
+def scan_tree(root,**options):
+    """ Yields (path, os.stat result) for every file under root using os.scandir, so each file is
+    stat'ed once (and on windows not at all, the directory listing has the stat). **options
+    can be {'ignore':'.pyc|etc'} or {'only':'.png|.bmp'} regular expressions on the file name"""
+    defaults={"ignore":None,"only":None}
+    scan_options={}
+    for key,value in defaults.items():
+        scan_options[key]=value
+    for key,value in options.items():
+        scan_options[key]=value
+    directories=[root]
+    while directories:
+        directory=directories.pop()
+        try:
+            entries=list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(entry.path)
+            elif entry.is_file():
+                if scan_options["ignore"] is not None and re.search(scan_options["ignore"],entry.name):
+                    continue
+                if scan_options["only"] is not None and not re.search(scan_options["only"],entry.name):
+                    continue
+                yield (entry.path,entry.stat())
+
+def extract_metadata(path,stat_result=None):
+    """ Returns a dictionary of HARVEST_TAGS:metadata for path, a value is None if the extractor
+    does not apply to the file or failed"""
+    if stat_result is None:
+        stat_result=os.stat(path)
+    metadata={}
+    metadata['System_Metadata']=get_system_metadata(path,stat_result)
+    metadata['File_Metadata']=None
+    if os.name=='nt':
+        try:
+            metadata['File_Metadata']=get_file_metadata(path)
+        except:
+            pass
+    try:
+        metadata['Image_Metadata']=get_image_metadata(path)
+    except:
+        metadata['Image_Metadata']=None
+    try:
+        python_metadata=get_python_metadata(path)
+        metadata['Python_Docstring']=python_metadata['Python_Docstring']
+    except:
+        metadata['Python_Docstring']=None
+    return metadata
+
+def harvest_metadata(paths,**options):
+    """ Yields (path, metadata dictionary) for each file in paths, a directory to scan with scan_tree or a
+    list of file paths. The extractors open and read files so they run in a thread pool of
+    options["max_workers"] threads, results are yielded as they finish so they can be streamed into a
+    metadata store. If options["cache"] is a MetadataCache files whose modification time and size did not
+    change since they were last harvested are skipped. options["extractor"] is a function
+    (path, stat_result) that returns the metadata, it defaults to extract_metadata. A file whose extractor
+    raises (unreadable or removed during the scan) is skipped and left out of the cache so it is retried next
+    time, (path, error) is appended to the list options["errors"] or printed if it is None"""
+    defaults={"max_workers":8,
+              "cache":None,
+              "extractor":extract_metadata,
+              "parallel":True,
+              "ignore":None,
+              "only":None,
+              "errors":None}
+    harvest_options={}
+    for key,value in defaults.items():
+        harvest_options[key]=value
+    for key,value in options.items():
+        harvest_options[key]=value
+    cache=harvest_options["cache"]
+    extractor=harvest_options["extractor"]
+    errors=harvest_options["errors"]
+    if isinstance(paths,str):
+        path_stats=scan_tree(paths,ignore=harvest_options["ignore"],only=harvest_options["only"])
+    else:
+        path_stats=_stat_paths(paths)
+    if cache is not None:
+        path_stats=((path,stat_result) for (path,stat_result) in path_stats
+                    if not cache.is_current(path,stat_result))
+    if not harvest_options["parallel"] or ThreadPoolExecutor is None:
+        for (path,stat_result) in path_stats:
+            try:
+                metadata=extractor(path,stat_result)
+            except Exception as error:
+                _record_harvest_error(path,error,errors)
+                continue
+            if cache is not None:
+                cache.update(path,stat_result)
+            yield (path,metadata)
+        return
+    # Only a few batches are in flight at a time so very large trees are not held in memory
+    window=4*harvest_options["max_workers"]
+    with ThreadPoolExecutor(max_workers=harvest_options["max_workers"]) as executor:
+        pending={}
+        for (path,stat_result) in path_stats:
+            pending[executor.submit(extractor,path,stat_result)]=(path,stat_result)
+            if len(pending)>=window:
+                done,not_done=wait(list(pending.keys()),return_when=FIRST_COMPLETED)
+                for future in done:
+                    result=_finish_harvest(pending.pop(future),future,cache,errors)
+                    if result is not None:
+                        yield result
+        for future in list(pending.keys()):
+            result=_finish_harvest(pending.pop(future),future,cache,errors)
+            if result is not None:
+                yield result
+
+def _stat_paths(paths):
+    """Yields (path, os.stat result) for the paths that exist"""
+    for path in paths:
+        try:
+            yield (path,os.stat(path))
+        except OSError:
+            pass
+
+def _record_harvest_error(path,error,errors=None):
+    """Appends (path, error) to errors or prints it if errors is None"""
+    if errors is None:
+        print(("No metadata for {0}: {1}".format(path,error)))
+    else:
+        errors.append((path,error))
+
+def _finish_harvest(path_stat,future,cache,errors=None):
+    """Returns (path, metadata) for a finished extractor future and records it in cache, returns None
+    if the extractor raised"""
+    (path,stat_result)=path_stat
+    try:
+        metadata=future.result()
+    except Exception as error:
+        _record_harvest_error(path,error,errors)
+        return None
+    if cache is not None:
+        cache.update(path,stat_result)
+    return (path,metadata)
+
+#-------------------------------------------------------------------------------
+# Module Classes
+class MetadataCache():
+    """ Remembers the modification time and size of every harvested file so that harvest_metadata
+    can skip unchanged files. If file_path is given the cache is read from and saved to that json file"""
+    def __init__(self,file_path=None):
+        self.path=file_path
+        self.signatures={}
+        if file_path is not None and os.path.isfile(file_path):
+            with open(file_path,'r') as in_file:
+                self.signatures=json.load(in_file)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def get_signature(self,stat_result):
+        """Returns the [modification time in ns, size] of a os.stat result"""
+        return [stat_result.st_mtime_ns,stat_result.st_size]
+
+    def is_current(self,path,stat_result):
+        """Returns True if path was harvested and has not changed since"""
+        return self.signatures.get(path)==self.get_signature(stat_result)
+
+    def update(self,path,stat_result):
+        """Records that path was harvested with stat_result"""
+        self.signatures[path]=self.get_signature(stat_result)
+
+    def remove(self,path):
+        """Forgets path so it is harvested again"""
+        self.signatures.pop(path,None)
+
+    def save(self,file_path=None):
+        """Saves the cache as json to file_path, defaults to self.path"""
+        if file_path is None:
+            file_path=self.path
+        with open(file_path,'w') as out_file:
+            json.dump(self.signatures,out_file)
+
 #-------------------------------------------------------------------------------
 # Script Functions
 def test_get_metadata(test_file_path='Data_Table_021311_1.xml'):
@@ -228,11 +412,42 @@ def test_get_python_metadata():
     print(MD)
     # for key,value in MD.iteritems():
     #     print '%s : %s'%(key,value)
-            
-    
+
+def test_harvest_metadata(root=None):
+    """ Times harvesting the metadata of root serially with get_metadata style calls, in parallel with
+    harvest_metadata and again with a MetadataCache so that every file is skipped"""
+    import time
+    if root is None:
+        root=TESTS_DIRECTORY
+    start=time.time()
+    serial_results={}
+    for (path,stat_result) in scan_tree(root):
+        serial_results[path]=extract_metadata(path)
+    serial_time=time.time()-start
+    cache=MetadataCache()
+    start=time.time()
+    parallel_results=dict(harvest_metadata(root,cache=cache))
+    parallel_time=time.time()-start
+    start=time.time()
+    cached_results=dict(harvest_metadata(root,cache=cache))
+    cached_time=time.time()-start
+    print(("{0} files, serial {1:.3f} s, harvest_metadata {2:.3f} s, second harvest skipped {3} of {0} in {4:.3f} s".format(
+        len(serial_results),serial_time,parallel_time,len(serial_results)-len(cached_results),cached_time)))
+    print(("The parallel results are the same: {0}".format(serial_results==parallel_results)))
+    def failing_extractor(path,stat_result):
+        if path.endswith('.py'):
+            raise IOError("could not read {0}".format(path))
+        return extract_metadata(path,stat_result)
+    errors=[]
+    partial_results=dict(harvest_metadata(root,extractor=failing_extractor,errors=errors))
+    print(("With a failing extractor {0} files were harvested and {1} skipped".format(len(partial_results),
+                                                                                      len(errors))))
+
+
 #-------------------------------------------------------------------------------
 # Module Runner    
 
 if __name__ == '__main__':
     test_get_metadata()
-    test_get_python_metadata()
\ No newline at end of file
+    test_get_python_metadata()
+    test_harvest_metadata()
\ No newline at end of file
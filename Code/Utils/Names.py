@@ -25,9 +25,16 @@ import os
 import re
 import datetime
 import glob
+import fnmatch
+import bisect
+import threading
 #-------------------------------------------------------------------------------
 # Module Constants
 GENERAL_DESCRIPTORS=['Log','Measurement','State','Settings']
+FILENAME_INDEX={}
+"Sorted file names by (directory,extension) used by auto_name, each directory is scanned once and then updated"
+FILENAME_INDEX_LOCK=threading.Lock()
+"Lock that protects FILENAME_INDEX from concurrent threads"
 
 #-------------------------------------------------------------------------------
 # Module Functions
@@ -59,15 +66,94 @@ def get_filename_iterator(base_name=None,directory=None,extension=None,padding=3
                 iterator+=1
         return replacement_string.format(iterator+1)
 
-def auto_name(specific_descriptor=None,general_descriptor=None,directory=None,extension='xml',padding=3):
-    """ Returns an automatically generated name for a file in a directory"""
+def get_filename_index(directory=None,extension=None,refresh=False):
+    """Returns the sorted list of file names in directory with extension (the names glob would return for
+    directory/*.extension). The directory is scanned only the first time or if refresh is True, after that the
+    list is kept up to date by add_to_filename_index"""
+    if extension is None:
+        extension="*"
+    if directory is None:
+        directory=os.getcwd()
+    key=(os.path.abspath(directory),extension)
+    with FILENAME_INDEX_LOCK:
+        if refresh or key not in FILENAME_INDEX:
+            pattern='*.'+extension
+            names=[name for name in os.listdir(key[0]) if not name.startswith('.') and
+                   fnmatch.fnmatch(name,pattern)]
+            names.sort()
+            FILENAME_INDEX[key]=names
+        return FILENAME_INDEX[key]
+
+def add_to_filename_index(file_name,directory=None,extension=None):
+    """Adds a new file name to the index of directory, if the directory has been indexed"""
+    if extension is None:
+        extension="*"
+    if directory is None:
+        directory=os.getcwd()
+    key=(os.path.abspath(directory),extension)
+    with FILENAME_INDEX_LOCK:
+        if key in FILENAME_INDEX:
+            names=FILENAME_INDEX[key]
+            position=bisect.bisect_left(names,file_name)
+            if position==len(names) or names[position]!=file_name:
+                names.insert(position,file_name)
+
+def clear_filename_index(directory=None):
+    """Removes directory from the file name index, or the whole index if directory is None. Use this if
+    files are deleted or renamed in an indexed directory"""
+    with FILENAME_INDEX_LOCK:
+        if directory is None:
+            FILENAME_INDEX.clear()
+        else:
+            directory=os.path.abspath(directory)
+            for key in list(FILENAME_INDEX.keys()):
+                if key[0]==directory:
+                    del FILENAME_INDEX[key]
+
+def count_filename_matches(base_name,names):
+    """Returns the number of names in the sorted list names that re.match base_name. Base names without
+    regular expression characters are counted as a prefix range by bisection"""
+    if base_name and re.escape(base_name)==base_name:
+        start=bisect.bisect_left(names,base_name)
+        stop=bisect.bisect_left(names,base_name[:-1]+chr(ord(base_name[-1])+1))
+        return stop-start
+    return len([name for name in names if re.match(base_name,name)])
+
+def auto_name(specific_descriptor=None,general_descriptor=None,directory=None,extension='xml',padding=3,
+              reserve=False):
+    """ Returns an automatically generated name for a file in a directory. The iterator is determined from the
+    file name index of the directory, the directory is scanned once and names found on disk afterwards are added
+    to the index as they are encountered. If reserve is True the file is created empty with an atomic
+    exclusive create, so that concurrent writers never receive the same name"""
     if not specific_descriptor is None:
-        name=specific_descriptor
+        base_name=specific_descriptor
         if not general_descriptor is None:
-            name=name+'_'+general_descriptor
-        name=name+'_'+get_date()+'_'
-        name=name+get_filename_iterator(name,directory,extension,padding)+'.'+extension
-        return name
+            base_name=base_name+'_'+general_descriptor
+        base_name=base_name+'_'+get_date()+'_'
+        if directory is None:
+            full_directory=os.getcwd()
+        else:
+            full_directory=directory
+        replacement_string="{:0"+str(padding)+"d}"
+        names=get_filename_index(full_directory,extension)
+        while True:
+            iterator=count_filename_matches(base_name,names)+1
+            name=base_name+replacement_string.format(iterator)+'.'+extension
+            path=os.path.join(full_directory,name)
+            if reserve:
+                try:
+                    os.close(os.open(path,os.O_CREAT|os.O_EXCL|os.O_WRONLY))
+                    created=True
+                except OSError:
+                    created=False
+            else:
+                created=not os.path.exists(path)
+            if created and not reserve:
+                return name
+            # the name is now on disk, so it is added to the index before returning or trying the next one
+            add_to_filename_index(name,full_directory,extension)
+            if created:
+                return name
     else:
         return None
 
@@ -177,6 +263,41 @@ def test_filename_change_iterator():
     print(("-"*80))
     print(("The result of filename_decrement is {0}".format(filename_decrement(name))))
 
+def test_auto_name_performance(number_files=100000,number_names=100):
+    """Compares the time to generate number_names names with auto_name and with the directory scan of
+    get_filename_iterator in a synthetic directory of number_files files"""
+    import tempfile
+    import shutil
+    import time
+    directory=tempfile.mkdtemp()
+    try:
+        for i in range(number_files):
+            open(os.path.join(directory,"Synthetic_Measurement_{0}_{1:06d}.xml".format(get_date(),i)),'w').close()
+        start=time.time()
+        for i in range(number_names):
+            base_name="Test_State_"+get_date()+"_"
+            name=base_name+get_filename_iterator(base_name,directory,'xml')+'.xml'
+            open(os.path.join(directory,name),'w').close()
+        scan_time=time.time()-start
+        clear_filename_index()
+        start=time.time()
+        for i in range(number_names):
+            name=auto_name("Test","Index",directory,'xml')
+            open(os.path.join(directory,name),'w').close()
+        index_time=time.time()-start
+        start=time.time()
+        for i in range(number_names):
+            auto_name("Test","Reserved",directory,'xml',reserve=True)
+        reserve_time=time.time()-start
+        print(("{0} names in a directory of {1} files took:".format(number_names,number_files)))
+        print(("{0} s with get_filename_iterator".format(scan_time)))
+        print(("{0} s with auto_name".format(index_time)))
+        print(("{0} s with auto_name(reserve=True)".format(reserve_time)))
+        print(("The last name was {0}".format(name)))
+    finally:
+        clear_filename_index(directory)
+        shutil.rmtree(directory)
+
 #-------------------------------------------------------------------------------
 # Module Runner
 
@@ -6,7 +6,18 @@
 # License:     MIT License
 #-----------------------------------------------------------------------------
 """ PerformanceUtils contains functions and classes for testing the performance of
- code in pyMez
+ code in pyMez. Timing is collected in hierarchical spans measured with time.perf_counter, together with named
+ counters and optional memory sampling (tracemalloc), in the in-process PERFORMANCE_REGISTRY. Collection is off by
+ default and the decorators only check a flag until enable_profiling() is called. The results can be exported as
+ json or as collapsed stacks for flame graph tools.
+
+ Examples
+--------
+    #!python
+    >>enable_profiling()
+    >>s2p=S2PV1("thru.s2p")
+    >>print_profile()
+    >>export_flame_graph("pyMez_Profile.txt")
 
    Help
 ---------------
@@ -20,33 +31,233 @@
 
 #-----------------------------------------------------------------------------
 # Standard Imports
+import os
 import datetime
 import time
+import json
+import threading
+import functools
+try:
+    import tracemalloc
+    TRACEMALLOC_AVAILABLE=True
+except:
+    TRACEMALLOC_AVAILABLE=False
+try:
+    perf_counter=time.perf_counter
+except AttributeError:
+    perf_counter=time.time
 #-----------------------------------------------------------------------------
 # Third Party Imports
 
 #-----------------------------------------------------------------------------
 # Module Constants
-def timer(function):
-    """Timer is meant to be a decorator for a function or method that prints its time"""
 
-    def timed(*args,**keywordargs):
+#-----------------------------------------------------------------------------
+# Module Functions
+def timing_span(name,registry=None):
+    """Returns a context manager that records the time of its block as a span, for example
+    with timing_span("parse"): ..."""
+    return TimingSpan(name,registry)
+
+def timed(name=None,registry=None):
+    """timed is a decorator factory that records every call of a function or method as a span. The span name
+    defaults to the function's __module__.__qualname__, use as @timed() or @timed("name")"""
+    def decorator(function):
+        span_name=name
+        if span_name is None:
+            span_name="{0}.{1}".format(function.__module__.split(".")[-1],
+                                       getattr(function,"__qualname__",function.__name__))
+        @functools.wraps(function)
+        def timed_function(*args,**keywordargs):
+            span_registry=registry
+            if span_registry is None:
+                span_registry=PERFORMANCE_REGISTRY
+            if not span_registry.enabled:
+                return function(*args,**keywordargs)
+            with TimingSpan(span_name,span_registry):
+                return function(*args,**keywordargs)
+        return timed_function
+    return decorator
+
+def count_event(name,value=1,registry=None):
+    """Adds value to the counter name in the registry"""
+    if registry is None:
+        registry=PERFORMANCE_REGISTRY
+    registry.increment(name,value)
+
+def enable_profiling(memory=False,reset=True):
+    """Turns on collection in PERFORMANCE_REGISTRY, if memory is True the peak traced memory of each span is
+    recorded"""
+    if reset:
+        PERFORMANCE_REGISTRY.reset()
+    PERFORMANCE_REGISTRY.enable(memory=memory)
+
+def disable_profiling():
+    """Turns off collection in PERFORMANCE_REGISTRY"""
+    PERFORMANCE_REGISTRY.disable()
+
+def get_profile(registry=None):
+    """Returns the spans and counters of the registry as a dictionary"""
+    if registry is None:
+        registry=PERFORMANCE_REGISTRY
+    return registry.get_report()
+
+def print_profile(registry=None,number_spans=25):
+    """Prints the number_spans spans with the largest total time and all counters"""
+    report=get_profile(registry)
+    print(("{0:>10} {1:>12} {2:>12} {3:>12}  {4}".format("calls","total (s)","self (s)","max (s)","span")))
+    for span in report["spans"][:number_spans]:
+        print(("{0:>10} {1:>12.6f} {2:>12.6f} {3:>12.6f}  {4}".format(span["calls"],span["total"],span["self"],
+                                                                      span["max"],span["path"])))
+    for name,value in sorted(report["counters"].items()):
+        print(("{0} = {1}".format(name,value)))
+
+def export_json(file_path,registry=None):
+    """Writes the spans and counters of the registry to a json file and returns the path"""
+    out_file=open(file_path,'w')
+    json.dump(get_profile(registry),out_file,indent=2)
+    out_file.close()
+    return file_path
+
+def export_flame_graph(file_path,registry=None):
+    """Writes the spans in the collapsed stack format ('outer;inner self_time_in_microseconds' per line)
+    read by flamegraph.pl, speedscope and similar tools. Returns the path"""
+    report=get_profile(registry)
+    out_file=open(file_path,'w')
+    for span in report["spans"]:
+        out_file.write("{0} {1}\n".format(span["path"].replace(" ","_"),int(round(span["self"]*10**6))))
+    out_file.close()
+    return file_path
+
+def timer(function):
+    """Timer is meant to be a decorator for a function or method that prints its time, the time is also
+    recorded as a span if profiling is enabled"""
+    timed_function=timed(function.__name__)(function)
+    @functools.wraps(function)
+    def timer_function(*args,**keywordargs):
         start_time=datetime.datetime.now()
-        result=function(*args,**keywordargs)
+        start=perf_counter()
+        result=timed_function(*args,**keywordargs)
+        elapsed=perf_counter()-start
         stop_time=datetime.datetime.now()
         print(("The function {0} started at {1} and ended at {2}".format(function.__name__,
                                                                         start_time,
                                                                         stop_time)))
-        diff=stop_time-start_time
-        print(("It took {0} seconds to run".format(diff.total_seconds())))
+        print(("It took {0} seconds to run".format(elapsed)))
         return result
 
-    return timed
-#-----------------------------------------------------------------------------
-# Module Functions
+    return timer_function
 
 #-----------------------------------------------------------------------------
 # Module Classes
+class PerformanceRegistry():
+    """PerformanceRegistry collects timing spans, counters and memory samples. Spans are stored by their call path
+    (a tuple of span names from the outermost span) with the number of calls, total, self (total minus child spans),
+    minimum and maximum time in seconds and, if memory sampling is on, the peak traced memory in bytes."""
+    def __init__(self):
+        self.enabled=False
+        self.memory=False
+        self.spans={}
+        self.counters={}
+        self.lock=threading.Lock()
+        self.local=threading.local()
+
+    def get_stack(self):
+        """Returns the span stack of the current thread"""
+        if not hasattr(self.local,"stack"):
+            self.local.stack=[]
+        return self.local.stack
+
+    def enable(self,memory=False):
+        """Starts collecting, if memory is True tracemalloc is started and spans record their peak memory"""
+        self.enabled=True
+        self.memory=memory and TRACEMALLOC_AVAILABLE
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        """Stops collecting, the results are kept until reset"""
+        self.enabled=False
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.memory=False
+
+    def reset(self):
+        """Removes all spans and counters"""
+        with self.lock:
+            self.spans={}
+            self.counters={}
+
+    def increment(self,name,value=1):
+        """Adds value to the counter name"""
+        if self.enabled:
+            with self.lock:
+                self.counters[name]=self.counters.get(name,0)+value
+
+    def record(self,path,elapsed,child_time,peak_memory=None):
+        """Adds a finished span to the registry"""
+        with self.lock:
+            span=self.spans.get(path)
+            if span is None:
+                span={"calls":0,"total":0.,"self":0.,"min":elapsed,"max":elapsed,"peak_memory":None}
+                self.spans[path]=span
+            span["calls"]+=1
+            span["total"]+=elapsed
+            span["self"]+=elapsed-child_time
+            span["min"]=min(span["min"],elapsed)
+            span["max"]=max(span["max"],elapsed)
+            if peak_memory is not None:
+                span["peak_memory"]=max(span["peak_memory"] or 0,peak_memory)
+
+    def get_report(self):
+        """Returns the spans as a list of dictionaries sorted by total time and the counters as a dictionary"""
+        with self.lock:
+            spans=[dict(span,path=";".join(path),name=path[-1]) for path,span in self.spans.items()]
+            counters=dict(self.counters)
+        spans.sort(key=lambda span:span["total"],reverse=True)
+        return {"spans":spans,"counters":counters}
+
+class TimingSpan():
+    """TimingSpan is a context manager that times its block as a span of name in a PerformanceRegistry, spans
+    opened inside the block are recorded as its children. If the registry is not enabled it does nothing"""
+    def __init__(self,name,registry=None):
+        self.name=name
+        if registry is None:
+            registry=PERFORMANCE_REGISTRY
+        self.registry=registry
+        self.active=False
+
+    def __enter__(self):
+        if self.registry.enabled:
+            self.active=True
+            stack=self.registry.get_stack()
+            self.path=tuple([frame[0] for frame in stack])+(self.name,)
+            if self.registry.memory and hasattr(tracemalloc,"reset_peak") and tracemalloc.is_tracing():
+                # keep the enclosing span's peak so far before the peak is reset for this span
+                if stack:
+                    stack[-1][2]=max(stack[-1][2],tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+            # [name, child_time, peak_memory before the last child span]
+            stack.append([self.name,0.,0])
+            self.start=perf_counter()
+        return self
+
+    def __exit__(self,exception_type,exception_value,traceback):
+        if self.active:
+            elapsed=perf_counter()-self.start
+            stack=self.registry.get_stack()
+            frame=stack.pop()
+            if stack:
+                stack[-1][1]+=elapsed
+            peak_memory=None
+            if self.registry.memory and tracemalloc.is_tracing():
+                peak_memory=max(tracemalloc.get_traced_memory()[1],frame[2])
+            self.registry.record(self.path,elapsed,frame[1],peak_memory)
+            self.active=False
+        return False
+
+PERFORMANCE_REGISTRY=PerformanceRegistry()
+"The in-process registry used by timing_span, timed, count_event and timer"
 
 #-----------------------------------------------------------------------------
 # Module Scripts
@@ -63,8 +274,39 @@ def test_timer_with_args():
         time.sleep(wait)
 
     wait_around(time_to_wait)
+
+def test_timing_span():
+    """Tests nested spans, the timed decorator, counters and the exports"""
+    @timed()
+    def inner(wait):
+        time.sleep(wait)
+        count_event("inner_calls")
+
+    import tempfile
+    import shutil
+    enable_profiling(memory=True)
+    with timing_span("outer"):
+        data=[x**2 for x in range(100000)]
+        del data
+        for i in range(3):
+            inner(.01)
+    disable_profiling()
+    print_profile()
+    spans=PERFORMANCE_REGISTRY.get_report()["spans"]
+    outer_peak=[span["peak_memory"] for span in spans if span["path"]=="outer"][0]
+    inner_peak=max([span["peak_memory"] for span in spans if span["path"]!="outer"])
+    print(("The outer peak memory includes the allocation before the inner spans: {0}".format(
+        outer_peak>inner_peak)))
+    profile_directory=tempfile.mkdtemp()
+    print(export_json(os.path.join(profile_directory,"Test_Profile.json")))
+    flame_graph_path=export_flame_graph(os.path.join(profile_directory,"Test_Profile.txt"))
+    print(flame_graph_path)
+    with open(flame_graph_path) as flame_graph_file:
+        print(flame_graph_file.read())
+    shutil.rmtree(profile_directory)
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
     #test_timer()
-    test_timer_with_args()
\ No newline at end of file
+    test_timer_with_args()
+    test_timing_span()
@@ -56,6 +56,7 @@ TIMED_IMPORT=True
 # The new module load scheme can be for module in API_MODULES.keys()
 API_MODULES={"Code.Utils.Names":True,
              "Code.Utils.Alias":False,
+             "Code.Utils.BatchUtils":False,
              "Code.Utils.DjangoUtils":False,
              "Code.Utils.GetMetadata":False,
              "Code.Utils.HelpUtils":False,
@@ -69,6 +70,7 @@ API_MODULES={"Code.Utils.Names":True,
              "Code.DataHandlers.MUFModels":False,
              "Code.DataHandlers.NISTModels":True,
              "Code.DataHandlers.RadiCALModels":False,
+             "Code.DataHandlers.RegisterModels":False,
              "Code.DataHandlers.StatistiCALModels":False,
              "Code.DataHandlers.TouchstoneModels":True,
              "Code.DataHandlers.Translations":False,